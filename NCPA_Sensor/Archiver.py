@@ -0,0 +1,420 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     Archiver.py
+# Purpose:  Mirror the /data directories of NCPA sensors to local storage
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./Archiver.py -s 52,106,135 -A ~/SensorArchive
+#
+# Files are archived to <archivePath>/<sensor>/<data dir>/<file>.
+# A file is downloaded to <file>.part and renamed when its md5sum
+# matches the one on the sensor. An interrupted .part file is
+# resumed from its current size. <archivePath>/manifest.json
+# records the size and md5sum of every archived file, archived
+# files are not transferred again. The newest file of a sensor is
+# still being written by UMXcontrol and is left for the next run.
+# The transfers are read within the rate limits of the sensor and
+# its uplink and wait while the uplink is paused, see Transfer.py.
+#------------------------------------------------------------------
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import Continuity
+import MonitorCommands
+import NCPASensor_py3 as NCPASensor
+import Transfer
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+MAX_TRANSFERS  = 4    # Concurrent transfers over all sensors
+MAX_PER_SENSOR = 2    # Concurrent transfers per sensor
+SAVE_INTERVAL  = 20   # Save the manifest every SAVE_INTERVAL files
+
+#---------------------------------------------------------------
+def FileMD5( fileName ) :
+    md5 = hashlib.md5()
+    fi  = open( fileName, 'rb' )
+    for chunk in iter( lambda: fi.read( 1 << 20 ), b'' ) :
+        md5.update( chunk )
+    fi.close()
+    return md5.hexdigest()
+
+#---------------------------------------------------------------
+def FormatBytes( numBytes ) :
+    for unit in ( 'B', 'kB', 'MB', 'GB' ) :
+        if numBytes < 1000. or unit == 'GB' :
+            return '%.1f %s' % ( numBytes, unit )
+        numBytes = numBytes / 1000.
+
+#---------------------------------------------------------------
+def FormatDuration( seconds ) :
+    # H:MM:SS, the hours go past 24 for a long backlog
+    minutes, seconds = divmod( int( seconds ), 60 )
+    hours,   minutes = divmod( minutes, 60 )
+    return '%d:%02d:%02d' % ( hours, minutes, seconds )
+
+#---------------------------------------------------------
+# The record of the archived files:
+# { sensor name : { 'dir/file' : { size, md5, time } } }
+#---------------------------------------------------------
+class Manifest:
+    def __init__( self, archivePath ):
+        self.fileName = os.path.join( archivePath, 'manifest.json' )
+        self.sensors  = {}
+
+        os.makedirs( archivePath, exist_ok = True )
+
+        if os.path.exists( self.fileName ) :
+            fi = open( self.fileName, 'r' )
+            self.sensors = json.load( fi )
+            fi.close()
+
+    #-----------------------------------------------------------
+    def IsArchived( self, name, relPath, size ):
+        entry = self.sensors.get( name, {} ).get( relPath )
+        return entry is not None and entry[ 'size' ] == size
+
+    #-----------------------------------------------------------
+    def Add( self, name, relPath, size, md5 ):
+        self.sensors.setdefault( name, {} )[ relPath ] = \
+            { 'size' : size, 'md5' : md5, 'time' : time.time() }
+
+    #-----------------------------------------------------------
+    def Save( self ):
+        # Write then rename so a crash can not truncate the manifest
+        tempName = self.fileName + '.tmp'
+        fo = open( tempName, 'w' )
+        json.dump( self.sensors, fo, indent = 1, sort_keys = True )
+        fo.close()
+        os.replace( tempName, self.fileName )
+
+#---------------------------------------------------------
+# One file to transfer from a sensor
+#---------------------------------------------------------
+class ArchiveFile:
+    def __init__( self, sensor, relPath, size, archivePath ):
+        self.sensor     = sensor
+        self.relPath    = relPath
+        self.remotePath = '/data/' + relPath
+        self.size       = size
+        self.localPath  = os.path.join( archivePath, sensor.name, relPath )
+        self.partPath   = self.localPath + '.part'
+        self.offset     = 0
+        self.popen      = None
+        self.partFile   = None
+
+#---------------------------------------------------------
+# Runs the listings and transfers of a set of sensors. Poll()
+# is called from the Tk mainloop or from the command line loop.
+#---------------------------------------------------------
+class Archiver:
+    def __init__( self, sensors, archivePath,
+                  maxTransfers = MAX_TRANSFERS,
+                  maxPerSensor = MAX_PER_SENSOR ):
+        self.sensors      = sensors        # [ NCPASensor ]
+        self.archivePath  = archivePath
+        self.maxTransfers = maxTransfers
+        self.maxPerSensor = maxPerSensor
+        self.manifest     = Manifest( archivePath )
+        self.listings     = {}             # listing Popen by sensor name
+        self.queue        = []             # ArchiveFile to transfer
+        self.active       = []             # ArchiveFile in transfer
+        self.perSensor    = {}             # active transfers by name
+        self.messages     = ''
+        self.numDone      = 0
+        self.numSkipped   = 0
+        self.numFailed    = 0
+        self.bytesTotal   = 0              # bytes to transfer
+        self.bytesDone    = 0              # bytes transferred
+        self.sinceSave    = 0
+        self.startTime    = time.monotonic()
+
+    #-----------------------------------------------------------
+    def Start( self ):
+        # List the data files of every sensor
+        for sensor in self.sensors :
+            self.listings[ sensor.name ] = \
+                ( sensor, MonitorCommands.DataListCmd( sensor ) )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        # Return True while there is work to do
+        for name in list( self.listings.keys() ) :
+            sensor, popen = self.listings[ name ]
+            sp_out = MonitorCommands.PollOutput( popen )
+            if sp_out == None :
+                continue
+            del( self.listings[ name ] )
+
+            if popen.returncode != 0 :
+                self.Message( sensor.name + ': ls -l /data/* Failed.' )
+                continue
+            self.Plan( sensor, sp_out[0].decode( "utf-8" ).split( '\n' ) )
+
+        for archiveFile in list( self.active ) :
+            if not Transfer.ReadLimited( archiveFile.sensor, archiveFile.popen,
+                                         archiveFile.partFile.write ) :
+                self.Finish( archiveFile )
+
+        # Start transfers within the global & per sensor limits
+        for archiveFile in list( self.queue ) :
+            if len( self.active ) >= self.maxTransfers :
+                break
+            name = archiveFile.sensor.name
+            if self.perSensor.get( name, 0 ) >= self.maxPerSensor :
+                continue
+            self.queue.remove( archiveFile )
+            self.Transfer( archiveFile )
+
+        busy = bool( self.listings or self.queue or self.active )
+        if not busy or self.sinceSave >= SAVE_INTERVAL :
+            self.manifest.Save()
+            self.sinceSave = 0
+
+        return busy
+
+    #-----------------------------------------------------------
+    def Plan( self, sensor, lines ):
+        # Queue the files of the listing that are not yet archived
+        files = []
+        for fileName, size in Continuity.ParseListing( lines ) :
+            sensorName, startTime = UMXFile.ParseFileName( fileName )
+            relPath = UMXFile.DataDirName( sensorName, startTime ) + \
+                      '/' + fileName
+            files.append( ( startTime, relPath, size ) )
+
+        # The newest file is still being written
+        files.sort()
+        for startTime, relPath, size in files[ : -1 ] :
+            if self.manifest.IsArchived( sensor.name, relPath, size ) :
+                self.numSkipped = self.numSkipped + 1
+                continue
+
+            archiveFile = ArchiveFile( sensor, relPath, size,
+                                       self.archivePath )
+            if os.path.exists( archiveFile.partPath ) :
+                archiveFile.offset = os.path.getsize( archiveFile.partPath )
+                if archiveFile.offset > size :
+                    os.remove( archiveFile.partPath )
+                    archiveFile.offset = 0
+
+            self.bytesTotal = self.bytesTotal + size - archiveFile.offset
+            self.queue.append( archiveFile )
+
+    #-----------------------------------------------------------
+    def Transfer( self, archiveFile ):
+        os.makedirs( os.path.dirname( archiveFile.localPath ),
+                     exist_ok = True )
+
+        # Append to the .part file from where the last transfer stopped
+        archiveFile.partFile = open( archiveFile.partPath, 'ab' )
+        archiveFile.popen    = MonitorCommands.ArchiveFileCmd(
+                                   archiveFile.sensor, archiveFile.remotePath,
+                                   archiveFile.offset )
+
+        # Read without blocking the Tk mainloop, the uplink probes
+        # its RTT while it has transfers
+        os.set_blocking( archiveFile.popen.stdout.fileno(), False )
+        Transfer.GetUplink( archiveFile.sensor ).transfers.append( archiveFile )
+
+        name = archiveFile.sensor.name
+        self.perSensor[ name ] = self.perSensor.get( name, 0 ) + 1
+        self.active.append( archiveFile )
+
+    #-----------------------------------------------------------
+    def Finish( self, archiveFile ):
+        sp_out = archiveFile.popen.communicate()
+        archiveFile.partFile.close()
+        Transfer.GetUplink( archiveFile.sensor ).transfers.remove( archiveFile )
+
+        name = archiveFile.sensor.name
+        self.perSensor[ name ] = self.perSensor[ name ] - 1
+        self.active.remove( archiveFile )
+
+        received = os.path.getsize( archiveFile.partPath ) - archiveFile.offset
+        self.bytesDone = self.bytesDone + received
+
+        if archiveFile.popen.returncode != 0 :
+            # Keep the .part file to resume on the next run
+            self.numFailed = self.numFailed + 1
+            self.Message( name + ': archive ' + archiveFile.remotePath + \
+                          ' Failed.' )
+            return
+
+        # The md5sum line '<MD5_MARK><md5>  <file>' on stderr, the
+        # other lines are ssh warnings
+        remoteMD5 = ''
+        for line in sp_out[1].decode( "utf-8", "replace" ).split( '\n' ) :
+            if line.startswith( MonitorCommands.MD5_MARK ) :
+                remoteMD5 = line[ len( MonitorCommands.MD5_MARK ) : ].split()[0]
+
+        if not remoteMD5 :
+            # No md5sum, keep the .part file to resume on the next run
+            self.numFailed = self.numFailed + 1
+            self.Message( name + ': archive ' + archiveFile.remotePath + \
+                          ' Failed: no md5sum.' )
+            return
+
+        localMD5 = FileMD5( archiveFile.partPath )
+
+        if localMD5 != remoteMD5 :
+            os.remove( archiveFile.partPath )
+            self.numFailed = self.numFailed + 1
+            self.Message( name + ': archive ' + archiveFile.remotePath + \
+                          ' Failed: md5sum mismatch.' )
+            return
+
+        os.replace( archiveFile.partPath, archiveFile.localPath )
+        self.manifest.Add( name, archiveFile.relPath,
+                           os.path.getsize( archiveFile.localPath ), localMD5 )
+        self.numDone   = self.numDone + 1
+        self.sinceSave = self.sinceSave + 1
+
+    #-----------------------------------------------------------
+    def Cancel( self ):
+        for archiveFile in self.active :
+            archiveFile.popen.kill()
+            archiveFile.popen.communicate()
+            archiveFile.partFile.close()
+            Transfer.GetUplink( archiveFile.sensor ).transfers.remove(
+                archiveFile )
+        for name in self.listings :
+            self.listings[ name ][1].kill()
+        self.active   = []
+        self.queue    = []
+        self.listings = {}
+        self.manifest.Save()
+
+    #-----------------------------------------------------------
+    def Message( self, msg ):
+        self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                        ' ' + msg + '\n'
+
+    #-----------------------------------------------------------
+    def Progress( self ):
+        # Files done, throughput and ETA in one line
+        elapsed = max( time.monotonic() - self.startTime, 1e-3 )
+        rate    = self.bytesDone / elapsed
+        msg = 'Archive: ' + str( self.numDone ) + ' files, ' + \
+              str( self.numSkipped ) + ' already archived, ' + \
+              str( self.numFailed ) + ' failed, ' + \
+              str( len( self.queue ) + len( self.active ) ) + ' to go, ' + \
+              FormatBytes( rate ) + '/s'
+
+        remaining = self.bytesTotal - self.bytesDone
+        if rate > 0. and remaining > 0 :
+            msg = msg + ', ETA ' + FormatDuration( remaining / rate )
+        return msg
+
+#---------------------------------------------------------
+# Archive the selected sensors from the Tk mainloop
+#---------------------------------------------------------
+class ArchiveJob:
+    def __init__( self, monitor, keys ):
+        self.monitor  = monitor
+        sensors       = [ monitor.SensorCollection.SensorDict[ key ]
+                          for key in keys ]
+        self.names    = [ sensor.name for sensor in sensors ]
+        self.archiver = Archiver( sensors, monitor.args.archivePath,
+                                  monitor.args.archiveJobs )
+        self.archiver.Start()
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        busy = self.archiver.Poll()
+
+        self.monitor.msgCommand.set( self.archiver.messages + \
+                                     MonitorCommands.GetLocalUTC() + ' ' + \
+                                     self.archiver.Progress() )
+        if busy :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+        else :
+            self.monitor.archiveJob = None
+
+            # Add the new files to the min/max pyramids
+            self.monitor.pyramidJob.Update( self.names )
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    sensors = []
+    for sensorName in args.sensorList.split( ',' ) :
+        sensors.append( NCPASensor.NCPASensor( None, sensorName,
+                                               args.subnet + sensorName ) )
+
+    archiver = Archiver( sensors, args.archivePath, args.archiveJobs,
+                         args.perSensor )
+    archiver.Start()
+
+    while archiver.Poll() :
+        time.sleep( 0.2 )
+        print( '\r' + archiver.Progress(), end = '', flush = True )
+
+    print( '\r' + archiver.Progress() )
+    print( archiver.messages, end = '' )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA Sensor Archiver' )
+
+    parser.add_argument('-a', '--subnet',
+                        dest   = 'subnet', type = str,
+                        action = 'store', default = '192.168.1.',
+                        help = 'IP subnet prefix (192.168.1.).')
+
+    parser.add_argument('-s', '--sensorList',
+                        dest   = 'sensorList', type = str,
+                        action = 'store', required = True,
+                        help = 'Sensor IP address suffix (51,106,169).')
+
+    parser.add_argument('-A', '--archivePath',
+                        dest   = 'archivePath', type = str,
+                        action = 'store',
+                        default = os.environ['HOME'] + '/SensorArchive',
+                        help = 'Local archive directory (~/SensorArchive).')
+
+    parser.add_argument('-j', '--archiveJobs',
+                        dest   = 'archiveJobs', type = int,
+                        action = 'store', default = MAX_TRANSFERS,
+                        help = 'Concurrent transfers (4).')
+
+    parser.add_argument('-J', '--perSensor',
+                        dest   = 'perSensor', type = int,
+                        action = 'store', default = MAX_PER_SENSOR,
+                        help = 'Concurrent transfers per sensor (2).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+    MonitorCommands.DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     ArrayProcessing.py
+# Purpose:  Cross-correlation and beamforming of NCPA sensor arrays
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./ArrayProcessing.py -b 2026-10-19T00:00:00 -e 2026-10-19T06:00:00
+#                      -o beams.dat ~/SensorArchive/SN056 ...
+#
+# Each directory argument is one sensor of the array, named by the
+# directory. The sensor positions are the GPS fix of the first block
+# of its first file.
+#
+# Positions are relative to the array reference as X east, Y north
+# and Z up in m (NCPASensor.Position X/Y/Z_relative). A plane wave
+# from back-azimuth baz (degrees clockwise from north, the direction
+# it comes from) at trace velocity v reaches a sensor at r at
+#   t = t0 + s . r,   s = -( sin baz, cos baz ) / v
+# For every WINDOW_SECONDS window (every STEP_SECONDS) with data
+# from all sensors this estimates s twice:
+#   beam : the delay-and-sum (frequency domain) beam power between
+#          FREQ_MIN and FREQ_MAX over a grid of baz and v, relative
+#          to the incoherent power, 1 for a perfectly coherent wave
+#   xcorr: the least squares s fitted to the cross-correlation lags
+#          of all sensor pairs
+# Long spans are cut into SEGMENT_SECONDS tasks for a process pool.
+#------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import math
+import os
+import subprocess
+import time
+
+import numpy as np
+
+import MonitorCommands
+import UMXData
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+WINDOW_SECONDS  = 30.
+STEP_SECONDS    = 15.
+FREQ_MIN        = 0.5     # Hz
+FREQ_MAX        = 5.
+AZIMUTHS        = np.arange( 0., 360., 2. )       # degrees
+VELOCITIES      = np.arange( 250., 455., 10. )    # m/s
+SEGMENT_SECONDS = 3600.
+COHERENT        = 0.5     # Beam power of the windows summarized
+MAX_BEAM_BYTES  = 2e8     # Per batch of windows of the beam
+
+# WGS84
+EARTH_A  = 6378137.
+EARTH_E2 = 6.69437999014e-3
+
+#---------------------------------------------------------------
+def LocalXYZ( latitude, longitude, altitude, reference ) :
+    # East, north, up (m) of a position relative to the reference
+    # ( latitude, longitude, altitude ), a local tangent plane that
+    # is accurate over the few km of an array
+    lat0, lon0, alt0 = reference
+    sinLat = math.sin( math.radians( lat0 ) )
+    w = 1. - EARTH_E2 * sinLat**2
+    primeVertical = EARTH_A / math.sqrt( w )
+    meridional    = EARTH_A * ( 1. - EARTH_E2 ) / w**1.5
+
+    x = ( primeVertical + alt0 ) * math.cos( math.radians( lat0 ) ) * \
+        math.radians( longitude - lon0 )
+    y = ( meridional + alt0 ) * math.radians( latitude - lat0 )
+    return x, y, altitude - alt0
+
+#---------------------------------------------------------------
+def Centroid( positions ) :
+    # Mean ( latitude, longitude, altitude ) of positions
+    return tuple( float( np.mean( [ p[ i ] for p in positions ] ) )
+                  for i in range( 3 ) )
+
+#---------------------------------------------------------------
+def SetRelativePositions( sensors, reference = None ) :
+    # Fill Position.X/Y/Z_relative of the sensors that have a
+    # Position, relative to reference ( latitude, longitude,
+    # altitude ) or to their centroid. Return the reference.
+    located = [ sensor for sensor in sensors if sensor.Position ]
+    if not located :
+        return None
+
+    if not reference :
+        reference = Centroid( [ ( s.Position.latitude, s.Position.longitude,
+                                  s.Position.altitude ) for s in located ] )
+
+    for sensor in located :
+        p = sensor.Position
+        p.X_relative, p.Y_relative, p.Z_relative = \
+            LocalXYZ( p.latitude, p.longitude, p.altitude, reference )
+
+    return reference
+
+#---------------------------------------------------------------
+def FilePosition( fileName ) :
+    # ( latitude, longitude, altitude ) of the first block of a file
+    fileHeader, blocks = UMXFile.IterFile( fileName )
+    for blockHeader, samples in blocks :
+        blocks.close()
+        return ( blockHeader.gpsLatitude, blockHeader.gpsLongitude,
+                 blockHeader.gpsElevation )
+    return None
+
+#---------------------------------------------------------------
+def Slowness( azimuths, velocities ) :
+    # ( sx, sy ) s/m of the baz, v grid, flattened baz major
+    baz, vel = np.meshgrid( np.radians( azimuths ), velocities,
+                            indexing = 'ij' )
+    return np.column_stack( ( ( -np.sin( baz ) / vel ).ravel(),
+                              ( -np.cos( baz ) / vel ).ravel() ) )
+
+#---------------------------------------------------------------
+def AzimuthVelocity( s ) :
+    # Back-azimuth (degrees) and trace velocity of slowness rows s
+    baz = np.degrees( np.arctan2( -s[ ..., 0 ], -s[ ..., 1 ] ) ) % 360.
+    return baz, 1. / np.maximum( np.hypot( s[ ..., 0 ], s[ ..., 1 ] ), 1e-12 )
+
+#---------------------------------------------------------------
+def MeanAzimuth( azimuths ) :
+    # Circular mean (degrees), 350 and 10 average to 0
+    return np.degrees( np.angle( np.mean(
+        np.exp( 1j * np.radians( azimuths ) ) ) ) ) % 360.
+
+#---------------------------------------------------------------
+def Windows( data, samplingRate, startTime, windowSeconds, stepSeconds ) :
+    # Cut data ( sensors, samples ), NaN where missing, into windows.
+    # Return the window start times and ( windows, sensors, n )
+    # demeaned & Hann tapered windows with data from every sensor.
+    n    = int( windowSeconds * samplingRate )
+    step = int( stepSeconds * samplingRate )
+    if data.shape[1] < n :
+        return np.zeros( 0 ), np.zeros( ( 0, data.shape[0], n ) )
+
+    windows = np.lib.stride_tricks.sliding_window_view( data, n, axis = 1 )
+    windows = windows[ :, : : step ].transpose( 1, 0, 2 )
+    full    = ~np.isnan( windows ).any( axis = ( 1, 2 ) )
+    windows = windows[ full ]
+    starts  = startTime + np.flatnonzero( full ) * step / samplingRate
+
+    windows = windows - windows.mean( axis = 2, keepdims = True )
+    return starts, windows * np.hanning( n )
+
+#---------------------------------------------------------------
+def CrossCorrelation( windows, samplingRate, maxLag ) :
+    # Normalized cross-correlation of every sensor pair i < j of
+    # each window. Return the pairs, the lags (s) of the peaks,
+    # lag_ij = t_i - t_j, and the peak correlations, both
+    # ( windows, pairs ).
+    numWindows, numSensors, n = windows.shape
+    i, j   = np.triu_indices( numSensors, 1 )
+    spec   = np.fft.rfft( windows, 2 * n, axis = 2 )
+    cc     = np.fft.irfft( spec[ :, i ] * np.conj( spec[ :, j ] ),
+                           2 * n, axis = 2 )
+    m      = min( int( maxLag * samplingRate ), n - 1 )
+    cc     = np.concatenate( ( cc[ ..., -m : ], cc[ ..., : m + 1 ] ),
+                             axis = 2 )
+    energy = np.sum( windows**2, axis = 2 )
+    cc     = cc / np.sqrt( np.maximum( energy[ :, i ] * energy[ :, j ],
+                                       1e-30 ) )[ ..., None ]
+
+    peak = np.argmax( cc, axis = 2 )
+    best = np.take_along_axis( cc, peak[ ..., None ], axis = 2 )[ ..., 0 ]
+
+    # Parabolic interpolation between the neighbours of the peak
+    inside = ( peak > 0 ) & ( peak < 2 * m )
+    left   = np.take_along_axis( cc, np.maximum( peak - 1, 0 )[ ..., None ],
+                                 axis = 2 )[ ..., 0 ]
+    right  = np.take_along_axis( cc, np.minimum( peak + 1, 2 * m )[ ..., None ],
+                                 axis = 2 )[ ..., 0 ]
+    curve  = left - 2. * best + right
+    shift  = np.where( inside & ( curve < 0. ),
+                       0.5 * ( left - right ) / np.where( curve < 0., curve, -1. ),
+                       0. )
+
+    return ( i, j ), ( peak - m + shift ) / samplingRate, best
+
+#---------------------------------------------------------------
+def FitSlowness( pairs, lags, xy ) :
+    # Least squares s of lag_ij = s . ( r_i - r_j ), for all windows
+    i, j = pairs
+    baselines = xy[ i ] - xy[ j ]
+    s, residuals, rank, sv = np.linalg.lstsq( baselines, lags.T, rcond = None )
+    return s.T
+
+#---------------------------------------------------------------
+def Beam( windows, samplingRate, xy, slowness,
+          freqMin = FREQ_MIN, freqMax = FREQ_MAX ) :
+    # Relative delay-and-sum power ( windows, grid ) of the slowness
+    # grid, from the spectra between freqMin and freqMax
+    n     = windows.shape[2]
+    freqs = np.fft.rfftfreq( n, 1. / samplingRate )
+    band  = ( freqs >= freqMin ) & ( freqs <= freqMax )
+    spec  = np.fft.rfft( windows, axis = 2 )[ :, :, band ]
+
+    # Advance each sensor by its delay s . r
+    delays = slowness @ xy.T                           # ( grid, sensors )
+    steer  = np.exp( 2j * np.pi * delays[ :, :, None ] * freqs[ band ] )
+
+    incoherent = windows.shape[1] * np.sum( np.abs( spec )**2, axis = ( 1, 2 ) )
+    power = np.empty( ( len( windows ), len( slowness ) ) )
+
+    batch = max( 1, int( MAX_BEAM_BYTES / ( steer.size * 16 ) ) )
+    for start in range( 0, len( windows ), batch ) :
+        beams = np.einsum( 'wkf,gkf->wgf', spec[ start : start + batch ], steer )
+        power[ start : start + batch ] = \
+            np.sum( np.abs( beams )**2, axis = 2 ) / \
+            np.maximum( incoherent[ start : start + batch, None ], 1e-30 )
+
+    return power
+
+#---------------------------------------------------------------
+def SegmentData( fileLists, keys, startTime, stopTime ) :
+    # ( sensors, samples ) float array of startTime to stopTime,
+    # NaN where a sensor has no data, and the sampling rate
+    data = None
+    rate = None
+    for k, key in enumerate( keys ) :
+        for fileName in fileLists[ key ] :
+            fileHeader, runs = UMXData.ReadRuns( fileName, startTime, stopTime )
+            if rate is None :
+                rate = fileHeader.samplingRate
+                data = np.full( ( len( keys ),
+                                  int( round( ( stopTime - startTime ) * rate ) ) ),
+                                np.nan )
+            elif fileHeader.samplingRate != rate :
+                raise( Exception( key + ': samplingRate ' + \
+                                  str( fileHeader.samplingRate ) + ' != ' + \
+                                  str( rate ) ) )
+            for runStart, samples in runs :
+                first = int( round( ( runStart - startTime ) * rate ) )
+                last  = min( first + len( samples ), data.shape[1] )
+                data[ k, first : last ] = samples[ : last - first ]
+
+    return data, rate
+
+#---------------------------------------------------------------
+def ArrayTask( fileLists, keys, xy, startTime, stopTime ) :
+    # Beam and xcorr estimates of the windows of one segment, runs
+    # in the worker processes. Return ( rows, [ error messages ] )
+    # with rows of window start, beam baz, v, power,
+    # xcorr baz, v, mean peak correlation.
+    try :
+        data, rate = SegmentData( fileLists, keys, startTime, stopTime )
+    except Exception as e :
+        return [], [ str( e ) ]
+    if data is None :
+        return [], []
+
+    starts, windows = Windows( data, rate, startTime,
+                               WINDOW_SECONDS, STEP_SECONDS )
+    if not len( starts ) :
+        return [], []
+
+    xy       = np.asarray( xy )
+    slowness = Slowness( AZIMUTHS, VELOCITIES )
+    power    = Beam( windows, rate, xy, slowness )
+    best     = np.argmax( power, axis = 1 )
+    beamBaz, beamVel = AzimuthVelocity( slowness[ best ] )
+
+    # Lags of pairs up to the aperture at the slowest velocity
+    aperture = np.max( np.hypot( *( xy[ :, None ] - xy[ None, : ] ).T ) )
+    pairs, lags, peaks = CrossCorrelation( windows, rate,
+                                           aperture / VELOCITIES[0] + 1. )
+    ccBaz, ccVel = AzimuthVelocity( FitSlowness( pairs, lags, xy ) )
+
+    rows = np.column_stack( ( starts, beamBaz, beamVel,
+                              power[ np.arange( len( best ) ), best ],
+                              ccBaz, ccVel, peaks.mean( axis = 1 ) ) )
+    return rows.tolist(), []
+
+#---------------------------------------------------------------
+def SubmitArray( executor, fileLists, xy, startTime, stopTime ) :
+    # One ArrayTask per SEGMENT_SECONDS, overlapping by a window so
+    # that no window is lost at the segment boundaries
+    keys    = sorted( fileLists.keys() )
+    futures = []
+    segment = startTime
+    while segment < stopTime :
+        end   = min( segment + SEGMENT_SECONDS, stopTime )
+        files = { key : UMXFile.SelectFiles( fileLists[ key ], segment,
+                                             end + WINDOW_SECONDS )
+                  for key in keys }
+        futures.append( executor.submit( ArrayTask, files, keys, xy,
+                        segment, min( end + WINDOW_SECONDS - STEP_SECONDS,
+                                      stopTime ) ) )
+        segment = end
+    return futures
+
+#---------------------------------------------------------------
+def CombineRows( taskResults ) :
+    rows   = []
+    errors = []
+    for taskRows, taskErrors in taskResults :
+        rows.extend( taskRows )
+        errors.extend( taskErrors )
+
+    # Drop the windows repeated by the segment overlaps
+    rows.sort()
+    unique = []
+    for row in rows :
+        if not unique or row[0] > unique[-1][0] + 1e-6 :
+            unique.append( row )
+    return unique, errors
+
+#---------------------------------------------------------------
+def WriteRows( fileName, rows ) :
+    # Columns for gnuplot: UTC seconds, beam baz, v, power,
+    # xcorr baz, v, mean correlation
+    fo = open( fileName, 'w' )
+    for row in rows :
+        fo.write( '%.3f %.1f %.1f %.3f %.1f %.1f %.3f\n' % tuple( row ) )
+    fo.close()
+
+#---------------------------------------------------------------
+def PlotRows( gnuplotFile, dataFile, title ) :
+    fo = open( gnuplotFile, 'w' )
+    fo.write( 'set title "' + title + '"\n' )
+    fo.write( 'set xdata time\n' )
+    fo.write( 'set timefmt "%s"\n' )
+    fo.write( 'set format x "%H:%M"\n' )
+    fo.write( 'set multiplot layout 2,1\n' )
+    fo.write( 'set ylabel "Back-azimuth (deg)"\n' )
+    fo.write( 'set yrange [0:360]\n' )
+    fo.write( 'set cbrange [0:1]\n' )
+    fo.write( 'plot "' + dataFile + '" using 1:2:4 with points pt 7 ' + \
+              'palette title "beam", "' + dataFile + '" using 1:5 ' + \
+              'with points pt 1 title "xcorr"\n' )
+    fo.write( 'set ylabel "Trace velocity (m/s)"\n' )
+    fo.write( 'set yrange [*:*]\n' )
+    fo.write( 'plot "' + dataFile + '" using 1:3:4 with points pt 7 ' + \
+              'palette title "beam"\n' )
+    fo.write( 'unset multiplot\n' )
+    fo.close()
+
+    # Subprocess gnuplot to plot the estimates
+    cmdLine = 'gnuplot ' + gnuplotFile + ' -persist'
+    subprocess.Popen( cmdLine, shell = True, stdout = subprocess.PIPE )
+
+#---------------------------------------------------------------
+def ArchiveFiles( path ) :
+    fileNames = []
+    for root, dirs, files in os.walk( path ) :
+        fileNames.extend( os.path.join( root, f ) for f in files )
+    return UMXFile.SelectFiles( fileNames, None, None )
+
+#---------------------------------------------------------
+# Array processing of the archive of the selected sensors,
+# driven from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class ArrayJob:
+    def __init__( self, monitor, keys, startTime, stopTime ):
+        self.monitor  = monitor
+        self.futures  = []
+        self.messages = ''
+
+        sensors   = [ monitor.SensorCollection.SensorDict[ key ]
+                      for key in keys ]
+        fileLists = {}
+        positions = {}
+        for sensor in sensors :
+            fileNames = ArchiveFiles(
+                os.path.join( monitor.args.archivePath, sensor.name ) )
+            if not fileNames :
+                continue
+
+            # Sensors without a Position from the data polling are
+            # located by their first archived file
+            if sensor.Position :
+                positions[ sensor.name ] = ( sensor.Position.latitude,
+                                             sensor.Position.longitude,
+                                             sensor.Position.altitude )
+            else :
+                try :
+                    positions[ sensor.name ] = FilePosition( fileNames[0] )
+                except Exception :
+                    continue
+            fileLists[ sensor.name ] = fileNames
+
+        if len( fileLists ) < 3 :
+            monitor.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+                ' Array Failed: need 3 or more sensors with archived data.\n' )
+            return
+
+        reference = Centroid( list( positions.values() ) )
+        SetRelativePositions( sensors, reference )
+        xy = [ LocalXYZ( *( positions[ name ] + ( reference, ) ) )[ : 2 ]
+               for name in sorted( fileLists.keys() ) ]
+
+        self.names   = sorted( fileLists.keys() )
+        self.futures = SubmitArray( monitor.GetProcessPool(), fileLists, xy,
+                                    startTime, stopTime )
+        monitor.msgCommand.set( MonitorCommands.GetLocalUTC() + ' Array ' + \
+            ', '.join( self.names ) + ': ' + str( len( self.futures ) ) + \
+            ' segments.\n' )
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return all( future.done() for future in self.futures )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        if not self.Done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+            return
+
+        try :
+            rows, errors = CombineRows( [ future.result()
+                                          for future in self.futures ] )
+        except Exception as e :
+            rows   = []
+            errors = [ str( e ) ]
+
+        for error in errors :
+            self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                            ' Array Failed: ' + error + '\n'
+
+        if rows :
+            dataFile = self.monitor.tempDir + 'array.dat'
+            WriteRows( dataFile, rows )
+            PlotRows( self.monitor.tempDir + 'array_gnuplot.plt', dataFile,
+                      ', '.join( self.names ) )
+        self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+            ' Array: ' + str( len( rows ) ) + ' windows of ' + \
+            str( WINDOW_SECONDS ) + ' s'
+        coherent = [ row for row in rows if row[3] >= COHERENT ]
+        if coherent :
+            self.messages = self.messages + ', ' + str( len( coherent ) ) + \
+                ' coherent, mean back-azimuth %.0f deg, median %.0f m/s' % \
+                ( MeanAzimuth( [ row[1] for row in coherent ] ),
+                  np.median( [ row[2] for row in coherent ] ) )
+        self.messages = self.messages + '.\n'
+        self.monitor.msgCommand.set( self.messages )
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    fileLists = {}
+    for path in args.paths :
+        fileLists[ os.path.basename( os.path.normpath( path ) ) ] = \
+            ArchiveFiles( path )
+
+    keys = sorted( key for key in fileLists if fileLists[ key ] )
+    if len( keys ) < 3 :
+        print( 'Need 3 or more sensors with data.' )
+        return
+
+    startTime = UMXFile.ParseUTC( args.begin ) if args.begin else \
+        min( UMXFile.ParseFileName( fileLists[ key ][0] )[1] for key in keys )
+    stopTime  = UMXFile.ParseUTC( args.end ) if args.end else \
+        max( UMXFile.ParseFileName( fileLists[ key ][-1] )[1] for key in keys ) + \
+        UMXFile.FILE_LENGTH
+
+    positions = [ FilePosition( fileLists[ key ][0] ) for key in keys ]
+    reference = Centroid( positions )
+    xy = [ LocalXYZ( *( position + ( reference, ) ) )[ : 2 ]
+           for position in positions ]
+    for key, ( x, y ) in zip( keys, xy ) :
+        print( key + ' X %.1f m, Y %.1f m' % ( x, y ) )
+
+    executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+    futures  = SubmitArray( executor, { key : fileLists[ key ] for key in keys },
+                            xy, startTime, stopTime )
+    rows, errors = CombineRows( [ future.result() for future in futures ] )
+    executor.shutdown()
+
+    for error in errors :
+        print( error )
+    WriteRows( args.outFile, rows )
+    print( str( len( rows ) ) + ' windows written to ' + args.outFile )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA array processing' )
+
+    parser.add_argument('paths', nargs = '+',
+                        help = 'Archive directory of each sensor.')
+
+    parser.add_argument('-b', '--begin',
+                        dest   = 'begin', type = str,
+                        action = 'store', default = '',
+                        help = 'Start UTC (2026-10-19T00:00:00).')
+
+    parser.add_argument('-e', '--end',
+                        dest   = 'end', type = str,
+                        action = 'store', default = '',
+                        help = 'End UTC (2026-10-19T06:00:00).')
+
+    parser.add_argument('-o', '--outFile',
+                        dest   = 'outFile', type = str,
+                        action = 'store', default = 'array.dat',
+                        help = 'Output table (array.dat).')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = None,
+                        help = 'Number of worker processes (all cores).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#----------------------------------------------------------------------------
+# Name:     ConfigDeploy.py
+# Purpose:  Deploy only the changed sensor configs
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Send Config copies configInPath + configInFile to every selected
+# sensor. A deploy first gets the md5sum of the config on all the
+# sensors in parallel (MonitorCommands.RemoteHashCmd) and pushes
+# only those that differ from the local file. The push writes
+# configOutFile.tmp, renames it over configOutFile and returns its
+# md5sum in the same ssh connection (Transfer.Push), which
+# must match the local md5. Each sensor ends up as
+#   unchanged  the sensor already has the config
+#   changed    the config was deployed and verified
+#   failed     invalid config, ssh failure or md5 mismatch
+#------------------------------------------------------------------
+
+import hashlib
+import os
+
+import LibConfig
+import MonitorCommands
+import Transfer
+
+DEBUG = False # Set True by the -v (verbose) option
+
+#---------------------------------------------------------------
+def ParseMD5( output ) :
+    # The md5 of md5sum output, '' if there is none
+    words = output.decode( 'utf-8', 'replace' ).split()
+    if words and len( words[0] ) == 32 :
+        return words[0].lower()
+    return ''
+
+#---------------------------------------------------------
+# One deploy of the selected sensors, driven from the Tk
+# mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class DeployJob:
+    def __init__( self, monitor, keys ):
+        self.monitor = monitor
+        self.sensors = {}   # sensor by name
+        self.popens  = {}   # ( step, Popen ), step 'hash' or 'push'
+        self.md5     = {}   # md5 of the local config by name
+        self.results = {}   # ( 'changed' | 'unchanged' | 'failed', detail )
+
+        for key in keys :
+            sensor = monitor.SensorCollection.SensorDict[ key ]
+            self.sensors[ sensor.name ] = sensor
+            if sensor.sendConfigPopenBusy :
+                self.results[ sensor.name ] = ( 'failed',
+                                                'a send is in progress' )
+                continue
+
+            try :
+                fi = open( self.ConfigFile( sensor ), 'rb' )
+                data = fi.read()
+                fi.close()
+                problems = LibConfig.Parse( data, sensor.configInFile ).Validate()
+            except Exception as e :
+                problems = [ str( e ) ]
+            if problems :
+                self.results[ sensor.name ] = ( 'failed', '; '.join( problems ) )
+                continue
+
+            self.md5[ sensor.name ] = hashlib.md5( data ).hexdigest()
+            sensor.sendConfigPopenBusy = True
+            self.popens[ sensor.name ] = ( 'hash',
+                MonitorCommands.RemoteHashCmd( sensor, self.RemoteFile( sensor ) ) )
+
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def ConfigFile( self, sensor ):
+        return os.path.expanduser( sensor.configInPath + sensor.configInFile )
+
+    #-----------------------------------------------------------
+    def RemoteFile( self, sensor ):
+        return sensor.configOutPath + sensor.configOutFile
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return not self.popens
+
+    #-----------------------------------------------------------
+    def Finish( self, name, result, detail ):
+        self.results[ name ] = ( result, detail )
+        self.sensors[ name ].sendConfigPopenBusy = False
+        del( self.popens[ name ] )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        for name in list( self.popens.keys() ) :
+            step, popen = self.popens[ name ]
+            sp_out = MonitorCommands.PollOutput( popen )
+            if sp_out is None :
+                continue
+
+            remoteMD5 = ParseMD5( sp_out[0] )
+            if popen.returncode != 0 :
+                self.Finish( name, 'failed', step + ' on the sensor failed' )
+            elif remoteMD5 == self.md5[ name ] :
+                self.Finish( name, 'unchanged' if step == 'hash' else 'changed',
+                             remoteMD5 )
+            elif step == 'push' :
+                self.Finish( name, 'failed', 'verify: md5 ' + \
+                             ( remoteMD5 or 'none' ) + ' != ' + self.md5[ name ] )
+            else :
+                # Only a changed config is sent
+                sensor = self.sensors[ name ]
+                try :
+                    self.popens[ name ] = ( 'push', Transfer.Push( sensor,
+                        self.ConfigFile( sensor ), self.RemoteFile( sensor ) ) )
+                except Exception as e :
+                    self.Finish( name, 'failed', str( e ) )
+
+        if self.popens :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+        else :
+            self.Report()
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        counts = {}
+        lines  = []
+        for name in sorted( self.results.keys() ) :
+            result, detail = self.results[ name ]
+            counts[ result ] = counts.get( result, 0 ) + 1
+            lines.append( '%-10s %-9s %s' % ( name, result, detail ) )
+
+        lines.insert( 0, MonitorCommands.GetLocalUTC() + ' Deploy Config: ' + \
+                      ', '.join( str( counts.get( result, 0 ) ) + ' ' + result
+                                 for result in ( 'changed', 'unchanged',
+                                                 'failed' ) ) )
+        self.monitor.ShowReport( 'NCPA: Deploy Config', lines )
@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------
+# Name:     ConfigDrift.py
+# Purpose:  Compare the configs on the sensors with the local configs
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# A drift scan gets the md5sum of configOutPath + configOutFile on
+# the sensors, MAX_PARALLEL at a time (MonitorCommands.RemoteHashCmd),
+# and compares it with the md5 of the local configInPath + configInFile.
+# Only a config with an md5 that has not been seen before is pulled
+# from a sensor. The configs seen are kept by md5 in the cache file,
+# with the last result of each sensor, so a rescan of the fleet is
+# one md5sum per sensor. Each sensor ends up as
+#   match    the sensor has the local config
+#   drift    the sensor has another config, reported as the
+#            settings that differ (LibConfig.Diff)
+#   missing  there is no config on the sensor
+#   failed   no local config or ssh failure, the last result
+#            of the sensor is reported from the cache
+#------------------------------------------------------------------
+
+import hashlib
+import os
+import time
+
+import ConfigDeploy
+import LibConfig
+import MonitorCommands
+import UMXVerify
+
+DEBUG = False # Set True by the -v (verbose) option
+
+CACHE_FILE   = 'configdrift.json'
+MAX_PARALLEL = 8    # sensors scanned at the same time
+
+#---------------------------------------------------------------
+def LoadCache( cacheFile ) :
+    # { 'sensors' : { name : [ result, localMD5, remoteMD5, time ] },
+    #   'configs' : { md5 : text } }
+    cache = UMXVerify.LoadCache( cacheFile )
+    cache.setdefault( 'sensors', {} )
+    cache.setdefault( 'configs', {} )
+    return cache
+
+#---------------------------------------------------------------
+def SaveCache( cacheFile, cache ) :
+    # Only the configs of the last results are kept
+    used = set()
+    for result, localMD5, remoteMD5, scanTime in cache[ 'sensors' ].values() :
+        used.update( ( localMD5, remoteMD5 ) )
+    cache[ 'configs' ] = dict( ( md5, text ) for md5, text in
+                               cache[ 'configs' ].items() if md5 in used )
+    UMXVerify.SaveCache( cacheFile, cache )
+
+#---------------------------------------------------------------
+def DiffLines( configs, localMD5, remoteMD5 ) :
+    # The settings that differ between two configs of the cache
+    try :
+        diff = LibConfig.Diff(
+            LibConfig.Parse( configs[ localMD5 ].encode( 'utf-8' ), 'local' ),
+            LibConfig.Parse( configs[ remoteMD5 ].encode( 'utf-8' ), 'sensor' ) )
+    except Exception as e :
+        return [ '    ' + str( e ) ]
+
+    lines = []
+    for path, localValue, remoteValue in diff :
+        lines.append( '    %-40s %s -> %s' % ( path,
+            'missing' if localValue  is None else LibConfig.Format( localValue ),
+            'missing' if remoteValue is None else LibConfig.Format( remoteValue ) ) )
+    if not lines :
+        lines.append( '    the same settings, the text differs' )
+    return lines
+
+#---------------------------------------------------------
+# One drift scan of the sensors, driven from the Tk
+# mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class DriftJob:
+    def __init__( self, monitor, keys, cacheFile ):
+        self.monitor   = monitor
+        self.cacheFile = cacheFile
+        self.cache     = LoadCache( cacheFile )
+        self.sensors   = {}   # sensor by name
+        self.queue     = []   # names of the sensors to scan
+        self.popens    = {}   # ( step, Popen ), step 'hash' or 'pull'
+        self.md5       = {}   # ( localMD5, remoteMD5 ) by name
+        self.results   = {}   # ( 'match' | 'drift' | 'missing' | 'failed', detail )
+        self.pulls     = 0
+
+        for key in keys :
+            sensor = monitor.SensorCollection.SensorDict[ key ]
+            self.sensors[ sensor.name ] = sensor
+            try :
+                fi = open( os.path.expanduser( sensor.configInPath +
+                                               sensor.configInFile ), 'rb' )
+                data = fi.read()
+                fi.close()
+            except OSError as e :
+                self.results[ sensor.name ] = ( 'failed', 'local: ' + str( e ) )
+                continue
+
+            localMD5 = hashlib.md5( data ).hexdigest()
+            self.cache[ 'configs' ][ localMD5 ] = data.decode( 'utf-8', 'replace' )
+            self.md5[ sensor.name ] = ( localMD5, '' )
+            self.queue.append( sensor.name )
+
+        self.StartNext()
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def StartNext( self ):
+        # A pull takes the place of the hash of its sensor
+        while self.queue and len( self.popens ) < MAX_PARALLEL :
+            name   = self.queue.pop( 0 )
+            sensor = self.sensors[ name ]
+            self.popens[ name ] = ( 'hash',
+                MonitorCommands.RemoteHashCmd( sensor, self.RemoteFile( sensor ) ) )
+
+    #-----------------------------------------------------------
+    def RemoteFile( self, sensor ):
+        return sensor.configOutPath + sensor.configOutFile
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return not self.popens and not self.queue
+
+    #-----------------------------------------------------------
+    def Finish( self, name, result, detail = '' ):
+        self.results[ name ] = ( result, detail )
+        del( self.popens[ name ] )
+        if result != 'failed' :
+            localMD5, remoteMD5 = self.md5[ name ]
+            self.cache[ 'sensors' ][ name ] = [ result, localMD5, remoteMD5,
+                                                time.time() ]
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        configs = self.cache[ 'configs' ]
+        for name in list( self.popens.keys() ) :
+            step, popen = self.popens[ name ]
+            sp_out = MonitorCommands.PollOutput( popen )
+            if sp_out is None :
+                continue
+
+            localMD5 = self.md5[ name ][0]
+            if popen.returncode != 0 :
+                self.Finish( name, 'failed', step + ' on the sensor failed' )
+                continue
+
+            if step == 'hash' :
+                remoteMD5 = ConfigDeploy.ParseMD5( sp_out[0] )
+            else :
+                # The config may have changed since the md5sum
+                remoteMD5 = hashlib.md5( sp_out[0] ).hexdigest()
+                configs[ remoteMD5 ] = sp_out[0].decode( 'utf-8', 'replace' )
+            self.md5[ name ] = ( localMD5, remoteMD5 )
+
+            if not remoteMD5 :
+                self.Finish( name, 'missing' )
+            elif remoteMD5 == localMD5 :
+                self.Finish( name, 'match', remoteMD5 )
+            elif remoteMD5 in configs :
+                self.Finish( name, 'drift', remoteMD5 )
+            else :
+                # Only a config not seen before is pulled
+                self.pulls = self.pulls + 1
+                self.popens[ name ] = ( 'pull',
+                    MonitorCommands.CompressedPullCmd( self.sensors[ name ],
+                        'cat ' + self.RemoteFile( self.sensors[ name ] ) ) )
+
+        self.StartNext()
+        if not self.Done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+        else :
+            SaveCache( self.cacheFile, self.cache )
+            self.Report()
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        configs = self.cache[ 'configs' ]
+        counts  = {}
+        lines   = []
+        for name in sorted( self.results.keys() ) :
+            result, detail = self.results[ name ]
+            counts[ result ] = counts.get( result, 0 ) + 1
+            lines.append( '%-10s %-8s %s' % ( name, result, detail ) )
+
+            last = self.cache[ 'sensors' ].get( name )
+            if result == 'failed' and last :
+                lines.append( '    last ' + last[0] + ' at ' + \
+                    time.strftime( '%b %d %Y %H:%M:%S',
+                                   time.localtime( last[3] ) ) )
+                result, localMD5, remoteMD5 = last[ : 3 ]
+            else :
+                localMD5, remoteMD5 = self.md5.get( name, ( '', '' ) )
+
+            if result == 'drift' and localMD5 in configs and \
+               remoteMD5 in configs :
+                lines.extend( DiffLines( configs, localMD5, remoteMD5 ) )
+
+        lines.insert( 0, MonitorCommands.GetLocalUTC() + ' Config Drift: ' + \
+                      ', '.join( str( counts.get( result, 0 ) ) + ' ' + result
+                                 for result in ( 'match', 'drift', 'missing',
+                                                 'failed' ) ) + \
+                      ', ' + str( self.pulls ) + ' pulled' )
+        self.monitor.ShowReport( 'NCPA: Config Drift', lines )
@@ -0,0 +1,224 @@
+#----------------------------------------------------------------------------
+# Name:     Continuity.py
+# Purpose:  Data continuity index of the UMX files on NCPA sensors
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# The start time of a UMX file is in its name and the number of
+# one second blocks follows from its size, so the continuity of the
+# data is known from 'ls -l' listings without opening the files.
+# The index is filled from a full listing of /data and updated with
+# the 'ls -lt /data/<newest dir>' listing of every data poll.
+#------------------------------------------------------------------
+
+import bisect
+import time
+
+import UMXFile
+
+DEFAULT_SAMPLING_RATE = 125   # sampleFrequency = 5 in UMSX1.4.cfg
+TOLERANCE             = 1.    # seconds of slack between files
+
+#---------------------------------------------------------------
+def ParseListing( lines ) :
+    # Return [ ( fileName, size ) ] of the UMX files in 'ls -l' lines.
+    # Directory headers and 'total' lines are ignored.
+    files = []
+    for line in lines :
+        words = line.split()
+        if len( words ) < 5 or not UMXFile.ParseFileName( words[-1] ) :
+            continue
+        try :
+            size = int( words[4] )
+        except ValueError :
+            continue
+        files.append( ( words[-1].split( '/' )[-1], size ) )
+
+    return files
+
+#---------------------------------------------------------
+# Sorted intervals of the data files of one sensor
+#---------------------------------------------------------
+class SensorContinuity:
+    def __init__( self, samplingRate = DEFAULT_SAMPLING_RATE ):
+        self.samplingRate = samplingRate
+        self.starts       = []   # sorted file start times
+        self.files        = {}   # ( fileName, end, size ) by start time
+        self.gapStarts    = []   # sorted, rebuilt when dirty
+        self.gaps         = []   # ( start, end ) parallel to gapStarts
+        self.overlaps     = []   # ( start, end, fileName )
+        self.shortFiles   = []   # ( start, end, fileName )
+        self.dirty        = False
+
+    #-----------------------------------------------------------
+    def Add( self, fileName, size ):
+        start = UMXFile.ParseFileName( fileName )[1]
+        blocks = max( size - UMXFile.FILE_HEADER.size, 0 ) // \
+                 UMXFile.BlockSize( self.samplingRate )
+        entry = ( fileName, start + blocks, size )
+
+        if start not in self.files :
+            bisect.insort( self.starts, start )
+        elif self.files[ start ] == entry :
+            return
+        self.files[ start ] = entry
+        self.dirty = True
+
+    #-----------------------------------------------------------
+    def Rebuild( self ):
+        # Recompute the gaps, overlaps and short files
+        self.gapStarts  = []
+        self.gaps       = []
+        self.overlaps   = []
+        self.shortFiles = []
+
+        for i in range( len( self.starts ) ) :
+            start = self.starts[ i ]
+            fileName, end, size = self.files[ start ]
+
+            # The newest file is still being written
+            if i < len( self.starts ) - 1 :
+                if end - start < UMXFile.FILE_LENGTH - TOLERANCE :
+                    self.shortFiles.append( ( start, end, fileName ) )
+
+                nextStart = self.starts[ i + 1 ]
+                if nextStart - end > TOLERANCE :
+                    self.gapStarts.append( end )
+                    self.gaps.append( ( end, nextStart ) )
+                elif end - nextStart > TOLERANCE :
+                    self.overlaps.append( ( nextStart, end, fileName ) )
+
+        self.dirty = False
+
+    #-----------------------------------------------------------
+    def Gaps( self, minLength, startTime, stopTime ):
+        # Gaps longer than minLength ending after startTime and
+        # starting before stopTime
+        if self.dirty :
+            self.Rebuild()
+
+        # Gaps do not overlap, so gap ends are sorted as well
+        i = bisect.bisect_left( self.gapStarts, startTime )
+        if i > 0 and self.gaps[ i - 1 ][1] > startTime :
+            i = i - 1
+
+        found = []
+        while i < len( self.gaps ) and self.gaps[ i ][0] < stopTime :
+            gapStart, gapEnd = self.gaps[ i ]
+            if gapEnd - gapStart > minLength :
+                found.append( ( gapStart, gapEnd ) )
+            i = i + 1
+
+        return found
+
+    #-----------------------------------------------------------
+    def Files( self, startTime, stopTime ):
+        # [ ( start, fileName, size ) ] of the files with data
+        # between startTime and stopTime, sorted by start
+        i = bisect.bisect_left( self.starts, startTime )
+        if i > 0 :
+            i = i - 1
+
+        found = []
+        while i < len( self.starts ) and self.starts[ i ] < stopTime :
+            start = self.starts[ i ]
+            fileName, end, size = self.files[ start ]
+            if end > startTime :
+                found.append( ( start, fileName, size ) )
+            i = i + 1
+
+        return found
+
+    #-----------------------------------------------------------
+    def InWindow( self, intervals, startTime, stopTime ):
+        if self.dirty :
+            self.Rebuild()
+        return [ interval for interval in intervals
+                 if interval[1] > startTime and interval[0] < stopTime ]
+
+#---------------------------------------------------------
+# Continuity index of the whole fleet by sensor name
+#---------------------------------------------------------
+class ContinuityIndex:
+    def __init__( self ):
+        self.sensors = {}
+        self.listed  = set()   # names with a full listing merged
+
+    #-----------------------------------------------------------
+    def HasSensor( self, name ):
+        return name in self.sensors
+
+    #-----------------------------------------------------------
+    def Listed( self, name ):
+        # True once the full 'ls -l /data/*' of the sensor is merged,
+        # the listings of the newest directory do not count
+        return name in self.listed
+
+    #-----------------------------------------------------------
+    def AddListing( self, name, lines, full = False ):
+        # Merge the 'ls -l' lines of the sensor into the index
+        if full :
+            self.listed.add( name )
+        if name not in self.sensors :
+            self.sensors[ name ] = SensorContinuity()
+        sensor = self.sensors[ name ]
+
+        for fileName, size in ParseListing( lines ) :
+            sensor.Add( fileName, size )
+
+    #-----------------------------------------------------------
+    def Gaps( self, minLength, startTime, stopTime ):
+        # [ ( name, gapStart, gapEnd ) ] for the fleet
+        found = []
+        for name in sorted( self.sensors.keys() ) :
+            for gapStart, gapEnd in \
+                self.sensors[ name ].Gaps( minLength, startTime, stopTime ) :
+                found.append( ( name, gapStart, gapEnd ) )
+        return found
+
+    #-----------------------------------------------------------
+    def Overlaps( self, startTime, stopTime ):
+        found = []
+        for name in sorted( self.sensors.keys() ) :
+            sensor = self.sensors[ name ]
+            for start, end, fileName in \
+                sensor.InWindow( sensor.overlaps, startTime, stopTime ) :
+                found.append( ( name, start, end, fileName ) )
+        return found
+
+    #-----------------------------------------------------------
+    def ShortFiles( self, startTime, stopTime ):
+        found = []
+        for name in sorted( self.sensors.keys() ) :
+            sensor = self.sensors[ name ]
+            for start, end, fileName in \
+                sensor.InWindow( sensor.shortFiles, startTime, stopTime ) :
+                found.append( ( name, start, end, fileName ) )
+        return found
+
+    #-----------------------------------------------------------
+    def Report( self, minLength, startTime, stopTime ):
+        # Text report of the gaps, overlaps and short files
+        def UTC( t ) :
+            return time.strftime( '%Y-%m-%d %H:%M:%S', time.gmtime( t ) )
+
+        lines = []
+        for name, start, end in self.Gaps( minLength, startTime, stopTime ) :
+            lines.append( name + ' gap     ' + UTC( start ) + ' - ' + \
+                          UTC( end ) + ' ' + str( round( end - start ) ) + ' s' )
+
+        for name, start, end, fileName in \
+            self.Overlaps( startTime, stopTime ) :
+            lines.append( name + ' overlap ' + UTC( start ) + ' - ' + \
+                          UTC( end ) + ' ' + fileName )
+
+        for name, start, end, fileName in \
+            self.ShortFiles( startTime, stopTime ) :
+            lines.append( name + ' short   ' + fileName + ' ' + \
+                          str( round( end - start ) ) + ' s' )
+
+        return lines
@@ -0,0 +1,318 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     Delta.py
+# Purpose:  Block delta updates of files on NCPA sensors
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage, on the sensor:
+# ./Delta.py -s ~/UMXcontrol4.4.0 ~/run_scheduler4.4.0.sh
+# ./Delta.py -a ~/UMXcontrol4.4.0 ~/run_scheduler4.4.0.sh < deltas
+# ./Delta.py -r ~/UMXcontrol4.4.0
+#
+# The rsync algorithm. -s prints the signature of each file, one
+# JSON line of its size, md5, mode and the weak (rolling) and strong
+# (md5) checksum of each block of BLOCK_SIZE bytes. Delta() of the
+# new version against a signature finds the blocks of the old file
+# anywhere in the new one with the rolling checksum, the delta is
+# the copies of those blocks and the new bytes in between, zlib
+# compressed.
+#
+# -a reads from stdin a JSON line of [ md5, mode ] of each file,
+# then the length prefixed delta of each file. A file is rebuilt
+# from the old version and its delta into file.tmp, and only if
+# its md5 is the md5 of the new version the old version is copied
+# to file.prev and file.tmp renamed to file. -r swaps file and
+# file.prev back. -a and -r print
+#   md5 path       of the file installed
+#   error path msg
+# This runs on the sensors (see SoftwareDeploy.py), so it only
+# uses the standard library.
+#------------------------------------------------------------------
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import zlib
+
+DEBUG = False # Set True by the -v (verbose) option
+
+BLOCK_SIZE = 4096
+MODULUS    = 1 << 16
+
+COPY = struct.Struct( '>cII' )   # b'C', first block, blocks
+DATA = struct.Struct( '>cI' )    # b'D', bytes
+SIZE = struct.Struct( '>I' )     # bytes of a delta in the -a input
+
+#---------------------------------------------------------------
+def WeakSum( block ) :
+    # The rolling checksum ( a, b ) of block
+    a = 0
+    b = 0
+    n = len( block )
+    for i, x in enumerate( block ) :
+        a = a + x
+        b = b + ( n - i ) * x
+    return a % MODULUS, b % MODULUS
+
+#---------------------------------------------------------------
+def StrongSum( block ) :
+    return hashlib.md5( block ).hexdigest()[ : 16 ]
+
+#---------------------------------------------------------------
+def Signature( fileName, blockSize = BLOCK_SIZE ) :
+    # { size, md5, mode, blockSize, blocks : [ [ weak, strong ] ] }
+    # of the whole blocks of fileName, md5 '' if there is no file
+    try :
+        fi = open( fileName, 'rb' )
+        data = fi.read()
+        fi.close()
+    except OSError :
+        return { 'size' : 0, 'md5' : '', 'mode' : 0,
+                 'blockSize' : blockSize, 'blocks' : [] }
+
+    blocks = []
+    for offset in range( 0, len( data ) - blockSize + 1, blockSize ) :
+        block = data[ offset : offset + blockSize ]
+        a, b  = WeakSum( block )
+        blocks.append( [ a | b << 16, StrongSum( block ) ] )
+
+    return { 'size'      : len( data ),
+             'md5'       : hashlib.md5( data ).hexdigest(),
+             'mode'      : os.stat( fileName ).st_mode & 0o7777,
+             'blockSize' : blockSize,
+             'blocks'    : blocks }
+
+#---------------------------------------------------------------
+def Delta( signature, data ) :
+    # [ ( 'C', first block, blocks ) | ( 'D', bytes ) ] that rebuild
+    # data from the file of signature
+    L = signature[ 'blockSize' ]
+    table = {}
+    for index, ( weak, strong ) in enumerate( signature[ 'blocks' ] ) :
+        table.setdefault( weak, {} ).setdefault( strong, index )
+
+    ops = []
+    def Add( op ) :
+        if op[0] == 'C' and ops and ops[-1][0] == 'C' and \
+           ops[-1][1] + ops[-1][2] == op[1] :
+            ops[-1] = ( 'C', ops[-1][1], ops[-1][2] + op[2] )
+        elif op[0] == 'C' or op[1] :
+            ops.append( op )
+
+    n       = len( data )
+    literal = 0   # first byte not yet in ops
+    i       = 0
+    if table and n >= L :
+        a, b = WeakSum( data[ : L ] )
+        while True :
+            candidates = table.get( a | b << 16 )
+            if candidates :
+                index = candidates.get( StrongSum( data[ i : i + L ] ) )
+                if index is not None :
+                    Add( ( 'D', data[ literal : i ] ) )
+                    Add( ( 'C', index, 1 ) )
+                    i = literal = i + L
+                    if i + L > n :
+                        break
+                    a, b = WeakSum( data[ i : i + L ] )
+                    continue
+
+            if i + L >= n :
+                break
+            old = data[ i ]
+            a = ( a - old + data[ i + L ] ) % MODULUS
+            b = ( b - L * old + a ) % MODULUS
+            i = i + 1
+
+    Add( ( 'D', data[ literal : ] ) )
+    return ops
+
+#---------------------------------------------------------------
+def Encode( ops ) :
+    parts = []
+    for op in ops :
+        if op[0] == 'C' :
+            parts.append( COPY.pack( b'C', op[1], op[2] ) )
+        else :
+            parts.append( DATA.pack( b'D', len( op[1] ) ) + op[1] )
+    return zlib.compress( b''.join( parts ), 6 )
+
+#---------------------------------------------------------------
+def Patch( basis, delta, blockSize ) :
+    # The new file of the Encode()d delta against basis
+    delta = zlib.decompress( delta )
+    parts = []
+    offset = 0
+    while offset < len( delta ) :
+        if delta[ offset : offset + 1 ] == b'C' :
+            op, first, blocks = COPY.unpack_from( delta, offset )
+            offset = offset + COPY.size
+            if ( first + blocks ) * blockSize > len( basis ) :
+                raise( Exception( 'copy past the end of the old file' ) )
+            parts.append( basis[ first * blockSize :
+                                 ( first + blocks ) * blockSize ] )
+        else :
+            op, size = DATA.unpack_from( delta, offset )
+            offset = offset + DATA.size
+            parts.append( delta[ offset : offset + size ] )
+            offset = offset + size
+    return b''.join( parts )
+
+#---------------------------------------------------------------
+def FileDelta( signature, fileName ) :
+    # The Encode()d delta of fileName against signature, run in
+    # the process pool
+    fi = open( fileName, 'rb' )
+    data = fi.read()
+    fi.close()
+    return Encode( Delta( signature, data ) )
+
+#---------------------------------------------------------------
+def Apply( fileName, delta, md5, mode, blockSize = BLOCK_SIZE ) :
+    # Install the new version of fileName, keep the old one as
+    # fileName.prev. Return the md5 of the file installed.
+    try :
+        fi = open( fileName, 'rb' )
+        basis = fi.read()
+        fi.close()
+    except FileNotFoundError :
+        basis = b''
+
+    data = Patch( basis, delta, blockSize )
+    if hashlib.md5( data ).hexdigest() != md5 :
+        raise( Exception( 'md5 of the new version ' + \
+                          hashlib.md5( data ).hexdigest() + ' != ' + md5 ) )
+
+    fo = open( fileName + '.tmp', 'wb' )
+    fo.write( data )
+    fo.close()
+    os.chmod( fileName + '.tmp', mode )
+    if os.path.exists( fileName ) :
+        shutil.copy2( fileName, fileName + '.prev' )
+    os.replace( fileName + '.tmp', fileName )
+    return FileMD5( fileName )
+
+#---------------------------------------------------------------
+def Rollback( fileName ) :
+    # Swap fileName and fileName.prev, return the md5 installed
+    if not os.path.exists( fileName + '.prev' ) :
+        raise( Exception( 'no previous version' ) )
+    if os.path.exists( fileName ) :
+        os.replace( fileName, fileName + '.tmp' )
+        os.replace( fileName + '.prev', fileName )
+        os.replace( fileName + '.tmp', fileName + '.prev' )
+    else :
+        os.replace( fileName + '.prev', fileName )
+    return FileMD5( fileName )
+
+#---------------------------------------------------------------
+def FileMD5( fileName ) :
+    fi = open( fileName, 'rb' )
+    md5 = hashlib.md5( fi.read() ).hexdigest()
+    fi.close()
+    return md5
+
+#---------------------------------------------------------------
+def ParseLines( text ) :
+    # { path : ( md5, error ) } of the -a and -r output
+    results = {}
+    for line in text.split( '\n' ) :
+        words = line.split( None, 2 )
+        if len( words ) < 2 :
+            continue
+        if words[0] == 'error' :
+            results[ words[1] ] = ( '', ( words + [ '' ] )[2] )
+        else :
+            results[ words[1] ] = ( words[0], '' )
+    return results
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    if args.signature :
+        for fileName in args.files :
+            signature = Signature( fileName, args.blockSize )
+            signature[ 'path' ] = fileName
+            print( json.dumps( signature ) )
+        return
+
+    if args.apply :
+        data = sys.stdin.buffer.read()
+        offset = data.index( b'\n' ) + 1
+        header = json.loads( data[ : offset ].decode( 'utf-8' ) )
+
+    for n, fileName in enumerate( args.files ) :
+        try :
+            if args.apply :
+                size = SIZE.unpack_from( data, offset )[0]
+                offset = offset + SIZE.size
+                delta  = data[ offset : offset + size ]
+                offset = offset + size
+                md5, mode = header[ n ]
+                md5 = Apply( fileName, delta, md5, mode, args.blockSize )
+            else :
+                md5 = Rollback( fileName )
+            print( md5 + ' ' + fileName )
+        except Exception as e :
+            print( 'error ' + fileName + ' ' + str( e ) )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'Block delta updates' )
+
+    parser.add_argument('files', nargs = '+',
+                        help = 'Files on the sensor.')
+
+    parser.add_argument('-s', '--signature',
+                        dest   = 'signature',
+                        action = 'store_true', default = False,
+                        help = 'Print the signature of the files.')
+
+    parser.add_argument('-a', '--apply',
+                        dest   = 'apply',
+                        action = 'store_true', default = False,
+                        help = 'Apply the deltas from stdin to the files.')
+
+    parser.add_argument('-r', '--rollback',
+                        dest   = 'rollback',
+                        action = 'store_true', default = False,
+                        help = 'Swap the files and their previous version.')
+
+    parser.add_argument('-b', '--blockSize',
+                        dest   = 'blockSize', type = int,
+                        action = 'store', default = BLOCK_SIZE,
+                        help = 'Bytes per block (4096).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    if args.signature + args.apply + args.rollback != 1 :
+        parser.error( 'one of -s, -a or -r' )
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
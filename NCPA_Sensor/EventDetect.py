@@ -0,0 +1,490 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     EventDetect.py
+# Purpose:  Recursive STA/LTA event triggers of NCPA sensor data
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./EventDetect.py -b 2026-10-19T00:00:00 -e 2026-10-20T00:00:00
+#                  -c 3 ~/SensorArchive/SN056 ~/SensorArchive/SN106 ...
+#
+# Each directory argument is one sensor, named by the directory.
+#
+# The samples are high passed by removing a recursive mean of
+# DC_SECONDS, then the recursive short and long term averages of
+# the squared samples are
+#   sta[n] = sta[n-1] + ( x[n]^2 - sta[n-1] ) / ( STA_SECONDS * fs )
+#   lta[n] = lta[n-1] + ( x[n]^2 - lta[n-1] ) / ( LTA_SECONDS * fs )
+# A trigger turns on when sta / lta rises above ON_RATIO and off
+# when it falls below OFF_RATIO. The recursions are evaluated in
+# closed form on chunks of samples, for all the sensors fed in one
+# call at once, and the state is kept per sensor between calls so
+# that files and streamed blocks continue where the last one ended.
+# A gap in the data restarts the sensor, ratios are only used once
+# LTA_SECONDS of data have been seen.
+#
+# A coincidence is a time when at least minSensors sensors are
+# triggered, each trigger held on for COINCIDENCE_SECONDS after it
+# turns off to allow for the propagation across the array.
+#------------------------------------------------------------------
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+import MonitorCommands
+import UMXData
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+STA_SECONDS         = 2.
+LTA_SECONDS         = 60.
+DC_SECONDS          = 120.
+ON_RATIO            = 3.5
+OFF_RATIO           = 1.5
+COINCIDENCE_SECONDS = 30.
+MIN_SENSORS         = 2
+MAX_TRIGGERS        = 1000   # Kept by an EventJob
+LOG_RANGE           = 30.    # ln of the largest scaling in a chunk
+
+#---------------------------------------------------------------
+def RecursiveMean( x, c, y0 ) :
+    # y[n] = y[n-1] + c * ( x[n] - y[n-1] ) along the rows of the 2D
+    # x, from y[-1] = y0 (one per row). With d = 1 - c, in closed form
+    #   y[n] = d^(n+1) * ( y0 + c * sum_{i<=n} x[i] / d^(i+1) )
+    # which is evaluated on chunks short enough for 1 / d^(i+1)
+    # to stay within exp( LOG_RANGE ).
+    d     = 1. - c
+    chunk = max( 1, int( LOG_RANGE / -math.log( d ) ) )
+    y     = np.empty( x.shape )
+
+    for start in range( 0, x.shape[1], chunk ) :
+        xs = x[ :, start : start + chunk ]
+        p  = d ** np.arange( 1, xs.shape[1] + 1 )
+        y[ :, start : start + xs.shape[1] ] = \
+            p * ( y0[ :, None ] + c * np.cumsum( xs / p, axis = 1 ) )
+        y0 = y[ :, start + xs.shape[1] - 1 ]
+
+    return y
+
+#---------------------------------------------------------------
+def OnOff( ratio, triggered, onRatio, offRatio ) :
+    # Hysteresis of one row of ratios. Return the [ ( index, on ) ]
+    # changes and whether it ends triggered.
+    ons  = np.flatnonzero( ratio > onRatio )
+    offs = np.flatnonzero( ratio < offRatio )
+
+    changes  = []
+    position = 0
+    while True :
+        if triggered :
+            i = np.searchsorted( offs, position )
+            if i == len( offs ) :
+                break
+            position = offs[ i ]
+        else :
+            i = np.searchsorted( ons, position )
+            if i == len( ons ) :
+                break
+            position = ons[ i ]
+        triggered = not triggered
+        changes.append( ( position, triggered ) )
+
+    return changes, triggered
+
+#---------------------------------------------------------
+# Detector state of one sensor
+#---------------------------------------------------------
+class SensorState:
+    def __init__( self, samplingRate ):
+        self.samplingRate = samplingRate
+        self.Reset( None )
+
+    #-----------------------------------------------------------
+    def Reset( self, startTime ):
+        self.dc        = None    # first sample until initialized
+        self.sta       = 0.
+        self.lta       = 0.
+        self.seen      = 0       # samples since the last reset
+        self.nextTime  = startTime
+        self.triggered = False
+        self.onTime    = None
+        self.peak      = 0.
+
+#---------------------------------------------------------
+# STA/LTA triggers of many sensors
+#---------------------------------------------------------
+class Detector:
+    def __init__( self, staSeconds = STA_SECONDS, ltaSeconds = LTA_SECONDS,
+                  onRatio = ON_RATIO, offRatio = OFF_RATIO ):
+        self.staSeconds = staSeconds
+        self.ltaSeconds = ltaSeconds
+        self.onRatio    = onRatio
+        self.offRatio   = offRatio
+        self.states     = {}   # SensorState by sensor key
+
+    #-----------------------------------------------------------
+    def Feed( self, batch ):
+        # batch is a list of ( key, startTime, samplingRate, samples ).
+        # Return the triggers that turned off, as a list of ( key,
+        # onTime, offTime, peak ratio ).
+        triggers = []
+
+        # The runs of a key, such as those of a file with a gap, are
+        # fed one after another, each from the state of the last one
+        rounds = []
+        for entry in batch :
+            for entries in rounds :
+                if entry[0] not in entries :
+                    entries[ entry[0] ] = entry
+                    break
+            else :
+                rounds.append( { entry[0] : entry } )
+        if len( rounds ) > 1 :
+            for entries in rounds :
+                triggers.extend( self.Feed( list( entries.values() ) ) )
+            return triggers
+
+        # Sensors with the same rate and number of samples are
+        # filtered together
+        groups = {}
+        for key, startTime, samplingRate, samples in batch :
+            if not len( samples ) :
+                continue
+            state = self.states.get( key )
+            if not state or state.samplingRate != samplingRate :
+                state = self.states[ key ] = SensorState( samplingRate )
+
+            # Restart after a gap or an overlap
+            if state.nextTime is not None and \
+               abs( startTime - state.nextTime ) > 0.5 / samplingRate :
+                triggers.extend( self.Close( key, state.nextTime ) )
+                state.Reset( startTime )
+            state.nextTime = startTime + len( samples ) / samplingRate
+
+            groups.setdefault( ( samplingRate, len( samples ) ), [] ).append(
+                ( key, startTime, samples ) )
+
+        for ( samplingRate, length ), members in groups.items() :
+            triggers.extend( self.FeedGroup( samplingRate, length, members ) )
+
+        return triggers
+
+    #-----------------------------------------------------------
+    def FeedGroup( self, samplingRate, length, members ):
+        states = [ self.states[ key ] for key, startTime, samples in members ]
+        x = np.array( [ np.asarray( samples, dtype = np.float64 )
+                        for key, startTime, samples in members ] )
+
+        for i, state in enumerate( states ) :
+            if state.dc is None :
+                state.dc = x[ i, 0 ]
+
+        dc = RecursiveMean( x, 1. / ( DC_SECONDS * samplingRate ),
+                            np.array( [ s.dc for s in states ] ) )
+        power = ( x - dc )**2
+        sta = RecursiveMean( power, 1. / ( self.staSeconds * samplingRate ),
+                             np.array( [ s.sta for s in states ] ) )
+        lta = RecursiveMean( power, 1. / ( self.ltaSeconds * samplingRate ),
+                             np.array( [ s.lta for s in states ] ) )
+
+        ratio = sta / np.maximum( lta, 1e-30 )
+
+        # No triggers until the LTA has seen ltaSeconds of data
+        warmUp = self.ltaSeconds * samplingRate
+        seen   = np.array( [ s.seen for s in states ] )
+        ratio[ ( seen[ :, None ] + np.arange( length ) ) < warmUp ] = 0.
+
+        triggers = []
+        for i, ( key, startTime, samples ) in enumerate( members ) :
+            state = states[ i ]
+            state.dc   = dc [ i, -1 ]
+            state.sta  = sta[ i, -1 ]
+            state.lta  = lta[ i, -1 ]
+            state.seen = state.seen + length
+
+            changes, triggered = OnOff( ratio[ i ], state.triggered,
+                                        self.onRatio, self.offRatio )
+            start = 0
+            for index, on in changes :
+                t = startTime + index / samplingRate
+                if on :
+                    state.onTime = t
+                    state.peak   = 0.
+                else :
+                    state.peak = max( state.peak,
+                                      ratio[ i, start : index ].max( initial = 0. ) )
+                    triggers.append( ( key, state.onTime, t, state.peak ) )
+                    state.onTime = None
+                start = index
+            if triggered :
+                state.peak = max( state.peak, ratio[ i, start : ].max() )
+            state.triggered = triggered
+
+        return triggers
+
+    #-----------------------------------------------------------
+    def Close( self, key, stopTime ):
+        # End an open trigger of key at stopTime
+        state = self.states[ key ]
+        if not state.triggered :
+            return []
+        state.triggered = False
+        return [ ( key, state.onTime, stopTime, state.peak ) ]
+
+    #-----------------------------------------------------------
+    def Open( self ):
+        # [ ( key, onTime, peak ) ] of the triggers still on
+        return [ ( key, state.onTime, state.peak )
+                 for key, state in sorted( self.states.items() )
+                 if state.triggered ]
+
+#---------------------------------------------------------------
+def Coincidence( triggers, minSensors = MIN_SENSORS,
+                 holdSeconds = COINCIDENCE_SECONDS ) :
+    # Return [ ( start, end, [ keys ] ) ] of the times when at
+    # least minSensors sensors are triggered
+    events = []
+    for key, onTime, offTime, peak in triggers :
+        events.append( ( onTime, 1, key ) )
+        events.append( ( offTime + holdSeconds, -1, key ) )
+    # Offs before ons at the same time
+    events.sort( key = lambda event : ( event[0], event[1] ) )
+
+    active = {}    # trigger count by key
+    found  = []
+    start  = None
+    keys   = set()
+    for t, step, key in events :
+        active[ key ] = active.get( key, 0 ) + step
+        if not active[ key ] :
+            del( active[ key ] )
+
+        if len( active ) >= minSensors :
+            if start is None :
+                start = t
+                keys  = set()
+            keys.update( active.keys() )
+        elif start is not None :
+            found.append( ( start, t - holdSeconds, sorted( keys ) ) )
+            start = None
+
+    return found
+
+#---------------------------------------------------------------
+def DetectFiles( fileLists, startTime, stopTime,
+                 staSeconds = STA_SECONDS, ltaSeconds = LTA_SECONDS,
+                 onRatio = ON_RATIO, offRatio = OFF_RATIO ) :
+    # Triggers of { key : [ fileName ] } (time ordered). The i-th
+    # file of every sensor is fed in one batch. Runs in the worker
+    # processes. Return ( triggers, [ error messages ] ).
+    detector = Detector( staSeconds, ltaSeconds, onRatio, offRatio )
+    triggers = []
+    errors   = []
+    lastTime = {}
+
+    keys = sorted( fileLists.keys() )
+    for i in range( max( [ len( f ) for f in fileLists.values() ] + [ 0 ] ) ) :
+        batch = []
+        for key in keys :
+            if i >= len( fileLists[ key ] ) :
+                continue
+            fileName = fileLists[ key ][ i ]
+            try :
+                fileHeader, runs = UMXData.ReadRuns( fileName,
+                                                     startTime, stopTime )
+            except Exception as e :
+                errors.append( key + ': ' + fileName + ': ' + str( e ) )
+                continue
+            for runStart, samples in runs :
+                batch.append( ( key, runStart, fileHeader.samplingRate,
+                                samples ) )
+                lastTime[ key ] = runStart + \
+                                  len( samples ) / fileHeader.samplingRate
+        triggers.extend( detector.Feed( batch ) )
+
+    for key in lastTime :
+        triggers.extend( detector.Close( key, lastTime[ key ] ) )
+
+    triggers.sort( key = lambda trigger : trigger[1] )
+    return triggers, errors
+
+#---------------------------------------------------------------
+def Report( triggers, coincidences ) :
+    lines = []
+    for key, onTime, offTime, peak in triggers :
+        lines.append( key + ' trigger ' + UTC( onTime ) + ' - ' + \
+                      UTC( offTime ) + ' %.1f s, peak STA/LTA %.1f' % \
+                      ( offTime - onTime, peak ) )
+    for start, end, keys in coincidences :
+        lines.append( 'coincidence ' + UTC( start ) + ' - ' + UTC( end ) + \
+                      ' ' + str( len( keys ) ) + ' sensors: ' + \
+                      ', '.join( keys ) )
+    return lines
+
+#---------------------------------------------------------------
+def UTC( t ) :
+    return time.strftime( '%Y-%m-%d %H:%M:%S', time.gmtime( t ) )
+
+#---------------------------------------------------------
+# Triggers of the archive of the selected sensors and of the
+# Live streams, reported by Monitor.EventReport()
+#---------------------------------------------------------
+class EventJob:
+    def __init__( self, monitor ):
+        self.monitor  = monitor
+        self.detector = Detector()   # of the Live streams
+        self.triggers = []           # ( key, onTime, offTime, peak )
+        self.future   = None
+        self.messages = ''
+
+    #-----------------------------------------------------------
+    def FeedLive( self, batch ):
+        # Blocks of the Live streams, see LiveView.Update()
+        triggers = self.detector.Feed( batch )
+        for key, onTime, offTime, peak in triggers :
+            self.monitor.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+                ' ' + key + ': Event trigger ' + UTC( onTime ) + \
+                ' peak STA/LTA %.1f\n' % peak )
+        self.Add( triggers )
+
+    #-----------------------------------------------------------
+    def Add( self, triggers ):
+        self.triggers = sorted( self.triggers + triggers,
+                                key = lambda trigger : trigger[1] )
+        self.triggers = self.triggers[ -MAX_TRIGGERS : ]
+
+    #-----------------------------------------------------------
+    def ScanArchive( self, names, startTime, stopTime ):
+        # Detect in the archive files of names on the process pool
+        fileLists = {}
+        for name in names :
+            path = os.path.join( self.monitor.args.archivePath, name )
+            fileNames = []
+            for root, dirs, files in os.walk( path ) :
+                fileNames.extend( os.path.join( root, f ) for f in files )
+            fileLists[ name ] = UMXFile.SelectFiles( fileNames,
+                                                     startTime, stopTime )
+
+        self.future = self.monitor.GetProcessPool().submit(
+            DetectFiles, fileLists, startTime, stopTime )
+        self.monitor.Tk_root.after( 200, self.PollScan )
+
+    #-----------------------------------------------------------
+    def PollScan( self ):
+        if not self.future.done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.PollScan )
+            return
+
+        try :
+            triggers, errors = self.future.result()
+        except Exception as e :
+            triggers = []
+            errors   = [ 'Event scan Failed: ' + str( e ) ]
+        self.future = None
+
+        # Without the triggers found by an earlier scan
+        self.Add( [ t for t in triggers if t not in self.triggers ] )
+        self.monitor.EventReport( errors )
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    startTime = UMXFile.ParseUTC( args.begin ) if args.begin else None
+    stopTime  = UMXFile.ParseUTC( args.end   ) if args.end   else None
+
+    fileLists = {}
+    for path in args.paths :
+        key = os.path.basename( os.path.normpath( path ) )
+        fileNames = []
+        for root, dirs, files in os.walk( path ) :
+            fileNames.extend( os.path.join( root, f ) for f in files )
+        fileLists[ key ] = UMXFile.SelectFiles( fileNames, startTime, stopTime )
+
+    triggers, errors = DetectFiles( fileLists, startTime, stopTime,
+                                    args.sta, args.lta, args.on, args.off )
+    for error in errors :
+        print( error )
+
+    coincidences = Coincidence( triggers, args.coincidence, args.hold )
+    for line in Report( triggers, coincidences ) :
+        print( line )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA STA/LTA triggers' )
+
+    parser.add_argument('paths', nargs = '+',
+                        help = 'Archive directory of each sensor.')
+
+    parser.add_argument('-b', '--begin',
+                        dest   = 'begin', type = str,
+                        action = 'store', default = '',
+                        help = 'Start UTC (2026-10-19T00:00:00).')
+
+    parser.add_argument('-e', '--end',
+                        dest   = 'end', type = str,
+                        action = 'store', default = '',
+                        help = 'End UTC (2026-10-20T00:00:00).')
+
+    parser.add_argument('-S', '--sta',
+                        dest   = 'sta', type = float,
+                        action = 'store', default = STA_SECONDS,
+                        help = 'STA seconds (2).')
+
+    parser.add_argument('-L', '--lta',
+                        dest   = 'lta', type = float,
+                        action = 'store', default = LTA_SECONDS,
+                        help = 'LTA seconds (60).')
+
+    parser.add_argument('-n', '--on',
+                        dest   = 'on', type = float,
+                        action = 'store', default = ON_RATIO,
+                        help = 'Trigger on STA/LTA (3.5).')
+
+    parser.add_argument('-f', '--off',
+                        dest   = 'off', type = float,
+                        action = 'store', default = OFF_RATIO,
+                        help = 'Trigger off STA/LTA (1.5).')
+
+    parser.add_argument('-c', '--coincidence',
+                        dest   = 'coincidence', type = int,
+                        action = 'store', default = MIN_SENSORS,
+                        help = 'Sensors for a coincidence (2).')
+
+    parser.add_argument('-H', '--hold',
+                        dest   = 'hold', type = float,
+                        action = 'store', default = COINCIDENCE_SECONDS,
+                        help = 'Coincidence hold seconds (30).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#----------------------------------------------------------------------------
+# Name:     EventLoop.py
+# Purpose:  Event loop and variables of Monitor.py without Tk
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# The NCPASensor Poll*Cmd and the jobs of Monitor.py only use the
+# after(), after_idle() and after_cancel() of the Tk root and the
+# get() and set() of its StringVar and BooleanVar. EventLoop and
+# Var provide these without a display, for MonitorDaemon.py.
+#
+# mainloop() runs the idle callbacks, then the timers that are due
+# and sleeps until the next timer, so an idle loop takes no CPU. The
+# timers are on time.monotonic(), a clock change does not move them.
+# An exception of a callback is reported and the loop goes on, as
+# the Tk mainloop does.
+#------------------------------------------------------------------
+
+import heapq
+import sys
+import time
+import traceback
+
+DEBUG = False # Set True by the -v (verbose) option
+
+MAX_SLEEP = 1.   # s, longest sleep of mainloop(), to see quit()
+
+#---------------------------------------------------------
+# get() and set() of a StringVar or BooleanVar, set() calls
+# the callbacks of trace()
+#---------------------------------------------------------
+class Var:
+    def __init__( self, value = None ):
+        self.value  = value
+        self.traces = []
+
+    #-----------------------------------------------------------
+    def get( self ):
+        return self.value
+
+    #-----------------------------------------------------------
+    def set( self, value ):
+        self.value = value
+        for callback in self.traces :
+            callback( value )
+
+    #-----------------------------------------------------------
+    def trace( self, callback ):
+        self.traces.append( callback )
+
+#---------------------------------------------------------
+# after(), after_idle(), after_cancel(), mainloop() and quit()
+# of the Tk root
+#---------------------------------------------------------
+class EventLoop:
+    def __init__( self, report = None ):
+        self.timers  = []      # heap of [ due, id, func, args ]
+        self.idle    = []      # [ id, func, args ]
+        self.pending = {}      # timer or idle entry by id
+        self.count   = 0
+        self.running = False
+        self.report  = report  # of the callback exceptions, stderr if None
+
+    #-----------------------------------------------------------
+    def NewID( self ):
+        self.count = self.count + 1
+        return 'after#' + str( self.count )
+
+    #-----------------------------------------------------------
+    def after( self, ms, func = None, *args ):
+        # Call func( *args ) after ms, return the id for after_cancel()
+        if func is None :
+            time.sleep( ms / 1000. )
+            return None
+        id    = self.NewID()
+        entry = [ time.monotonic() + ms / 1000., id, func, args ]
+        heapq.heappush( self.timers, entry )
+        self.pending[ id ] = entry
+        return id
+
+    #-----------------------------------------------------------
+    def after_idle( self, func, *args ):
+        id    = self.NewID()
+        entry = [ id, func, args ]
+        self.idle.append( entry )
+        self.pending[ id ] = entry
+        return id
+
+    #-----------------------------------------------------------
+    def after_cancel( self, id ):
+        # The entry stays in timers or idle, without func
+        entry = self.pending.pop( id, None )
+        if entry :
+            entry[-2] = None
+
+    #-----------------------------------------------------------
+    def Call( self, entry ):
+        id, func, args = entry[-3 :]
+        self.pending.pop( id, None )
+        if func is None :
+            return
+        try :
+            func( *args )
+        except Exception :
+            text = 'Exception in callback ' + \
+                   getattr( func, '__qualname__', repr( func ) ) + '\n' + \
+                   traceback.format_exc()
+            if self.report :
+                self.report( text )
+            else :
+                sys.stderr.write( text )
+
+    #-----------------------------------------------------------
+    def mainloop( self ):
+        self.running = True
+        while self.running :
+            # The callbacks of after_idle() during these run next time
+            idle, self.idle = self.idle, []
+            for entry in idle :
+                self.Call( entry )
+
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now and self.running :
+                self.Call( heapq.heappop( self.timers ) )
+
+            if self.idle or not self.running :
+                continue
+            sleep = MAX_SLEEP
+            if self.timers :
+                sleep = min( sleep, self.timers[0][0] - time.monotonic() )
+            if sleep > 0. :
+                time.sleep( sleep )
+
+    #-----------------------------------------------------------
+    def quit( self ):
+        self.running = False
@@ -0,0 +1,242 @@
+#----------------------------------------------------------------------------
+# Name:     Extract.py
+# Purpose:  Time window extraction from the UMX files on NCPA sensors
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# A UTC window is mapped onto the data files of a sensor with the
+# Continuity index (file start times from the names, sizes from
+# 'ls -l') and onto block offsets within them, one block per
+# second from the start of the file. Only the file header and the
+# blocks of the window are read, all files of a sensor over one
+# ssh connection (MonitorCommands.RangeCmd). The blocks are placed
+# by their own utcTime into one array of the window, NaN where
+# there is no data.
+#
+#   data = Extract.Extract( sensors, monitor.continuity, start, stop )
+#   samplingRate, samples = data[ sensor.name ]
+#------------------------------------------------------------------
+
+import os
+import subprocess
+import time
+
+import numpy as np
+
+import MonitorCommands
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+#---------------------------------------------------------------
+def RemotePath( fileName ) :
+    # /data/ncpa42-1XXX_YYMMDD/ncpa42-1XXX_YYMMDD_HHMMSS.umx
+    return '/data/' + fileName.rsplit( '_', 1 )[0] + '/' + fileName
+
+#---------------------------------------------------------------
+def PlanRanges( files, startTime, stopTime, samplingRate ) :
+    # Return [ ( remotePath, offset, length, firstBlockTime ) ] of
+    # the whole blocks of files, [ ( start, fileName, size ) ] from
+    # the Continuity index, that cover startTime to stopTime
+    blockSize = UMXFile.BlockSize( samplingRate )
+    ranges = []
+    for fileStart, fileName, size in files :
+        blocks = max( size - UMXFile.FILE_HEADER.size, 0 ) // blockSize
+        first  = max( int( np.floor( startTime - fileStart ) ), 0 )
+        last   = min( int( np.ceil( stopTime - fileStart ) ), blocks )
+        if last > first :
+            ranges.append( ( RemotePath( fileName ),
+                             UMXFile.BlockOffset( samplingRate, first ),
+                             ( last - first ) * blockSize,
+                             fileStart + first ) )
+    return ranges
+
+#---------------------------------------------------------------
+def Stitch( data, ranges, startTime, stopTime, samplingRate ) :
+    # Place the blocks of the RangeCmd output, the file header and
+    # the blocks of each range, into one float array of startTime
+    # to stopTime. Return the samples, NaN where there is no data,
+    # samples[0] is the first sample at or after startTime.
+    samples = np.full( int( round( ( stopTime - startTime ) * samplingRate ) ),
+                       np.nan )
+    offset = 0
+    for remotePath, rangeOffset, length, firstBlockTime in ranges :
+        fileHeader = UMXFile.FileHeader( data[ offset : ] )
+        if fileHeader.samplingRate != samplingRate :
+            raise( Exception( remotePath + ' samplingRate ' + \
+                              str( fileHeader.samplingRate ) + ' != ' + \
+                              str( samplingRate ) ) )
+        offset = offset + UMXFile.FILE_HEADER.size
+
+        if len( data ) < offset + length :
+            raise( Exception( remotePath + ' is short: ' + \
+                              str( len( data ) - offset ) + ' of ' + \
+                              str( length ) + ' bytes' ) )
+        blocks, end = UMXFile.DecodeBlocks( data[ offset : offset + length ],
+                                            fileHeader, 0 )
+        offset = offset + length
+
+        for blockHeader, block in blocks :
+            first = int( np.floor( ( blockHeader.utcTime - startTime ) *
+                                   samplingRate + 1e-6 ) )
+            block = np.frombuffer( block, dtype = np.int32 )
+            lo = max( first, 0 )
+            hi = min( first + len( block ), len( samples ) )
+            if hi > lo :
+                samples[ lo : hi ] = block[ lo - first : hi - first ]
+
+    return samples
+
+#---------------------------------------------------------------
+def Plan( sensorContinuity, startTime, stopTime ) :
+    if sensorContinuity is None :
+        raise( Exception( 'no data file listing, poll the sensor first' ) )
+    return PlanRanges( sensorContinuity.Files( startTime, stopTime ),
+                       startTime, stopTime, sensorContinuity.samplingRate )
+
+#---------------------------------------------------------------
+def Extract( sensors, continuity, startTime, stopTime ) :
+    # Blocking extraction of startTime to stopTime from sensors, in
+    # parallel. Return { name : ( samplingRate, samples ) } and
+    # [ error messages ].
+    popens = {}
+    errors = []
+    for sensor in sensors :
+        try :
+            ranges = Plan( continuity.sensors.get( sensor.name ),
+                           startTime, stopTime )
+        except Exception as e :
+            errors.append( sensor.name + ': Extract Failed: ' + str( e ) )
+            continue
+        if ranges :
+            popens[ sensor.name ] = ( MonitorCommands.RangeCmd( sensor, ranges ),
+                                      ranges )
+
+    data = {}
+    for name in sorted( popens.keys() ) :
+        popen, ranges = popens[ name ]
+        out = popen.communicate()[0]
+        samplingRate = continuity.sensors[ name ].samplingRate
+        try :
+            if popen.returncode != 0 :
+                raise( Exception( 'ssh returned ' + str( popen.returncode ) ) )
+            data[ name ] = ( samplingRate, Stitch( out, ranges, startTime,
+                                                   stopTime, samplingRate ) )
+        except Exception as e :
+            errors.append( name + ': Extract Failed: ' + str( e ) )
+
+    return data, errors
+
+#---------------------------------------------------------------
+def WriteWindow( fileName, startTime, samplingRate, samples ) :
+    # Columns for gnuplot: UTC seconds, ADC counts, a blank
+    # line at each gap
+    fo = open( fileName, 'w' )
+    full = ~np.isnan( samples )
+    for i in range( len( samples ) ) :
+        if full[ i ] :
+            fo.write( '%.3f %d\n' % ( startTime + i / samplingRate,
+                                      samples[ i ] ) )
+        elif i and full[ i - 1 ] :
+            fo.write( '\n' )
+    fo.close()
+
+#---------------------------------------------------------
+# Extraction of a window from the selected sensors, driven
+# from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class ExtractJob:
+    def __init__( self, monitor, keys, startTime, stopTime ):
+        self.monitor   = monitor
+        self.startTime = startTime
+        self.stopTime  = stopTime
+        self.popens    = {}    # ( Popen, ranges ) by sensor name
+        self.outputs   = {}    # stdout read while polling
+        self.messages  = ''
+
+        for key in keys :
+            sensor = monitor.SensorCollection.SensorDict[ key ]
+            try :
+                ranges = Plan( monitor.continuity.sensors.get( sensor.name ),
+                               startTime, stopTime )
+            except Exception as e :
+                self.Message( sensor.name + ': Extract Failed: ' + str( e ) )
+                continue
+            if not ranges :
+                self.Message( sensor.name + ': Extract: no data in the window' )
+                continue
+            self.popens[ sensor.name ] = \
+                ( MonitorCommands.RangeCmd( sensor, ranges ), ranges )
+
+        monitor.msgCommand.set( self.messages )
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Message( self, msg ):
+        self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                        ' ' + msg + '\n'
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return len( self.outputs ) == len( self.popens )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        for name in self.popens :
+            if name not in self.outputs :
+                sp_out = MonitorCommands.PollOutput( self.popens[ name ][0] )
+                if sp_out is not None :
+                    self.outputs[ name ] = sp_out[0]
+
+        if not self.Done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+            return
+
+        plots = []
+        for name in sorted( self.popens.keys() ) :
+            popen, ranges = self.popens[ name ]
+            samplingRate = self.monitor.continuity.sensors[ name ].samplingRate
+            try :
+                if popen.returncode != 0 :
+                    raise( Exception( 'ssh returned ' + str( popen.returncode ) ) )
+                samples = Stitch( self.outputs[ name ], ranges, self.startTime,
+                                  self.stopTime, samplingRate )
+            except Exception as e :
+                self.Message( name + ': Extract Failed: ' + str( e ) )
+                continue
+
+            # The window as a .npy of float ADC counts, NaN in the gaps
+            fileName = os.path.join( self.monitor.args.exportPath, name + \
+                time.strftime( '_%y%m%d_%H%M%S', time.gmtime( self.startTime ) ) + \
+                time.strftime( '_%H%M%S.npy', time.gmtime( self.stopTime ) ) )
+            os.makedirs( self.monitor.args.exportPath, exist_ok = True )
+            np.save( fileName, samples )
+
+            dataFile = self.monitor.tempDir + name + '_extract.dat'
+            WriteWindow( dataFile, self.startTime, samplingRate, samples )
+            plots.append( '"' + dataFile + '" using 1:2 with lines title "' + \
+                          name + '"' )
+            self.Message( name + ': Extract ' + \
+                str( int( np.sum( ~np.isnan( samples ) ) ) ) + ' of ' + \
+                str( len( samples ) ) + ' samples from ' + \
+                str( len( ranges ) ) + ' files, ' + \
+                str( len( self.outputs[ name ] ) ) + ' bytes to ' + fileName )
+
+        if plots :
+            gnuplotFile = self.monitor.tempDir + 'extract_gnuplot.plt'
+            fo = open( gnuplotFile, 'w' )
+            fo.write( 'set xdata time\n' )
+            fo.write( 'set timefmt "%s"\n' )
+            fo.write( 'set format x "%H:%M:%S"\n' )
+            fo.write( 'set ylabel "ADC counts"\n' )
+            fo.write( 'plot ' + ', '.join( plots ) + '\n' )
+            fo.close()
+            subprocess.Popen( 'gnuplot ' + gnuplotFile + ' -persist',
+                              shell = True, stdout = subprocess.PIPE )
+
+        self.monitor.msgCommand.set( self.messages )
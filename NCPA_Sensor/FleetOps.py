@@ -0,0 +1,202 @@
+#----------------------------------------------------------------------------
+# Name:     FleetOps.py
+# Purpose:  Fleet operations on NCPA sensors in waves
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Sensors are selected by the Group and Tags fields of Sensors.txt
+# (see SensorFile.py) and an operation, Reboot, Halt, Start UMX or
+# Send Config, runs on them in waves of waveSize sensors (-W). The
+# command runs on the sensors of a wave in parallel, with the same
+# Popen and Poll*Cmd of NCPASensor as the buttons. Then the wave
+# must become healthy, checked every HEALTH_INTERVAL s from the
+# delay of the operation for up to HEALTH_TIMEOUT s:
+#   ssh  the sensor takes ssh logins (MonitorCommands.SSHCmd)
+#   umx  UMXcontrol4.4.0 is running (MonitorCommands.UMXCmd)
+# before the next wave starts. Once maxFailures (-F) sensors have
+# failed no further wave is started, -F 0 stops at the first failure.
+#------------------------------------------------------------------
+
+import time
+
+import MonitorCommands
+
+DEBUG = False # Set True by the -v (verbose) option
+
+HEALTH_TIMEOUT  = 300.   # seconds for a sensor to become healthy
+HEALTH_INTERVAL = 5.     # seconds between health checks of a sensor
+
+# name : ( Popen, busy flag, status msg and monitor messages
+#          attributes, command, Poll*Cmd, health check, delay s )
+OPERATIONS = {
+    'Reboot'      : ( 'rebootPopen', 'rebootPopenBusy',
+                      'rebootStatusMsg', 'rebootMessages',
+                      MonitorCommands.RebootCmd, 'PollRebootCmd',
+                      'ssh', 30. ),
+    'Halt'        : ( 'haltPopen', 'haltPopenBusy',
+                      'haltStatusMsg', 'haltMessages',
+                      MonitorCommands.HaltCmd, 'PollHaltCmd',
+                      None, 0. ),
+    'Start UMX'   : ( 'startUMXSchedulerPopen', 'startUMXSchedulerPopenBusy',
+                      'startUMXSchedulerStatusMsg', 'startUMXMessages',
+                      MonitorCommands.StartUMXSchedulerCmd,
+                      'PollStartUMXSchedulerCmd', 'umx', 5. ),
+    'Send Config' : ( 'sendConfigPopen', 'sendConfigPopenBusy',
+                      'sendConfigStatusMsg', 'sendConfigMessages',
+                      MonitorCommands.SendConfigCmd, 'PollSendConfigCmd',
+                      'ssh', 0. ) }
+
+HEALTH = { 'ssh' : MonitorCommands.SSHCmd,
+           'umx' : MonitorCommands.UMXCmd }
+
+#---------------------------------------------------------------
+def Select( sensorDict, text ) :
+    # The keys of the sensors in the groups or with the tags of
+    # text, 'all' for every sensor
+    names = set( text.replace( ',', ' ' ).split() )
+    return [ key for key in sensorDict
+             if 'all' in names or sensorDict[ key ].group in names or
+                names.intersection( sensorDict[ key ].tags ) ]
+
+#---------------------------------------------------------
+# One operation on the sensors of keys in waves, driven from
+# the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class WaveJob:
+    def __init__( self, monitor, keys, operation, waveSize, maxFailures ):
+        self.monitor     = monitor
+        self.operation   = operation
+        self.maxFailures = maxFailures
+        self.sensors     = dict( ( key, monitor.SensorCollection.SensorDict[ key ] )
+                                 for key in keys )
+        self.waves       = [ keys[ i : i + max( waveSize, 1 ) ]
+                             for i in range( 0, len( keys ), max( waveSize, 1 ) ) ]
+        self.wave        = -1
+        self.pending     = {}   # [ step, next check, done time, Popen ] by key
+        self.results     = {}   # ( result, detail ) by key
+        self.failures    = 0
+        self.stopped     = False
+
+        setattr( monitor, OPERATIONS[ operation ][3], '' )
+        self.NextWave()
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Result( self, key, result, detail = '' ):
+        self.results[ key ] = ( result, detail )
+        if result == 'failed' :
+            self.failures = self.failures + 1
+        self.pending.pop( key, None )
+
+    #-----------------------------------------------------------
+    def NextWave( self ):
+        popen, busy, statusMsg, messages, command, poll, health, delay = \
+            OPERATIONS[ self.operation ]
+        self.wave = self.wave + 1
+        for key in self.waves[ self.wave ] :
+            sensor = self.sensors[ key ]
+            if getattr( sensor, busy ) :
+                self.Result( key, 'failed', 'a command is in progress' )
+                continue
+
+            setattr( sensor, statusMsg, '' )
+            setattr( sensor, busy, True )
+            try :
+                setattr( sensor, popen, command( sensor ) )
+            except OSError as e :
+                # Send Config of a local config that can not be read
+                msg = MonitorCommands.GetLocalUTC() + ' ' + sensor.name + \
+                      ': ' + self.operation + ' Failed: ' + str( e ) + '\n'
+                setattr( sensor, statusMsg, msg )
+                setattr( sensor, busy, False )
+                setattr( self.monitor, messages,
+                         getattr( self.monitor, messages ) + msg )
+                self.Result( key, 'failed', msg.strip() )
+                continue
+            self.monitor.Tk_root.after_idle( getattr( sensor, poll ) )
+            self.pending[ key ] = [ 'command', 0., 0., None ]
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return not self.pending and \
+               ( self.stopped or self.wave == len( self.waves ) - 1 )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        popen, busy, statusMsg, messages, command, poll, health, delay = \
+            OPERATIONS[ self.operation ]
+        now = time.monotonic()
+
+        for key in list( self.pending.keys() ) :
+            sensor = self.sensors[ key ]
+            state  = self.pending[ key ]
+            if state[0] == 'command' :
+                if getattr( sensor, busy ) :
+                    continue
+                msg = getattr( sensor, statusMsg )
+                if 'Failed' in msg :
+                    self.Result( key, 'failed', msg.strip() )
+                elif not health :
+                    self.Result( key, 'done' )
+                else :
+                    self.pending[ key ] = [ 'health', now + delay, now, None ]
+                continue
+
+            step, nextCheck, doneTime, check = state
+            if check :
+                sp_out = MonitorCommands.PollOutput( check )
+                if sp_out is None :
+                    continue
+                if check.returncode == 0 :
+                    self.Result( key, 'healthy',
+                                 'after %.0f s' % ( now - doneTime ) )
+                    continue
+                state[1] = now + HEALTH_INTERVAL
+                state[3] = None
+            if now > doneTime + delay + HEALTH_TIMEOUT :
+                self.Result( key, 'failed', 'not ' + health + ' healthy after ' + \
+                             '%.0f s' % ( delay + HEALTH_TIMEOUT ) )
+            elif now >= state[1] :
+                state[3] = HEALTH[ health ]( sensor )
+
+        if not self.pending :
+            if self.failures and self.failures >= self.maxFailures and \
+               self.wave < len( self.waves ) - 1 :
+                self.stopped = True
+                for wave in self.waves[ self.wave + 1 : ] :
+                    for key in wave :
+                        self.results[ key ] = ( 'skipped', '' )
+            if self.Done() :
+                self.Report()
+                return
+            self.NextWave()
+
+        # register this function for a callback after 200 ms
+        self.monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        counts = {}
+        lines  = []
+        for wave, keys in enumerate( self.waves ) :
+            for key in keys :
+                result, detail = self.results[ key ]
+                counts[ result ] = counts.get( result, 0 ) + 1
+                lines.append( '%-4d %-10s %-8s %s' % ( wave + 1,
+                              self.sensors[ key ].name, result, detail ) )
+
+        header = MonitorCommands.GetLocalUTC() + ' ' + self.operation + \
+                 ' of ' + str( len( self.sensors ) ) + ' sensors in ' + \
+                 str( len( self.waves ) ) + ' waves: ' + \
+                 ', '.join( str( counts[ result ] ) + ' ' + result
+                            for result in sorted( counts.keys() ) )
+        if self.stopped :
+            header = header + '\nStopped after wave ' + str( self.wave + 1 ) + \
+                     ', ' + str( self.failures ) + ' failures >= ' + \
+                     str( self.maxFailures )
+        self.monitor.ShowReport( 'NCPA: Fleet ' + self.operation,
+                                 [ header, 'wave sensor     result' ] + lines )
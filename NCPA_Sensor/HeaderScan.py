@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     HeaderScan.py
+# Purpose:  Battery and timing state of UMX files from their block headers
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./HeaderScan.py -b 2026-10-19T00:00:00 /data
+#
+# Reads only the file header, the first block header and the last
+# complete block header of each file, about 240 bytes of a 300 s
+# file of 150 kB at 125 Hz. This runs on the sensors (see
+# MonitorCommands.HeaderScanCmd) as well as on local files, so it
+# only uses the standard library.
+#
+# One line per file, sorted by file start time:
+#   fileStart firstTime lastTime blocks batteryFirst batteryLast dataType
+# fileStart from the file name, firstTime and lastTime the utcTime
+# of the first and last block, the last sample is 1 s after
+# lastTime. A file that can not be read is a line:
+#   # fileName error
+#------------------------------------------------------------------
+
+import argparse
+import os
+
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+RECORD_FORMAT = '%d %.3f %.3f %d %.3f %.3f %d'
+MAX_RECORDS   = 2016   # records kept per sensor by Monitor.py, 7 days
+                       # of 300 s files
+
+#---------------------------------------------------------------
+def ScanFile( fileName ) :
+    # Return the record ( fileStart, firstTime, lastTime, blocks,
+    # batteryFirst, batteryLast, dataType ) of a UMX file, None if
+    # it has no complete block yet
+    fi = open( fileName, 'rb' )
+    try :
+        fileHeader = UMXFile.FileHeader( fi.read( UMXFile.FILE_HEADER.size ) )
+        fi.seek( 0, os.SEEK_END )
+        blocks = ( fi.tell() - UMXFile.FILE_HEADER.size ) // fileHeader.blockSize
+        if blocks < 1 :
+            return None
+
+        fi.seek( UMXFile.BlockOffset( fileHeader.samplingRate, 0 ) )
+        first = UMXFile.BlockHeader( fi.read( UMXFile.BLOCK_HEADER.size ) )
+        fi.seek( UMXFile.BlockOffset( fileHeader.samplingRate, blocks - 1 ) )
+        last  = UMXFile.BlockHeader( fi.read( UMXFile.BLOCK_HEADER.size ) )
+    finally :
+        fi.close()
+
+    return ( UMXFile.ParseFileName( fileName )[1], first.utcTime, last.utcTime,
+             blocks, first.batteryLevel, last.batteryLevel, last.dataType )
+
+#---------------------------------------------------------------
+def ScanFiles( fileNames ) :
+    # Return the records of fileNames and [ ( fileName, error ) ]
+    records = []
+    errors  = []
+    for fileName in fileNames :
+        try :
+            record = ScanFile( fileName )
+        except Exception as e :
+            errors.append( ( fileName, str( e ) ) )
+            continue
+        if record :
+            records.append( record )
+    return records, errors
+
+#---------------------------------------------------------------
+def ParseLines( text ) :
+    # Records and [ ( fileName, error ) ] from the output of main()
+    records = []
+    errors  = []
+    for line in text.split( '\n' ) :
+        if line.startswith( '#' ) :
+            words = line[ 1 : ].split( None, 1 )
+            errors.append( ( words[0], words[1] if len( words ) > 1 else '' ) )
+            continue
+        words = line.split()
+        if len( words ) != 7 :
+            continue
+        records.append( ( int( words[0] ), float( words[1] ), float( words[2] ),
+                          int( words[3] ), float( words[4] ), float( words[5] ),
+                          int( words[6] ) ) )
+    return records, errors
+
+#---------------------------------------------------------------
+def BatteryTrend( records, seconds = 86400. ) :
+    # Least squares battery slope (V/day) over the last seconds
+    # of records, None with less than two points
+    if not records :
+        return None
+    since  = records[-1][2] - seconds
+    points = [ ( r[1], r[4] ) for r in records if r[1] >= since ] + \
+             [ ( r[2], r[5] ) for r in records if r[2] >= since ]
+    if len( points ) < 2 :
+        return None
+
+    meanT = sum( t for t, v in points ) / len( points )
+    meanV = sum( v for t, v in points ) / len( points )
+    varT  = sum( ( t - meanT )**2 for t, v in points )
+    if varT <= 0. :
+        return None
+    cov = sum( ( t - meanT ) * ( v - meanV ) for t, v in points )
+    return cov / varT * 86400.
+
+#---------------------------------------------------------------
+def WriteTrend( fileName, records ) :
+    # UTC seconds and battery level, a blank line between
+    # files that do not follow on for gnuplot
+    fo = open( fileName, 'w' )
+    lastTime = None
+    for record in records :
+        if lastTime is not None and record[1] - lastTime > 1.5 :
+            fo.write( '\n' )
+        fo.write( '%.3f %.3f\n%.3f %.3f\n' % ( record[1], record[4],
+                                               record[2], record[5] ) )
+        lastTime = record[2] + 1.
+    fo.close()
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    startTime = UMXFile.ParseUTC( args.begin ) if args.begin else None
+
+    fileNames = []
+    for path in args.paths :
+        if os.path.isdir( path ) :
+            for root, dirs, files in os.walk( path ) :
+                fileNames.extend( os.path.join( root, f ) for f in files )
+        else :
+            fileNames.append( path )
+
+    records, errors = ScanFiles( UMXFile.SelectFiles( fileNames,
+                                                      startTime, None ) )
+    for record in records :
+        print( RECORD_FORMAT % record )
+    for fileName, error in errors :
+        print( '# ' + fileName + ' ' + error )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'UMX block header scan' )
+
+    parser.add_argument('paths', nargs = '*', default = [ '/data' ],
+                        help = 'UMX files or directories (/data).')
+
+    parser.add_argument('-b', '--begin',
+                        dest   = 'begin', type = str,
+                        action = 'store', default = '',
+                        help = 'Files from UTC (2026-10-19T00:00:00).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     LibConfig.py
+# Purpose:  Parse, validate and render libconfig UMSX sensor configs
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./LibConfig.py SN056_UMSX1.4.cfg SN057_UMSX1.4.cfg ...
+# ./LibConfig.py -g adcConfig.sampleFrequency SN*_UMSX1.4.cfg
+# ./LibConfig.py -t UMSX1.4.cfg -r overrides.txt -o configFiles
+#
+# The UMSX .cfg files (configFiles/UMSX1.4.cfg) are libconfig:
+#   name = value;  groups { }, lists ( ), arrays [ ], "strings",
+#   integers, floats, true/false and #, // and /* */ comments.
+# Groups parse to dicts and lists and arrays to lists. A setting is
+# addressed by its path, 'gpsConfig.baud', 'autoControl.event.[1].stop'.
+#
+# Parsed files are cached by the md5 of their bytes. A Config keeps
+# the source span of every scalar value, so Render() of a template
+# with overrides only replaces those values and keeps the layout
+# and the comments.
+#
+# The overrides file of a batch render has one line per config:
+#   SN056 sensorConfig.sensorName = "ncpa42-1056"; adcConfig.sensorGain = 4;
+# rendered as <outPath>/SN056_UMSX1.4.cfg. Every rendered config is
+# validated against SCHEMA.
+#------------------------------------------------------------------
+
+import argparse
+import hashlib
+import os
+import re
+
+DEBUG = False # Set True by the -v (verbose) option
+
+CONFIG_SUFFIX = '_UMSX1.4.cfg'
+
+TOKEN = re.compile( r'''
+    (?P<space>   \s+ | \#[^\n]* | //[^\n]* | /\*.*?\*/ )
+  | (?P<string>  "(?:[^"\\]|\\.)*" )
+  | (?P<float>   [-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)? | [-+]?\d+[eE][-+]?\d+ )
+  | (?P<hex>     0[xX][0-9a-fA-F]+L{0,2} )
+  | (?P<integer> [-+]?\d+L{0,2} )
+  | (?P<boolean> (?:[Tt][Rr][Uu][Ee]|[Ff][Aa][Ll][Ss][Ee])\b )
+  | (?P<name>    [A-Za-z*][-A-Za-z0-9_*]* )
+  | (?P<punct>   [=:;,{}()\[\].] )
+''', re.VERBOSE | re.DOTALL )
+
+# path = of an overrides setting
+SETTING = re.compile( r'\s*([A-Za-z*][-A-Za-z0-9_*]*' +
+                      r'(?:\.(?:[A-Za-z*][-A-Za-z0-9_*]*|\[\d+\]))*)\s*[=:]' )
+
+ESCAPES = { 'n' : '\n', 't' : '\t', 'r' : '\r', 'f' : '\f',
+            '\\' : '\\', '"' : '"' }
+
+BAUDS = ( 1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400,
+          460800, 921600 )
+
+CALIBRATION = re.compile( r'\s*([0-9.eE+-]+)\s*([mun]?)v\s*/\s*pa\s*$',
+                          re.IGNORECASE )
+
+# Settings of a UMSX config: path, type, check of the value, and the
+# description of the check
+SCHEMA = (
+    ( 'sensorConfig.magic',            str, lambda v : v == '.umx', '".umx"' ),
+    ( 'sensorConfig.sensorName',       str,
+      lambda v : re.match( r'^[-A-Za-z0-9]+$', v ), 'letters, digits and -' ),
+    ( 'sensorConfig.sensorLocation',   str, lambda v : len( v ) < 32,
+      'under 32 characters' ),
+    ( 'sensorConfig.calibrationLevel', str,
+      lambda v : CALIBRATION.match( v ), 'like "20mv/Pa"' ),
+    ( 'sensorConfig.calibrationDate',  str, lambda v : len( v ) < 16,
+      'under 16 characters' ),
+    ( 'sensorConfig.filePath',         str, lambda v : v.startswith( '/' ),
+      'an absolute path' ),
+    ( 'sensorConfig.UMXFileLength',    int, lambda v : 1 <= v <= 86400,
+      '1 to 86400 s' ),
+    ( 'gpsConfig.port',   str, lambda v : v.startswith( '/dev/' ), '/dev/...' ),
+    ( 'gpsConfig.baud',   int, lambda v : v in BAUDS, 'a standard baud rate' ),
+    ( 'gpsConfig.bits',   int, lambda v : 5 <= v <= 8, '5 to 8' ),
+    ( 'gpsConfig.parity', str, lambda v : v in ( 'N', 'E', 'O' ), 'N, E or O' ),
+    ( 'gpsConfig.stop',   int, lambda v : v in ( 1, 2 ), '1 or 2' ),
+    ( 'mcuConfig.port',   str, lambda v : v.startswith( '/dev/' ), '/dev/...' ),
+    ( 'mcuConfig.baud',   int, lambda v : v in BAUDS, 'a standard baud rate' ),
+    ( 'mcuConfig.bits',   int, lambda v : 5 <= v <= 8, '5 to 8' ),
+    ( 'mcuConfig.parity', str, lambda v : v in ( 'N', 'E', 'O' ), 'N, E or O' ),
+    ( 'mcuConfig.stop',   int, lambda v : v in ( 1, 2 ), '1 or 2' ),
+    ( 'adcConfig.name',            str, lambda v : len( v ) < 16,
+      'under 16 characters' ),
+    ( 'adcConfig.sensorGain',      int, lambda v : 1 <= v <= 4, '1 to 4' ),
+    ( 'adcConfig.sampleFrequency', int, lambda v : 1 <= v <= 15, '1 to 15' ),
+)
+
+PARSED = {}   # Config by ( fileName, md5 of the file bytes )
+
+#---------------------------------------------------------------
+def Tokenize( text, fileName = '' ) :
+    # Return [ ( kind, text, start ) ] without the space and comments
+    tokens = []
+    pos = 0
+    while pos < len( text ) :
+        match = TOKEN.match( text, pos )
+        if not match :
+            raise( Exception( Location( text, pos, fileName ) + \
+                              'unexpected ' + repr( text[ pos ] ) ) )
+        if match.lastgroup != 'space' :
+            tokens.append( ( match.lastgroup, match.group(), pos ) )
+        pos = match.end()
+    tokens.append( ( 'end', '', len( text ) ) )
+    return tokens
+
+#---------------------------------------------------------------
+def Location( text, pos, fileName = '' ) :
+    line = text.count( '\n', 0, pos ) + 1
+    column = pos - text.rfind( '\n', 0, pos )
+    return fileName + ':' + str( line ) + ':' + str( column ) + ': '
+
+#---------------------------------------------------------------
+def Scalar( kind, token ) :
+    # The Python value of a scalar token
+    if kind == 'string' :
+        return re.sub( r'\\(.)', lambda m : ESCAPES.get( m.group(1),
+                                                         m.group(1) ),
+                       token[ 1 : -1 ] )
+    if kind == 'integer' :
+        return int( token.rstrip( 'L' ) )
+    if kind == 'hex' :
+        return int( token.rstrip( 'L' ), 16 )
+    if kind == 'float' :
+        return float( token )
+    return token.lower() == 'true'
+
+#---------------------------------------------------------
+# Recursive descent parser of a libconfig text
+#---------------------------------------------------------
+class Parser:
+    def __init__( self, text, fileName = '' ):
+        self.text     = text
+        self.fileName = fileName
+        self.tokens   = Tokenize( text, fileName )
+        self.i        = 0
+        self.spans    = {}   # ( start, end ) of the scalar values by path
+
+    #-----------------------------------------------------------
+    def Error( self, msg ):
+        kind, token, pos = self.tokens[ self.i ]
+        raise( Exception( Location( self.text, pos, self.fileName ) + msg + \
+                          ', found ' + ( repr( token ) if token else 'end' ) ) )
+
+    #-----------------------------------------------------------
+    def Next( self, expected = None ):
+        kind, token, pos = self.tokens[ self.i ]
+        if expected and token not in expected :
+            self.Error( 'expected ' + ' or '.join( expected ) )
+        self.i = self.i + 1
+        return kind, token, pos
+
+    #-----------------------------------------------------------
+    def Peek( self ):
+        return self.tokens[ self.i ][ : 2 ]
+
+    #-----------------------------------------------------------
+    def Settings( self, path, closing ):
+        settings = {}
+        while self.Peek()[1] != closing :
+            kind, name, pos = self.Next()
+            if kind != 'name' :
+                self.i = self.i - 1
+                self.Error( 'expected a setting name' )
+            if name in settings :
+                self.i = self.i - 1
+                self.Error( 'duplicate setting ' + name )
+            self.Next( ( '=', ':' ) )
+            settings[ name ] = self.Value( path + name )
+            if self.Peek()[1] in ( ';', ',' ) :
+                self.Next()
+        return settings
+
+    #-----------------------------------------------------------
+    def Value( self, path ):
+        kind, token, pos = self.Next()
+        if token == '{' :
+            value = self.Settings( path + '.', '}' )
+            self.Next( ( '}', ) )
+            return value
+
+        if token in ( '(', '[' ) :
+            closing = ')' if token == '(' else ']'
+            value = []
+            while self.Peek()[1] != closing :
+                value.append( self.Value( path + '.[' + str( len( value ) ) + ']' ) )
+                if self.Peek()[1] != ',' :
+                    break
+                self.Next()
+            self.Next( ( closing, ) )
+            return value
+
+        if kind == 'string' :
+            # Adjacent strings are concatenated
+            value = Scalar( kind, token )
+            end   = pos + len( token )
+            while self.Peek()[0] == 'string' :
+                kind, token, next = self.Next()
+                value = value + Scalar( kind, token )
+                end   = next + len( token )
+            self.spans[ path ] = ( pos, end )
+            return value
+
+        if kind in ( 'integer', 'hex', 'float', 'boolean' ) :
+            self.spans[ path ] = ( pos, pos + len( token ) )
+            return Scalar( kind, token )
+
+        self.i = self.i - 1
+        self.Error( 'expected a value' )
+
+    #-----------------------------------------------------------
+    def Parse( self ):
+        settings = self.Settings( '', '' )
+        if self.Peek()[0] != 'end' :
+            self.Error( 'expected a setting name' )
+        return settings
+
+#---------------------------------------------------------
+# A parsed config
+#---------------------------------------------------------
+class Config:
+    def __init__( self, text, fileName = '' ):
+        parser        = Parser( text, fileName )
+        self.text     = text
+        self.fileName = fileName
+        self.settings = parser.Parse()
+        self.spans    = parser.spans
+
+    #-----------------------------------------------------------
+    def Get( self, path, default = None ):
+        value = self.settings
+        for name in path.split( '.' ) :
+            if name.startswith( '[' ) and isinstance( value, list ) :
+                index = int( name[ 1 : -1 ] )
+                if index >= len( value ) :
+                    return default
+                value = value[ index ]
+            elif isinstance( value, dict ) and name in value :
+                value = value[ name ]
+            else :
+                return default
+        return value
+
+    #-----------------------------------------------------------
+    def Validate( self ):
+        # Return [ problems ] against SCHEMA, [] if the config is good
+        problems = []
+        for path, valueType, check, description in SCHEMA :
+            value = self.Get( path )
+            if value is None :
+                problems.append( path + ' is missing' )
+            elif type( value ) is not valueType :
+                problems.append( path + ' = ' + Format( value ) + \
+                                 ' is not ' + valueType.__name__ )
+            elif not check( value ) :
+                problems.append( path + ' = ' + Format( value ) + \
+                                 ' is not ' + description )
+        return problems
+
+    #-----------------------------------------------------------
+    def Render( self, overrides ):
+        # The text with the values of { path : value } overrides
+        text = self.text
+        for path in sorted( overrides, key = lambda p : -self.Span( p )[0] ) :
+            start, end = self.Span( path )
+            text = text[ : start ] + Format( overrides[ path ] ) + text[ end : ]
+        return text
+
+    #-----------------------------------------------------------
+    def Span( self, path ):
+        if path not in self.spans :
+            raise( Exception( self.fileName + ': no scalar setting ' + path ) )
+        return self.spans[ path ]
+
+#---------------------------------------------------------------
+def Format( value ) :
+    # libconfig text of a Python value
+    if isinstance( value, bool ) :
+        return 'true' if value else 'false'
+    if isinstance( value, str ) :
+        return '"' + value.replace( '\\', '\\\\' ).replace( '"', '\\"' ) + '"'
+    if isinstance( value, float ) :
+        text = repr( value )
+        return text if ( '.' in text or 'e' in text ) else text + '.0'
+    return str( value )
+
+#---------------------------------------------------------------
+def Parse( data, fileName = '' ) :
+    # Config of the bytes of a file, from PARSED if seen before. The
+    # fileName is in the key, a Config reports its errors by it.
+    key = ( fileName, hashlib.md5( data ).hexdigest() )
+    if key not in PARSED :
+        PARSED[ key ] = Config( data.decode( 'utf-8' ), fileName )
+    return PARSED[ key ]
+
+#---------------------------------------------------------------
+def ParseFile( fileName ) :
+    fi = open( fileName, 'rb' )
+    data = fi.read()
+    fi.close()
+    return Parse( data, fileName )
+
+#---------------------------------------------------------------
+def Diff( a, b ) :
+    # [ ( path, value in a, value in b ) ] of the scalar settings
+    # that differ between the Configs a and b, None where missing
+    diff = []
+    for path in sorted( set( a.spans ) | set( b.spans ) ) :
+        valueA = a.Get( path )
+        valueB = b.Get( path )
+        if type( valueA ) is not type( valueB ) or valueA != valueB :
+            diff.append( ( path, valueA, valueB ) )
+    return diff
+
+#---------------------------------------------------------------
+def ParseOverrides( text, fileName = '' ) :
+    # { name : { path : value } } of an overrides file
+    overrides = {}
+    for number, line in enumerate( text.split( '\n' ) ) :
+        words = line.split( None, 1 )
+        if not words or words[0].startswith( '#' ) :
+            continue
+        where    = fileName + ':' + str( number + 1 ) + ': ' + words[0]
+        rest     = words[1] if len( words ) > 1 else ''
+        settings = {}
+        pos      = 0
+        while rest[ pos : ].strip() :
+            match = SETTING.match( rest, pos )
+            if not match :
+                raise( Exception( where + ': expected path = value at ' + \
+                                  repr( rest[ pos : ].strip() ) ) )
+            try :
+                parser = Parser( rest[ match.end() : ] )
+                settings[ match.group( 1 ) ] = parser.Value( match.group( 1 ) )
+                if parser.Peek()[1] in ( ';', ',' ) :
+                    parser.Next()
+            except Exception as e :
+                raise( Exception( where + ' ' + match.group( 1 ) + \
+                                  str( e ).lstrip( ':0123456789' ) ) )
+            pos = match.end() + parser.tokens[ parser.i ][2]
+        overrides[ words[0] ] = settings
+    return overrides
+
+#---------------------------------------------------------------
+def RenderBatch( templateFile, overrides, outPath ) :
+    # Render <outPath>/<name>_UMSX1.4.cfg of each name of overrides.
+    # Return [ ( fileName, problems ) ], a config with problems is
+    # not written.
+    template = ParseFile( templateFile )
+    results  = []
+    for name in sorted( overrides.keys() ) :
+        fileName = os.path.join( outPath, name + CONFIG_SUFFIX )
+        try :
+            text     = template.Render( overrides[ name ] )
+            problems = Parse( text.encode( 'utf-8' ), fileName ).Validate()
+        except Exception as e :
+            problems = [ str( e ) ]
+
+        if not problems :
+            fo = open( fileName + '.tmp', 'w' )
+            fo.write( text )
+            fo.close()
+            os.replace( fileName + '.tmp', fileName )
+        results.append( ( fileName, problems ) )
+    return results
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    if args.template :
+        fi = open( args.overrides )
+        overrides = ParseOverrides( fi.read(), args.overrides )
+        fi.close()
+        os.makedirs( args.outPath, exist_ok = True )
+        results = RenderBatch( args.template, overrides, args.outPath )
+    else :
+        results = []
+        for fileName in args.configFiles :
+            try :
+                config = ParseFile( fileName )
+            except Exception as e :
+                results.append( ( fileName, [ str( e ) ] ) )
+                continue
+            if args.get :
+                print( fileName + ' ' + Format( config.Get( args.get ) ) )
+            results.append( ( fileName, config.Validate() ) )
+
+    for fileName, problems in results :
+        if problems :
+            print( fileName + ' Failed:' )
+            for problem in problems :
+                print( '    ' + problem )
+        elif DEBUG or args.template :
+            print( fileName + ' OK' )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser(
+        description = 'UMSX libconfig validator and renderer' )
+
+    parser.add_argument('configFiles', nargs = '*',
+                        help = 'Config files to validate.')
+
+    parser.add_argument('-g', '--get',
+                        dest   = 'get', type = str,
+                        action = 'store', default = '',
+                        help = 'Print the value of a setting path.')
+
+    parser.add_argument('-t', '--template',
+                        dest   = 'template', type = str,
+                        action = 'store', default = '',
+                        help = 'Base config to render from.')
+
+    parser.add_argument('-r', '--overrides',
+                        dest   = 'overrides', type = str,
+                        action = 'store', default = 'overrides.txt',
+                        help = 'Overrides of each rendered config.')
+
+    parser.add_argument('-o', '--outPath',
+                        dest   = 'outPath', type = str,
+                        action = 'store', default = './',
+                        help = 'Directory of the rendered configs (./).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#----------------------------------------------------------------------------
+# Name:     LiveView.py
+# Purpose:  Live strip chart of the data streaming from NCPA sensors
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+import collections
+import os
+import time
+
+from tkinter import *
+
+import MonitorCommands
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+REFRESH_MS     = 100    # Strip chart update interval
+MAX_READ_BYTES = 65536  # Per stream per update, so the GUI is not starved
+IDLE_TIMEOUT   = 5.     # Restart a stream after this many seconds w/o data
+CHART_WIDTH    = 800
+CHART_HEIGHT   = 120
+
+#---------------------------------------------------------
+# A persistent ssh channel streaming the active UMX file of
+# one sensor into a bounded ring buffer of recent samples
+#---------------------------------------------------------
+class LiveStream:
+    def __init__( self, sensor, seconds ):
+        self.sensor       = sensor
+        self.seconds      = seconds
+        self.popen        = None
+        self.decoder      = None
+        self.fileName     = ''
+        self.nameBuffer   = b''
+        self.samples      = collections.deque( maxlen = seconds * 125 )
+        self.lastUTC      = None
+        self.lastDataTime = 0.
+        self.restartTime  = None
+        self.statusMsg    = ''
+        self.newBlocks    = []   # ( utcTime, samplingRate, samples )
+
+    #-----------------------------------------------------------
+    def Start( self ):
+        self.decoder      = UMXFile.StreamDecoder()
+        self.fileName     = ''
+        self.nameBuffer   = b''
+        self.lastDataTime = time.monotonic()
+        self.restartTime  = None
+        self.popen        = MonitorCommands.LiveStreamCmd( self.sensor )
+
+        # Read without blocking the Tk mainloop
+        os.set_blocking( self.popen.stdout.fileno(), False )
+
+    #-----------------------------------------------------------
+    def Stop( self ):
+        if self.popen :
+            self.popen.kill()
+            self.popen.communicate()
+            del( self.popen )
+            self.popen = None
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        # Read whatever is available on the stream and decode it.
+        # Called from LiveView.Update() every REFRESH_MS.
+        if not self.popen :
+            # Waiting to reconnect after the channel closed
+            if self.restartTime and time.monotonic() >= self.restartTime :
+                self.Start()
+            return
+
+        try :
+            data = os.read( self.popen.stdout.fileno(), MAX_READ_BYTES )
+        except BlockingIOError :
+            data = None
+
+        if data :
+            self.lastDataTime = time.monotonic()
+            self.Decode( data )
+
+        elif data == b'' :
+            # The ssh exited, try again after IDLE_TIMEOUT
+            self.popen.poll()
+            if self.popen.returncode :
+                self.statusMsg = MonitorCommands.GetLocalUTC() + ' ' + \
+                                 self.sensor.name + ': Live stream Failed.'
+            self.Stop()
+            self.restartTime = time.monotonic() + IDLE_TIMEOUT
+
+        elif time.monotonic() - self.lastDataTime > IDLE_TIMEOUT :
+            # tail -f is following a file that UMXcontrol has
+            # closed: restart on the newest file
+            if DEBUG :
+                print( 'LiveStream.Poll() restarting ' + self.sensor.name )
+            self.Stop()
+            self.Start()
+
+    #-----------------------------------------------------------
+    def Decode( self, data ):
+        if not self.fileName :
+            # The stream starts with the file name on one line
+            self.nameBuffer = self.nameBuffer + data
+            if b'\n' not in self.nameBuffer :
+                return
+            name, data = self.nameBuffer.split( b'\n', 1 )
+            self.fileName = name.decode( 'utf-8' ).strip()
+            self.nameBuffer = b''
+
+        try :
+            blocks = self.decoder.Feed( data )
+        except Exception as e :
+            self.statusMsg = MonitorCommands.GetLocalUTC() + ' ' + \
+                             self.sensor.name + ': ' + str( e )
+            self.Stop()
+            return
+
+        # Until the whole file header has arrived there are no blocks
+        if self.decoder.fileHeader is None :
+            return
+
+        # Size the ring buffer to the sampling rate of the file
+        maxlen = self.seconds * self.decoder.fileHeader.samplingRate
+        if self.samples.maxlen != maxlen :
+            self.samples = collections.deque( self.samples, maxlen = maxlen )
+
+        for blockHeader, samples in blocks :
+            # A restart on the same file replays it from the start,
+            # the blocks already shown are not new
+            if self.lastUTC is not None and \
+               blockHeader.utcTime <= self.lastUTC :
+                continue
+            self.samples.extend( samples )
+            self.lastUTC = blockHeader.utcTime
+            self.newBlocks.append( ( blockHeader.utcTime,
+                                     self.decoder.fileHeader.samplingRate,
+                                     samples ) )
+
+        self.statusMsg = ''
+
+#---------------------------------------------------------
+# Toplevel window with one scrolling strip chart per sensor
+#---------------------------------------------------------
+class LiveView:
+    def __init__( self, monitor ):
+        self.monitor  = monitor
+        self.seconds  = monitor.args.liveWindow
+        self.streams  = {}   # LiveStream by sensor key
+        self.charts   = {}   # ( Canvas, line, text ) by sensor key
+        self.window   = Toplevel( monitor.Tk_root )
+        self.window.title( 'NCPA: Live Data' )
+        self.window.protocol( 'WM_DELETE_WINDOW', self.Close )
+        self.window.columnconfigure( 0, weight = 1 )
+
+        self.afterID = self.window.after( REFRESH_MS, self.Update )
+
+    #-----------------------------------------------------------
+    def AddSensor( self, key, sensor ):
+        if key in self.streams :
+            return
+
+        canvas = Canvas( self.window, width = CHART_WIDTH,
+                         height = CHART_HEIGHT, background = 'white' )
+        canvas.grid( column = 0, row = len( self.charts ),
+                     sticky = (N,S,W,E), padx = 3, pady = 3 )
+        self.window.rowconfigure( len( self.charts ), weight = 1 )
+
+        line = canvas.create_line( 0, 0, 0, 0, fill = 'blue' )
+        text = canvas.create_text( 5, 5, anchor = NW, text = sensor.name )
+
+        stream = LiveStream( sensor, self.seconds )
+        stream.Start()
+
+        self.streams[ key ] = stream
+        self.charts [ key ] = ( canvas, line, text )
+
+    #-----------------------------------------------------------
+    def Update( self ):
+        for key in self.streams :
+            self.streams[ key ].Poll()
+            self.Draw( key )
+
+        self.Detect()
+
+        # Re-register this function for another callback
+        self.afterID = self.window.after( REFRESH_MS, self.Update )
+
+    #-----------------------------------------------------------
+    def Detect( self ):
+        # Feed the new blocks to the STA/LTA detector, one block of
+        # each stream per batch
+        blocks = {}
+        for key in self.streams :
+            stream = self.streams[ key ]
+            if stream.newBlocks :
+                blocks[ stream.sensor.name ] = stream.newBlocks
+                stream.newBlocks = []
+
+        while blocks :
+            batch = []
+            for name in list( blocks.keys() ) :
+                utcTime, samplingRate, samples = blocks[ name ].pop( 0 )
+                batch.append( ( name, utcTime, samplingRate, samples ) )
+                if not blocks[ name ] :
+                    del( blocks[ name ] )
+            self.monitor.eventJob.FeedLive( batch )
+
+    #-----------------------------------------------------------
+    def Draw( self, key ):
+        stream = self.streams[ key ]
+        canvas, line, text = self.charts[ key ]
+
+        label = stream.sensor.name + ' ' + stream.fileName
+        if stream.lastUTC :
+            label = label + '  ' + \
+                time.strftime( '%H:%M:%S', time.gmtime( stream.lastUTC ) )
+        if stream.statusMsg :
+            label = label + '  ' + stream.statusMsg
+
+        if len( stream.samples ) < 2 :
+            canvas.itemconfigure( text, text = label )
+            return
+
+        width  = max( canvas.winfo_width(),  2 )
+        height = max( canvas.winfo_height(), 2 )
+
+        # Reduce the buffer to a min & max per pixel column, the
+        # newest sample is at the right edge of the chart
+        samples  = list( stream.samples )
+        maxlen   = stream.samples.maxlen
+        perPixel = max( maxlen // width, 1 )
+        x0       = width - len( samples ) * width / maxlen
+
+        columns = []
+        for i in range( 0, len( samples ), perPixel ) :
+            chunk = samples[ i : i + perPixel ]
+            columns.append( ( i, min( chunk ), max( chunk ) ) )
+
+        yMin = min( c[1] for c in columns )
+        yMax = max( c[2] for c in columns )
+        yScale = ( height - 20 ) / max( yMax - yMin, 1 )
+
+        coords = []
+        for i, lo, hi in columns :
+            x = x0 + i * width / maxlen
+            coords.extend( ( x, height - 5 - ( lo - yMin ) * yScale,
+                             x, height - 5 - ( hi - yMin ) * yScale ) )
+
+        canvas.coords( line, *coords )
+        canvas.itemconfigure( text, text = label + '  [' + str( yMin ) + \
+                              ', ' + str( yMax ) + ']' )
+
+    #-----------------------------------------------------------
+    def Close( self ):
+        self.window.after_cancel( self.afterID )
+
+        for key in self.streams :
+            self.streams[ key ].Stop()
+
+        self.window.destroy()
+        self.monitor.liveView = None
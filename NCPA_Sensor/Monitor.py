@@ -9,44 +9,65 @@
 # Created:  
 #----------------------------------------------------------------------------
 
-#------------------------------------------------------------------
-# todo:
-# Opening a new file dialog clears the listbox sensor highlighting
-#------------------------------------------------------------------
-
 #------------------------------------------------------------------
 # Installation:
 # sudo apt-get install python3.2
 # sudo apt-get install python3-tk
+# sudo apt-get install python3-numpy
 # Edit Sensors.txt to specify sensors & .cfg files
 # ./Monitor.py
+# ./MonitorDaemon.py -f Sensors.txt   (no display, see MonitorDaemon.py)
 #------------------------------------------------------------------
 
 import os
 import argparse
 import subprocess
-import tempfile
+import time
 
 from tkinter import *
 # Override tkinter (Tk) widgets with the tk-themed ones (Ttk) in ttk
 from tkinter import ttk # 'tk themed widgets'
 from tkinter import messagebox
 from tkinter import filedialog
+from tkinter import simpledialog
 
 import NCPASensor_py3 as NCPASensor # NCPASensor & SensorCollection
 import MonitorCommands
+import Archiver
+import ArrayProcessing
+import ConfigDeploy
+import ConfigDrift
+import Delta
+import EventDetect
+import Extract
+import FleetOps
+import HeaderScan
+import LibConfig
+import LiveView
+import MonitorCore
+import MonitorDaemon
+import NoiseAnalysis
+import Pyramid
+import QualityMetrics
+import SensorFile
+import SoftwareDeploy
+import Transfer
+import UMXExport
+import UMXFile
+import UMXVerify
+import ZoomView
 
 DEBUG = False # Set True by the -v (verbose) option
 
-#---------------------------------------------------------------
-# Python equivalent of a C++ enumeration using a class
-class MonitorStatus:
-    OK, WARN, ERROR = range( 3 )
+HEADER_DAYS = 7       # Days of files of the first header sweep
+
+MonitorStatus = MonitorCore.MonitorStatus
 
 #---------------------------------------------------------------
-# Class to monitor the overall sensor collection status
+# Class to monitor the overall sensor collection status, shown
+# as the status graphic
 #---------------------------------------------------------------
-class Status:
+class Status( MonitorCore.Status ):
     def __init__( self, monitor ):
         OKFile   = monitor.args.monitorPath + '/statusOK.gif'
         WarnFile = monitor.args.monitorPath + '/statusWarn.gif'
@@ -61,41 +82,14 @@ class Status:
                     '\nUse the -m option to specify the path.'
            raise( Exception( errMsg ) )
 
-        self.Tk_root      = monitor.Tk_root
-        self.state        = MonitorStatus.OK
+        MonitorCore.Status.__init__( self, monitor )
         self.Label        = None # assigned in main()
         self.OKGraphic    = PhotoImage( file = OKFile   )
         self.WarnGraphic  = PhotoImage( file = WarnFile )
         self.ErrorGraphic = PhotoImage( file = ErrFile  )
-        self.pingStatus   = MonitorStatus.OK
-        self.timeStatus   = MonitorStatus.OK
-        self.dataStatus   = MonitorStatus.OK
-        self.logStatus    = MonitorStatus.OK
-        self.umxStatus    = MonitorStatus.OK
 
     #----------------------------------------------------------------
-    def Update( self ) :
-        # Check all the monitor update states
-        # JP Containerize these ?
-        if self.pingStatus == MonitorStatus.OK and \
-           self.timeStatus == MonitorStatus.OK and \
-           self.dataStatus == MonitorStatus.OK and \
-           self.logStatus  == MonitorStatus.OK and \
-           self.umxStatus  == MonitorStatus.OK :
-
-            self.state = MonitorStatus.OK
-
-        elif self.pingStatus == MonitorStatus.ERROR or \
-             self.timeStatus == MonitorStatus.ERROR or \
-             self.dataStatus == MonitorStatus.ERROR or \
-             self.logStatus  == MonitorStatus.ERROR or \
-             self.umxStatus  == MonitorStatus.ERROR :
-
-            self.state = MonitorStatus.ERROR
-
-        else:
-            self.state = MonitorStatus.WARN
-
+    def Show( self ) :
         # Set the overall status based on the monitor states
         if self.state == MonitorStatus.OK :
             self.Label.config( image = self.OKGraphic )
@@ -109,131 +103,36 @@ class Status:
 
         self.Label.update_idletasks()
 
-        # Re-register this function for another callback
-        self.Tk_root.after( 1000, self.Update )
-
 #---------------------------------------------------------------
-# The application container (GUI & executive functions)
+# The application container (GUI & executive functions), the
+# sensor polling is MonitorCore
 #---------------------------------------------------------------
-class NCPA_Monitor:
+class NCPA_Monitor( MonitorCore.MonitorCore ):
 
     # Note that a tkinter Tk() StringVar() can not be created
     # until after the root widget is created: root = Tk()
     # StringVar() has get() and set() methods for Label updates. 
     def __init__( self, root, args ):
+        MonitorCore.MonitorCore.__init__( self, root, args,
+                                          StringVar, BooleanVar )
         self.Version          = 'NCPA Sensor Monitor\nVer. 0.1\n'
-        self.Tk_root          = root
-        self.args             = args
-        self.sensorFile       = args.sensorFile    # reassigned in OpenFile()
         self.configFilePath   = '~/'               # reassigned in OpenFile()
-        self.msgLogFile       = StringVar( value = 'Log Info'  )
-        self.msgDataFile      = StringVar( value = 'Data Info' )
-        self.msgPing          = StringVar( value = 'Ping Info' )
-        self.msgTime          = StringVar( value = 'Time Info' )
-        self.msgUMX           = StringVar( value = 'UMX Info'  )
-        self.msgCommand       = StringVar( value = 'Commands'  )
-        self.timeMessages     = ''
-        self.pingMessages     = ''
-        self.dataMessages     = ''
-        self.logMessages      = ''
-        self.umxMessages      = ''
-        self.rebootMessages   = ''
-        self.haltMessages     = ''
-        self.sendConfigMessages = ''
-        self.startUMXMessages = ''
-        self.killUMXMessages  = ''
-        self.plotMessages     = ''
-        self.pollOnOff        = BooleanVar( value = False )
         self.pollSelectWindow = None
-        self.pingPoll         = BooleanVar( value = True )
-        self.timePoll         = BooleanVar( value = True )
-        self.dataPoll         = BooleanVar( value = True )
-        self.logPoll          = BooleanVar( value = True )
-        self.umxPoll          = BooleanVar( value = True )
-        self.pingAfterID      = None  # assigned in PollChanged()
-        self.timeAfterID      = None
-        self.dataFileAfterID  = None
-        self.logFileAfterID   = None
-        self.umxAfterID       = None
         self.listBox          = None  # assigned in main()
-        self.SensorCollection = None  # assigned in main() or OpenFile() 
-        self.selectedSensors  = None  # assigned in ProcessListbox()
-        self.Status           = None  # assigned in main()
-
-        # Create a temporary directory for plot files
-        self.TemporaryDirectory = tempfile.TemporaryDirectory()
-        self.tempDir            = self.TemporaryDirectory.name + '/'
-        if DEBUG:
-            print( 'Created temporary directory: ' + self.tempDir )
-
-    #----------------------------------------------------------------
-    # Called when the root window Poll On/Off checkbox is clicked
-    def PollChanged( self ) :
-        if DEBUG:
-            print( 'PollChanged value: ', self.pollOnOff.get() )
-            print( 'timePoll', self.timePoll.get(),
-                   'timeRefresh', self.args.timeRefresh )
-            print( 'pingPoll', self.pingPoll.get(), 
-                   'pingRefresh ', self.args.pingRefresh )
-            print( 'dataPoll', self.dataPoll.get(),
-                   'dataRefresh', self.args.dataRefresh )
-            print( 'logPoll',  self.logPoll.get(),
-                   'logRefresh', self.args.dataRefresh )
-            print( 'umxPoll', self.umxPoll.get(),
-                   'umxRefresh', self.args.umxRefresh )
-
-        if self.pollOnOff.get() :
-            # Activate the callbacks if the poll interval is positive
-            # Note that each of these functions automatically
-            # re-registers itself to run again. 
-            if self.timePoll.get() and self.args.timeRefresh > 0. :
-                self.timeAfterID = self.Tk_root.after( self.args.timeRefresh, 
-                                                       self.TimeMonitor )
-            if self.pingPoll.get() and self.args.pingRefresh > 0. :
-                self.pingAfterID = self.Tk_root.after( self.args.pingRefresh, 
-                                                       self.PingMonitor )
-            if self.dataPoll.get() and self.args.dataRefresh > 0. :
-                self.dataFileAfterID = self.Tk_root.after(self.args.dataRefresh,
-                                                          self.DataFileMonitor)
-            if self.logPoll.get() and self.args.logRefresh > 0. :
-                self.logFileAfterID = self.Tk_root.after( self.args.logRefresh,
-                                                          self.LogFileMonitor )
-            if self.umxPoll.get() and self.args.umxRefresh > 0. :
-                self.umxAfterID = self.Tk_root.after( self.args.umxRefresh, 
-                                                      self.UMXMonitor )
-
-            self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
-                                 ' Sensor Polling Activated.' )
-
-        else:
-            # deactivate the callbacks
-            id = self.timeAfterID
-            self.timeAfterID = None
-            if id:
-                self.Tk_root.after_cancel( id )
-
-            id = self.pingAfterID
-            self.pingAfterID = None
-            if id:
-                self.Tk_root.after_cancel( id )
-
-            id = self.dataFileAfterID
-            self.dataFileAfterID = None
-            if id:
-                self.Tk_root.after_cancel( id )
-
-            id = self.logFileAfterID
-            self.logFileAfterID = None
-            if id:
-                self.Tk_root.after_cancel( id )
-
-            id = self.umxAfterID
-            self.umxAfterID = None
-            if id:
-                self.Tk_root.after_cancel( id )
-
-            self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
-                                 ' Sensor Polling Deactivated.' )
+        self.liveView         = None  # assigned in LiveData()
+        self.archiveJob       = None  # assigned in ArchiveData()
+        self.exportJob        = None  # assigned in ExportData()
+        self.zoomView         = None  # assigned in ZoomData()
+        self.arrayJob         = None  # assigned in ArrayData()
+        self.extractJob       = None  # assigned in ExtractData()
+        self.verifyJob        = None  # ( cache, cached, newest, futures )
+        self.qualityJob       = None  # assigned in QualityData()
+        self.deployJob        = None  # assigned in DeployConfig()
+        self.driftJob         = None  # assigned in ConfigDrift()
+        self.softwareJob      = None  # assigned in DeploySoftware()
+        self.fleetJob         = None  # assigned in FleetOperation()
+        self.pyramidJob       = Pyramid.PyramidJob( self )
+        self.eventJob         = EventDetect.EventJob( self )
 
     #----------------------------------------------------------------
     # Called when the Config - Polling menu is selected
@@ -299,7 +198,551 @@ class NCPA_Monitor:
 
                 if not sensor.plotPopenBusy :
                     sensor.plotStatusMsg = ''
-                    MonitorCommands.PlotCmd( sensor )
+                    sensor.plotPopenBusy = True
+                    sensor.plotPopen     = MonitorCommands.PlotCmd( sensor )
+
+                    # Register a callback to poll the transfer and plot
+                    self.Tk_root.after_idle( sensor.PollPlotCmd )
+
+    #----------------------------------------------------------------
+    def LiveData( self ) :
+        if DEBUG:
+            print( 'LiveData' )
+            print( self.selectedSensors )
+
+        if self.selectedSensors :
+            # One live view window, each selected sensor is added to it
+            if not self.liveView :
+                self.liveView = LiveView.LiveView( self )
+
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+                self.liveView.AddSensor( key, sensor )
+
+            self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+                                 ' Live data: ' + \
+                                 ', '.join( self.selectedSensors ) )
+
+    #----------------------------------------------------------------
+    def PSDData( self ) :
+        if DEBUG:
+            print( 'PSDData' )
+            print( self.selectedSensors )
+
+        if self.selectedSensors :
+            # Fetch, analyse and plot the current data files
+            NoiseAnalysis.PSDJob( self, self.selectedSensors )
+
+    #----------------------------------------------------------------
+    def ArchiveData( self ) :
+        if DEBUG:
+            print( 'ArchiveData' )
+            print( self.selectedSensors )
+
+        if self.archiveJob :
+            messagebox.showinfo( message = 'An archive is in progress.' )
+            return
+
+        if self.selectedSensors :
+            # Mirror /data of the selected sensors into args.archivePath
+            self.archiveJob = Archiver.ArchiveJob( self, self.selectedSensors )
+
+    #----------------------------------------------------------------
+    def ZoomData( self ) :
+        if DEBUG:
+            print( 'ZoomData' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if not self.zoomView :
+            self.zoomView = ZoomView.ZoomView( self )
+        else :
+            self.zoomView.window.lift()
+
+        names = [ self.SensorCollection.SensorDict[ key ].name
+                  for key in self.selectedSensors ]
+        for name in names :
+            self.zoomView.AddSensor( name )
+
+        # Bring the pyramids up to date with the archive, the view
+        # is redrawn as the builds finish
+        self.pyramidJob.Update( names )
+
+    #----------------------------------------------------------------
+    def ExportData( self ) :
+        if DEBUG:
+            print( 'ExportData' )
+            print( self.selectedSensors )
+
+        if self.exportJob :
+            messagebox.showinfo( message = 'An export is in progress.' )
+            return
+
+        if not self.selectedSensors :
+            return
+
+        fmt = simpledialog.askstring( 'Export',
+                  'Format (' + ', '.join( sorted( UMXExport.FORMATS ) ) + '):',
+                  initialvalue = 'hdf5' )
+        if not fmt :
+            return
+
+        try :
+            UMXExport.CheckFormat( fmt.strip().lower() )
+        except Exception as e :
+            messagebox.showerror( message = str( e ) )
+            return
+
+        # Convert the archive of the selected sensors into args.exportPath
+        self.exportJob = UMXExport.ExportJob( self, self.selectedSensors,
+                                              fmt.strip().lower() )
+
+    #----------------------------------------------------------------
+    def SummaryData( self ) :
+        if DEBUG:
+            print( 'SummaryData' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        minutes = simpledialog.askfloat( 'Data Summary', 'Last minutes:',
+                                         initialvalue = 60, minvalue = 1 )
+        if minutes is None :
+            return
+
+        interval = simpledialog.askinteger( 'Data Summary',
+                                            'Seconds per record:',
+                                            initialvalue = 1, minvalue = 1 )
+        if interval is None :
+            return
+
+        # Clear the plot msgs
+        self.plotMessages = ''
+        stopTime  = time.time()
+        startTime = stopTime - minutes * 60.
+
+        # Schedule SummaryCmd for each sensor and store the Popen object
+        for key in self.selectedSensors :
+            sensor = self.SensorCollection.SensorDict[ key ]
+
+            if not sensor.summaryPopenBusy :
+                sensor.summaryStatusMsg = ''
+                sensor.summaryPopenBusy = True
+                sensor.summaryPopen = MonitorCommands.SummaryCmd( 
+                    sensor, startTime, stopTime, interval )
+
+                # Register a callback to poll and plot the summary
+                self.Tk_root.after_idle( sensor.PollSummaryCmd )
+
+    #----------------------------------------------------------------
+    def ExtractData( self ) :
+        if DEBUG:
+            print( 'ExtractData' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.extractJob and not self.extractJob.Done() :
+            messagebox.showinfo( message = 'An extraction is in progress.' )
+            return
+
+        start = simpledialog.askstring( 'Extract Data', 'Start UTC:',
+            initialvalue = time.strftime( '%Y-%m-%dT%H:%M:%S',
+                                          time.gmtime( time.time() - 600 ) ) )
+        if start is None :
+            return
+        seconds = simpledialog.askfloat( 'Extract Data', 'Seconds:',
+                                         initialvalue = 300, minvalue = 1 )
+        if seconds is None :
+            return
+
+        try :
+            startTime = UMXFile.ParseUTC( start )
+        except Exception as e :
+            messagebox.showerror( message = str( e ) )
+            return
+
+        self.extractJob = Extract.ExtractJob( self, self.selectedSensors,
+                                              startTime, startTime + seconds )
+
+    #----------------------------------------------------------------
+    def VerifyData( self ) :
+        # Integrity checks of the data files of the selected sensors,
+        # on the sensors or in the local archive on the process pool
+        if DEBUG:
+            print( 'VerifyData' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.verifyJob or any( self.SensorCollection.SensorDict[ key ].\
+                                  verifyPopenBusy
+                                  for key in self.selectedSensors ) :
+            messagebox.showinfo( message = 'A verification is in progress.' )
+            return
+
+        remote = messagebox.askyesnocancel( 'Verify',
+            'Verify the files on the sensors?\n(No: the local archive)' )
+        if remote is None :
+            return
+
+        names = [ self.SensorCollection.SensorDict[ key ].name
+                  for key in self.selectedSensors ]
+        if remote :
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+                sensor.verifyStatusMsg = ''
+                sensor.verifyPopenBusy = True
+                sensor.verifyPopen = MonitorCommands.VerifyCmd( sensor )
+                self.Tk_root.after_idle( sensor.PollVerifyCmd )
+            self.Tk_root.after( 200, lambda: self.PollVerifyData( names ) )
+            return
+
+        # Only the new and changed files of the archive are read
+        fileNames = []
+        for name in names :
+            for root, dirs, files in os.walk(
+                    os.path.join( self.args.archivePath, name ) ) :
+                fileNames.extend( os.path.join( root, f ) for f in files
+                                  if f.endswith( UMXFile.FILE_SUFFIX ) )
+        cache = UMXVerify.LoadCache( os.path.join( self.args.archivePath,
+                                                   'umxverify.json' ) )
+        cached, toCheck, newest = UMXVerify.PlanVerify( sorted( fileNames ),
+                                                        cache,
+                                                        UMXFile.FILE_LENGTH )
+        futures = UMXVerify.SubmitVerify( self.GetProcessPool(), toCheck,
+                                          UMXFile.FILE_LENGTH, newest )
+        self.verifyJob = ( cache, cached, newest, futures )
+        self.msgCommand.set( MonitorCommands.GetLocalUTC() + ' Verify ' + \
+            str( len( toCheck ) ) + ' archive files, ' + \
+            str( len( cached ) ) + ' cached.\n' )
+        self.Tk_root.after( 200, self.PollVerifyArchive )
+
+    #----------------------------------------------------------------
+    def PollVerifyData( self, names ) :
+        sensors = [ sensor for sensor in
+                    self.SensorCollection.SensorDict.values()
+                    if sensor.name in names ]
+        if any( sensor.verifyPopenBusy for sensor in sensors ) :
+            # register this function for a callback after 200 ms
+            self.Tk_root.after( 200, lambda: self.PollVerifyData( names ) )
+            return
+
+        lines = [ MonitorCommands.GetLocalUTC() + \
+                  ' Verification of the files on the sensors:' ]
+        for sensor in sorted( sensors, key = lambda s : s.name ) :
+            if not sensor.verifyResults :
+                lines.append( sensor.name + ' ' + \
+                              sensor.verifyStatusMsg.strip() )
+                continue
+            bad, checked = sensor.verifyResults
+            lines.append( sensor.name + ' ' + str( checked ) + \
+                          ' files, ' + str( len( bad ) ) + ' bad' )
+            for fileName, problems in bad :
+                lines.append( '    ' + fileName + ' ' + '; '.join( problems ) )
+        self.ShowReport( 'NCPA: Verify', lines )
+
+    #----------------------------------------------------------------
+    def PollVerifyArchive( self ) :
+        cache, cached, newest, futures = self.verifyJob
+        if not all( future.done() for future in futures ) :
+            # register this function for a callback after 200 ms
+            self.Tk_root.after( 200, self.PollVerifyArchive )
+            return
+        self.verifyJob = None
+
+        results = []
+        lines   = [ MonitorCommands.GetLocalUTC() + \
+                    ' Verification of ' + self.args.archivePath + ':' ]
+        try :
+            for future in futures :
+                results.extend( future.result() )
+        except Exception as e :
+            lines.append( 'Verify Failed: ' + str( e ) )
+        UMXVerify.UpdateCache( cache, results, newest )
+        UMXVerify.SaveCache( os.path.join( self.args.archivePath,
+                                           'umxverify.json' ), cache )
+
+        lines.extend( UMXVerify.FormatResults( cached + results ) )
+        self.ShowReport( 'NCPA: Verify', lines )
+
+    #----------------------------------------------------------------
+    def QualityData( self ) :
+        # Fleet QC of the archive, metrics of the new files first
+        if DEBUG:
+            print( 'QualityData' )
+
+        if self.qualityJob and not self.qualityJob.Done() :
+            messagebox.showinfo( message = 'A quality scan is in progress.' )
+            return
+
+        days = simpledialog.askfloat( 'Data Quality', 'Days:',
+                                      initialvalue = 7, minvalue = 0 )
+        if days is None :
+            return
+
+        os.makedirs( self.args.archivePath, exist_ok = True )
+        self.qualityJob = QualityMetrics.QualityJob( self, days )
+        self.msgCommand.set( MonitorCommands.GetLocalUTC() + ' Quality of ' + \
+            str( len( self.qualityJob.fileNames ) ) + ' new archive files.\n' )
+
+    #----------------------------------------------------------------
+    def HeaderData( self ) :
+        # Sweep the block headers of the new data files of the whole
+        # fleet in parallel, then report the battery trends
+        if DEBUG:
+            print( 'HeaderData' )
+
+        if not self.SensorCollection :
+            return
+
+        self.dataMessages = ''
+        for key in self.SensorCollection.SensorDict :
+            sensor = self.SensorCollection.SensorDict[ key ]
+
+            if not sensor.headerPopenBusy :
+                if sensor.headerRecords :
+                    startTime = sensor.headerRecords[-1][0]
+                else :
+                    startTime = time.time() - HEADER_DAYS * 86400.
+                sensor.headerStatusMsg = ''
+                sensor.headerPopenBusy = True
+                sensor.headerPopen = MonitorCommands.HeaderScanCmd(
+                    sensor, startTime )
+                self.Tk_root.after_idle( sensor.PollHeaderCmd )
+
+        self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+            ' Header scan of ' + \
+            str( len( self.SensorCollection.SensorDict ) ) + ' sensors.\n' )
+        self.Tk_root.after( 200, self.PollHeaderData )
+
+    #----------------------------------------------------------------
+    def PollHeaderData( self ) :
+        if any( sensor.headerPopenBusy for sensor in
+                self.SensorCollection.SensorDict.values() ) :
+            # register this function for a callback after 200 ms
+            self.Tk_root.after( 200, self.PollHeaderData )
+            return
+        self.HeaderReport()
+
+    #----------------------------------------------------------------
+    def HeaderReport( self ) :
+        # Last sample, battery level and trend of each sensor from
+        # the header sweeps, with a plot of the battery levels
+        now   = time.time()
+        lines = [ MonitorCommands.GetLocalUTC() + \
+                  ' Block headers: last sample (age), battery, trend' ]
+        plots = []
+        for key in sorted( self.SensorCollection.SensorDict.keys() ) :
+            sensor  = self.SensorCollection.SensorDict[ key ]
+            records = sensor.headerRecords
+            if sensor.headerStatusMsg :
+                lines.append( sensor.headerStatusMsg.strip() )
+            if not records :
+                lines.append( sensor.name + ' no data files' )
+                continue
+
+            last  = records[-1]
+            trend = HeaderScan.BatteryTrend( records )
+            lines.append( sensor.name + ' ' + EventDetect.UTC( last[2] + 1. ) + \
+                ' (%.0f s), %.2f V, ' % ( now - last[2] - 1., last[5] ) + \
+                ( '%+.3f V/day' % trend if trend is not None else '-' ) + \
+                ', ' + str( len( records ) ) + ' files' )
+            for fileName, error in sensor.headerErrors :
+                lines.append( '    ' + fileName + ' ' + error )
+
+            dataFile = self.tempDir + sensor.name + '_battery.dat'
+            HeaderScan.WriteTrend( dataFile, records )
+            plots.append( '"' + dataFile + '" using 1:2 with lines title "' + \
+                          sensor.name + '"' )
+        self.ShowReport( 'NCPA: Block Headers', lines )
+
+        if plots :
+            gnuplotFile = self.tempDir + 'battery_gnuplot.plt'
+            fo = open( gnuplotFile, 'w' )
+            fo.write( 'set title "Battery level"\n' )
+            fo.write( 'set xdata time\n' )
+            fo.write( 'set timefmt "%s"\n' )
+            fo.write( 'set format x "%m-%d %H:%M"\n' )
+            fo.write( 'set ylabel "V"\n' )
+            fo.write( 'plot ' + ', '.join( plots ) + '\n' )
+            fo.close()
+            subprocess.Popen( 'gnuplot ' + gnuplotFile + ' -persist',
+                              shell = True, stdout = subprocess.PIPE )
+
+    #----------------------------------------------------------------
+    def EventData( self ) :
+        if DEBUG:
+            print( 'EventData' )
+            print( self.selectedSensors )
+
+        if self.eventJob.future :
+            messagebox.showinfo( message = 'An event scan is in progress.' )
+            return
+
+        if not self.selectedSensors :
+            # Only the triggers of the Live streams
+            self.EventReport( [] )
+            return
+
+        hours = simpledialog.askfloat( 'Event Triggers',
+                                       'Scan the archive of the last hours:',
+                                       initialvalue = 24, minvalue = 0 )
+        if hours is None :
+            return
+
+        names = [ self.SensorCollection.SensorDict[ key ].name
+                  for key in self.selectedSensors ]
+        stopTime = time.time()
+        self.eventJob.ScanArchive( names, stopTime - hours * 3600., stopTime )
+
+    #----------------------------------------------------------------
+    def EventReport( self, errors ) :
+        # STA/LTA triggers of the archive scans and Live streams
+        triggers     = self.eventJob.triggers
+        coincidences = EventDetect.Coincidence( triggers )
+
+        lines = [ MonitorCommands.GetLocalUTC() + ' ' + \
+                  str( len( triggers ) ) + ' triggers, ' + \
+                  str( len( coincidences ) ) + ' coincidences of ' + \
+                  str( EventDetect.MIN_SENSORS ) + ' or more sensors:' ]
+        lines.extend( errors )
+        lines.extend( EventDetect.Report( triggers, coincidences ) )
+        for key, onTime, peak in self.eventJob.detector.Open() :
+            lines.append( key + ' trigger ' + EventDetect.UTC( onTime ) + \
+                          ' - (on), peak STA/LTA %.1f' % peak )
+        self.ShowReport( 'NCPA: Event Triggers', lines )
+
+    #----------------------------------------------------------------
+    def ArrayData( self ) :
+        if DEBUG:
+            print( 'ArrayData' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors or len( self.selectedSensors ) < 3 :
+            messagebox.showinfo( message = 'Select 3 or more sensors.' )
+            return
+
+        if self.arrayJob and not self.arrayJob.Done() :
+            messagebox.showinfo( message = 'Array processing is in progress.' )
+            return
+
+        hours = simpledialog.askfloat( 'Array Processing',
+                                       'Beams of the archive of the last hours:',
+                                       initialvalue = 6, minvalue = 0 )
+        if hours is None :
+            return
+
+        stopTime = time.time()
+        self.arrayJob = ArrayProcessing.ArrayJob( self, self.selectedSensors,
+                                                  stopTime - hours * 3600.,
+                                                  stopTime )
+
+    #----------------------------------------------------------------
+    def ContinuityReport( self ) :
+        days = simpledialog.askfloat( 'Data Continuity', 'Days:',
+                                      initialvalue = 7, minvalue = 0 )
+        if days is None :
+            return
+
+        minGap = simpledialog.askfloat( 'Data Continuity',
+                                        'Minimum gap (s):',
+                                        initialvalue = 10, minvalue = 0 )
+        if minGap is None :
+            return
+
+        stopTime  = time.time()
+        startTime = stopTime - days * 86400.
+        lines = self.continuity.Report( minGap, startTime, stopTime )
+
+        header = MonitorCommands.GetLocalUTC() + ' ' + \
+                 str( len( self.continuity.sensors ) ) + \
+                 ' sensors indexed, gaps > ' + str( minGap ) + \
+                 ' s in the last ' + str( days ) + ' days:'
+        self.ShowReport( 'NCPA: Data Continuity', [ header ] + lines )
+
+    #----------------------------------------------------------------
+    def TransferReport( self ) :
+        # Measured compression and throughput of the file transfers.
+        # Transfer.Stats() would create the state of the sensors
+        # without a transfer, so only the measured ones are read.
+        lines = [ MonitorCommands.GetLocalUTC() + ' Compressed transfers:' ]
+        for key in sorted( self.SensorCollection.SensorDict.keys() ) :
+            sensor = self.SensorCollection.SensorDict[ key ]
+            if sensor.state and 'transferStats' in sensor.state :
+                lines.append( sensor.name + ' ' + \
+                              sensor.transferStats.Report() )
+            else :
+                lines.append( sensor.name + ' no transfers' )
+
+        # The uplinks of the transfers so far
+
+        for name in sorted( Transfer.UPLINKS.keys() ) :
+            lines.append( Transfer.UPLINKS[ name ].Report() )
+        self.ShowReport( 'NCPA: Transfers', lines )
+
+    #----------------------------------------------------------------
+    def PositionReport( self ) :
+        # GPS positions from the data file headers and their history
+        lines = [ MonitorCommands.GetLocalUTC() + ' GPS positions, ' + \
+                  'X/Y/Z relative to ' + \
+                  ( '%.6f, %.6f, %.1f m' % self.arrayReference
+                    if self.arrayReference else 'the array centroid' ) + ':' ]
+        for key in sorted( self.SensorCollection.SensorDict.keys() ) :
+            sensor   = self.SensorCollection.SensorDict[ key ]
+            position = sensor.Position
+            if not position :
+                lines.append( sensor.name + ' no GPS position' )
+                continue
+
+            lines.append( sensor.name + \
+                ' %.6f, %.6f, %.1f m  X %.1f Y %.1f Z %.1f m' % \
+                ( position.latitude, position.longitude, position.altitude,
+                  position.X_relative, position.Y_relative,
+                  position.Z_relative ) )
+
+            # Reading positionHistory would create it and the state dict
+            if not ( sensor.state and 'positionHistory' in sensor.state ) :
+                continue
+            history = sensor.positionHistory
+            for run in history.runs :
+                lines.append( '    ' + EventDetect.UTC( run[0] ) + ' - ' + \
+                    EventDetect.UTC( run[1] ) + \
+                    ' %.6f, %.6f, %.1f m, %d fixes' % tuple( run[ 2 : ] ) )
+            if history.faults :
+                lines.append( '    ' + str( history.faults ) + \
+                    ' GPS faults, last ' + EventDetect.UTC( history.lastFault ) )
+        self.ShowReport( 'NCPA: Positions', lines )
+
+    #----------------------------------------------------------------
+    def DaemonReport( self ) :
+        # The state a MonitorDaemon.py saves in its -S statePath
+        self.ShowReport( 'NCPA: Daemon', MonitorDaemon.ReportLines(
+            UMXVerify.LoadCache( os.path.join( self.args.daemonPath,
+                                               MonitorDaemon.STATE_FILE ) ) ) )
+
+    #----------------------------------------------------------------
+    # Show the lines of a report in a scrolled text window
+    def ShowReport( self, title, lines ):
+        window = Toplevel( self.Tk_root )
+        window.title( title )
+
+        text = Text( window, width = 100, height = 30, wrap = 'none' )
+        scrollBar = ttk.Scrollbar( window, orient = VERTICAL,
+                                   command = text.yview )
+        text.configure( yscrollcommand = scrollBar.set )
+        text.insert( END, '\n'.join( lines ) + '\n' )
+        text.configure( state = DISABLED )
+
+        text.grid     ( column = 0, row = 0, sticky = (N,S,W,E) )
+        scrollBar.grid( column = 1, row = 0, sticky = (N,S) )
+        window.columnconfigure( 0, weight = 1 )
+        window.rowconfigure   ( 0, weight = 1 )
 
     #----------------------------------------------------------------
     def StartUMX( self ) :
@@ -382,6 +825,10 @@ class NCPA_Monitor:
             if not validateSendConfig :
                 return
 
+            # Validate the configs before any is sent
+            if not self.ValidateConfigs( self.selectedSensors ) :
+                return
+
             # Clear the sendConfig msgs
             self.sendConfigMessages = ''
 
@@ -392,13 +839,186 @@ class NCPA_Monitor:
                 if not sensor.sendConfigPopenBusy :
                     sensor.sendConfigStatusMsg = ''
                     sensor.sendConfigPopenBusy = True
-                    sensor.sendConfigPopen = \
-                        MonitorCommands.SendConfigCmd( sensor )
+                    try :
+                        sensor.sendConfigPopen = \
+                            MonitorCommands.SendConfigCmd( sensor )
+                    except OSError as e :
+                        # The local config can not be read
+                        sensor.sendConfigStatusMsg = \
+                            MonitorCommands.GetLocalUTC() + ' ' + \
+                            sensor.name + ': SendConfig Failed: ' + \
+                            str( e ) + '\n'
+                        sensor.sendConfigPopenBusy = False
+                        self.sendConfigMessages = self.sendConfigMessages + \
+                                                  sensor.sendConfigStatusMsg
+                        self.msgCommand.set( self.sendConfigMessages )
+                        self.Status.sendConfigStatus = \
+                                        MonitorCore.MonitorStatus.ERROR
+                        continue
 
                     # Register a callback to poll and report the resultant
                     # message from HaltCmd into monitor.msgCommand.set()
                     self.Tk_root.after_idle( sensor.PollSendConfigCmd )
 
+    #----------------------------------------------------------------
+    def ValidateConfigs( self, keys ) :
+        # True if the configs of keys are valid or the user wants
+        # to send them anyway
+        problems = []
+        for key in keys :
+            sensor = self.SensorCollection.SensorDict[ key ]
+            configFile = os.path.expanduser( sensor.configInPath +
+                                             sensor.configInFile )
+            try :
+                found = LibConfig.ParseFile( configFile ).Validate()
+            except Exception as e :
+                found = [ str( e ) ]
+            problems.extend( sensor.name + ' ' + sensor.configInFile + \
+                             ': ' + problem for problem in found )
+
+        return not problems or messagebox.askyesno(
+            message = '\n'.join( problems ) + '\n\nSend anyway?',
+            icon = 'warning', title = 'Send Config' )
+
+    #----------------------------------------------------------------
+    def SelectGroup( self ) :
+        # Select the sensors of groups or tags in the listbox
+        if not self.SensorCollection :
+            return
+
+        text = simpledialog.askstring( 'Select Group',
+                                       'Groups or tags (all):' )
+        if not text :
+            return
+
+        keys = FleetOps.Select( self.SensorCollection.SensorDict, text )
+        self.listBox.selection_clear( 0, END )
+        for i, key in enumerate( self.listBox.get( 0, END ) ) :
+            if key in keys :
+                self.listBox.selection_set( i )
+
+        self.selectedSensors = keys or None
+        self.msgCommand.set( MonitorCommands.GetLocalUTC() + ' Selected ' + \
+            str( len( keys ) ) + ' sensors of ' + text + '.\n' )
+
+    #----------------------------------------------------------------
+    def FleetOperation( self, operation ) :
+        # Reboot, Halt, Start UMX or Send Config on the selected
+        # sensors in waves, see FleetOps.py
+        if DEBUG:
+            print( 'FleetOperation ' + operation )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.fleetJob and not self.fleetJob.Done() :
+            messagebox.showinfo( message = 'A fleet operation is in progress.' )
+            return
+
+        if not messagebox.askyesno(
+                message = operation + ' ' + \
+                          ', '.join( self.selectedSensors ) + \
+                          ' in waves of ' + str( self.args.waveSize ) + \
+                          ', stop after ' + str( self.args.maxFailures ) + \
+                          ' failures?',
+                icon = 'question', title = 'Fleet ' + operation ) :
+            return
+
+        if operation == 'Send Config' and \
+           not self.ValidateConfigs( self.selectedSensors ) :
+            return
+
+        self.fleetJob = FleetOps.WaveJob( self, list( self.selectedSensors ),
+                                          operation, self.args.waveSize,
+                                          self.args.maxFailures )
+
+    #----------------------------------------------------------------
+    def DeployConfig( self ) :
+        # Send Config of only the configs that differ on the sensors
+        if DEBUG:
+            print( 'DeployConfig' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.deployJob and not self.deployJob.Done() :
+            messagebox.showinfo( message = 'A deploy is in progress.' )
+            return
+
+        self.deployJob = ConfigDeploy.DeployJob( self, self.selectedSensors )
+
+    #----------------------------------------------------------------
+    def ConfigDrift( self ) :
+        # Compare the configs on the whole fleet with the local configs
+        if DEBUG:
+            print( 'ConfigDrift' )
+
+        if not self.SensorCollection :
+            return
+
+        if self.driftJob and not self.driftJob.Done() :
+            messagebox.showinfo( message = 'A drift scan is in progress.' )
+            return
+
+        os.makedirs( self.args.archivePath, exist_ok = True )
+        self.driftJob = ConfigDrift.DriftJob( self,
+            list( self.SensorCollection.SensorDict.keys() ),
+            os.path.join( self.args.archivePath, ConfigDrift.CACHE_FILE ) )
+
+    #----------------------------------------------------------------
+    def DeploySoftware( self ) :
+        # Delta updates of UMX binaries and scripts on the sensors
+        if DEBUG:
+            print( 'DeploySoftware' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.softwareJob and not self.softwareJob.Done() :
+            messagebox.showinfo( message = 'A deployment is in progress.' )
+            return
+
+        localFiles = filedialog.askopenfilenames(
+            title = 'Software to deploy' )
+        if not localFiles :
+            return
+
+        if not messagebox.askyesno(
+                message = 'Deploy ' + ', '.join(
+                    os.path.basename( f ) for f in localFiles ) + \
+                    ' to ' + ', '.join( self.selectedSensors ) + '?',
+                icon = 'question', title = 'Deploy Software' ) :
+            return
+
+        self.softwareJob = SoftwareDeploy.SoftwareJob( self,
+            self.selectedSensors, localFiles )
+
+    #----------------------------------------------------------------
+    def RollbackSoftware( self ) :
+        # Put back the previous version of deployed files
+        if DEBUG:
+            print( 'RollbackSoftware' )
+            print( self.selectedSensors )
+
+        if not self.selectedSensors :
+            return
+
+        if self.softwareJob and not self.softwareJob.Done() :
+            messagebox.showinfo( message = 'A deployment is in progress.' )
+            return
+
+        names = simpledialog.askstring( 'Rollback Software', 'Files:',
+            initialvalue = ' '.join( self.softwareJob.names )
+                           if self.softwareJob else '' )
+        if not names or not names.split() :
+            return
+
+        self.softwareJob = SoftwareDeploy.SoftwareJob( self,
+            self.selectedSensors, names.split(), rollback = True )
+
     #----------------------------------------------------------------
     def Halt( self ) :
         if DEBUG:
@@ -461,150 +1081,6 @@ class NCPA_Monitor:
                     # message from RebootCmd into monitor.msgCommand.set()
                     self.Tk_root.after_idle( sensor.PollRebootCmd )
 
-    #----------------------------------------------------------------
-    def TimeMonitor( self ):
-        if DEBUG:
-            print( "TimeMonitor()" )
-            print( self.selectedSensors )
-
-        if self.selectedSensors :
-            # Show any messages
-            self.msgTime.set( self.timeMessages )
-            # Clear the time msgs
-            self.timeMessages = ''
-
-            # Schedule TimeCmd for each sensor
-            for key in self.selectedSensors :
-                sensor = self.SensorCollection.SensorDict[ key ]
-
-                if not sensor.timePopenBusy :
-                    sensor.timeStatusMsg = ''
-                    sensor.timePopenBusy = True
-                    sensor.timePopen     = MonitorCommands.TimeCmd( sensor )
-                
-                    # Register a callback to poll and report the resultant
-                    # message from TimeCmd into monitor.msgTime.set( msg )
-                    self.Tk_root.after_idle( sensor.PollTimeCmd )
-
-        # Re-register TimeMonitor for another callback
-        if self.pollOnOff.get() :
-            self.Tk_root.after( self.args.timeRefresh, self.TimeMonitor )
-
-    #----------------------------------------------------------------
-    def PingMonitor( self ):
-        if DEBUG:
-            print( "PingMonitor()" )
-            print( self.selectedSensors )
-
-        if self.selectedSensors :
-            # Show current messages
-            self.msgPing.set( self.pingMessages )
-            # Clear the ping msgs
-            self.pingMessages = ''
-
-            # Schedule PingCmd for each sensor and store the Popen object
-            for key in self.selectedSensors :
-                sensor = self.SensorCollection.SensorDict[ key ]
-
-                if not sensor.pingPopenBusy :
-                    sensor.pingStatusMsg = ''
-                    sensor.pingPopenBusy = True
-                    sensor.pingPopen     = MonitorCommands.PingCmd( sensor )
-                
-                    # Register a callback to poll and report the resultant
-                    # message from PingCmd into monitor.msgPing.set()
-                    self.Tk_root.after_idle( sensor.PollPingCmd )
-
-        # Re-register this function for another callback
-        if self.pollOnOff.get() :
-            self.Tk_root.after( self.args.pingRefresh, self.PingMonitor )
-
-    #----------------------------------------------------------------
-    def DataFileMonitor( self ):
-        if DEBUG:
-            print( "DataFileMonitor()" )
-
-        # Show the data msgs since the last monitor call
-        if self.selectedSensors :
-            self.msgDataFile.set( self.dataMessages )
-            # Clear the data msgs
-            self.dataMessages = ''
-
-            # Schedule DataCmd for each sensor and store the Popen object
-            for key in self.selectedSensors :
-                sensor = self.SensorCollection.SensorDict[ key ]
-
-                if not sensor.dataPopenBusy :
-                    sensor.dataStatusMsg = ''
-                    sensor.dataPopenBusy = True
-                    sensor.dataPopen = \
-                       MonitorCommands.DataFileCmd( sensor )
-                
-                    # Register a callback to poll and report the resultant
-                    # message from DataCmd into monitor.msgData.set()
-                    self.Tk_root.after_idle( sensor.PollDataCmd )
-
-        # Re-register this function for another callback
-        if self.pollOnOff.get() :
-            self.Tk_root.after( self.args.dataRefresh, self.DataFileMonitor )
-
-    #----------------------------------------------------------------
-    def LogFileMonitor( self ):
-        if DEBUG:
-            print( "LogFileMonitor()" )
-
-        # Show the log msgs since the last monitor call
-        if self.selectedSensors :
-            self.msgLogFile.set( self.logMessages )
-            # Clear the log msgs
-            self.logMessages = ''
-
-            # Schedule LogCmd for this sensor and store the Popen object
-            for key in self.selectedSensors :
-                sensor = self.SensorCollection.SensorDict[ key ]
-
-                if not sensor.logPopenBusy :
-                    sensor.logStatusMsg = ''
-                    sensor.logPopenBusy = True
-                    sensor.logPopen = \
-                       MonitorCommands.LogFileCmd( sensor )
-                
-                    # Register a callback to poll and report the resultant
-                    # message from LogCmd into monitor.msgLog.set()
-                    self.Tk_root.after_idle( sensor.PollLogCmd )
-
-        # Re-register this function for another callback
-        if self.pollOnOff.get() :
-            self.Tk_root.after( self.args.logRefresh, self.LogFileMonitor )
-
-    #----------------------------------------------------------------
-    def UMXMonitor( self ):
-        if DEBUG:
-            print( "UMXMonitor()" )
-
-        # Show the umx msgs since the last monitor call
-        if self.selectedSensors :
-            self.msgUMX.set( self.umxMessages )
-            # Clear the umx msgs
-            self.umxMessages = ''
-
-            # Schedule UMXCmd for each sensor and store the Popen object
-            for key in self.selectedSensors :
-                sensor = self.SensorCollection.SensorDict[ key ]
-
-                if not sensor.umxPopenBusy :
-                    sensor.umxStatusMsg = ''
-                    sensor.umxPopenBusy = True
-                    sensor.umxPopen = MonitorCommands.UMXCmd( sensor )
-                
-                    # Register a callback to poll and report the resultant
-                    # message from UMXCmd into monitor.msgUMX.set()
-                    self.Tk_root.after_idle( sensor.PollUMXCmd )
-
-        # Re-register this function for another callback
-        if self.pollOnOff.get() :
-            self.Tk_root.after( self.args.umxRefresh, self.UMXMonitor )
-
     #----------------------------------------------------------------
     # Read the listbox selection and assign to selectedSensors
     #----------------------------------------------------------------
@@ -634,27 +1110,37 @@ class NCPA_Monitor:
             #messagebox.showinfo(message='Sensor file not loaded.')
             return
 
-        self.selectedSensors = None
-        self.sensorFile      = sensorFile
-        self.SensorCollection.NewFile( self.sensorFile )
-
-        # Clear the ListBox
-        self.listBox.delete( 0, END )
-        # Insert the sensor names into the Listbox
-        i = 1
-        for key in self.SensorCollection.SensorDict.keys() :
-            self.listBox.insert( i, key )
-            i = i + 1
-
-        # Colorize alternating lines of the listbox
-        for i in range( 0, len(self.SensorCollection.SensorDict.keys()), 2 ):
-            self.listBox.itemconfigure( i, background = '#f0f0ff' )
+        self.sensorFile = sensorFile
+        self.ReloadSensors()
 
         # Get a suggestion for self.configFilePath from the first sensor
         # Note that dict.values() is a view in Py3, not a sliceable item
         # Convert to a list to use indexing, but on a copy for thread safety
-        sensor = list( self.SensorCollection.SensorDict.copy().values() )[0]
-        self.configFilePath = sensor.configInPath
+        if self.SensorCollection.SensorDict :
+            sensor = list( self.SensorCollection.SensorDict.copy().values() )[0]
+            self.configFilePath = sensor.configInPath
+
+    #----------------------------------------------------------------
+    def ReloadSensors( self ):
+        # MonitorCore.ReloadSensors(), the listbox rows of the
+        # sensors kept stay
+        added, removed, changed = \
+            MonitorCore.MonitorCore.ReloadSensors( self )
+
+        names = list( self.listBox.get( 0, END ) )
+        for key in removed :
+            if key in names :
+                self.listBox.delete( names.index( key ) )
+                names.remove( key )
+        for key in added :
+            self.listBox.insert( END, key )
+
+        # Colorize alternating lines of the listbox
+        for i in range( self.listBox.size() ) :
+            self.listBox.itemconfigure( i,
+                background = '#f0f0ff' if i % 2 == 0 else '' )
+
+        return added, removed, changed
 
     #----------------------------------------------------------------
     def OpenConfigFile( self ):
@@ -697,6 +1183,7 @@ def main():
     # objects and populate a dictionary of NCPASensor objects
     monitor.SensorCollection = \
         NCPASensor.SensorCollection( monitor )
+    root.after( MonitorCore.INVENTORY_REFRESH, monitor.WatchInventory )
   
     # Create the main widget Frame (window)
     mainframe = ttk.Frame( root, padding = "3 3 6 6" )
@@ -708,11 +1195,46 @@ def main():
     menuFile = Menu( menuBar, tearoff = False )
     menuBar.add_cascade( menu = menuFile, label = 'File' )
     menuFile.add_command( label = 'Open', command = monitor.OpenFile )
+    menuFile.add_command( label = 'Daemon', command = monitor.DaemonReport )
     #-----------------------------------------------
     menuConfig = Menu( menuBar, tearoff = False )
     menuBar.add_cascade( menu = menuConfig, label = 'Config' )
     menuConfig.add_command( label = 'Open', command = monitor.OpenConfigFile )
     menuConfig.add_command( label = 'Polling', command = monitor.ChangePolling)
+    menuConfig.add_command( label = 'Deploy',  command = monitor.DeployConfig )
+    menuConfig.add_command( label = 'Drift',   command = monitor.ConfigDrift )
+    menuConfig.add_command( label = 'Software',
+                            command = monitor.DeploySoftware )
+    menuConfig.add_command( label = 'Rollback',
+                            command = monitor.RollbackSoftware )
+    #-----------------------------------------------
+    menuData = Menu( menuBar, tearoff = False )
+    menuBar.add_cascade( menu = menuData, label = 'Data' )
+    menuData.add_command( label = 'Live', command = monitor.LiveData )
+    menuData.add_command( label = 'PSD',  command = monitor.PSDData )
+    menuData.add_command( label = 'Summary', command = monitor.SummaryData )
+    menuData.add_command( label = 'Continuity',
+                          command = monitor.ContinuityReport )
+    menuData.add_command( label = 'Archive', command = monitor.ArchiveData )
+    menuData.add_command( label = 'Export',  command = monitor.ExportData )
+    menuData.add_command( label = 'Zoom',    command = monitor.ZoomData )
+    menuData.add_command( label = 'Events',  command = monitor.EventData )
+    menuData.add_command( label = 'Array',   command = monitor.ArrayData )
+    menuData.add_command( label = 'Extract', command = monitor.ExtractData )
+    menuData.add_command( label = 'Headers', command = monitor.HeaderData )
+    menuData.add_command( label = 'Verify',  command = monitor.VerifyData )
+    menuData.add_command( label = 'Quality', command = monitor.QualityData )
+    menuData.add_command( label = 'Positions',
+                          command = monitor.PositionReport )
+    menuData.add_command( label = 'Transfers',
+                          command = monitor.TransferReport )
+    #-----------------------------------------------
+    menuFleet = Menu( menuBar, tearoff = False )
+    menuBar.add_cascade( menu = menuFleet, label = 'Fleet' )
+    menuFleet.add_command( label = 'Select Group', command = monitor.SelectGroup )
+    for operation in sorted( FleetOps.OPERATIONS.keys() ) :
+        menuFleet.add_command( label = operation, command =
+            lambda operation = operation : monitor.FleetOperation( operation ) )
     #-----------------------------------------------
     menuHelp = Menu( menuBar, tearoff = False )
     menuBar.add_cascade( menu = menuHelp, label = 'Help' )
@@ -879,20 +1401,8 @@ def ParseCmdLine():
 
     parser = argparse.ArgumentParser( description = 'NCPA Sensor Monitor' )
     
-    parser.add_argument('-a', '--subnet',
-                        dest   = 'subnet', type = str, 
-                        action = 'store', default = '192.168.1.',
-                        help = 'IP subnet prefix (192.168.1.).')
-
-    parser.add_argument('-s', '--sensorList',
-                        dest   = 'sensorList', type = str, 
-                        action = 'store', default = '',
-                        help = 'Sensor IP address suffix (51,106,169).')
-
-    parser.add_argument('-f', '--sensorFile',
-                        dest   = 'sensorFile', type = str, 
-                        action = 'store', default = '',
-                        help = 'Sensor parameter file name.')
+    # The sensors and polling, -a -s -f -p -u -l -d -t -R -U -G -v
+    MonitorCore.AddArguments( parser )
 
     homePath = os.environ['HOME']
     parser.add_argument('-m', '--monitorPath',
@@ -904,49 +1414,80 @@ def ParseCmdLine():
                         help = 'Path to Monitor.py ' + \
                                '(~/Sensor/monitorGUI).')
 
-    parser.add_argument('-p', '--pingRefresh',
-                        dest   = 'pingRefresh', type = float, 
-                        action = 'store', default = 3.0,
-                        help = 'Ping monitor refresh interval (3 s).' )
-
-    parser.add_argument('-u', '--umxRefresh',
-                        dest   = 'umxRefresh', type = float,
-                        action = 'store', default = 4.0,
-                        help = 'UMX monitor refresh interval (4 s).' )
+    parser.add_argument('-w', '--liveWindow',
+                        dest   = 'liveWindow', type = int, 
+                        action = 'store', default = 30,
+                        help = 'Live data strip chart length (30 s).' )
 
-    parser.add_argument('-l', '--logRefresh',
-                        dest   = 'logRefresh', type = float, 
-                        action = 'store', default = 5.0,
-                        help = 'Log file monitor refresh interval (5 s).' )
-
-    parser.add_argument('-d', '--dataRefresh',
-                        dest   = 'dataRefresh', type = float, 
-                        action = 'store', default = 6.0,
-                        help = 'Data file monitor refresh interval (6 s).' )
-
-    parser.add_argument('-t', '--timeRefresh',
-                        dest   = 'timeRefresh', type = float, 
-                        action = 'store', default = 5.0,
-                        help = 'Time monitor refresh interval (5 s).' )
+    parser.add_argument('-n', '--noiseModel',
+                        dest   = 'noiseModel', type = str, 
+                        action = 'store', default = '',
+                        help = 'PSD noise model file (Hz, dB re 1 Pa^2/Hz).' )
 
-    parser.add_argument('-v', '--verbose',
-                        dest   = 'verbose', # type = bool, 
-                        action = 'store_true', default = False )
+    parser.add_argument('-A', '--archivePath',
+                        dest   = 'archivePath', type = str, 
+                        action = 'store', 
+                        default = homePath + '/SensorArchive',
+                        help = 'Local data archive (~/SensorArchive).' )
+
+    parser.add_argument('-E', '--exportPath',
+                        dest   = 'exportPath', type = str,
+                        action = 'store',
+                        default = homePath + '/SensorExport',
+                        help = 'Exported data (~/SensorExport).' )
+
+    parser.add_argument('-P', '--pyramidPath',
+                        dest   = 'pyramidPath', type = str,
+                        action = 'store',
+                        default = homePath + '/SensorPyramid',
+                        help = 'Min/max tiles of the archive (~/SensorPyramid).' )
+
+    parser.add_argument('-j', '--archiveJobs',
+                        dest   = 'archiveJobs', type = int, 
+                        action = 'store', default = Archiver.MAX_TRANSFERS,
+                        help = 'Concurrent archive transfers (4).' )
+
+    parser.add_argument('-D', '--daemonPath',
+                        dest   = 'daemonPath', type = str,
+                        action = 'store',
+                        default = homePath + '/SensorMonitor',
+                        help = 'State of MonitorDaemon.py (~/SensorMonitor).' )
+
+    parser.add_argument('-W', '--waveSize',
+                        dest   = 'waveSize', type = int,
+                        action = 'store', default = 5,
+                        help = 'Sensors per wave of the Fleet operations (5).' )
+
+    parser.add_argument('-F', '--maxFailures',
+                        dest   = 'maxFailures', type = int,
+                        action = 'store', default = 1,
+                        help = 'Failures that stop a Fleet operation (1).' )
 
     args = parser.parse_args()
 
-    # convert the refresh args to milliseconds for after() 
-    args.pingRefresh = round( args.pingRefresh * 1000 )
-    args.umxRefresh  = round( args.umxRefresh  * 1000 )
-    args.logRefresh  = round( args.logRefresh  * 1000 )
-    args.dataRefresh = round( args.dataRefresh * 1000 )
-    args.timeRefresh = round( args.timeRefresh * 1000 )
-
-    # Save the users home directory
-    args.homePath = homePath
+    # The refresh intervals in ms, the transfer rates and homePath
+    MonitorCore.SetArguments( args )
 
     # set DEBUG status
     DEBUG = args.verbose
+    LiveView.DEBUG = args.verbose
+    NoiseAnalysis.DEBUG = args.verbose
+    UMXExport.DEBUG = args.verbose
+    Pyramid.DEBUG   = args.verbose
+    ZoomView.DEBUG  = args.verbose
+    EventDetect.DEBUG = args.verbose
+    ArrayProcessing.DEBUG = args.verbose
+    HeaderScan.DEBUG = args.verbose
+    Extract.DEBUG    = args.verbose
+    UMXVerify.DEBUG  = args.verbose
+    QualityMetrics.DEBUG = args.verbose
+    LibConfig.DEBUG  = args.verbose
+    ConfigDeploy.DEBUG = args.verbose
+    ConfigDrift.DEBUG  = args.verbose
+    Delta.DEBUG        = args.verbose
+    SoftwareDeploy.DEBUG = args.verbose
+    SensorFile.DEBUG   = args.verbose
+    FleetOps.DEBUG     = args.verbose
 
     return args
 
@@ -1,22 +1,80 @@
+import os
 import subprocess
 import time
 
+import Transfer
+import UMXFile
+
 DEBUG = False
 
+# The python modules are shipped from here to run on the sensors
+MODULE_PATH = os.path.dirname( os.path.abspath( __file__ ) )
+REMOTE_PATH = '/tmp/umxtools'
+
+# Marks the md5sum line of ArchiveFileCmd among the ssh warnings
+MD5_MARK = 'MD5: '
+
 #---------------------------------------------------------------
 def GetLocalUTC() :
     t = time.strftime( '%b %d %Y %H:%M:%S', ( time.gmtime(time.time()) ) )
     return str( t )
 
+#---------------------------------------------------------------
+def PollOutput( sp ) :
+    # Read the output of sp without blocking the mainloop, so that
+    # a long output can not fill the pipe and stall the command.
+    # Return the communicate() tuple once sp has finished, else None.
+    try :
+        return sp.communicate( timeout = 0.01 )
+    except subprocess.TimeoutExpired :
+        return None
+
 #---------------------------------------------------------------
 def SendConfigCmd( sensor ) :
 
-    cmdLine = 'scp -o "ConnectTimeout 3" ' + \
-              sensor.configInPath + sensor.configInFile + \
-              ' root@' + sensor.IP + ':' + \
-              sensor.configOutPath + sensor.configOutFile
+    # gzip compressed through ssh into configOutFile.tmp, renamed
+    # to configOutFile when complete, see Transfer.py
+    sp = Transfer.Push( sensor, sensor.configInPath + sensor.configInFile,
+                        sensor.configOutPath + sensor.configOutFile )
+    return sp
 
-    sp = subprocess.Popen( cmdLine, shell = True, 
+#---------------------------------------------------------------
+def RemoteHashCmd( sensor, remotePath ):
+
+    # md5sum of remotePath, no output if it does not exist
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " 'md5sum " + remotePath + " 2>/dev/null; true'"
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def CompressedPullCmd( sensor, remoteCmd ):
+
+    # remoteCmd writes the (compressed) file to stdout
+    cmdLine = 'exec ssh -n -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " '" + remoteCmd + "'"
+
+    if DEBUG:
+        print( 'CompressedPullCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def CompressedPushCmd( sensor, remoteCmd ):
+
+    # remoteCmd reads the (compressed) file from stdin
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " '" + remoteCmd + "'"
+
+    if DEBUG:
+        print( 'CompressedPushCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdin  = subprocess.PIPE,
                            stdout = subprocess.PIPE )
     return sp
 
@@ -147,6 +205,140 @@ def DataFileSubCmd( sensor ) :
                            stdout = subprocess.PIPE )
     return sp
 
+#---------------------------------------------------------------
+def GPSHeaderCmd( sensor ) :
+    # Called from PollDataSubCmd() for each new data file
+
+    # Only the file header and the first block header, the GPS fix
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              ' head -c ' + \
+              str( UMXFile.FILE_HEADER.size + UMXFile.BLOCK_HEADER.size ) + \
+              ' /data/' + sensor.firstDataDir + '/' + sensor.firstDataFile
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def DataListCmd( sensor ) :
+
+    # Long listing of all the data files in all the /data dirs
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + \
+              sensor.IP + " 'ls -l /data/*'"
+
+    sp = subprocess.Popen( cmdLine, shell = True, 
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def ArchiveFileCmd( sensor, remotePath, offset ) :
+
+    # remotePath from byte offset on stdout, read by Archiver.py
+    # within the Transfer.py rate limits. The md5sum of the whole
+    # remote file is written to stderr on a line starting MD5_MARK,
+    # ssh writes its warnings there too.
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " 'tail -c +" + str( offset + 1 ) + ' ' + remotePath + \
+              ' && md5sum ' + remotePath + ' | sed "s/^/' + MD5_MARK + \
+              '/" >&2' + "'"
+
+    if DEBUG:
+        print( 'ArchiveFileCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE, stderr = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def RangeCmd( sensor, ranges ) :
+
+    # The file header and length bytes from offset of each
+    # ( remotePath, offset, length, ... ) in ranges, one after
+    # the other on stdout, see Extract.PlanRanges()
+    reads = [ 'head -c ' + str( UMXFile.FILE_HEADER.size ) + ' ' + r[0] + \
+              ' && tail -c +' + str( r[1] + 1 ) + ' ' + r[0] + \
+              ' | head -c ' + str( r[2] ) for r in ranges ]
+    cmdLine = 'ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " '" + ' && '.join( reads ) + "'"
+
+    if DEBUG:
+        print( 'RangeCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def RemotePythonCmd( sensor, modules, script, arguments ):
+
+    # Copy the modules to REMOTE_PATH on the sensor and run script
+    # there with python3, all over a single ssh connection
+    cmdLine = 'tar -C ' + MODULE_PATH + ' -cf - ' + ' '.join( modules ) + \
+              ' | ssh -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " 'mkdir -p " + REMOTE_PATH + ' && tar -C ' + REMOTE_PATH + \
+              ' -xf - && python3 ' + REMOTE_PATH + '/' + script + ' ' + \
+              arguments + "'"
+
+    if DEBUG:
+        print( 'RemotePythonCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
+#---------------------------------------------------------------
+def SummaryCmd( sensor, startTime, stopTime, interval ):
+
+    # min/max/mean/rms per interval of /data from startTime to
+    # stopTime, computed on the sensor by UMXSummary.py
+    utc = lambda t : time.strftime( '%Y-%m-%dT%H:%M:%S', time.gmtime( t ) )
+
+    arguments = '-b ' + utc( startTime ) + ' -e ' + utc( stopTime ) + \
+                ' -i ' + str( interval ) + ' /data'
+
+    return RemotePythonCmd( sensor, [ 'UMXFile.py', 'UMXSummary.py' ],
+                            'UMXSummary.py', arguments )
+
+#---------------------------------------------------------------
+def HeaderScanCmd( sensor, startTime ):
+
+    # Battery and block times of the /data files from startTime,
+    # read from their block headers on the sensor by HeaderScan.py
+    arguments = '-b ' + time.strftime( '%Y-%m-%dT%H:%M:%S',
+                                       time.gmtime( startTime ) ) + ' /data'
+
+    return RemotePythonCmd( sensor, [ 'UMXFile.py', 'HeaderScan.py' ],
+                            'HeaderScan.py', arguments )
+
+#---------------------------------------------------------------
+def VerifyCmd( sensor ):
+
+    # Integrity checks of the /data files on the sensor by
+    # UMXVerify.py, with the results cached on the sensor
+    return RemotePythonCmd( sensor, [ 'UMXFile.py', 'UMXVerify.py' ],
+                            'UMXVerify.py', '-c ~/umxverify.json /data' )
+
+#---------------------------------------------------------------
+def DeltaSignatureCmd( sensor, remoteFiles ):
+
+    # Block signatures of the remoteFiles by Delta.py, which stays
+    # in REMOTE_PATH for DeltaApplyCmd
+    return RemotePythonCmd( sensor, [ 'Delta.py' ], 'Delta.py',
+                            '-s ' + ' '.join( remoteFiles ) )
+
+#---------------------------------------------------------------
+def DeltaApplyCmd( sensor, remoteFiles ):
+
+    # Delta.py of DeltaSignatureCmd reads the deltas from stdin
+    return CompressedPushCmd( sensor, 'python3 ' + REMOTE_PATH + \
+                              '/Delta.py -a ' + ' '.join( remoteFiles ) )
+
+#---------------------------------------------------------------
+def DeltaRollbackCmd( sensor, remoteFiles ):
+
+    return RemotePythonCmd( sensor, [ 'Delta.py' ], 'Delta.py',
+                            '-r ' + ' '.join( remoteFiles ) )
+
 #---------------------------------------------------------------
 def LogFileCmd( sensor ):
 
@@ -185,9 +377,30 @@ def UMXCmd( sensor ):
                            stdout = subprocess.PIPE )
     return sp
 
+#---------------------------------------------------------------
+def SSHCmd( sensor ):
+
+    # Exits 0 once the sensor is up and takes ssh logins
+    cmdLine = 'ssh -n -o "ConnectTimeout 3" root@' + sensor.IP + ' true'
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
+
 #---------------------------------------------------------------
 def PlotCmd( sensor ):
 
+    dataFile    = '/data/' + sensor.firstDataDir + '/' + sensor.firstDataFile
+    tempUMXFile = sensor.monitor.tempDir + sensor.name + '_temp.umx'
+
+    # Copy the .umx to a local temporary file, compressed on the wire.
+    # The transfer is polled like a Popen, see NCPASensor.PollPlotCmd()
+    return Transfer.PullTransfer( sensor, dataFile, tempUMXFile )
+
+#---------------------------------------------------------------
+def GnuplotCmd( sensor ):
+
+    # Plot the .umx copied by PlotCmd()
     dataFile = '/data/' + sensor.firstDataDir + '/' + sensor.firstDataFile
 
     tempDir      = sensor.monitor.tempDir
@@ -195,23 +408,6 @@ def PlotCmd( sensor ):
     tempDataFile = tempUMXFile.replace('.umx', '.dat')
     gnuplotFile  = tempDir + sensor.name + '_gnuplot.plt'
 
-    # Copy the .umx to a local temporary file
-    cmdLine = 'scp -o "ConnectTimeout 3" root@' + \
-              sensor.IP + ':' + dataFile + ' ' + tempUMXFile
-
-    sp = subprocess.Popen( cmdLine, shell = True, 
-                           stdout = subprocess.PIPE )
-
-    # communicate() returns a tuple, sets returncode
-    sp_out = sp.communicate() 
-
-    if sp.returncode != 0 :
-        msg = GetLocalUTC() + ' ' + sensor.name + ': scp ' + dataFile + \
-              ' Failed: ' + sp_out[0].decode("utf-8") + '\n'
-        sensor.plotStatusMsg = msg
-        sensor.monitor.msgCommand.set( msg )
-        return
-
     # Convert the .umx into ASCII in a temporary file
     cmdLine = 'umxcat4 ' + tempUMXFile + ' > ' + tempDataFile
 
@@ -253,3 +449,21 @@ def PlotCmd( sensor ):
     msg = GetLocalUTC() + ' ' + sensor.name + \
               ': Plotting ' + tempUMXFile + '\n'
     sensor.monitor.msgCommand.set( msg )
+
+#---------------------------------------------------------------
+def LiveStreamCmd( sensor ):
+
+    # Stream the most recent data file as it is written. The first
+    # line of the output is the file name, followed by the raw file.
+    # exec replaces the local shell so that kill() stops the ssh.
+    cmdLine = 'exec ssh -n -o "ConnectTimeout 3" root@' + sensor.IP + \
+              " 'd=/data/`ls -t /data | head -n 1`; " + \
+              "f=$d/`ls -t $d | head -n 1`; " + \
+              "echo $f; exec tail -c +1 -f $f'"
+
+    if DEBUG:
+        print( 'LiveStreamCmd(): ' + cmdLine )
+
+    sp = subprocess.Popen( cmdLine, shell = True,
+                           stdout = subprocess.PIPE )
+    return sp
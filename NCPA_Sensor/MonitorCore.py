@@ -0,0 +1,473 @@
+#----------------------------------------------------------------------------
+# Name:     MonitorCore.py
+# Purpose:  The sensor polling of Monitor.py, with or without Tk
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# MonitorCore has the state and the polling loops that the
+# NCPASensor Poll*Cmd report to: the msg* variables, the *Messages,
+# the Status, the continuity index and the time, ping, data, log
+# and umx monitors of the selected sensors. It only uses after()
+# and the get() and set() of the variables, so it runs on the Tk
+# root with StringVar and BooleanVar in NCPA_Monitor (Monitor.py)
+# and on an EventLoop with EventLoop.Var in MonitorDaemon.py.
+#------------------------------------------------------------------
+
+import concurrent.futures
+import os
+import tempfile
+
+import Continuity
+import MonitorCommands
+import Transfer
+
+DEBUG = False # Set True by the -v (verbose) option
+
+INVENTORY_REFRESH = 5000  # ms between checks of the Sensors.txt files
+
+#---------------------------------------------------------------
+# Python equivalent of a C++ enumeration using a class
+class MonitorStatus:
+    OK, WARN, ERROR = range( 3 )
+
+#---------------------------------------------------------------
+# Class to monitor the overall sensor collection status, Show()
+# displays it
+#---------------------------------------------------------------
+class Status:
+    def __init__( self, monitor ):
+        self.Tk_root      = monitor.Tk_root
+        self.state        = MonitorStatus.OK
+        self.pingStatus   = MonitorStatus.OK
+        self.timeStatus   = MonitorStatus.OK
+        self.dataStatus   = MonitorStatus.OK
+        self.logStatus    = MonitorStatus.OK
+        self.umxStatus    = MonitorStatus.OK
+
+    #----------------------------------------------------------------
+    def Update( self ) :
+        # Check all the monitor update states
+        # JP Containerize these ?
+        if self.pingStatus == MonitorStatus.OK and \
+           self.timeStatus == MonitorStatus.OK and \
+           self.dataStatus == MonitorStatus.OK and \
+           self.logStatus  == MonitorStatus.OK and \
+           self.umxStatus  == MonitorStatus.OK :
+
+            self.state = MonitorStatus.OK
+
+        elif self.pingStatus == MonitorStatus.ERROR or \
+             self.timeStatus == MonitorStatus.ERROR or \
+             self.dataStatus == MonitorStatus.ERROR or \
+             self.logStatus  == MonitorStatus.ERROR or \
+             self.umxStatus  == MonitorStatus.ERROR :
+
+            self.state = MonitorStatus.ERROR
+
+        else:
+            self.state = MonitorStatus.WARN
+
+        self.Show()
+
+        # Re-register this function for another callback
+        self.Tk_root.after( 1000, self.Update )
+
+    #----------------------------------------------------------------
+    def Show( self ) :
+        pass
+
+#---------------------------------------------------------------
+# The sensors and their polling, StringVar and BooleanVar make
+# the message and poll variables
+#---------------------------------------------------------------
+class MonitorCore:
+    def __init__( self, root, args, StringVar, BooleanVar ):
+        self.Tk_root          = root
+        self.args             = args
+        self.sensorFile       = args.sensorFile    # reassigned in OpenFile()
+        self.msgLogFile       = StringVar( value = 'Log Info'  )
+        self.msgDataFile      = StringVar( value = 'Data Info' )
+        self.msgPing          = StringVar( value = 'Ping Info' )
+        self.msgTime          = StringVar( value = 'Time Info' )
+        self.msgUMX           = StringVar( value = 'UMX Info'  )
+        self.msgCommand       = StringVar( value = 'Commands'  )
+        self.timeMessages     = ''
+        self.pingMessages     = ''
+        self.dataMessages     = ''
+        self.logMessages      = ''
+        self.umxMessages      = ''
+        self.rebootMessages   = ''
+        self.haltMessages     = ''
+        self.sendConfigMessages = ''
+        self.startUMXMessages = ''
+        self.killUMXMessages  = ''
+        self.plotMessages     = ''
+        self.pollOnOff        = BooleanVar( value = False )
+        self.pingPoll         = BooleanVar( value = True )
+        self.timePoll         = BooleanVar( value = True )
+        self.dataPoll         = BooleanVar( value = True )
+        self.logPoll          = BooleanVar( value = True )
+        self.umxPoll          = BooleanVar( value = True )
+        self.pingAfterID      = None  # assigned in PollChanged()
+        self.timeAfterID      = None
+        self.dataFileAfterID  = None
+        self.logFileAfterID   = None
+        self.umxAfterID       = None
+        self.SensorCollection = None  # assigned in main() or OpenFile() 
+        self.selectedSensors  = None  # assigned in ProcessListbox()
+        self.Status           = None  # assigned in main()
+        self.processPool      = None  # assigned in GetProcessPool()
+        self.continuity       = Continuity.ContinuityIndex()
+        self.arrayReference   = None  # ( lat, lon, alt ) from args
+        if args.arrayReference :
+            self.arrayReference = tuple( float( value ) for value in
+                                         args.arrayReference.split( ',' ) )
+
+        # Create a temporary directory for plot files
+        self.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.tempDir            = self.TemporaryDirectory.name + '/'
+        if DEBUG:
+            print( 'Created temporary directory: ' + self.tempDir )
+
+    #----------------------------------------------------------------
+    # Called when the root window Poll On/Off checkbox is clicked
+    def PollChanged( self ) :
+        if DEBUG:
+            print( 'PollChanged value: ', self.pollOnOff.get() )
+            print( 'timePoll', self.timePoll.get(),
+                   'timeRefresh', self.args.timeRefresh )
+            print( 'pingPoll', self.pingPoll.get(), 
+                   'pingRefresh ', self.args.pingRefresh )
+            print( 'dataPoll', self.dataPoll.get(),
+                   'dataRefresh', self.args.dataRefresh )
+            print( 'logPoll',  self.logPoll.get(),
+                   'logRefresh', self.args.dataRefresh )
+            print( 'umxPoll', self.umxPoll.get(),
+                   'umxRefresh', self.args.umxRefresh )
+
+        if self.pollOnOff.get() :
+            # Activate the callbacks if the poll interval is positive
+            # Note that each of these functions automatically
+            # re-registers itself to run again. 
+            if self.timePoll.get() and self.args.timeRefresh > 0. :
+                self.timeAfterID = self.Tk_root.after( self.args.timeRefresh, 
+                                                       self.TimeMonitor )
+            if self.pingPoll.get() and self.args.pingRefresh > 0. :
+                self.pingAfterID = self.Tk_root.after( self.args.pingRefresh, 
+                                                       self.PingMonitor )
+            if self.dataPoll.get() and self.args.dataRefresh > 0. :
+                self.dataFileAfterID = self.Tk_root.after(self.args.dataRefresh,
+                                                          self.DataFileMonitor)
+            if self.logPoll.get() and self.args.logRefresh > 0. :
+                self.logFileAfterID = self.Tk_root.after( self.args.logRefresh,
+                                                          self.LogFileMonitor )
+            if self.umxPoll.get() and self.args.umxRefresh > 0. :
+                self.umxAfterID = self.Tk_root.after( self.args.umxRefresh, 
+                                                      self.UMXMonitor )
+
+            self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+                                 ' Sensor Polling Activated.' )
+
+        else:
+            # deactivate the callbacks
+            id = self.timeAfterID
+            self.timeAfterID = None
+            if id:
+                self.Tk_root.after_cancel( id )
+
+            id = self.pingAfterID
+            self.pingAfterID = None
+            if id:
+                self.Tk_root.after_cancel( id )
+
+            id = self.dataFileAfterID
+            self.dataFileAfterID = None
+            if id:
+                self.Tk_root.after_cancel( id )
+
+            id = self.logFileAfterID
+            self.logFileAfterID = None
+            if id:
+                self.Tk_root.after_cancel( id )
+
+            id = self.umxAfterID
+            self.umxAfterID = None
+            if id:
+                self.Tk_root.after_cancel( id )
+
+            self.msgCommand.set( MonitorCommands.GetLocalUTC() + \
+                                 ' Sensor Polling Deactivated.' )
+
+    #----------------------------------------------------------------
+    # Process pool shared by the data analysis commands
+    def GetProcessPool( self ) :
+        if not self.processPool :
+            self.processPool = concurrent.futures.ProcessPoolExecutor()
+        return self.processPool
+
+    #----------------------------------------------------------------
+    def TimeMonitor( self ):
+        if DEBUG:
+            print( "TimeMonitor()" )
+            print( self.selectedSensors )
+
+        if self.selectedSensors :
+            # Show any messages
+            self.msgTime.set( self.timeMessages )
+            # Clear the time msgs
+            self.timeMessages = ''
+
+            # Schedule TimeCmd for each sensor
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+
+                if not sensor.timePopenBusy :
+                    sensor.timeStatusMsg = ''
+                    sensor.timePopenBusy = True
+                    sensor.timePopen     = MonitorCommands.TimeCmd( sensor )
+                
+                    # Register a callback to poll and report the resultant
+                    # message from TimeCmd into monitor.msgTime.set( msg )
+                    self.Tk_root.after_idle( sensor.PollTimeCmd )
+
+        # Re-register TimeMonitor for another callback
+        if self.pollOnOff.get() :
+            self.Tk_root.after( self.args.timeRefresh, self.TimeMonitor )
+
+    #----------------------------------------------------------------
+    def PingMonitor( self ):
+        if DEBUG:
+            print( "PingMonitor()" )
+            print( self.selectedSensors )
+
+        if self.selectedSensors :
+            # Show current messages
+            self.msgPing.set( self.pingMessages )
+            # Clear the ping msgs
+            self.pingMessages = ''
+
+            # Schedule PingCmd for each sensor and store the Popen object
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+
+                if not sensor.pingPopenBusy :
+                    sensor.pingStatusMsg = ''
+                    sensor.pingPopenBusy = True
+                    sensor.pingPopen     = MonitorCommands.PingCmd( sensor )
+                
+                    # Register a callback to poll and report the resultant
+                    # message from PingCmd into monitor.msgPing.set()
+                    self.Tk_root.after_idle( sensor.PollPingCmd )
+
+        # Re-register this function for another callback
+        if self.pollOnOff.get() :
+            self.Tk_root.after( self.args.pingRefresh, self.PingMonitor )
+
+    #----------------------------------------------------------------
+    def DataFileMonitor( self ):
+        if DEBUG:
+            print( "DataFileMonitor()" )
+
+        # Show the data msgs since the last monitor call
+        if self.selectedSensors :
+            self.msgDataFile.set( self.dataMessages )
+            # Clear the data msgs
+            self.dataMessages = ''
+
+            # Schedule DataCmd for each sensor and store the Popen object
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+
+                if not sensor.dataPopenBusy :
+                    sensor.dataStatusMsg = ''
+                    sensor.dataPopenBusy = True
+                    sensor.dataPopen = \
+                       MonitorCommands.DataFileCmd( sensor )
+                
+                    # Register a callback to poll and report the resultant
+                    # message from DataCmd into monitor.msgData.set()
+                    self.Tk_root.after_idle( sensor.PollDataCmd )
+
+                # Until a full listing of all the data files has made
+                # the continuity index, DataCmd keeps it up to date
+                if not self.continuity.Listed( sensor.name ) and \
+                   not sensor.continuityPopenBusy :
+                    sensor.continuityPopenBusy = True
+                    sensor.continuityPopen = \
+                       MonitorCommands.DataListCmd( sensor )
+                    self.Tk_root.after_idle( sensor.PollContinuityCmd )
+
+        # Re-register this function for another callback
+        if self.pollOnOff.get() :
+            self.Tk_root.after( self.args.dataRefresh, self.DataFileMonitor )
+
+    #----------------------------------------------------------------
+    def LogFileMonitor( self ):
+        if DEBUG:
+            print( "LogFileMonitor()" )
+
+        # Show the log msgs since the last monitor call
+        if self.selectedSensors :
+            self.msgLogFile.set( self.logMessages )
+            # Clear the log msgs
+            self.logMessages = ''
+
+            # Schedule LogCmd for this sensor and store the Popen object
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+
+                if not sensor.logPopenBusy :
+                    sensor.logStatusMsg = ''
+                    sensor.logPopenBusy = True
+                    sensor.logPopen = \
+                       MonitorCommands.LogFileCmd( sensor )
+                
+                    # Register a callback to poll and report the resultant
+                    # message from LogCmd into monitor.msgLog.set()
+                    self.Tk_root.after_idle( sensor.PollLogCmd )
+
+        # Re-register this function for another callback
+        if self.pollOnOff.get() :
+            self.Tk_root.after( self.args.logRefresh, self.LogFileMonitor )
+
+    #----------------------------------------------------------------
+    def UMXMonitor( self ):
+        if DEBUG:
+            print( "UMXMonitor()" )
+
+        # Show the umx msgs since the last monitor call
+        if self.selectedSensors :
+            self.msgUMX.set( self.umxMessages )
+            # Clear the umx msgs
+            self.umxMessages = ''
+
+            # Schedule UMXCmd for each sensor and store the Popen object
+            for key in self.selectedSensors :
+                sensor = self.SensorCollection.SensorDict[ key ]
+
+                if not sensor.umxPopenBusy :
+                    sensor.umxStatusMsg = ''
+                    sensor.umxPopenBusy = True
+                    sensor.umxPopen = MonitorCommands.UMXCmd( sensor )
+                
+                    # Register a callback to poll and report the resultant
+                    # message from UMXCmd into monitor.msgUMX.set()
+                    self.Tk_root.after_idle( sensor.PollUMXCmd )
+
+        # Re-register this function for another callback
+        if self.pollOnOff.get() :
+            self.Tk_root.after( self.args.umxRefresh, self.UMXMonitor )
+
+    #----------------------------------------------------------------
+    def ReloadSensors( self ):
+        # Read self.sensorFile into the SensorCollection as a diff,
+        # the sensors kept go on with their commands and stay selected
+        added, removed, changed = \
+            self.SensorCollection.NewFile( self.sensorFile )
+
+        if self.selectedSensors :
+            self.selectedSensors = [ key for key in self.selectedSensors
+                if key in self.SensorCollection.SensorDict ] or None
+
+        return added, removed, changed
+
+    #----------------------------------------------------------------
+    def WatchInventory( self ):
+        # Reload the sensorFile when it or one of its includes changes
+        if self.SensorCollection and \
+           self.SensorCollection.InventoryChanged() :
+            if DEBUG:
+                print( 'WatchInventory: ' + self.sensorFile + ' changed' )
+            self.ReloadSensors()
+
+        # Re-register this function for another callback
+        self.Tk_root.after( INVENTORY_REFRESH, self.WatchInventory )
+
+#----------------------------------------------------------------------------
+# The command line options of the sensors and their polling
+#----------------------------------------------------------------------------
+def AddArguments( parser ):
+    parser.add_argument('-a', '--subnet',
+                        dest   = 'subnet', type = str, 
+                        action = 'store', default = '192.168.1.',
+                        help = 'IP subnet prefix (192.168.1.).')
+
+    parser.add_argument('-s', '--sensorList',
+                        dest   = 'sensorList', type = str, 
+                        action = 'store', default = '',
+                        help = 'Sensor IP address suffix (51,106,169).')
+
+    parser.add_argument('-f', '--sensorFile',
+                        dest   = 'sensorFile', type = str, 
+                        action = 'store', default = '',
+                        help = 'Sensor parameter file name.')
+
+    parser.add_argument('-p', '--pingRefresh',
+                        dest   = 'pingRefresh', type = float, 
+                        action = 'store', default = 3.0,
+                        help = 'Ping monitor refresh interval (3 s).' )
+
+    parser.add_argument('-u', '--umxRefresh',
+                        dest   = 'umxRefresh', type = float,
+                        action = 'store', default = 4.0,
+                        help = 'UMX monitor refresh interval (4 s).' )
+
+    parser.add_argument('-l', '--logRefresh',
+                        dest   = 'logRefresh', type = float, 
+                        action = 'store', default = 5.0,
+                        help = 'Log file monitor refresh interval (5 s).' )
+
+    parser.add_argument('-d', '--dataRefresh',
+                        dest   = 'dataRefresh', type = float, 
+                        action = 'store', default = 6.0,
+                        help = 'Data file monitor refresh interval (6 s).' )
+
+    parser.add_argument('-t', '--timeRefresh',
+                        dest   = 'timeRefresh', type = float, 
+                        action = 'store', default = 5.0,
+                        help = 'Time monitor refresh interval (5 s).' )
+
+    parser.add_argument('-R', '--sensorRate',
+                        dest   = 'sensorRate', type = float,
+                        action = 'store', default = Transfer.SENSOR_RATE / 1000.,
+                        help = 'Bulk transfer kB/s per sensor (250).' )
+
+    parser.add_argument('-U', '--uplinkRate',
+                        dest   = 'uplinkRate', type = float,
+                        action = 'store', default = Transfer.UPLINK_RATE / 1000.,
+                        help = 'Bulk transfer kB/s per Uplink group (500).' )
+
+    parser.add_argument('-G', '--arrayReference',
+                        dest   = 'arrayReference', type = str,
+                        action = 'store', default = '',
+                        help = 'Array reference lat,lon,alt of X/Y/Z_relative (centroid).' )
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool, 
+                        action = 'store_true', default = False )
+
+#----------------------------------------------------------------------------
+def SetArguments( args ):
+    global DEBUG
+
+    # convert the refresh args to milliseconds for after() 
+    args.pingRefresh = round( args.pingRefresh * 1000 )
+    args.umxRefresh  = round( args.umxRefresh  * 1000 )
+    args.logRefresh  = round( args.logRefresh  * 1000 )
+    args.dataRefresh = round( args.dataRefresh * 1000 )
+    args.timeRefresh = round( args.timeRefresh * 1000 )
+
+    # Save the users home directory
+    args.homePath = os.environ['HOME']
+
+    # set DEBUG status
+    DEBUG = args.verbose
+    Transfer.DEBUG = args.verbose
+
+    # Bulk transfer rate limits, see Transfer.py
+    Transfer.SENSOR_RATE = args.sensorRate * 1000.
+    Transfer.UPLINK_RATE = args.uplinkRate * 1000.
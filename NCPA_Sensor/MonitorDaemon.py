@@ -0,0 +1,373 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     MonitorDaemon.py
+# Purpose:  Monitor a set of NCPA sensors without a display
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./MonitorDaemon.py -f Sensors.txt
+# ./MonitorDaemon.py -f Sensors.txt -g arrayB,solar -q
+# ./MonitorDaemon.py -r        (report of the running daemon)
+#
+# The time, ping, data, log and umx polling of Monitor.py
+# (MonitorCore) of the sensors in the groups or with the tags of
+# -g (FleetOps.Select) on an EventLoop instead of the Tk root, on a
+# server or under systemd:
+#   [Service]
+#   ExecStart=/home/ncpa/NCPA_Sensor/MonitorDaemon.py -f /home/ncpa/Sensors.txt
+#   WorkingDirectory=/home/ncpa/NCPA_Sensor
+#   Restart=on-failure
+# In the statePath (-S) are
+#   monitor.log  the messages of the Monitor.py labels, the status
+#                changes and the exceptions of the callbacks, a new
+#                file every LOG_SIZE bytes, LOG_FILES kept as
+#                monitor.log.1 ... With -q only the failures of
+#                the polling are logged, -L - logs to stdout.
+#   state.json   the status, the last message of each poll and the
+#                GPS position history of each sensor, saved every
+#                STATE_REFRESH ms and on SIGTERM or SIGINT. It is
+#                read at the start, so the positions survive a
+#                restart. -r prints it, Monitor.py File > Daemon
+#                shows it.
+# A change of the Sensors.txt files is read in as in Monitor.py.
+#------------------------------------------------------------------
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+import ArrayProcessing
+import EventLoop
+import FleetOps
+import MonitorCommands
+import MonitorCore
+import NCPASensor_py3 as NCPASensor
+import SensorFile
+import UMXVerify
+
+DEBUG = False # Set True by the -v (verbose) option
+
+LOG_FILE      = 'monitor.log'
+LOG_SIZE      = 10000000  # bytes of a log file
+LOG_FILES     = 5         # old log files kept
+STATE_FILE    = 'state.json'
+STATE_REFRESH = 60000     # ms between saves of the state
+STATE_VERSION = 1
+
+POLLS = ( 'time', 'ping', 'data', 'log', 'umx' )   # polls of the messages
+
+STATUS_NAMES = { MonitorCore.MonitorStatus.OK    : 'OK',
+                 MonitorCore.MonitorStatus.WARN  : 'WARN',
+                 MonitorCore.MonitorStatus.ERROR : 'ERROR' }
+
+#---------------------------------------------------------------
+def UTC( t ) :
+    return time.strftime( '%b %d %Y %H:%M:%S', time.gmtime( t ) )
+
+#---------------------------------------------------------------
+def ReportLines( state ) :
+    # The lines of a state.json report
+    if state.get( 'version' ) != STATE_VERSION :
+        return [ 'No daemon state' ]
+
+    status = state[ 'status' ]
+    lines  = [ 'Daemon pid ' + str( state[ 'pid' ] ) + ' started ' + \
+               UTC( state[ 'started' ] ) + ', saved ' + UTC( state[ 'saved' ] ) + \
+               ', ' + state[ 'sensorFile' ] + ' groups ' + state[ 'groups' ],
+               'Status ' + status[ 'state' ] + ': ' + \
+               ', '.join( poll + ' ' + status[ poll ] for poll in POLLS ) ]
+
+    for name in sorted( state[ 'sensors' ].keys() ) :
+        entry = state[ 'sensors' ][ name ]
+        lines.append( name + ' ' + entry[ 'IP' ] + \
+                      ( '' if entry[ 'selected' ] else ' not polled' ) )
+        for poll in POLLS :
+            if entry[ 'messages' ].get( poll ) :
+                lines.append( '    ' + entry[ 'messages' ][ poll ] )
+        runs, faults, lastFault = entry.get( 'positionHistory',
+                                             ( [], 0, None ) )
+        if runs :
+            lines.append( '    GPS %.6f, %.6f, %.1f m since ' % \
+                          tuple( runs[-1][ 2 : 5 ] ) + UTC( runs[-1][0] ) + \
+                          ', ' + str( len( runs ) ) + ' positions, ' + \
+                          str( faults ) + ' faults' )
+    return lines
+
+#---------------------------------------------------------
+# The log file, a new one every LOG_SIZE bytes
+#---------------------------------------------------------
+class Log:
+    def __init__( self, fileName ):
+        self.fileName = fileName   # '-' for stdout
+        self.file     = sys.stdout
+        if fileName != '-' :
+            self.file = open( fileName, 'a' )
+
+    #-----------------------------------------------------------
+    def Write( self, text ):
+        lines = [ line for line in text.split( '\n' ) if line.strip() ]
+        if not lines :
+            return
+        self.file.write( '\n'.join( lines ) + '\n' )
+        self.file.flush()
+        if self.fileName != '-' and self.file.tell() > LOG_SIZE :
+            self.Rotate()
+
+    #-----------------------------------------------------------
+    def Rotate( self ):
+        self.file.close()
+        for n in range( LOG_FILES - 1, 0, -1 ) :
+            if os.path.exists( self.fileName + '.' + str( n ) ) :
+                os.replace( self.fileName + '.' + str( n ),
+                            self.fileName + '.' + str( n + 1 ) )
+        os.replace( self.fileName, self.fileName + '.1' )
+        self.file = open( self.fileName, 'a' )
+
+#---------------------------------------------------------------
+# The overall status, a change is logged
+#---------------------------------------------------------------
+class DaemonStatus( MonitorCore.Status ):
+    def __init__( self, monitor ):
+        MonitorCore.Status.__init__( self, monitor )
+        self.log   = monitor.log
+        self.shown = MonitorCore.MonitorStatus.OK
+
+    #----------------------------------------------------------------
+    def Show( self ) :
+        if self.state != self.shown :
+            self.log.Write( MonitorCommands.GetLocalUTC() + ' Status ' + \
+                STATUS_NAMES[ self.shown ] + ' -> ' + \
+                STATUS_NAMES[ self.state ] + ': ' + \
+                ', '.join( poll + ' ' + \
+                           STATUS_NAMES[ getattr( self, poll + 'Status' ) ]
+                           for poll in POLLS ) )
+            self.shown = self.state
+
+#---------------------------------------------------------------
+# The sensor polling of MonitorCore on an EventLoop
+#---------------------------------------------------------------
+class MonitorDaemon( MonitorCore.MonitorCore ):
+    def __init__( self, root, args ):
+        MonitorCore.MonitorCore.__init__( self, root, args,
+                                          EventLoop.Var, EventLoop.Var )
+        self.stateFile = os.path.join( args.statePath, STATE_FILE )
+        self.log       = Log( args.logFile or
+                              os.path.join( args.statePath, LOG_FILE ) )
+        self.saved     = {}   # the last state.json
+        self.started   = time.time()
+
+        # The messages of the Monitor.py labels go to the log
+        for var in ( self.msgTime, self.msgPing, self.msgDataFile,
+                     self.msgLogFile, self.msgUMX ) :
+            var.trace( self.LogPoll )
+        self.msgCommand.trace( self.log.Write )
+
+    #----------------------------------------------------------------
+    def LogPoll( self, text ):
+        if self.args.quiet :
+            text = '\n'.join( line for line in text.split( '\n' )
+                              if 'Failed' in line or 'ERROR' in line )
+        self.log.Write( text )
+
+    #----------------------------------------------------------------
+    def Select( self ):
+        # The sensors of the -g groups are polled
+        self.selectedSensors = sorted( FleetOps.Select(
+            self.SensorCollection.SensorDict, self.args.groups ) ) or None
+
+    #----------------------------------------------------------------
+    def ReloadSensors( self ):
+        added, removed, changed = MonitorCore.MonitorCore.ReloadSensors( self )
+        self.Select()
+        return added, removed, changed
+
+    #----------------------------------------------------------------
+    def LoadState( self ):
+        # The positions and the last messages of the sensors
+        self.saved = UMXVerify.LoadCache( self.stateFile )
+        if self.saved.get( 'version' ) != STATE_VERSION :
+            self.saved = {}
+            return
+
+        located = False
+        for sensor in self.SensorCollection.SensorDict.values() :
+            entry = self.saved[ 'sensors' ].get( sensor.name )
+            if not entry :
+                continue
+            sensor.gpsDataFile = entry[ 'gpsDataFile' ]
+            if 'positionHistory' not in entry :
+                continue
+            runs, faults, lastFault = entry[ 'positionHistory' ]
+            sensor.positionHistory.runs      = runs
+            sensor.positionHistory.faults    = faults
+            sensor.positionHistory.lastFault = lastFault
+            if runs :
+                sensor.Position = NCPASensor.Position( *runs[-1][ 2 : 5 ] )
+                located = True
+
+        if located :
+            ArrayProcessing.SetRelativePositions(
+                self.SensorCollection.SensorDict.values(), self.arrayReference )
+
+    #----------------------------------------------------------------
+    def SaveState( self ):
+        sensors = self.saved.get( 'sensors', {} )
+        state = { 'version'    : STATE_VERSION,
+                  'pid'        : os.getpid(),
+                  'started'    : self.started,
+                  'saved'      : time.time(),
+                  'sensorFile' : self.sensorFile or '-s ' + self.args.sensorList,
+                  'groups'     : self.args.groups,
+                  'status'     : { 'state' : STATUS_NAMES[ self.Status.state ] },
+                  'sensors'    : {} }
+        for poll in POLLS :
+            state[ 'status' ][ poll ] = \
+                STATUS_NAMES[ getattr( self.Status, poll + 'Status' ) ]
+
+        selected = set( self.selectedSensors or () )
+        for key, sensor in self.SensorCollection.SensorDict.items() :
+            # A message is '' while its command runs, the last one stays
+            messages = sensors.get( sensor.name, {} ).get( 'messages', {} )
+            for poll in POLLS :
+                msg = getattr( sensor, poll + 'StatusMsg' ).strip()
+                if msg :
+                    messages[ poll ] = msg
+            entry = { 'IP'          : sensor.IP,
+                      'selected'    : key in selected,
+                      'messages'    : messages,
+                      'gpsDataFile' : sensor.gpsDataFile }
+            # Reading positionHistory would create it, and the state
+            # dict, for every sensor without a GPS fix
+            if sensor.state and 'positionHistory' in sensor.state :
+                history = sensor.positionHistory
+                entry[ 'positionHistory' ] = [ history.runs, history.faults,
+                                               history.lastFault ]
+            state[ 'sensors' ][ sensor.name ] = entry
+
+        UMXVerify.SaveCache( self.stateFile, state )
+        self.saved = state
+
+    #----------------------------------------------------------------
+    def PollState( self ):
+        self.SaveState()
+
+        # Re-register this function for another callback
+        self.Tk_root.after( STATE_REFRESH, self.PollState )
+
+    #----------------------------------------------------------------
+    def Stop( self, signum, frame ):
+        self.log.Write( MonitorCommands.GetLocalUTC() + ' Stopped by ' + \
+                        signal.Signals( signum ).name )
+        self.Tk_root.quit()
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    if args.report :
+        for line in ReportLines( UMXVerify.LoadCache(
+                                 os.path.join( args.statePath, STATE_FILE ) ) ) :
+            print( line )
+        return
+
+    os.makedirs( args.statePath, exist_ok = True )
+
+    root    = EventLoop.EventLoop()
+    monitor = MonitorDaemon( root, args )
+    root.report = monitor.log.Write
+
+    monitor.Status = DaemonStatus( monitor )
+    monitor.log.Write( MonitorCommands.GetLocalUTC() + ' Started pid ' + \
+                       str( os.getpid() ) + ', state in ' + monitor.stateFile )
+
+    # Read the sensors, as Monitor.py main()
+    monitor.SensorCollection = NCPASensor.SensorCollection( monitor )
+    monitor.Select()
+    monitor.LoadState()
+
+    signal.signal( signal.SIGTERM, monitor.Stop )
+    signal.signal( signal.SIGINT,  monitor.Stop )
+
+    root.after( MonitorCore.INVENTORY_REFRESH, monitor.WatchInventory )
+    root.after( STATE_REFRESH, monitor.PollState )
+    monitor.Status.Update()
+
+    # Poll On
+    monitor.pollOnOff.set( True )
+    monitor.PollChanged()
+
+    root.mainloop()
+
+    monitor.SaveState()
+    if monitor.processPool :
+        monitor.processPool.shutdown()
+    monitor.TemporaryDirectory.cleanup()
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA Sensor Monitor daemon' )
+
+    # The sensors and polling, -a -s -f -p -u -l -d -t -R -U -G -v
+    MonitorCore.AddArguments( parser )
+
+    homePath = os.environ['HOME']
+    parser.add_argument('-S', '--statePath',
+                        dest   = 'statePath', type = str,
+                        action = 'store',
+                        default = homePath + '/SensorMonitor',
+                        help = 'Log and state files (~/SensorMonitor).' )
+
+    parser.add_argument('-L', '--logFile',
+                        dest   = 'logFile', type = str,
+                        action = 'store', default = '',
+                        help = 'Log file, - for stdout (statePath/monitor.log).' )
+
+    parser.add_argument('-g', '--groups',
+                        dest   = 'groups', type = str,
+                        action = 'store', default = 'all',
+                        help = 'Groups or tags of the sensors polled (all).' )
+
+    parser.add_argument('-q', '--quiet',
+                        dest   = 'quiet',
+                        action = 'store_true', default = False,
+                        help = 'Only log the failures of the polling.' )
+
+    parser.add_argument('-r', '--report',
+                        dest   = 'report',
+                        action = 'store_true', default = False,
+                        help = 'Print the state of the daemon and exit.' )
+
+    args = parser.parse_args()
+
+    # The refresh intervals in ms, the transfer rates and homePath
+    MonitorCore.SetArguments( args )
+
+    # set DEBUG status
+    DEBUG = args.verbose
+    EventLoop.DEBUG  = args.verbose
+    FleetOps.DEBUG   = args.verbose
+    SensorFile.DEBUG = args.verbose
+    UMXVerify.DEBUG  = args.verbose
+    ArrayProcessing.DEBUG = args.verbose
+
+    if not args.report and not args.sensorFile and not args.sensorList :
+        parser.error( 'one of -f or -s' )
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,26 @@
 # Created:      
 #----------------------------------------------------------------------------
 
+import collections
+import os
+import subprocess
+import sys
+
+import ArrayProcessing
+import HeaderScan
+import UMXVerify
 import MonitorCommands
-import Monitor
+import MonitorCore
+import SensorFile
+import UMXFile
+import UMXSummary
+import Transfer
 
 DEBUG = False # Set True by the -v (verbose) option
 
+POSITION_MOVE = 10.   # m, a GPS fix further than this is a new position
+MAX_POSITIONS = 200   # runs kept in a PositionHistory
+
 #---------------------------------------------------------
 # Geo-reference Class
 #---------------------------------------------------------
@@ -24,78 +39,168 @@ class Position:
         self.Y_relative = 0.
         self.Z_relative = 0.
 
+#---------------------------------------------------------
+# GPS fixes of a sensor, one run per position:
+# [ firstTime, lastTime, latitude, longitude, altitude, fixes ]
+# A fix within POSITION_MOVE m (2 x vertically) of the run
+# only extends it, so a fixed sensor keeps a single run.
+#---------------------------------------------------------
+class PositionHistory:
+    def __init__( self ):
+        self.runs      = []
+        self.faults    = 0      # fixes that are not a position
+        self.lastFault = None   # UTC of the last fault
+
+    #-----------------------------------------------------------
+    def Add( self, utcTime, latitude, longitude, altitude ):
+        # Return True if the fix starts a new run
+        if not ( -90. <= latitude <= 90. and -180. <= longitude <= 180. ) or \
+           ( latitude == 0. and longitude == 0. ) :
+            self.faults    = self.faults + 1
+            self.lastFault = utcTime
+            return False
+
+        if self.runs :
+            run = self.runs[-1]
+            x, y, z = ArrayProcessing.LocalXYZ( latitude, longitude, altitude,
+                                                run[ 2 : 5 ] )
+            if ( x * x + y * y ) ** 0.5 <= POSITION_MOVE and \
+               abs( z ) <= 2 * POSITION_MOVE :
+                run[1] = max( run[1], utcTime )
+                run[5] = run[5] + 1
+                return False
+
+        self.runs.append( [ utcTime, utcTime, latitude, longitude, altitude, 1 ] )
+        self.runs = self.runs[ -MAX_POSITIONS : ]
+        return True
+
+    #-----------------------------------------------------------
+    def Moved( self ):
+        # Distance (m) of the last move, None if there was none
+        if len( self.runs ) < 2 :
+            return None
+        x, y, z = ArrayProcessing.LocalXYZ( *( self.runs[-1][ 2 : 5 ] +
+                                               [ self.runs[-2][ 2 : 5 ] ] ) )
+        return ( x * x + y * y + z * z ) ** 0.5
+
+#---------------------------------------------------------
+# Per-command state of a sensor, name : default. Most sensors
+# of a fleet are idle, so a sensor only keeps the values that
+# differ from the default, in a dict allocated by its first
+# command and released when every value is back to the default.
+# A default of list, HeaderRecords or PositionHistory is a new one
+# on first use.
+#---------------------------------------------------------
+def HeaderRecords() :
+    # The newest HeaderScan.MAX_RECORDS records of the header sweeps
+    return collections.deque( maxlen = HeaderScan.MAX_RECORDS )
+
+COMMANDS = ( 'time', 'ping', 'data', 'dataSubCmd', 'log', 'logSubCmd',
+             'umx', 'reboot', 'halt', 'sendConfig', 'startUMXScheduler',
+             'startUMX', 'killUMX', 'killUMXSubCmd', 'killUMXSubCmd2',
+             'killUMXSubCmd3', 'plot', 'continuity', 'summary', 'gps',
+             'header', 'verify' )
+
+STATE = {}
+for command in COMMANDS :
+    STATE[ command + 'Popen' ]     = None
+    STATE[ command + 'PopenBusy' ] = False
+    STATE[ command + 'StatusMsg' ] = ''
+STATE.update( { 'firstDataDir'    : '',
+                'firstDataFile'   : '',
+                'firstLogFile'    : '',
+                'gpsDataFile'     : '',    # file of the last GPS fix
+                'headerRecords'   : HeaderRecords,
+                'headerErrors'    : list,  # ( fileName, error )
+                'verifyResults'   : None,  # ( bad files, checked )
+                'umxSchedPID'     : '',
+                'umxControlPID'   : '',
+                'transferStats'   : None,  # Transfer.TransferStats
+                'positionHistory' : PositionHistory } )
+
+FACTORIES = ( list, HeaderRecords, PositionHistory )
+
+TAGS = {}   # the tags tuples of the sensors, shared
+
+#---------------------------------------------------------------
+def StateProperty( name, default ) :
+    # The attribute name of NCPASensor, kept in its state dict
+    def Get( self ) :
+        state = self.state
+        if state is not None and name in state :
+            return state[ name ]
+        if default in FACTORIES :
+            value = default()
+            Set( self, value )
+            return value
+        return default
+
+    def Set( self, value ) :
+        if default not in FACTORIES and type( value ) is type( default ) and \
+           value == default :
+            Delete( self )
+            return
+        if self.state is None :
+            self.state = {}
+        self.state[ name ] = value
+
+    def Delete( self ) :
+        state = self.state
+        if state is not None :
+            state.pop( name, None )
+            if not state :
+                self.state = None
+
+    return property( Get, Set, Delete )
+
+#---------------------------------------------------------------
+def Intern( value ) :
+    # Paths, file names, uplinks and groups repeat across a fleet
+    return sys.intern( value ) if type( value ) is str else value
+
 #---------------------------------------------------------
 # Sensor Class
 #---------------------------------------------------------
 class NCPASensor:
+    __slots__ = ( 'name', 'serialNumber', 'IP', 'configInPath',
+                  'configInFile', 'configOutPath', 'configOutFile',
+                  'UMXSchedulerCmd', 'uplink', 'group', 'tags', 'Position',
+                  'monitor', 'state' )
+
     def __init__( self, monitor, SN, IP, 
                   configInPath    = './',
                   configInFile    = 'SN123_UMSX1.4.cfg',
                   configOutPath   = '~/', 
                   configOutFile   = 'UMSX1.4.cfg',
-                  UMXSchedulerCmd = 'run_scheduler.sh' ):
+                  UMXSchedulerCmd = 'run_scheduler.sh',
+                  uplink          = '',
+                  group           = '',
+                  tags            = () ):
 
         self.name            = 'SN' + SN     # string: 'SN056'
         self.serialNumber    = SN            # 3 digit string: '056'
+        self.Position        = None          # Position of the GPS fix
+        self.SetFields( IP, configInPath, configInFile, configOutPath,
+                        configOutFile, UMXSchedulerCmd, uplink, group, tags )
+        # These are specific to Monitor.py, the Popens, busy flags,
+        # status messages and results of the commands are STATE
+        self.monitor         = monitor
+        self.state           = None
+
+    #-----------------------------------------------------------
+    def SetFields( self, IP, configInPath, configInFile, configOutPath,
+                   configOutFile, UMXSchedulerCmd, uplink, group, tags ):
+        # The Sensors.txt fields, tags a tuple of tag strings
+        tags = tuple( Intern( tag ) for tag in tags )
         self.IP              = IP            # string of IP address
-        self.configInPath    = configInPath
-        self.configInFile    = configInFile
-        self.configOutPath   = configOutPath
-        self.configOutFile   = configOutFile
-        self.UMXSchedulerCmd = UMXSchedulerCmd
-        self.Position        = None
-        # These are specific to Monitor.py
-        self.monitor                 = monitor
-        self.timePopen               = None
-        self.pingPopen               = None
-        self.dataPopen               = None
-        self.dataSubCmdPopen         = None
-        self.logPopen                = None
-        self.logSubCmdPopen          = None
-        self.umxPopen                = None
-        self.rebootPopen             = None
-        self.haltPopen               = None
-        self.sendConfigPopen         = None
-        self.startUMXSchedulerPopen  = None
-        self.killUMXPopen            = None
-        self.killUMXSubCmdPopen      = None
-        self.killUMXSubCmd2Popen     = None
-        self.killUMXSubCmd3Popen     = None
-        self.plotPopen               = None
-        self.timePopenBusy           = False
-        self.pingPopenBusy           = False
-        self.dataPopenBusy           = False
-        self.dataSubCmdPopenBusy     = False
-        self.logPopenBusy            = False
-        self.logSubCmdPopenBusy      = False
-        self.umxPopenBusy            = False
-        self.rebootPopenBusy         = False
-        self.haltPopenBusy           = False
-        self.sendConfigPopenBusy     = False
-        self.killUMXPopenBusy        = False
-        self.killUMXSubCmdPopenBusy  = False
-        self.killUMXSubCmd2PopenBusy = False
-        self.killUMXSubCmd3PopenBusy = False
-        self.startUMXSchedulerPopenBusy = False
-        self.plotPopenBusy           = False
-        self.timeStatusMsg           = ''
-        self.pingStatusMsg           = ''
-        self.dataStatusMsg           = ''
-        self.logStatusMsg            = ''
-        self.umxStatusMsg            = ''
-        self.rebootStatusMsg         = ''
-        self.haltStatusMsg           = ''
-        self.sendConfigStatusMsg     = ''
-        self.startUMXStatusMsg       = ''
-        self.killUMXStatusMsg        = ''
-        self.killUMXSubCmdStatusMsg  = ''
-        self.killUMXSubCmd2StatusMsg = ''
-        self.killUMXSubCmd3StatusMsg = ''
-        self.plotStatusMsg           = ''
-        self.firstDataDir            = ''
-        self.firstDataFile           = ''
-        self.firstLogFile            = ''
-        self.umxSchedPID             = ''
+        self.configInPath    = Intern( configInPath )
+        self.configInFile    = Intern( configInFile )
+        self.configOutPath   = Intern( configOutPath )
+        self.configOutFile   = Intern( configOutFile )
+        self.UMXSchedulerCmd = Intern( UMXSchedulerCmd )
+        self.uplink          = Intern( uplink )  # shared radio link name
+        self.group           = Intern( group )   # string: 'arrayB'
+        self.tags            = TAGS.setdefault( tags, tags )
 
     def Print( self ):
         print( 'ConfigInFile: ' + self.configInFile )
@@ -105,6 +210,19 @@ class NCPASensor:
 
     #-----------------------------------------------------------
     # These are specific to Monitor.py
+    #-----------------------------------------------------------
+    def KillCommands( self ):
+        # Kill the running commands of a sensor removed from the
+        # inventory. Their Poll*Cmd callbacks are still registered,
+        # they reap the Popens and post the commands as Failed.
+        if self.state is None :
+            return
+        for command in COMMANDS :
+            popen = getattr( self, command + 'Popen' )
+            popen = getattr( popen, 'popen', popen )   # Transfer.PullTransfer
+            if isinstance( popen, subprocess.Popen ) and popen.poll() == None :
+                popen.kill()
+
     #-----------------------------------------------------------
     def PollTimeCmd( self ):
         if self.timePopen:
@@ -138,9 +256,9 @@ class NCPASensor:
                                             self.timeStatusMsg
 
                 if 'Failed' in msg :
-                    self.monitor.Status.timeStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.timeStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.timeStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.timeStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.timePopen )
                 self.timePopen     = None
@@ -164,6 +282,9 @@ class NCPASensor:
                 sp_out  = self.pingPopen.communicate() 
                 pingOut = sp_out[0].decode("utf-8").split()
 
+                # The RTT also paces the bulk transfers
+                Transfer.ObservePing( self, sp_out[0].decode("utf-8") )
+
                 msg = MonitorCommands.GetLocalUTC() + ' ' + \
                       self.name + ': ' + ' '.join( pingOut[15:20] ) + '\n'
 
@@ -175,9 +296,9 @@ class NCPASensor:
                                             self.pingStatusMsg
 
                 if '0 received' in msg :
-                    self.monitor.Status.pingStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.pingStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.pingStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.pingStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.pingPopen )
                 self.pingPopen     = None
@@ -227,9 +348,9 @@ class NCPASensor:
                                             self.dataStatusMsg
 
                 if 'Failed' in msg :
-                    self.monitor.Status.dataStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.dataStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.dataStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.dataStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.dataPopen )
                 self.dataPopen     = None
@@ -270,6 +391,16 @@ class NCPASensor:
                     # the file name is the last word on the second line
                     self.firstDataFile = ls_lines[1].split()[-1]
 
+                    # Keep the data continuity index up to date
+                    self.monitor.continuity.AddListing( self.name, ls_lines )
+
+                    # Read the GPS fix of each new data file
+                    if self.firstDataFile != self.gpsDataFile and \
+                       not self.gpsPopenBusy :
+                        self.gpsPopenBusy = True
+                        self.gpsPopen = MonitorCommands.GPSHeaderCmd( self )
+                        self.monitor.Tk_root.after_idle( self.PollGPSCmd )
+
                 self.dataStatusMsg = dataFileInfo
 
                 # Add the status to the monitor.dataMessages and
@@ -278,14 +409,293 @@ class NCPASensor:
                                             self.dataStatusMsg
 
                 if 'Failed' in dataFileInfo :
-                    self.monitor.Status.dataStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.dataStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.dataStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.dataStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.dataSubCmdPopen )
                 self.dataSubCmdPopen     = None
                 self.dataSubCmdPopenBusy = False
 
+    #-----------------------------------------------------------
+    def PollGPSCmd( self ):
+        if self.gpsPopen:
+            # check the gpsPopen object (subprocess.Popen) with
+            # a poll and see if the command has finished
+            self.gpsPopen.poll()
+
+            # None value indicates that the process hasn’t terminated yet.
+            if self.gpsPopen.returncode == None :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollGPSCmd )
+            else:
+                # Post the return status
+                timeStr = MonitorCommands.GetLocalUTC()
+                msg     = ''
+
+                if self.gpsPopen.returncode != 0 :
+                    msg = timeStr + ' ' + self.name + ': head /data/' + \
+                          self.firstDataDir + '/' + self.firstDataFile + \
+                          ' Failed.\n'
+                else:
+                    sp_out = self.gpsPopen.communicate()
+                    data   = sp_out[0]
+
+                    # A new file has no block yet, try at the next poll
+                    if len( data ) == UMXFile.FILE_HEADER.size + \
+                                      UMXFile.BLOCK_HEADER.size :
+                        self.gpsDataFile = self.firstDataFile
+                        try :
+                            UMXFile.FileHeader( data )
+                            blockHeader = UMXFile.BlockHeader(
+                                data, UMXFile.FILE_HEADER.size )
+                            msg = self.UpdatePosition( blockHeader )
+                        except Exception as e :
+                            msg = timeStr + ' ' + self.name + ': GPS ' + \
+                                  self.firstDataFile + ' ' + str( e ) + \
+                                  ' Failed.\n'
+
+                self.gpsStatusMsg = msg
+
+                # Add the status to the monitor.dataMessages
+                self.monitor.dataMessages = self.monitor.dataMessages + \
+                                            self.gpsStatusMsg
+
+                del( self.gpsPopen )
+                self.gpsPopen     = None
+                self.gpsPopenBusy = False
+
+    #-----------------------------------------------------------
+    def UpdatePosition( self, blockHeader ):
+        # Add the GPS fix of blockHeader to the positionHistory,
+        # on a new position update Position and the X/Y/Z_relative
+        # of the array. Return a message of a move or GPS fault.
+        faults = self.positionHistory.faults
+        if not self.positionHistory.Add( blockHeader.utcTime,
+                                         blockHeader.gpsLatitude,
+                                         blockHeader.gpsLongitude,
+                                         blockHeader.gpsElevation ) :
+            if self.positionHistory.faults > faults :
+                return MonitorCommands.GetLocalUTC() + ' ' + self.name + \
+                       ': no GPS position in ' + self.gpsDataFile + '\n'
+            return ''
+
+        self.Position = Position( blockHeader.gpsLatitude,
+                                  blockHeader.gpsLongitude,
+                                  blockHeader.gpsElevation )
+        ArrayProcessing.SetRelativePositions(
+            self.monitor.SensorCollection.SensorDict.values(),
+            self.monitor.arrayReference )
+
+        moved = self.positionHistory.Moved()
+        if moved is None :
+            return ''
+        return MonitorCommands.GetLocalUTC() + ' ' + self.name + \
+               ': GPS position moved %.0f m\n' % moved
+
+    #-----------------------------------------------------------
+    def PollHeaderCmd( self ):
+        if self.headerPopen:
+            # Read the header records while polling
+            sp_out = MonitorCommands.PollOutput( self.headerPopen )
+
+            # None value indicates that the process hasn’t terminated yet.
+            if sp_out == None :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollHeaderCmd )
+            else:
+                # Post the return status
+                timeStr = MonitorCommands.GetLocalUTC()
+
+                if self.headerPopen.returncode != 0 :
+                    msg = timeStr + ' ' + self.name + ': Header scan' + \
+                          ' Failed.\n'
+                else:
+                    records, self.headerErrors = \
+                        HeaderScan.ParseLines( sp_out[0].decode( 'utf-8' ) )
+
+                    # The scan starts at the last file, which has grown
+                    if records :
+                        headerRecords = self.headerRecords
+                        while headerRecords and \
+                              headerRecords[-1][0] >= records[0][0] :
+                            headerRecords.pop()
+                        headerRecords.extend( records )
+                    msg = ''
+
+                self.headerStatusMsg = msg
+
+                # Add the status to the monitor.dataMessages
+                self.monitor.dataMessages = self.monitor.dataMessages + \
+                                            self.headerStatusMsg
+
+                del( self.headerPopen )
+                self.headerPopen     = None
+                self.headerPopenBusy = False
+
+    #-----------------------------------------------------------
+    def PollVerifyCmd( self ):
+        if self.verifyPopen:
+            # Read the verification results while polling
+            sp_out = MonitorCommands.PollOutput( self.verifyPopen )
+
+            # None value indicates that the process hasn’t terminated yet.
+            if sp_out == None :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollVerifyCmd )
+            else:
+                # Post the return status
+                timeStr = MonitorCommands.GetLocalUTC()
+
+                if self.verifyPopen.returncode != 0 :
+                    msg = timeStr + ' ' + self.name + ': Verify' + \
+                          ' Failed.\n'
+                    self.verifyResults = None
+                else:
+                    self.verifyResults = \
+                        UMXVerify.ParseLines( sp_out[0].decode( 'utf-8' ) )
+                    msg = ''
+
+                self.verifyStatusMsg = msg
+
+                # Add the status to the monitor.dataMessages
+                self.monitor.dataMessages = self.monitor.dataMessages + \
+                                            self.verifyStatusMsg
+
+                del( self.verifyPopen )
+                self.verifyPopen     = None
+                self.verifyPopenBusy = False
+
+    #-----------------------------------------------------------
+    def PollContinuityCmd( self ):
+        if self.continuityPopen:
+            # The listing of a sensor with many days of data is longer
+            # than a pipe holds, so read it while polling
+            sp_out = MonitorCommands.PollOutput( self.continuityPopen )
+
+            # None value indicates that the process hasn’t terminated yet.
+            if sp_out == None :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollContinuityCmd )
+            else:
+                # Post the return status
+                timeStr = MonitorCommands.GetLocalUTC()
+
+                if self.continuityPopen.returncode != 0 :
+                    msg = timeStr + ' ' + self.name + ': ls -l /data/*' + \
+                          ' Failed.\n'
+                else:
+                    # The listing of every data file on the sensor
+                    ls_lines = sp_out[0].decode("utf-8").split('\n') 
+                    self.monitor.continuity.AddListing( self.name, ls_lines,
+                                                        full = True )
+                    msg = ''
+
+                self.continuityStatusMsg = msg
+
+                # Add the status to the monitor.dataMessages
+                self.monitor.dataMessages = self.monitor.dataMessages + \
+                                            self.continuityStatusMsg
+
+                del( self.continuityPopen )
+                self.continuityPopen     = None
+                self.continuityPopenBusy = False
+
+    #-----------------------------------------------------------
+    def PollPlotCmd( self ):
+        if self.plotPopen:
+            # plotPopen is a Transfer.PullTransfer, Poll() reads the
+            # data as it arrives and returns True while running
+            if self.plotPopen.Poll() :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollPlotCmd )
+            else:
+                if self.plotPopen.returncode != 0 :
+                    msg = MonitorCommands.GetLocalUTC() + ' ' + self.name + \
+                          ': Transfer ' + self.plotPopen.remotePath + \
+                          ' Failed: ' + self.plotPopen.errorMsg + '\n'
+                    self.plotStatusMsg = msg
+                    self.monitor.msgCommand.set( msg )
+                else:
+                    MonitorCommands.GnuplotCmd( self )
+
+                del( self.plotPopen )
+                self.plotPopen     = None
+                self.plotPopenBusy = False
+
+    #-----------------------------------------------------------
+    def PollSummaryCmd( self ):
+        if self.summaryPopen:
+            # Read the binary summary while polling
+            sp_out = MonitorCommands.PollOutput( self.summaryPopen )
+
+            # None value indicates that the process hasn’t terminated yet.
+            if sp_out == None :
+                # register this function for a callback after 200 ms
+                self.monitor.Tk_root.after( 200, self.PollSummaryCmd )
+            else:
+                # Post the return status
+                timeStr = MonitorCommands.GetLocalUTC()
+
+                try :
+                    if self.summaryPopen.returncode != 0 :
+                        raise( Exception( 'returned ' + \
+                                     str( self.summaryPopen.returncode ) ) )
+                    sensorName, samplingRate, interval, runs = \
+                        UMXSummary.Decode( sp_out[0] )
+                except Exception as e :
+                    msg = timeStr + ' ' + self.name + ': Summary Failed: ' + \
+                          str( e ) + '\n'
+                    runs = None
+
+                if runs :
+                    numRecords = sum( len( records ) 
+                                      for runStart, records in runs )
+                    rawBytes   = numRecords * interval * \
+                                 UMXFile.BlockSize( samplingRate )
+                    msg = timeStr + ' ' + self.name + ': Summary of ' + \
+                          str( numRecords ) + ' x ' + str( interval ) + \
+                          ' s in ' + str( len( sp_out[0] ) ) + ' bytes (' + \
+                          str( round( rawBytes / len( sp_out[0] ) ) ) + \
+                          'x smaller than the raw data)\n'
+                    self.PlotSummary( interval, runs )
+                elif runs is not None :
+                    msg = timeStr + ' ' + self.name + \
+                          ': Summary: no data in the time range.\n'
+
+                self.summaryStatusMsg = msg
+
+                self.monitor.plotMessages = self.monitor.plotMessages + \
+                                            self.summaryStatusMsg
+                self.monitor.msgCommand.set( self.monitor.plotMessages )
+
+                del( self.summaryPopen )
+                self.summaryPopen     = None
+                self.summaryPopenBusy = False
+
+    #-----------------------------------------------------------
+    def PlotSummary( self, interval, runs ):
+        tempDir     = self.monitor.tempDir
+        dataFile    = tempDir + self.name + '_summary.dat'
+        gnuplotFile = tempDir + self.name + '_summary.plt'
+
+        UMXSummary.WriteTable( dataFile, interval, runs )
+
+        fo = open( gnuplotFile, 'w' )
+        fo.write( 'set title "' + self.name + ' summary"\n' )
+        fo.write( 'set xdata time\n' )
+        fo.write( 'set timefmt "%s"\n' )
+        fo.write( 'set format x "%H:%M"\n' )
+        fo.write( 'plot "' + dataFile + '" using 1:2 with lines title "min", ' + \
+                  '"' + dataFile + '" using 1:3 with lines title "max", ' + \
+                  '"' + dataFile + '" using 1:4 with lines title "mean", ' + \
+                  '"' + dataFile + '" using 1:5 with lines title "rms"\n' )
+        fo.close()
+
+        # Subprocess gnuplot to plot the summary
+        cmdLine = 'gnuplot ' + gnuplotFile + ' -persist'
+        subprocess.Popen( cmdLine, shell = True, stdout = subprocess.PIPE )
+
     #-----------------------------------------------------------
     def PollLogCmd( self ):
         if self.logPopen:
@@ -331,9 +741,9 @@ class NCPASensor:
                                            self.logStatusMsg
 
                 if 'Failed' in msg :
-                    self.monitor.Status.logStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.logStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.logStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.logStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.logPopen )
                 self.logPopen = None
@@ -372,9 +782,9 @@ class NCPASensor:
                                            self.logStatusMsg
 
                 if 'Failed' in logFileMsg :
-                    self.monitor.Status.logStatus = Monitor.MonitorStatus.ERROR
+                    self.monitor.Status.logStatus = MonitorCore.MonitorStatus.ERROR
                 else:
-                    self.monitor.Status.logStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.logStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.logSubCmdPopen )
                 self.logSubCmdPopen = None
@@ -411,10 +821,10 @@ class NCPASensor:
                                            self.umxStatusMsg
 
                 if 'Failed' in umxMsg :
-                    #self.monitor.Status.umxStatus = Monitor.MonitorStatus.ERROR
-                    self.monitor.Status.umxStatus = Monitor.MonitorStatus.WARN
+                    #self.monitor.Status.umxStatus = MonitorCore.MonitorStatus.ERROR
+                    self.monitor.Status.umxStatus = MonitorCore.MonitorStatus.WARN
                 else:
-                    self.monitor.Status.umxStatus = Monitor.MonitorStatus.OK
+                    self.monitor.Status.umxStatus = MonitorCore.MonitorStatus.OK
 
                 del( self.umxPopen )
                 self.umxPopen = None
@@ -453,10 +863,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.rebootStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.rebootStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.rebootPopen )
                 self.rebootPopen = None
@@ -494,10 +904,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.haltStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.haltStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.haltPopen )
                 self.haltPopen = None
@@ -538,10 +948,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.sendConfigStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.sendConfigStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.sendConfigPopen )
                 self.sendConfigPopen     = None
@@ -592,10 +1002,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.killUMXPopen )
                 self.killUMXPopen     = None
@@ -644,10 +1054,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.killUMXSubCmdPopen )
                 self.killUMXSubCmdPopen     = None
@@ -699,10 +1109,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.killUMXSubCmd2Popen )
                 self.killUMXSubCmd2Popen     = None
@@ -744,10 +1154,10 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.killUMXStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.killUMXSubCmd3Popen )
                 self.killUMXSubCmd3Popen     = None
@@ -793,15 +1203,18 @@ class NCPASensor:
 
                 if 'Failed' in msg :
                     self.monitor.Status.startUMXStatus = \
-                                        Monitor.MonitorStatus.ERROR
+                                        MonitorCore.MonitorStatus.ERROR
                 else:
                     self.monitor.Status.startUMXStatus = \
-                                        Monitor.MonitorStatus.OK
+                                        MonitorCore.MonitorStatus.OK
 
                 del( self.startUMXSchedulerPopen )
                 self.startUMXSchedulerPopen     = None
                 self.startUMXSchedulerPopenBusy = False
 
+for name in STATE :
+    setattr( NCPASensor, name, StateProperty( name, STATE[ name ] ) )
+
 #---------------------------------------------------------
 # SensorCollection has a dictionary of NCPASensor objects
 #---------------------------------------------------------
@@ -810,6 +1223,8 @@ class SensorCollection:
         self.monitor    = monitor
         self.sensorFile = monitor.sensorFile # from -f command line
         self.SensorDict = {}
+        self.records    = {}     # Sensors.txt fields by SensorDict key
+        self.inventory  = None   # SensorFile.Inventory of sensorFile
         # OpenFile() in the gui menubar will call NewFile() 
         # which will populate the SensorDict from a file.
 
@@ -824,216 +1239,120 @@ class SensorCollection:
 
     #----------------------------------------------------- 
     def NewFile( self, sensorFile ):
-        # sensorFile is from filedialog.askopenfilename in FileOpen
-        # or the -f command line option 
+        # sensorFile is from filedialog.askopenfilename in FileOpen,
+        # the -f command line option or a change of the file.
+        # Return the SensorDict keys added, removed and changed.
         self.sensorFile = str( sensorFile )
-        del( self.SensorDict )
-        self.SensorDict = {}
-        # Populate the SensorDict from the sensorFile
-        self.CreateSensorsFromFile()
+        # Update the SensorDict from the sensorFile
+        return self.CreateSensorsFromFile()
 
     #----------------------------------------------------- 
-    def ValidIPAddress( self, IPAddress ) :
-        # Verify a reasonable IP as a.b.c.d 
-        digits = IPAddress.split( '.' )
-        if len( digits ) != 4 :
+    def InventoryChanged( self ):
+        # True if the sensorFile or one of its includes has a new
+        # size or mtime since it was read
+        if not self.inventory :
             return False
-        
-        # Every field must have at least one digit
-        for digit in digits :
-            if not digit :
-                return False
+        for path, size, mtime, md5 in self.inventory.files :
+            try :
+                stat = os.stat( path )
+            except OSError :
+                return True
+            if stat.st_size != size or stat.st_mtime_ns != mtime :
+                return True
+        return False
 
-        # Digits must be > 0 and < 256
-        for digit in digits :
-            val = int( digit ) 
-            if val < 1 or val > 255 :
-                return False
+    #----------------------------------------------------- 
+    def UpdateSensor( self, sensor, record ):
+        # New Sensors.txt fields of a sensor, its Popens, busy flags
+        # and history are kept and the next commands use the fields
+        sensor.SetFields( *( record[ : 8 ] +
+                             ( SensorFile.Tags( record[8] ), ) ) )
 
-        return True
+    #----------------------------------------------------- 
+    def ValidIPAddress( self, IPAddress ) :
+        # Verify a reasonable IP as a.b.c.d 
+        return SensorFile.ValidIP( IPAddress )
 
     #----------------------------------------------------- 
     def CreateSensorsFromFile( self ):
         global DEBUG 
         DEBUG = self.monitor.args.verbose
 
-        # Read the sensorFile
-        fi    = open( self.sensorFile, 'r' )
-        lines = fi.readlines()
-        fi.close()
-        numLines = len( lines )
-
-        # Process the sensorFile
-        # The delimeters are: Sensor { ... }
-        # with fields: IP = xxx, ConfigInPath = xxx, ConfigInFile...
-        # For now we assume that parameter entries are on separate lines.
-        Done      = False
-        newSensor = False
-        i         = 0
-        msg       = ''
-
-        while not Done :
-            if i >= numLines - 1 :
-                break
-
-            line = lines[ i ]
-
-            if '#' in line :
-                # treat this line as a comment
-                i = i + 1
-                continue
-
-            if '{' in line :
-                newSensor = True
-
-                # allow { on the same line as a parameter field
-                line = line.split( '{' )[1]
-
-                IP            = ''
-                ConfigInPath  = ''
-                ConfigInFile  = ''
-                ConfigOutPath = ''
-                ConfigOutFile = ''
-                UMXStart      = ''
-
-                while newSensor :
-                    if '#' in line :
-                        # treat this line as a comment
-                        i = i + 1
-                        if i >= numLines - 1 :
-                            break
-                        line = lines[ i ]
-                        continue
-
-                    if '}' in line :
-                        # allow } on the same line as a parameter field
-                        line = line.split( '}' )[0]
-                        newSensor = False
-
-                    if 'IP' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + MonitorCommands.GetLocalUTC() + \
-                                  ' ERROR: Malformed IP: ' + line + '\n'
-                            break
-                        IP = words[1].split()[0]
-
-                    elif 'ConfigInPath' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + MonitorCommands.GetLocalUTC() + \
-                                  ' ERROR: Malformed ConfigInPath: ' + \
-                                  line + '\n'
-                            break
-                        ConfigInPath = words[1].split()[0]
-
-                    elif 'ConfigInFile' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + MonitorCommands.GetLocalUTC() + \
-                                  ' ERROR: Malformed ConfigInFile: ' + \
-                                  line + '\n'
-                            break
-                        ConfigInFile = words[1].split()[0]
-
-                    elif 'ConfigOutPath' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + MonitorCommands.GetLocalUTC() + \
-                                  ' ERROR: Malformed ConfigOutPath: ' + \
-                                  line + '\n'
-                            break
-                        ConfigOutPath = words[1].split()[0]
-
-                    elif 'ConfigOutFile' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + ' ERROR: Malformed ConfigOutFile: ' + \
-                                  line + '\n'
-                            break
-                        ConfigOutFile = words[1].split()[0]
-
-                    elif 'UMXStart' in line :
-                        words = line.split('=')
-                        if len( words ) != 2 :
-                            msg = msg + MonitorCommands.GetLocalUTC() + \
-                                  ' ERROR: Malformed UMXStart: ' + \
-                                  line + '\n'
-                            break
-                        UMXStart = words[1].split()[0]
-
-                    if newSensor:
-                        i = i + 1
-                        if i >= numLines - 1 :
-                            break
-                        line = lines[ i ]
-
-                # END: while newSensor :
-
-                if not IP:
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse IP\n'
-                    continue
-                if not ConfigInPath:
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse ConfigInPath' + \
-                          ' for sensor ' + IP + '\n'
-                    continue
-                if not ConfigInFile:
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse ConfigInFile' + \
-                          ' for sensor ' + IP + '\n'
-                    continue
-                if not ConfigOutPath:
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse ConfigOutPath' + \
-                          ' for sensor ' + IP + '\n'
-                    continue
-                if not ConfigOutFile:
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse ConfigOutFile' + \
-                          ' for sensor ' + IP  + '\n'
-                    continue
-                if not UMXStart :
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Failed to parse UMXStart ' + \
-                          ' for sensor ' + IP  + '\n'
-                    continue
-
-                if not self.ValidIPAddress( IP ) :
-                    msg = msg + MonitorCommands.GetLocalUTC() + \
-                          ' ERROR: Malformed IP: ' + IP + ' from file: ' + \
-                          self.sensorFile + '\n'
-                    continue
-                                
-                sensorName = IP[ IP.rfind('.') + 1 : ]
-                sensor = NCPASensor( monitor         = self.monitor,
-                                     SN              = sensorName, 
-                                     IP              = IP, 
-                                     configInPath    = ConfigInPath,
-                                     configInFile    = ConfigInFile,
-                                     configOutPath   = ConfigOutPath,
-                                     configOutFile   = ConfigOutFile,
-                                     UMXSchedulerCmd = UMXStart )
-
-                self.SensorDict[ sensorName ] = sensor
+        # Parse the sensorFile and its includes, see SensorFile.py
+        # for the format. The errors are file:line:column: located,
+        # the good Sensor blocks are created.
+        msg = ''
+        inventory = SensorFile.Load( self.sensorFile,
+                                     subnet = self.monitor.args.subnet )
+        for error in inventory.errors :
+            msg = msg + MonitorCommands.GetLocalUTC() + \
+                  ' ERROR: ' + error + '\n'
 
-                i = i + 1
+        # A missing, unreadable or half-written sensorFile is not an
+        # empty inventory, the sensors are kept until a good read.
+        # The old inventory stays, so the next change is read again.
+        if self.SensorDict and \
+           ( not inventory.files or not inventory.records ) :
+            msg = msg + MonitorCommands.GetLocalUTC() + \
+                  ' ERROR: no sensors read from ' + self.sensorFile + \
+                  ', kept the ' + str( len( self.SensorDict ) ) + ' sensors.'
+            self.monitor.msgCommand.set( msg )
+            if DEBUG:
+                print( msg )
+            return [], [], []
+
+        records = {}
+        for record in inventory.records :
+            records[ SensorFile.Key( record, self.monitor.args.subnet ) ] = \
+                record[ : -1 ]
+
+        # Only the sensors added, removed or changed since the last
+        # read are touched, the others keep running
+        added   = []
+        removed = []
+        changed = []
+        for sensorName in list( self.SensorDict.keys() ) :
+            if sensorName not in records :
+                self.SensorDict[ sensorName ].KillCommands()
+                del( self.SensorDict[ sensorName ] )
+                removed.append( sensorName )
+
+        for sensorName in records :
+            IP, ConfigInPath, ConfigInFile, ConfigOutPath, ConfigOutFile, \
+                UMXStart, Uplink, Group, Tags, Name = records[ sensorName ]
+
+            if sensorName in self.SensorDict :
+                if records[ sensorName ] != self.records.get( sensorName ) :
+                    self.UpdateSensor( self.SensorDict[ sensorName ],
+                                       records[ sensorName ] )
+                    changed.append( sensorName )
+                continue
 
-            # END: if '{' in line :
+            sensor = NCPASensor( monitor         = self.monitor,
+                                 SN              = sensorName, 
+                                 IP              = IP, 
+                                 configInPath    = ConfigInPath,
+                                 configInFile    = ConfigInFile,
+                                 configOutPath   = ConfigOutPath,
+                                 configOutFile   = ConfigOutFile,
+                                 UMXSchedulerCmd = UMXStart,
+                                 uplink          = Uplink,
+                                 group           = Group,
+                                 tags            = SensorFile.Tags( Tags ) )
 
-            else :
-                i = i + 1
-                
-            if i >= numLines - 1 :
-                Done = True
+            self.SensorDict[ sensorName ] = sensor
+            added.append( sensorName )
 
-        # END: while not Done :
+        self.records   = records
+        self.inventory = inventory
 
         # Report results
         msg = msg + MonitorCommands.GetLocalUTC() + \
-              ' Read ' + str( numLines ) + ' lines from ' + \
-              self.sensorFile + ' created ' + \
+              ' Read ' + str( inventory.lines ) + ' lines from ' + \
+              self.sensorFile + ( ' (cached)' if inventory.cached else '' ) + \
+              ' added ' + str( len( added ) ) + \
+              ' removed ' + str( len( removed ) ) + \
+              ' changed ' + str( len( changed ) ) + ', ' + \
               str( len( self.SensorDict ) ) + ' sensors.'
 
         self.monitor.msgCommand.set( msg )
@@ -1042,6 +1361,8 @@ class SensorCollection:
             print( self.SensorDict.keys() )
             print( msg )
 
+        return added, removed, changed
+
     #----------------------------------------------------- 
     def CreateSensorsFromCmd( self ):
         global DEBUG 
@@ -0,0 +1,479 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     NoiseAnalysis.py
+# Purpose:  Welch power spectral densities of NCPA sensor data
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./NoiseAnalysis.py -b 2026-10-19T00:00:00 -e 2026-10-19T06:00:00
+#                    -c ../configFiles/SN056_UMSX1.4.cfg
+#                    -n noiseModel.txt /archive/SN056 /archive/SN106
+#
+# Each directory (or file) argument is one sensor. The PSD of each
+# sensor is written to <outPath>/<sensor>_psd.dat as
+# frequency (Hz), PSD (dB re 1 Pa^2/Hz).
+#
+# A noise model file has two columns: frequency (Hz) and the
+# model PSD (dB re 1 Pa^2/Hz), '#' starts a comment.
+#------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import os
+import subprocess
+
+import numpy as np
+
+import MonitorCommands
+import Transfer
+import UMXData
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+SEGMENT_LENGTH  = 4096  # Samples per Welch segment, ~33 s at 125 Hz
+SEGMENT_OVERLAP = 0.5
+FILES_PER_TASK  = 12    # One hour of 300 s files per process pool task
+
+#---------------------------------------------------------------
+def StackSegments( samples, segmentLength, step ) :
+    # The overlapping Welch segments of samples as rows of a 2D view
+    if len( samples ) < segmentLength :
+        return np.empty( ( 0, segmentLength ) )
+
+    windows = np.lib.stride_tricks.sliding_window_view( samples,
+                                                        segmentLength )
+    return windows[ : : step ]
+
+#---------------------------------------------------------------
+def PeriodogramSums( segments, owners, numOwners ) :
+    # Sum the Hann windowed periodograms of the rows of segments
+    # into one row per owner. owners must be sorted. All segments,
+    # of all the sensors, are transformed with a single rfft.
+    window  = np.hanning( segments.shape[1] )
+    x       = segments - segments.mean( axis = 1, keepdims = True )
+    spectra = np.fft.rfft( x * window, axis = 1 )
+    power   = spectra.real**2 + spectra.imag**2
+
+    counts = np.bincount( owners, minlength = numOwners )
+    starts = np.concatenate( ( [0], np.cumsum( counts )[ : -1 ] ) )
+    sums   = np.zeros( ( numOwners, power.shape[1] ) )
+
+    hasSegments = counts > 0
+    if hasSegments.any() :
+        sums[ hasSegments ] = np.add.reduceat( power,
+                                               starts[ hasSegments ], axis = 0 )
+    return sums, counts
+
+#---------------------------------------------------------------
+def PSDTask( task ) :
+    # Process pool worker. task is ( items, startTime, stopTime,
+    # segmentLength ) with items a list of ( key, fileName ).
+    # Return the partial Welch sums by key, and error messages.
+    items, startTime, stopTime, segmentLength = task
+    step = max( int( segmentLength * ( 1. - SEGMENT_OVERLAP ) ), 1 )
+
+    keys     = sorted( set( key for key, fileName in items ) )
+    info     = {}
+    segments = []
+    owners   = []
+    errors   = []
+
+    for owner, key in enumerate( keys ) :
+        for itemKey, fileName in items :
+            if itemKey != key :
+                continue
+            try :
+                fileHeader, runs = UMXData.ReadRuns( fileName,
+                                                     startTime, stopTime )
+            except Exception as e :
+                errors.append( key + ': ' + fileName + ': ' + str( e ) )
+                continue
+
+            info[ key ] = ( fileHeader.samplingRate,
+                            fileHeader.calibrationLevel )
+
+            for runStart, samples in runs :
+                rows = StackSegments( samples.astype( np.float64 ),
+                                      segmentLength, step )
+                segments.append( rows )
+                owners.append( np.full( len( rows ), owner ) )
+
+    results = {}
+    if not segments :
+        return results, errors
+
+    sums, counts = PeriodogramSums( np.concatenate( segments ),
+                                    np.concatenate( owners ), len( keys ) )
+
+    for owner, key in enumerate( keys ) :
+        if key in info :
+            samplingRate, calibrationLevel = info[ key ]
+            results[ key ] = [ samplingRate, calibrationLevel,
+                               sums[ owner ], counts[ owner ] ]
+    return results, errors
+
+#---------------------------------------------------------------
+def SubmitPSD( pool, fileLists, startTime, stopTime,
+               segmentLength = SEGMENT_LENGTH ) :
+    # Split the files { key : [ fileName ] } into process pool tasks.
+    # Each task holds FILES_PER_TASK files, of one or more sensors.
+    items = []
+    for key in sorted( fileLists.keys() ) :
+        for fileName in fileLists[ key ] :
+            items.append( ( key, fileName ) )
+
+    futures = []
+    for i in range( 0, len( items ), FILES_PER_TASK ) :
+        task = ( items[ i : i + FILES_PER_TASK ], startTime, stopTime,
+                 segmentLength )
+        futures.append( pool.submit( PSDTask, task ) )
+
+    return futures
+
+#---------------------------------------------------------------
+def CombinePSD( taskResults, calibrationLevels,
+                segmentLength = SEGMENT_LENGTH ) :
+    # Merge the PSDTask results into { key : ( freqs, psd, units ) }.
+    # The calibrationLevel from the sensor config has priority over
+    # the one in the UMX file header.
+    window = np.hanning( segmentLength )
+    merged = {}
+    errors = []
+
+    for results, taskErrors in taskResults :
+        errors.extend( taskErrors )
+        for key in results :
+            samplingRate, calibrationLevel, sums, count = results[ key ]
+            if key in merged :
+                merged[ key ][2] = merged[ key ][2] + sums
+                merged[ key ][3] = merged[ key ][3] + count
+            else :
+                merged[ key ] = [ samplingRate, calibrationLevel, sums, count ]
+
+    psds = {}
+    for key in merged :
+        samplingRate, fileCalibration, sums, count = merged[ key ]
+        if count == 0 :
+            errors.append( key + ': less than ' + str( segmentLength ) + \
+                           ' contiguous samples.' )
+            continue
+
+        # One sided PSD density scaling, DC and Nyquist are not doubled
+        psd = 2. * sums / ( count * samplingRate * np.sum( window**2 ) )
+        psd[0] = psd[0] / 2.
+        if segmentLength % 2 == 0 :
+            psd[-1] = psd[-1] / 2.
+
+        level = calibrationLevels.get( key ) or fileCalibration
+        scale = UMXData.CountsToPascal( level ) if level else None
+        if scale :
+            psd   = psd * scale**2
+            units = 'Pa^2/Hz'
+        else :
+            errors.append( key + ': invalid calibrationLevel ' + \
+                           repr( level ) + ', PSD is in counts^2/Hz.' )
+            units = 'counts^2/Hz'
+
+        freqs = np.fft.rfftfreq( segmentLength, 1. / samplingRate )
+        psds[ key ] = ( freqs, psd, units )
+
+    return psds, errors
+
+#---------------------------------------------------------------
+def WelchPSD( fileLists, startTime, stopTime, calibrationLevels,
+              pool = None, segmentLength = SEGMENT_LENGTH ) :
+    # Welch PSDs of { key : [ fileName ] } between startTime and
+    # stopTime, spread over pool (a concurrent.futures executor)
+    executor = pool or concurrent.futures.ProcessPoolExecutor()
+    futures  = SubmitPSD( executor, fileLists, startTime, stopTime,
+                          segmentLength )
+    taskResults = [ future.result() for future in futures ]
+    if not pool :
+        executor.shutdown()
+
+    return CombinePSD( taskResults, calibrationLevels, segmentLength )
+
+#---------------------------------------------------------------
+def LoadNoiseModel( fileName ) :
+    # Return the model ( freqs, dB ) from a two column text file
+    model = np.loadtxt( fileName, comments = '#', ndmin = 2 )
+    order = np.argsort( model[ :, 0 ] )
+    return model[ order, 0 ], model[ order, 1 ]
+
+#---------------------------------------------------------------
+def CompareNoiseModel( freqs, psd, noiseModel ) :
+    # Compare a PSD with a noise model over the model frequency band.
+    # Return the fraction of the band above the model, the largest
+    # excess in dB and the frequency of the largest excess.
+    modelFreqs, modelDB = noiseModel
+    inBand = ( freqs >= modelFreqs[0] ) & ( freqs <= modelFreqs[-1] ) & \
+             ( freqs > 0. )
+    if not inBand.any() :
+        return None
+
+    model  = np.interp( np.log10( freqs[ inBand ] ),
+                        np.log10( modelFreqs ), modelDB )
+    excess = 10. * np.log10( np.maximum( psd[ inBand ], 1e-300 ) ) - model
+    worst  = np.argmax( excess )
+
+    return np.mean( excess > 0. ), excess[ worst ], freqs[ inBand ][ worst ]
+
+#---------------------------------------------------------------
+def WritePSD( fileName, freqs, psd ) :
+    # Two columns: frequency, PSD in dB
+    table = np.column_stack( ( freqs[ 1 : ],
+                 10. * np.log10( np.maximum( psd[ 1 : ], 1e-300 ) ) ) )
+    np.savetxt( fileName, table, fmt = '%.6g' )
+
+#---------------------------------------------------------------
+def ModelMessage( key, freqs, psd, noiseModel ) :
+    comparison = CompareNoiseModel( freqs, psd, noiseModel )
+    if not comparison :
+        return key + ': no overlap with the noise model band.'
+
+    fraction, excess, freq = comparison
+    return key + ': ' + str( round( 100. * fraction ) ) + \
+           '% of the noise model band above the model, max ' + \
+           '%+.1f dB at %.3g Hz.' % ( excess, freq )
+
+#---------------------------------------------------------
+# PSD of the current data file of the selected sensors,
+# driven from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class PSDJob:
+    def __init__( self, monitor, keys ):
+        self.monitor  = monitor
+        self.fetch    = {}   # scp Popen by sensor key
+        self.files    = {}   # [ local UMX file ] by sensor key
+        self.levels   = {}   # calibrationLevel by sensor key
+        self.futures  = []
+        self.messages = ''
+
+        for key in keys :
+            sensor = monitor.SensorCollection.SensorDict[ key ]
+
+            if not sensor.firstDataFile :
+                self.messages = self.messages + \
+                    MonitorCommands.GetLocalUTC() + ' ' + sensor.name + \
+                    ': PSD Failed: no data file, turn on Data polling.\n'
+                continue
+
+            localFile = monitor.tempDir + sensor.name + '_psd.umx'
+            self.files [ key ] = [ localFile ]
+            self.levels[ key ] = UMXData.ConfigCalibrationLevel(
+                                   sensor.configInPath + sensor.configInFile )
+            self.fetch [ key ] = \
+                Transfer.PullTransfer( sensor, '/data/' + sensor.firstDataDir +
+                                       '/' + sensor.firstDataFile, localFile )
+
+        monitor.msgCommand.set( self.messages )
+        monitor.Tk_root.after( 200, self.PollFetch )
+
+    #-----------------------------------------------------------
+    def PollFetch( self ):
+        # Poll() every transfer so that they all keep reading
+        running = [ key for key in self.fetch if self.fetch[ key ].Poll() ]
+        if running :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.PollFetch )
+            return
+
+        for key in list( self.fetch.keys() ) :
+            if self.fetch[ key ].returncode != 0 :
+                self.messages = self.messages + \
+                    MonitorCommands.GetLocalUTC() + ' ' + key + \
+                    ': PSD transfer Failed.\n'
+                del( self.files[ key ] )
+        self.fetch = {}
+
+        if not self.files :
+            self.monitor.msgCommand.set( self.messages )
+            return
+
+        self.futures = SubmitPSD( self.monitor.GetProcessPool(),
+                                  self.files, None, None )
+        self.monitor.Tk_root.after( 200, self.PollPSD )
+
+    #-----------------------------------------------------------
+    def PollPSD( self ):
+        if not all( future.done() for future in self.futures ) :
+            self.monitor.Tk_root.after( 200, self.PollPSD )
+            return
+
+        try :
+            psds, errors = CombinePSD( [ future.result()
+                                         for future in self.futures ],
+                                       self.levels )
+        except Exception as e :
+            psds   = {}
+            errors = [ 'PSD Failed: ' + str( e ) ]
+
+        for error in errors :
+            self.messages = self.messages + \
+                            MonitorCommands.GetLocalUTC() + ' ' + error + '\n'
+
+        noiseModel = None
+        if self.monitor.args.noiseModel :
+            try :
+                noiseModel = LoadNoiseModel( self.monitor.args.noiseModel )
+            except Exception as e :
+                self.messages = self.messages + \
+                    MonitorCommands.GetLocalUTC() + ' Noise model ' + \
+                    self.monitor.args.noiseModel + ' Failed: ' + \
+                    str( e ) + '\n'
+
+        plots = []
+        for key in sorted( psds.keys() ) :
+            freqs, psd, units = psds[ key ]
+            dataFile = self.monitor.tempDir + key + '_psd.dat'
+            WritePSD( dataFile, freqs, psd )
+            plots.append( '"' + dataFile + '" using 1:2 with lines title "' + \
+                          key + ' ' + units + '"' )
+
+            if noiseModel :
+                self.messages = self.messages + \
+                    MonitorCommands.GetLocalUTC() + ' ' + \
+                    ModelMessage( key, freqs, psd, noiseModel ) + '\n'
+
+        if noiseModel :
+            plots.append( '"' + self.monitor.args.noiseModel + \
+                          '" using 1:2 with lines dashtype 2 ' + \
+                          'title "noise model"' )
+
+        if plots :
+            PlotPSD( self.monitor.tempDir + 'psd_gnuplot.plt', plots )
+            self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                ' Plotting PSD of ' + ', '.join( sorted( psds.keys() ) ) + '\n'
+
+        self.monitor.msgCommand.set( self.messages )
+
+#---------------------------------------------------------------
+def PlotPSD( gnuplotFile, plots ) :
+    fo = open( gnuplotFile, 'w' )
+    fo.write( 'set logscale x\n' )
+    fo.write( 'set xlabel "Frequency (Hz)"\n' )
+    fo.write( 'set ylabel "PSD (dB)"\n' )
+    fo.write( 'plot ' + ', '.join( plots ) + '\n' )
+    fo.close()
+
+    # Subprocess gnuplot to plot the PSDs
+    cmdLine = 'gnuplot ' + gnuplotFile + ' -persist'
+    subprocess.Popen( cmdLine, shell = True, stdout = subprocess.PIPE )
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    startTime = UMXFile.ParseUTC( args.begin ) if args.begin else None
+    stopTime  = UMXFile.ParseUTC( args.end   ) if args.end   else None
+
+    level = args.calibrationLevel
+    if not level and args.configFile :
+        level = UMXData.ConfigCalibrationLevel( args.configFile )
+
+    fileLists = {}
+    levels    = {}
+    for path in args.paths :
+        key = os.path.basename( os.path.normpath( path ) )
+        if os.path.isdir( path ) :
+            fileNames = []
+            for root, dirs, files in os.walk( path ) :
+                fileNames.extend( os.path.join( root, f ) for f in files )
+            fileLists[ key ] = UMXFile.SelectFiles( fileNames,
+                                                    startTime, stopTime )
+        else :
+            fileLists[ key ] = [ path ]
+        levels[ key ] = level
+
+    executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+    psds, errors = WelchPSD( fileLists, startTime, stopTime, levels,
+                             executor, args.segmentLength )
+    executor.shutdown()
+
+    for error in errors :
+        print( error )
+
+    noiseModel = LoadNoiseModel( args.noiseModel ) if args.noiseModel \
+                 else None
+
+    for key in sorted( psds.keys() ) :
+        freqs, psd, units = psds[ key ]
+        dataFile = os.path.join( args.outPath, key + '_psd.dat' )
+        WritePSD( dataFile, freqs, psd )
+        print( key + ': ' + units + ' written to ' + dataFile )
+        if noiseModel :
+            print( ModelMessage( key, freqs, psd, noiseModel ) )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA Sensor PSD' )
+
+    parser.add_argument('paths', nargs = '+',
+                        help = 'UMX file or directory for each sensor.')
+
+    parser.add_argument('-b', '--begin',
+                        dest   = 'begin', type = str,
+                        action = 'store', default = '',
+                        help = 'Start UTC (2026-10-19T00:00:00).')
+
+    parser.add_argument('-e', '--end',
+                        dest   = 'end', type = str,
+                        action = 'store', default = '',
+                        help = 'End UTC (2026-10-19T06:00:00).')
+
+    parser.add_argument('-c', '--configFile',
+                        dest   = 'configFile', type = str,
+                        action = 'store', default = '',
+                        help = 'Sensor .cfg file for the calibrationLevel.')
+
+    parser.add_argument('-k', '--calibrationLevel',
+                        dest   = 'calibrationLevel', type = str,
+                        action = 'store', default = '',
+                        help = 'Sensor calibrationLevel (20mv/Pa).')
+
+    parser.add_argument('-n', '--noiseModel',
+                        dest   = 'noiseModel', type = str,
+                        action = 'store', default = '',
+                        help = 'Noise model file: Hz, dB re 1 Pa^2/Hz.')
+
+    parser.add_argument('-o', '--outPath',
+                        dest   = 'outPath', type = str,
+                        action = 'store', default = './',
+                        help = 'Output directory (./).')
+
+    parser.add_argument('-L', '--segmentLength',
+                        dest   = 'segmentLength', type = int,
+                        action = 'store', default = SEGMENT_LENGTH,
+                        help = 'Welch segment length (4096 samples).')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = None,
+                        help = 'Number of worker processes (all cores).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     Pyramid.py
+# Purpose:  Multi-resolution min/max tiles of archived NCPA sensor data
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./Pyramid.py -P ~/SensorPyramid ~/SensorArchive/SN056 ~/SensorArchive/SN106
+#
+# Each directory argument is one sensor, named by the directory.
+#
+# For every level the time axis is cut into bins of LEVELS[ level ]
+# seconds from the epoch, the min and max ADC count of each bin are
+# kept in tiles of TILE_BINS bins:
+#   <pyramidPath>/<sensor>/L<level>/<tile index>.npy
+# a ( TILE_BINS, 2 ) int32 array of min, max. Bins without data hold
+# EMPTY_MIN, EMPTY_MAX. Since min & max can be merged in any order a
+# file is added by merging its bins into the tiles, and a file that
+# has grown since it was added is simply merged again.
+# <pyramidPath>/<sensor>/built.json records the size and mtime of
+# the files already merged.
+#
+# Views are drawn from the level whose bins are just narrower than
+# a pixel, reading the tiles through np.load( mmap_mode = 'r' ).
+#------------------------------------------------------------------
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+import MonitorCommands
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+SUB_BINS       = 5                                  # level 0 bins per block
+LEVELS         = [ 1. / SUB_BINS, 1., 10., 60., 600., 3600. ] # bin seconds
+TILE_BINS      = 4096
+EMPTY_MIN      = np.iinfo( np.int32 ).max
+EMPTY_MAX      = np.iinfo( np.int32 ).min
+MAX_OPEN_TILES = 256   # Memory-mapped tiles kept open by a PyramidReader
+STATE_FILE     = 'built.json'
+
+#---------------------------------------------------------------
+def BinIndex( t, level ) :
+    # Bin of level holding time t (seconds since the epoch)
+    bins = np.floor( np.asarray( t ) / LEVELS[ level ] + 1e-6 )
+    return bins.astype( np.int64 )
+
+#---------------------------------------------------------------
+def TileFile( sensorPath, level, tile ) :
+    return os.path.join( sensorPath, 'L' + str( level ), str( tile ) + '.npy' )
+
+#---------------------------------------------------------------
+def FileMinMax( fileName ) :
+    # Return the block times and the ( blocks, SUB_BINS ) min and
+    # max of a UMX file, reading one block at a time
+    fileHeader, blocks = UMXFile.IterFile( fileName )
+    rate    = fileHeader.samplingRate
+    offsets = ( np.arange( SUB_BINS ) * rate ) // SUB_BINS
+
+    times = []
+    mins  = []
+    maxs  = []
+    for blockHeader, samples in blocks :
+        samples = np.frombuffer( samples, dtype = np.int32 )
+        times.append( blockHeader.utcTime )
+        mins.append( np.minimum.reduceat( samples, offsets ) )
+        maxs.append( np.maximum.reduceat( samples, offsets ) )
+
+    if not times :
+        return None
+    return np.array( times ), np.array( mins ), np.array( maxs )
+
+#---------------------------------------------------------------
+def MergeBins( sensorPath, level, bins, mins, maxs ) :
+    # Merge the min & max of bins into the tiles of level
+    tiles = bins // TILE_BINS
+    for tile in np.unique( tiles ) :
+        tileFile = TileFile( sensorPath, level, tile )
+        if not os.path.exists( tileFile ) :
+            # Create complete before it is visible to readers
+            os.makedirs( os.path.dirname( tileFile ), exist_ok = True )
+            tempFile = tileFile + '.tmp.npy'
+            empty = np.lib.format.open_memmap( tempFile, mode = 'w+',
+                        dtype = np.int32, shape = ( TILE_BINS, 2 ) )
+            empty[ :, 0 ] = EMPTY_MIN
+            empty[ :, 1 ] = EMPTY_MAX
+            empty.flush()
+            del( empty )
+            os.replace( tempFile, tileFile )
+
+        inTile = tiles == tile
+        offset = bins[ inTile ] - tile * TILE_BINS
+
+        # Updated in place, so open memory maps of readers see it
+        data = np.lib.format.open_memmap( tileFile, mode = 'r+' )
+        np.minimum.at( data[ :, 0 ], offset, mins[ inTile ] )
+        np.maximum.at( data[ :, 1 ], offset, maxs[ inTile ] )
+        data.flush()
+        del( data )
+
+#---------------------------------------------------------------
+def AddFile( sensorPath, fileName ) :
+    # Merge one UMX file into every level, return the blocks added
+    minMax = FileMinMax( fileName )
+    if not minMax :
+        return 0
+    times, mins, maxs = minMax
+
+    # Level 0 from the sub-block bins
+    bins = ( BinIndex( times, 0 )[ :, None ] +
+             np.arange( SUB_BINS ) ).ravel()
+    MergeBins( sensorPath, 0, bins, mins.ravel(), maxs.ravel() )
+
+    # The coarser levels from the block min & max
+    blockMins = mins.min( axis = 1 )
+    blockMaxs = maxs.max( axis = 1 )
+    for level in range( 1, len( LEVELS ) ) :
+        MergeBins( sensorPath, level, BinIndex( times, level ),
+                   blockMins, blockMaxs )
+
+    return len( times )
+
+#---------------------------------------------------------------
+def BuildSensor( pyramidPath, sensorName, fileNames ) :
+    # Add the new and grown files of a sensor to its pyramid, runs
+    # in the worker processes, one task per sensor at a time.
+    # Return ( sensorName, files added, [ error messages ] )
+    sensorPath = os.path.join( pyramidPath, sensorName )
+    stateFile  = os.path.join( sensorPath, STATE_FILE )
+    os.makedirs( sensorPath, exist_ok = True )
+
+    state = {}
+    if os.path.exists( stateFile ) :
+        fi = open( stateFile, 'r' )
+        state = json.load( fi )
+        fi.close()
+
+    added  = 0
+    errors = []
+    for fileName in fileNames :
+        key    = os.path.basename( fileName )
+        status = os.stat( fileName )
+        stamp  = [ status.st_size, status.st_mtime ]
+        if state.get( key ) == stamp :
+            continue
+
+        try :
+            AddFile( sensorPath, fileName )
+        except Exception as e :
+            errors.append( sensorName + ': ' + fileName + ': ' + str( e ) )
+            continue
+
+        state[ key ] = stamp
+        added = added + 1
+
+    if added :
+        fo = open( stateFile + '.tmp', 'w' )
+        json.dump( state, fo )
+        fo.close()
+        os.replace( stateFile + '.tmp', stateFile )
+
+    return sensorName, added, errors
+
+#---------------------------------------------------------------
+def ArchiveFiles( path ) :
+    # The UMX files under path in time order
+    fileNames = []
+    for root, dirs, files in os.walk( path ) :
+        fileNames.extend( os.path.join( root, f ) for f in files )
+    return UMXFile.SelectFiles( fileNames, None, None )
+
+#---------------------------------------------------------------
+def ChooseLevel( startTime, stopTime, pixels ) :
+    # The coarsest level with at least one bin per pixel
+    span = stopTime - startTime
+    for level in range( len( LEVELS ) - 1, -1, -1 ) :
+        if span / LEVELS[ level ] >= pixels :
+            return level
+    return 0
+
+#---------------------------------------------------------
+# Read access to the pyramids of all sensors, keeping the
+# most recently used tiles memory mapped
+#---------------------------------------------------------
+class PyramidReader:
+    def __init__( self, pyramidPath ):
+        self.pyramidPath = pyramidPath
+        self.tiles       = collections.OrderedDict()
+
+    #-----------------------------------------------------------
+    def Tile( self, sensorName, level, tile ):
+        key = ( sensorName, level, tile )
+        if key in self.tiles :
+            self.tiles.move_to_end( key )
+            return self.tiles[ key ]
+
+        tileFile = TileFile( os.path.join( self.pyramidPath, sensorName ),
+                             level, tile )
+        if not os.path.exists( tileFile ) :
+            # Not cached, the tile may be built later
+            return None
+
+        self.tiles[ key ] = np.load( tileFile, mmap_mode = 'r' )
+        if len( self.tiles ) > MAX_OPEN_TILES :
+            self.tiles.popitem( last = False )
+        return self.tiles[ key ]
+
+    #-----------------------------------------------------------
+    def Query( self, sensorName, startTime, stopTime, level ):
+        # Return the bin start times and float min & max of level
+        # from startTime to stopTime, NaN where there is no data
+        first = int( BinIndex( startTime, level ) )
+        last  = int( BinIndex( stopTime,  level ) ) + 1
+        mins  = np.full( last - first, np.nan )
+        maxs  = np.full( last - first, np.nan )
+
+        for tile in range( first // TILE_BINS, ( last - 1 ) // TILE_BINS + 1 ) :
+            data = self.Tile( sensorName, level, tile )
+            if data is None :
+                continue
+            lo = max( first, tile * TILE_BINS )
+            hi = min( last,  ( tile + 1 ) * TILE_BINS )
+            mins[ lo - first : hi - first ] = \
+                data[ lo - tile * TILE_BINS : hi - tile * TILE_BINS, 0 ]
+            maxs[ lo - first : hi - first ] = \
+                data[ lo - tile * TILE_BINS : hi - tile * TILE_BINS, 1 ]
+
+        empty = maxs < mins
+        mins[ empty ] = np.nan
+        maxs[ empty ] = np.nan
+
+        times = np.arange( first, last ) * LEVELS[ level ]
+        return times, mins, maxs
+
+    #-----------------------------------------------------------
+    def Extent( self, sensorName ):
+        # ( first, last ) time with data, from the coarsest level,
+        # or None before anything is built
+        level    = len( LEVELS ) - 1
+        levelDir = os.path.dirname( TileFile( os.path.join(
+                       self.pyramidPath, sensorName ), level, 0 ) )
+        if not os.path.isdir( levelDir ) :
+            return None
+
+        tiles = sorted( int( f[ : -4 ] ) for f in os.listdir( levelDir )
+                        if f.endswith( '.npy' ) and '.tmp' not in f )
+        if not tiles :
+            return None
+
+        extent = []
+        for tile in ( tiles[0], tiles[-1] ) :
+            data = self.Tile( sensorName, level, tile )
+            full = np.flatnonzero( data[ :, 1 ] >= data[ :, 0 ] )
+            if not len( full ) :
+                return None
+            extent.append( ( tile * TILE_BINS + full ) * LEVELS[ level ] )
+
+        return extent[0][0], extent[1][-1] + LEVELS[ level ]
+
+#---------------------------------------------------------
+# Background pyramid builds of the archived sensors, driven
+# from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class PyramidJob:
+    def __init__( self, monitor ):
+        self.monitor  = monitor
+        self.futures  = {}      # by sensor name
+        self.pending  = set()   # sensors to build again when done
+        self.messages = ''
+        self.polling  = False
+
+    #-----------------------------------------------------------
+    def Update( self, sensorNames ):
+        # Build the pyramids of sensorNames from the archive
+        for sensorName in sensorNames :
+            if sensorName in self.futures :
+                self.pending.add( sensorName )
+            else :
+                self.Submit( sensorName )
+
+        if self.futures and not self.polling :
+            self.polling = True
+            self.monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Submit( self, sensorName ):
+        fileNames = ArchiveFiles( os.path.join( self.monitor.args.archivePath,
+                                                sensorName ) )
+        self.futures[ sensorName ] = self.monitor.GetProcessPool().submit(
+            BuildSensor, self.monitor.args.pyramidPath, sensorName, fileNames )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        for sensorName in list( self.futures.keys() ) :
+            future = self.futures[ sensorName ]
+            if not future.done() :
+                continue
+            del( self.futures[ sensorName ] )
+
+            try :
+                name, added, errors = future.result()
+            except Exception as e :
+                added  = 0
+                errors = [ sensorName + ': ' + str( e ) ]
+
+            for error in errors :
+                self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                                ' Pyramid Failed: ' + error + '\n'
+            if added and self.monitor.zoomView :
+                self.monitor.zoomView.Draw()
+
+            if sensorName in self.pending :
+                self.pending.discard( sensorName )
+                self.Submit( sensorName )
+
+        if self.futures :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+        else :
+            self.polling = False
+            if self.messages :
+                self.monitor.msgCommand.set( self.messages )
+                self.messages = ''
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+    futures  = []
+    for path in args.paths :
+        sensorName = os.path.basename( os.path.normpath( path ) )
+        futures.append( executor.submit( BuildSensor, args.pyramidPath,
+                                         sensorName, ArchiveFiles( path ) ) )
+
+    reader = PyramidReader( args.pyramidPath )
+    for future in concurrent.futures.as_completed( futures ) :
+        sensorName, added, errors = future.result()
+        for error in errors :
+            print( error )
+
+        extent = reader.Extent( sensorName )
+        print( sensorName + ': added ' + str( added ) + ' files' + \
+               ( ', data from ' + UTC( extent[0] ) + ' to ' + \
+                 UTC( extent[1] ) if extent else '' ) )
+    executor.shutdown()
+
+#---------------------------------------------------------------
+def UTC( t ) :
+    return time.strftime( '%Y-%m-%d %H:%M:%S', time.gmtime( t ) )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA data pyramid' )
+
+    parser.add_argument('paths', nargs = '+',
+                        help = 'Archive directory of each sensor.')
+
+    parser.add_argument('-P', '--pyramidPath',
+                        dest   = 'pyramidPath', type = str,
+                        action = 'store',
+                        default = os.environ['HOME'] + '/SensorPyramid',
+                        help = 'Pyramid directory (~/SensorPyramid).')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = None,
+                        help = 'Number of worker processes (all cores).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     QualityMetrics.py
+# Purpose:  Per file data quality metrics of the NCPA sensor archive
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./QualityMetrics.py -j 8 -d 7 ~/SensorArchive
+#
+# The metrics of every archived UMX file are computed once and kept
+# in the sqlite table <archive>/quality.sqlite, keyed by file name
+# with its size and mtime, so a file is only read again if it
+# changed. In ADC counts:
+#   samples   number of samples, completeness = samples / expected
+#             ( UMXFileLength x samplingRate )
+#   mean      offset
+#   rms       about the mean
+#   peak      peak-to-peak
+#   clipped   samples within CLIP_FRACTION of the LTC-2440 full scale
+#   flatline  longest run of identical samples, seconds
+# The fleet report ranks the sensors by Anomaly() of the metrics of
+# their files, without reading any data.
+#------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+import UMXData
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+DATABASE         = 'quality.sqlite'
+CLIP_FRACTION    = 0.99     # of UMXFile.ADC_FULL_SCALE
+FLATLINE_SECONDS = 10.      # A longer flatline is a dead channel
+DEAD_RMS         = 1.       # counts, below this the channel is dead
+COMPLETE         = 0.99     # completeness of a good file
+
+COLUMNS = ( 'fileName', 'sensor', 'startTime', 'size', 'mtime',
+            'samplingRate', 'samples', 'expected', 'mean', 'rms', 'peak',
+            'clipped', 'flatline', 'error' )
+
+#---------------------------------------------------------------
+def FileMetrics( fileName, fileLength = UMXFile.FILE_LENGTH ) :
+    # Return the row of COLUMNS of a UMX file
+    sensor, startTime = UMXFile.ParseFileName( fileName )
+    stat = os.stat( fileName )
+    row  = [ os.path.basename( fileName ), sensor, startTime,
+             stat.st_size, stat.st_mtime ]
+    try :
+        fileHeader, runs = UMXData.ReadRuns( fileName )
+    except Exception as e :
+        return row + [ 0, 0, 0, 0., 0., 0, 0, 0., str( e ) ]
+
+    rate     = fileHeader.samplingRate
+    expected = fileLength * rate
+    if not runs :
+        return row + [ rate, 0, expected, 0., 0., 0, 0, 0., '' ]
+
+    x       = np.concatenate( [ samples for runStart, samples in runs ] )
+    x64     = x.astype( np.float64 )
+    mean    = float( np.mean( x64 ) )
+    rms     = float( np.sqrt( np.mean( ( x64 - mean )**2 ) ) )
+    peak    = int( np.max( x ) ) - int( np.min( x ) )
+    clipped = int( np.count_nonzero( np.abs( x64 ) >=
+                                     CLIP_FRACTION * UMXFile.ADC_FULL_SCALE ) )
+
+    # Longest run of identical samples, within each run of blocks
+    flatline = 0
+    for runStart, samples in runs :
+        changes = np.flatnonzero( np.diff( samples ) ) + 1
+        edges   = np.concatenate( ( [ 0 ], changes, [ len( samples ) ] ) )
+        flatline = max( flatline, int( np.max( np.diff( edges ) ) ) )
+
+    return row + [ rate, len( x ), expected, mean, rms, peak, clipped,
+                   flatline / rate, '' ]
+
+#---------------------------------------------------------------
+def MetricsFiles( fileNames, fileLength = UMXFile.FILE_LENGTH ) :
+    # Rows of fileNames, runs in the worker processes
+    rows = []
+    for fileName in fileNames :
+        try :
+            rows.append( FileMetrics( fileName, fileLength ) )
+        except Exception as e :
+            if DEBUG :
+                print( fileName + ': ' + str( e ) )
+    return rows
+
+#---------------------------------------------------------
+# The metrics table of an archive
+#---------------------------------------------------------
+class MetricsTable:
+    def __init__( self, archivePath ):
+        self.connection = sqlite3.connect( os.path.join( archivePath,
+                                                         DATABASE ) )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS metrics ( fileName TEXT PRIMARY KEY,' +
+            ' sensor TEXT, startTime REAL, size INTEGER, mtime REAL,' +
+            ' samplingRate INTEGER, samples INTEGER, expected INTEGER,' +
+            ' mean REAL, rms REAL, peak INTEGER, clipped INTEGER,' +
+            ' flatline REAL, error TEXT )' )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS metricsSensor ON metrics' +
+            ' ( sensor, startTime )' )
+        self.connection.commit()
+
+    #-----------------------------------------------------------
+    def NewFiles( self, fileNames ):
+        # The fileNames that are not in the table or changed
+        known = {}
+        for fileName, size, mtime in self.connection.execute(
+                'SELECT fileName, size, mtime FROM metrics' ) :
+            known[ fileName ] = ( size, mtime )
+
+        new = []
+        for fileName in fileNames :
+            stat = os.stat( fileName )
+            if known.get( os.path.basename( fileName ) ) != \
+               ( stat.st_size, stat.st_mtime ) :
+                new.append( fileName )
+        return new
+
+    #-----------------------------------------------------------
+    def Add( self, rows ):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO metrics VALUES ( ' +
+            ', '.join( '?' * len( COLUMNS ) ) + ' )', rows )
+        self.connection.commit()
+
+    #-----------------------------------------------------------
+    def Rows( self, startTime = None ):
+        # { sensor : [ rows ] } of the files from startTime
+        if startTime is None :
+            startTime = 0.
+        rows = {}
+        for row in self.connection.execute(
+                'SELECT ' + ', '.join( COLUMNS ) + ' FROM metrics' +
+                ' WHERE startTime >= ? ORDER BY sensor, startTime',
+                ( startTime, ) ) :
+            rows.setdefault( row[1], [] ).append( row )
+        return rows
+
+    #-----------------------------------------------------------
+    def Close( self ):
+        self.connection.close()
+
+#---------------------------------------------------------------
+def SensorSummary( rows ) :
+    # Aggregate metrics of the rows of one sensor
+    c = dict( ( name, i ) for i, name in enumerate( COLUMNS ) )
+    good = [ r for r in rows if not r[ c['error'] ] and r[ c['samples'] ] ]
+    summary = { 'files'        : len( rows ),
+                'errors'       : len( rows ) - len( good ),
+                'completeness' : 0.,
+                'incomplete'   : 0.,
+                'clipped'      : 0.,
+                'flatline'     : 0.,
+                'dead'         : 0.,
+                'rms'          : 0.,
+                'mean'         : 0. }
+    if not good :
+        return summary
+
+    samples  = np.array( [ r[ c['samples'] ]  for r in good ], dtype = float )
+    expected = np.array( [ r[ c['expected'] ] for r in good ], dtype = float )
+    rms      = np.array( [ r[ c['rms'] ]      for r in good ] )
+    summary['completeness'] = float( samples.sum() / expected.sum() )
+    summary['incomplete'] = float( np.mean( samples < COMPLETE * expected ) )
+    summary['clipped']  = float( np.mean( [ r[ c['clipped'] ] > 0
+                                            for r in good ] ) )
+    summary['flatline'] = float( np.mean( [ r[ c['flatline'] ] >=
+                                            FLATLINE_SECONDS for r in good ] ) )
+    summary['dead']     = float( np.mean( rms < DEAD_RMS ) )
+    summary['rms']      = float( np.median( rms ) )
+    summary['mean']     = float( np.median( [ r[ c['mean'] ] for r in good ] ) )
+    return summary
+
+#---------------------------------------------------------------
+def Anomaly( summary, fleetRMS ) :
+    # Higher for a worse sensor: the fractions of bad files and the
+    # decades of its RMS from the fleet median
+    score = 10. * summary['dead'] + 5. * summary['flatline'] + \
+            5. * summary['clipped'] + 2. * summary['incomplete'] + \
+            10. * summary['errors'] / max( summary['files'], 1 )
+    if summary['rms'] > 0. and fleetRMS > 0. :
+        score = score + abs( np.log10( summary['rms'] / fleetRMS ) )
+    return score
+
+#---------------------------------------------------------------
+def FleetReport( table, startTime = None ) :
+    # Lines of the sensors sorted by Anomaly(), worst first
+    summaries = dict( ( sensor, SensorSummary( rows ) )
+                      for sensor, rows in table.Rows( startTime ).items() )
+    rms = [ s['rms'] for s in summaries.values() if s['rms'] > 0. ]
+    fleetRMS = float( np.median( rms ) ) if rms else 0.
+    ranked = sorted( summaries.items(),
+                     key = lambda item : -Anomaly( item[1], fleetRMS ) )
+
+    lines = [ 'sensor             score files errors complete clipped ' + \
+              'flatline  dead      rms     mean' ]
+    for sensor, s in ranked :
+        lines.append( '%-18s %5.2f %5d %6d %7.1f%% %6.1f%% %7.1f%% %4.0f%% ' \
+                      '%8.1f %8.0f' % ( sensor, Anomaly( s, fleetRMS ),
+                      s['files'], s['errors'], 100. * s['completeness'],
+                      100. * s['clipped'], 100. * s['flatline'],
+                      100. * s['dead'], s['rms'], s['mean'] ) )
+    return lines
+
+#---------------------------------------------------------------
+def ArchiveFiles( archivePath ) :
+    fileNames = []
+    for root, dirs, files in os.walk( archivePath ) :
+        fileNames.extend( os.path.join( root, f ) for f in files
+                          if UMXFile.ParseFileName( f ) )
+    return sorted( fileNames )
+
+#---------------------------------------------------------------
+def SubmitMetrics( executor, fileNames, chunk = 20 ) :
+    return [ executor.submit( MetricsFiles, fileNames[ i : i + chunk ] )
+             for i in range( 0, len( fileNames ), chunk ) ]
+
+#---------------------------------------------------------
+# Metrics of the new archive files on the process pool, then
+# the fleet report, driven from the Tk mainloop
+#---------------------------------------------------------
+class QualityJob:
+    def __init__( self, monitor, days ):
+        self.monitor   = monitor
+        self.startTime = time.time() - days * 86400.
+        self.table     = MetricsTable( monitor.args.archivePath )
+        self.fileNames = self.table.NewFiles(
+            ArchiveFiles( monitor.args.archivePath ) )
+        self.futures   = SubmitMetrics( monitor.GetProcessPool(),
+                                        self.fileNames )
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return all( future.done() for future in self.futures )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        if not self.Done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+            return
+
+        lines = []
+        for future in self.futures :
+            try :
+                self.table.Add( future.result() )
+            except Exception as e :
+                lines.append( 'Quality Failed: ' + str( e ) )
+
+        lines = [ time.strftime( '%Y-%m-%d %H:%M:%S', time.gmtime() ) + \
+                  ' UTC quality of the files since ' + \
+                  time.strftime( '%Y-%m-%d %H:%M', \
+                                 time.gmtime( self.startTime ) ) + \
+                  ', ' + str( len( self.fileNames ) ) + ' new files:' ] + \
+                lines + FleetReport( self.table, self.startTime )
+        self.table.Close()
+        self.monitor.ShowReport( 'NCPA: Quality', lines )
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    table     = MetricsTable( args.archivePath )
+    fileNames = table.NewFiles( ArchiveFiles( args.archivePath ) )
+
+    executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+    for future in SubmitMetrics( executor, fileNames ) :
+        table.Add( future.result() )
+    executor.shutdown()
+
+    print( str( len( fileNames ) ) + ' new files' )
+    for line in FleetReport( table, time.time() - args.days * 86400. ) :
+        print( line )
+    table.Close()
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'UMX data quality' )
+
+    parser.add_argument('archivePath',
+                        help = 'Local data archive.')
+
+    parser.add_argument('-d', '--days',
+                        dest   = 'days', type = float,
+                        action = 'store', default = 7.,
+                        help = 'Days of files in the report (7).')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = None,
+                        help = 'Number of worker processes (all cores).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     SensorFile.py
+# Purpose:  Parse the Sensors.txt inventory of Monitor.py
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./SensorFile.py Sensors.txt
+# ./SensorFile.py -n fleet/Sensors.txt     (without the cache)
+# ./SensorFile.py -a 10.1. fleet/Sensors.txt
+#
+# The inventory is a list of Sensor blocks and includes:
+#   # comment, to the end of the line
+#   include uplinkA.txt       (relative to the including file)
+#   Sensor {
+#      IP            =  192.168.1.52
+#      ConfigInPath  =  ../configFiles/
+#      ConfigInFile  =  SN052_UMSX1.4.cfg
+#      ConfigOutPath =  ~/
+#      ConfigOutFile =  UMSX1.4.cfg
+#      UMXStart      =  run_scheduler4.4.0.sh
+#      Uplink        =  ridge      (optional)
+#      Group         =  arrayB     (optional)
+#      Tags          =  "solar, north"   (optional)
+#      Name          =  1052       (optional)
+#   }
+# The sensor is SN + its Key(): the Name, else the IP after the
+# subnet (Monitor.py -a, 192.168.1.), SN52, else the whole IP,
+# SN10.1.4.52.
+# A value is one word or a "quoted string". Errors are reported as
+# file:line:column: and the parser goes on with the next Sensor, so
+# one bad block does not lose the others.
+#
+# Load() keeps the parsed inventory in a marshal cache next to the
+# file, .Sensors.txt.cache, with the size, mtime and md5 of the file
+# and of its includes. When they are unchanged the cache is used
+# and nothing is parsed, when only the mtime changed the md5 is
+# checked.
+#------------------------------------------------------------------
+
+import argparse
+import bisect
+import hashlib
+import marshal
+import os
+import re
+import sys
+
+DEBUG = False # Set True by the -v (verbose) option
+
+CACHE_VERSION = 4
+
+# The fields of a Sensor, in the order of the records
+FIELDS   = ( 'IP', 'ConfigInPath', 'ConfigInFile', 'ConfigOutPath',
+             'ConfigOutFile', 'UMXStart', 'Uplink', 'Group', 'Tags',
+             'Name' )
+OPTIONAL = ( 'Uplink', 'Group', 'Tags', 'Name' )
+
+TOKEN = re.compile( r'''
+    (?P<space>   [ \t\r\f\v]+ | \#[^\n]* )
+  | (?P<newline> \n )
+  | (?P<punct>   [{}=] )
+  | (?P<string>  "[^"\n]*" )
+  | (?P<word>    [^\s{}=#"]+ )
+  | (?P<error>   . )
+''', re.VERBOSE )
+
+#---------------------------------------------------------------
+def Tokenize( text, fileName = '' ) :
+    # Return [ ( kind, text, start ) ] without the space and comments
+    tokens = []
+    for match in TOKEN.finditer( text ) :
+        kind = match.lastgroup
+        if kind == 'space' :
+            continue
+        if kind == 'error' :
+            raise( Exception( Location( LineStarts( text ), match.start(),
+                                        fileName ) + \
+                              'unexpected ' + repr( match.group() ) ) )
+        tokens.append( ( kind, match.group(), match.start() ) )
+    tokens.append( ( 'end', '', len( text ) ) )
+    return tokens
+
+#---------------------------------------------------------------
+def LineStarts( text ) :
+    return [ 0 ] + [ match.end() for match in re.finditer( '\n', text ) ]
+
+#---------------------------------------------------------------
+def Location( lineStarts, pos, fileName = '' ) :
+    line = bisect.bisect_right( lineStarts, pos )
+    return fileName + ':' + str( line ) + ':' + \
+           str( pos - lineStarts[ line - 1 ] + 1 ) + ': '
+
+#---------------------------------------------------------------
+def ValidIP( IP ) :
+    # a.b.c.d with every field 1 to 255
+    digits = IP.split( '.' )
+    return len( digits ) == 4 and \
+           all( digit.isdigit() and 0 < int( digit ) < 256
+                for digit in digits )
+
+#---------------------------------------------------------------
+def Tags( text ) :
+    # The tags of a Tags value, separated by commas or spaces
+    return tuple( tag for tag in re.split( r'[\s,]+', text ) if tag )
+
+#---------------------------------------------------------------
+def Key( record, subnet = '' ) :
+    # The SensorDict key of a record, the sensor is 'SN' + key
+    IP, name = record[0], record[ FIELDS.index( 'Name' ) ]
+    if name :
+        return name
+    if subnet and IP.startswith( subnet ) :
+        return IP[ len( subnet ) : ]
+    return IP
+
+#---------------------------------------------------------------
+def Value( kind, token ) :
+    # Interned, the paths and file names repeat across a fleet
+    return sys.intern( token[ 1 : -1 ] if kind == 'string' else token )
+
+#---------------------------------------------------------------
+def Parse( text, fileName = '' ) :
+    # Return [ record ], [ ( include, location ) ], [ errors ] and the
+    # number of lines of text. A record is the FIELDS values of a
+    # Sensor, '' if not given, and its location.
+    records  = []
+    includes = []
+    errors   = []
+    lines    = len( text.splitlines() )
+    try :
+        tokens = Tokenize( text, fileName )
+    except Exception as e :
+        return records, includes, [ str( e ) ], lines
+
+    lineStarts = LineStarts( text )
+    def Where( i ) :
+        return Location( lineStarts, tokens[ i ][2], fileName )
+
+    def SkipLine( i ) :
+        while tokens[ i ][0] not in ( 'newline', 'end' ) :
+            i = i + 1
+        return i
+
+    i = 0
+    while tokens[ i ][0] != 'end' :
+        kind, token, pos = tokens[ i ]
+        if kind == 'newline' :
+            i = i + 1
+
+        elif kind == 'word' and token == 'include' :
+            if tokens[ i + 1 ][0] in ( 'word', 'string' ) :
+                includes.append( ( Value( *tokens[ i + 1 ][ : 2 ] ),
+                                   Where( i + 1 ) ) )
+            else :
+                errors.append( Where( i + 1 ) + 'expected a file name to include' )
+            i = SkipLine( i + 1 )
+
+        elif kind == 'word' and token == 'Sensor' :
+            sensorLocation = Where( i )
+            i = i + 1
+            while tokens[ i ][0] == 'newline' :
+                i = i + 1
+            if tokens[ i ][1] != '{' :
+                errors.append( Where( i ) + 'expected {' )
+                i = SkipLine( i )
+                continue
+            i = i + 1
+
+            # The fields up to }
+            fields = {}
+            while True :
+                kind, token, pos = tokens[ i ]
+                if kind == 'newline' :
+                    i = i + 1
+                elif token == '}' :
+                    i = i + 1
+                    break
+                elif kind == 'end' :
+                    fields = None
+                    errors.append( sensorLocation + 'Sensor without }' )
+                    break
+                elif kind != 'word' or token not in FIELDS :
+                    errors.append( Where( i ) + 'expected one of ' + \
+                                   ', '.join( FIELDS ) + ' or }, found ' + \
+                                   repr( token ) )
+                    i = SkipLine( i )
+                elif tokens[ i + 1 ][1] != '=' or \
+                     tokens[ i + 2 ][0] not in ( 'word', 'string' ) :
+                    errors.append( Where( i ) + 'expected ' + token + ' = value' )
+                    i = SkipLine( i )
+                elif token in fields :
+                    errors.append( Where( i ) + 'duplicate ' + token )
+                    i = SkipLine( i )
+                else :
+                    fields[ token ] = Value( *tokens[ i + 2 ][ : 2 ] )
+                    i = i + 3
+
+            if fields is None :
+                continue
+            missing = [ field for field in FIELDS
+                        if field not in fields and field not in OPTIONAL ]
+            if missing :
+                errors.append( sensorLocation + 'Sensor without ' + \
+                               ', '.join( missing ) )
+            elif not ValidIP( fields[ 'IP' ] ) :
+                errors.append( sensorLocation + 'malformed IP ' + fields[ 'IP' ] )
+            else :
+                records.append( tuple( fields.get( field, '' )
+                                       for field in FIELDS ) + \
+                                ( sensorLocation, ) )
+
+        else :
+            errors.append( Where( i ) + 'expected Sensor or include, found ' + \
+                           repr( token ) )
+            i = SkipLine( i )
+
+    return records, includes, errors, lines
+
+#---------------------------------------------------------------
+def FileMD5( data ) :
+    return hashlib.md5( data ).hexdigest()
+
+#---------------------------------------------------------------
+def CacheFile( fileName ) :
+    directory, name = os.path.split( os.path.abspath( fileName ) )
+    return os.path.join( directory, '.' + name + '.cache' )
+
+#---------------------------------------------------------
+# The sensors of an inventory file and its includes
+#---------------------------------------------------------
+class Inventory:
+    def __init__( self, fileName ):
+        self.fileName = fileName
+        self.records  = []     # FIELDS values and location of each Sensor
+        self.errors   = []     # 'file:line:column: msg'
+        self.files    = []     # [ path, size, mtime_ns, md5 ] read
+        self.lines    = 0
+        self.cached   = False  # read from the cache
+        self.touched  = False  # cached, with a new mtime
+
+    #-----------------------------------------------------------
+    def Read( self, fileName, location = '', stack = () ):
+        path = os.path.abspath( fileName )
+        if path in stack :
+            self.errors.append( location + 'include loop of ' + fileName )
+            return
+        try :
+            fi = open( path, 'rb' )
+            data = fi.read()
+            stat = os.fstat( fi.fileno() )
+            fi.close()
+        except OSError as e :
+            self.errors.append( location + str( e ) )
+            return
+
+        self.files.append( [ path, stat.st_size, stat.st_mtime_ns,
+                             FileMD5( data ) ] )
+        records, includes, errors, lines = Parse(
+            data.decode( 'utf-8', 'replace' ), fileName )
+        self.records.extend( records )
+        self.errors.extend( errors )
+        self.lines = self.lines + lines
+
+        for include, location in includes :
+            if not os.path.isabs( os.path.expanduser( include ) ) :
+                include = os.path.join( os.path.dirname( fileName ), include )
+            self.Read( os.path.expanduser( include ), location,
+                       stack + ( path, ) )
+
+    #-----------------------------------------------------------
+    def CheckDuplicates( self, subnet = '' ):
+        # The sensors are named by their Key()
+        seen = {}
+        records = []
+        for record in self.records :
+            IP, location = record[0], record[-1]
+            name = 'SN' + Key( record, subnet )
+            if name in seen :
+                self.errors.append( location + 'duplicate ' + name + \
+                                    ' (' + IP + '), first at ' + \
+                                    seen[ name ].rstrip( ': ' ) )
+                continue
+            seen[ name ] = location
+            records.append( record )
+        self.records = records
+
+    #-----------------------------------------------------------
+    def Dump( self ):
+        return marshal.dumps( ( CACHE_VERSION, self.files, self.records,
+                                self.errors, self.lines ) )
+
+    #-----------------------------------------------------------
+    def Undump( self, data ):
+        # Use the cache data if the files are unchanged, return True
+        version, files, records, errors, lines = marshal.loads( data )
+        if version != CACHE_VERSION :
+            return False
+
+        for entry in files :
+            path, size, mtime, md5 = entry
+            stat = os.stat( path )
+            if stat.st_size != size :
+                return False
+            if stat.st_mtime_ns != mtime :
+                fi = open( path, 'rb' )
+                same = FileMD5( fi.read() ) == md5
+                fi.close()
+                if not same :
+                    return False
+                entry[2]     = stat.st_mtime_ns
+                self.touched = True
+
+        self.files   = files
+        self.records = records
+        self.errors  = errors
+        self.lines   = lines
+        self.cached  = True
+        return True
+
+#---------------------------------------------------------------
+def Load( fileName, useCache = True, subnet = '' ) :
+    # The Inventory of fileName, from its cache if that is current.
+    # The cache has the records before CheckDuplicates( subnet ).
+    inventory = Inventory( fileName )
+    cacheFile = CacheFile( fileName )
+    if useCache :
+        try :
+            fi = open( cacheFile, 'rb' )
+            data = fi.read()
+            fi.close()
+            if not inventory.Undump( data ) :
+                inventory = Inventory( fileName )
+        except Exception :
+            inventory = Inventory( fileName )
+
+    if not inventory.cached :
+        inventory.Read( fileName )
+
+    if useCache and inventory.files and \
+       ( inventory.touched or not inventory.cached ) :
+        # A new or touched cache, a failed write only costs a parse
+        try :
+            fo = open( cacheFile + '.tmp', 'wb' )
+            fo.write( inventory.Dump() )
+            fo.close()
+            os.replace( cacheFile + '.tmp', cacheFile )
+        except OSError :
+            pass
+
+    inventory.CheckDuplicates( subnet )
+    return inventory
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    inventory = Load( args.sensorFile, not args.noCache, args.subnet )
+    for record in inventory.records :
+        print( ' '.join( value or '-' for value in record[ : -1 ] ) )
+    for error in inventory.errors :
+        print( 'ERROR: ' + error )
+    if DEBUG :
+        print( str( len( inventory.records ) ) + ' sensors, ' + \
+               str( inventory.lines ) + ' lines in ' + \
+               str( len( inventory.files ) ) + ' files' + \
+               ( ' (cached)' if inventory.cached else '' ) )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'Sensors.txt parser' )
+
+    parser.add_argument('sensorFile', nargs = '?', default = 'Sensors.txt',
+                        help = 'Sensor inventory file (Sensors.txt).')
+
+    parser.add_argument('-a', '--subnet',
+                        dest   = 'subnet', type = str,
+                        action = 'store', default = '192.168.1.',
+                        help = 'IP subnet prefix of the names (192.168.1.).')
+
+    parser.add_argument('-n', '--noCache',
+                        dest   = 'noCache',
+                        action = 'store_true', default = False,
+                        help = 'Parse without the cache.')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
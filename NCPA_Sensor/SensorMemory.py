@@ -0,0 +1,144 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     SensorMemory.py
+# Purpose:  Memory benchmark of the NCPASensor objects of a fleet
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./SensorMemory.py
+# ./SensorMemory.py -n 1000,10000,100000
+#
+# For each fleet size an inventory file of that many Sensor blocks,
+# in groups of GROUP_SIZE sensors on UPLINKS uplinks, is loaded into
+# a SensorCollection as Monitor.py -f does, from the SensorFile.py
+# cache, with tracemalloc on. Printed are the bytes per sensor
+#   idle      as loaded
+#   commands  after a Time and a Ping of every sensor, the status
+#             messages kept and the Popens released
+# The inventory records kept by the SensorCollection are counted.
+#------------------------------------------------------------------
+
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+import EventLoop
+import NCPASensor_py3 as NCPASensor
+import SensorFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+GROUP_SIZE = 100   # sensors per Group of the inventory
+UPLINKS    = 4     # Uplink values of the inventory
+
+#---------------------------------------------------------------
+def Inventory( n ) :
+    # Sensors.txt text of n sensors
+    blocks = []
+    for i in range( n ) :
+        blocks.append( 'Sensor {\n' + \
+            '  IP            = 10.%d.%d.%d\n' % ( i // 64516 % 254 + 1,
+                                                  i // 254 % 254 + 1,
+                                                  i % 254 + 1 ) + \
+            '  ConfigInPath  = ../configFiles/\n' + \
+            '  ConfigInFile  = SN%d_UMSX1.4.cfg\n' % i + \
+            '  ConfigOutPath = ~/\n' + \
+            '  ConfigOutFile = UMSX1.4.cfg\n' + \
+            '  UMXStart      = run_scheduler4.4.0.sh\n' + \
+            '  Uplink        = link%d\n' % ( i % UPLINKS ) + \
+            '  Group         = array%d\n' % ( i // GROUP_SIZE ) + \
+            '  Tags          = "solar, north"\n}\n' )
+    return ''.join( blocks )
+
+#---------------------------------------------------------------
+def Measure( n, sensorFile ) :
+    # Bytes per sensor ( idle, commands ) of a fleet of n sensors
+    fo = open( sensorFile, 'w' )
+    fo.write( Inventory( n ) )
+    fo.close()
+
+    # Parse once for the cache, the SensorCollection loads from it
+    inventory = SensorFile.Load( sensorFile )
+    if inventory.errors :
+        raise( Exception( inventory.errors[0] ) )
+    del( inventory )
+
+    # The parts of Monitor.py that SensorCollection uses
+    args    = argparse.Namespace( sensorList = '', sensorFile = sensorFile,
+                                  subnet = '', verbose = False )
+    monitor = argparse.Namespace( args = args, sensorFile = sensorFile,
+                                  msgCommand = EventLoop.Var( '' ) )
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+
+    collection = NCPASensor.SensorCollection( monitor )
+    sensors    = list( collection.SensorDict.values() )
+    if len( sensors ) != n :
+        raise( Exception( monitor.msgCommand.get() ) )
+    gc.collect()
+    idle = tracemalloc.get_traced_memory()[0] - start
+
+    # The state a Time and a Ping leave, see PollTimeCmd and PollPingCmd
+    for sensor in sensors :
+        for command in ( 'time', 'ping' ) :
+            setattr( sensor, command + 'PopenBusy', True )
+            setattr( sensor, command + 'Popen', True )
+            setattr( sensor, command + 'StatusMsg', 'Oct 19 2026 12:00:00 ' + \
+                     sensor.name + ': ' + command + ' ok\n' )
+            setattr( sensor, command + 'Popen', None )
+            setattr( sensor, command + 'PopenBusy', False )
+    gc.collect()
+    commands = tracemalloc.get_traced_memory()[0] - start
+
+    tracemalloc.stop()
+    return idle / n, commands / n
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    print( '%8s %10s %10s' % ( 'sensors', 'idle', 'commands' ) )
+    with tempfile.TemporaryDirectory() as directory :
+        for n in [ int( n ) for n in args.sizes.split( ',' ) ] :
+            idle, commands = Measure( n, os.path.join( directory,
+                                                       'Sensors.txt' ) )
+            print( '%8d %10.0f %10.0f' % ( n, idle, commands ) )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPASensor memory' )
+
+    parser.add_argument('-n', '--sizes',
+                        dest   = 'sizes', type = str,
+                        action = 'store', default = '1000,10000,100000',
+                        help = 'Fleet sizes (1000,10000,100000).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
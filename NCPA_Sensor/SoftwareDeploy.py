@@ -0,0 +1,216 @@
+#----------------------------------------------------------------------------
+# Name:     SoftwareDeploy.py
+# Purpose:  Deploy UMX binaries and scripts to NCPA sensors as deltas
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# The local files, such as UMXcontrol4.4.0, UMXscheduler4 and
+# run_scheduler4.4.0.sh, go to REMOTE_DIR on the selected sensors,
+# MAX_PARALLEL sensors at a time. For each sensor
+#   signature  Delta.py -s on the sensor, the block checksums of
+#              the installed versions (MonitorCommands.DeltaSignatureCmd)
+#   delta      Delta.FileDelta() of each file that differs, in the
+#              process pool. Sensors with the same old version share
+#              the delta.
+#   apply      the deltas over one ssh connection, the sensor checks
+#              the md5 of each new version before it is installed
+#              and keeps the old one as file.prev, the md5 of the
+#              installed file must be the local md5.
+# A rollback swaps the files with their .prev on the sensors. A
+# running UMXcontrol keeps its old binary until it is restarted.
+#------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+
+import Delta
+import MonitorCommands
+
+DEBUG = False # Set True by the -v (verbose) option
+
+MAX_PARALLEL = 4       # sensors deployed at the same time
+REMOTE_DIR   = '~/'    # of the UMX binaries and scripts
+
+#---------------------------------------------------------
+# One deployment or rollback of the selected sensors, driven
+# from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class SoftwareJob:
+    def __init__( self, monitor, keys, localFiles, rollback = False ):
+        self.monitor  = monitor
+        self.rollback = rollback
+        self.names    = [ os.path.basename( f ) for f in localFiles ]
+        self.remote   = [ REMOTE_DIR + name for name in self.names ]
+        self.local    = {}   # ( localFile, md5, mode ) by file name
+        self.queue    = [ monitor.SensorCollection.SensorDict[ key ]
+                          for key in keys ]
+        self.active   = {}   # ( step, sensor, Popen or work ) by sensor name
+        self.deltas   = {}   # future of the delta by ( file name, old md5 )
+        self.results  = {}   # [ ( file name, result, detail ) ] by sensor
+        self.sent     = 0    # delta bytes sent
+        self.full     = 0    # bytes of the files updated
+
+        if not rollback :
+            for localFile, name in zip( localFiles, self.names ) :
+                fi = open( localFile, 'rb' )
+                md5 = hashlib.md5( fi.read() ).hexdigest()
+                fi.close()
+                self.local[ name ] = ( localFile, md5,
+                                       os.stat( localFile ).st_mode & 0o7777 )
+
+        self.StartNext()
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def StartNext( self ):
+        while self.queue and len( self.active ) < MAX_PARALLEL :
+            sensor = self.queue.pop( 0 )
+            if self.rollback :
+                self.active[ sensor.name ] = ( 'rollback', sensor,
+                    MonitorCommands.DeltaRollbackCmd( sensor, self.remote ) )
+            else :
+                self.active[ sensor.name ] = ( 'signature', sensor,
+                    MonitorCommands.DeltaSignatureCmd( sensor, self.remote ) )
+
+    #-----------------------------------------------------------
+    def Done( self ):
+        return not self.active and not self.queue
+
+    #-----------------------------------------------------------
+    def Finish( self, name, results ):
+        self.results[ name ] = results
+        del( self.active[ name ] )
+        self.StartNext()
+
+    #-----------------------------------------------------------
+    def Signatures( self, sensor, output ):
+        # Start the deltas of the files that differ on the sensor,
+        # return [ ( name, key, mode ) ] of them and the results of
+        # the unchanged files
+        changed = []
+        results = []
+        lines   = [ line for line in output.decode( 'utf-8' ).split( '\n' )
+                    if line.strip() ]
+        if len( lines ) != len( self.names ) :
+            raise( Exception( str( len( lines ) ) + ' of ' + \
+                              str( len( self.names ) ) + ' signatures' ) )
+        for name, line in zip( self.names, lines ) :
+            signature = json.loads( line )
+            localFile, md5, mode = self.local[ name ]
+            if signature[ 'md5' ] == md5 :
+                results.append( ( name, 'unchanged', md5 ) )
+                continue
+
+            key = ( name, signature[ 'md5' ] )
+            if key not in self.deltas :
+                self.deltas[ key ] = self.monitor.GetProcessPool().submit(
+                    Delta.FileDelta, signature, localFile )
+            changed.append( ( name, key, signature[ 'mode' ] or mode ) )
+        return changed, results
+
+    #-----------------------------------------------------------
+    def Apply( self, sensor, changed ):
+        # The -a input of Delta.py, a JSON line of [ md5, mode ] and
+        # the length prefixed deltas
+        header = [ [ self.local[ name ][1], mode ]
+                   for name, key, mode in changed ]
+        data   = [ json.dumps( header ).encode( 'utf-8' ) + b'\n' ]
+        for name, key, mode in changed :
+            delta = self.deltas[ key ].result()
+            data.append( Delta.SIZE.pack( len( delta ) ) + delta )
+            self.sent = self.sent + len( delta )
+            self.full = self.full + os.path.getsize( self.local[ name ][0] )
+
+        sp = MonitorCommands.DeltaApplyCmd( sensor,
+            [ REMOTE_DIR + name for name, key, mode in changed ] )
+        sp.stdin.write( b''.join( data ) )
+        sp.stdin.close()
+        sp.stdin = None   # so that communicate() reads the output
+        return sp
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        for name in list( self.active.keys() ) :
+            step, sensor, work = self.active[ name ]
+
+            if step == 'delta' :
+                changed, results = work
+                if all( self.deltas[ key ].done()
+                        for n, key, mode in changed ) :
+                    try :
+                        self.active[ name ] = ( 'apply', sensor,
+                            ( self.Apply( sensor, changed ), results,
+                              [ n for n, key, mode in changed ] ) )
+                    except Exception as e :
+                        self.Finish( name, results +
+                            [ ( n, 'failed', str( e ) ) for n, k, m in changed ] )
+                continue
+
+            popen = work[0] if step == 'apply' else work
+            sp_out = MonitorCommands.PollOutput( popen )
+            if sp_out is None :
+                continue
+
+            if popen.returncode != 0 :
+                self.Finish( name, [ ( n, 'failed', step + ' on the sensor failed' )
+                                     for n in self.names ] )
+            elif step == 'signature' :
+                try :
+                    changed, results = self.Signatures( sensor, sp_out[0] )
+                except Exception as e :
+                    self.Finish( name, [ ( n, 'failed', 'signature: ' + str( e ) )
+                                         for n in self.names ] )
+                    continue
+                if changed :
+                    self.active[ name ] = ( 'delta', sensor, ( changed, results ) )
+                else :
+                    self.Finish( name, results )
+            else :
+                # The sensor shell expands REMOTE_DIR, the results are
+                # matched by file name
+                installed = dict( ( os.path.basename( path ), result )
+                    for path, result in
+                    Delta.ParseLines( sp_out[0].decode( 'utf-8' ) ).items() )
+                results   = work[1] if step == 'apply' else []
+                for n in ( work[2] if step == 'apply' else self.names ) :
+                    md5, error = installed.get( n, ( '', 'no result' ) )
+                    if error :
+                        results.append( ( n, 'failed', error ) )
+                    elif step == 'rollback' :
+                        results.append( ( n, 'rolled back', md5 ) )
+                    elif md5 == self.local[ n ][1] :
+                        results.append( ( n, 'updated', md5 ) )
+                    else :
+                        results.append( ( n, 'failed', 'verify: md5 ' + md5 + \
+                                          ' != ' + self.local[ n ][1] ) )
+                self.Finish( name, results )
+
+        if not self.Done() :
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+        else :
+            self.Report()
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        counts = {}
+        lines  = []
+        for name in sorted( self.results.keys() ) :
+            for fileName, result, detail in sorted( self.results[ name ] ) :
+                counts[ result ] = counts.get( result, 0 ) + 1
+                lines.append( '%-10s %-24s %-11s %s' % ( name, fileName,
+                                                         result, detail ) )
+
+        title = 'Software Rollback' if self.rollback else 'Software Deploy'
+        header = MonitorCommands.GetLocalUTC() + ' ' + title + ': ' + \
+                 ', '.join( str( counts[ result ] ) + ' ' + result
+                            for result in sorted( counts.keys() ) )
+        if self.full :
+            header = header + ', ' + str( self.sent ) + ' delta bytes for ' + \
+                     str( self.full ) + ' bytes of files'
+        self.monitor.ShowReport( 'NCPA: ' + title, [ header ] + lines )
@@ -0,0 +1,457 @@
+#----------------------------------------------------------------------------
+# Name:     Transfer.py
+# Purpose:  Compressed file transfers to and from NCPA sensors over ssh
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# A pull runs '<compressor> -c <file>' on the sensor and decompresses
+# the ssh output as it arrives, a push compresses locally and the
+# sensor decompresses into file.tmp and renames it to the file, so a
+# broken push never leaves a truncated file. The codec and level of each
+# transfer are chosen per sensor from the measured link bandwidth,
+# compression ratio and compressor speed:
+#
+#   expected throughput = min( bandwidth * ratio, compressor speed )
+#
+# The measurements start from the PRIOR guesses below and follow
+# every transfer with an exponential moving average. Every
+# EXPLORE_EVERY transfers the least measured option is tried so
+# that a faster link or CPU is noticed.
+#
+# Bulk transfers share the radio links with the status polling, so
+# their reads are rate limited by a token bucket per sensor and one
+# per uplink group (the Uplink field of Sensors.txt, sensors without
+# one are their own group). Not reading stops the remote sender once
+# the ssh window is full. While transfers run, the uplink RTT is
+# probed with ping: the rate is cut in half when the RTT rises above
+# RTT_CONGESTED times the lowest RTT seen, transfers pause above
+# RTT_PAUSE or on a lost ping, and the rate climbs back in INCREASE
+# steps while the RTT is normal. While status commands are running
+# on an uplink the bulk data gets only STATUS_SHARE of its rate.
+#------------------------------------------------------------------
+
+import os
+import re
+import time
+import zlib
+
+import MonitorCommands
+
+DEBUG = False # Set True by the -v (verbose) option
+
+# ( codec, level ) : ( ratio, compressor speed bytes/s )
+PRIOR = { ( 'none', 0 ) : ( 1.0, 1e12 ),
+          ( 'gzip', 1 ) : ( 2.0, 8e6  ),
+          ( 'gzip', 6 ) : ( 2.3, 3e6  ),
+          ( 'gzip', 9 ) : ( 2.4, 1e6  ) }
+
+PRIOR_BANDWIDTH = 1e6     # bytes/s until a transfer has been measured
+SMOOTHING       = 0.3     # Weight of the newest measurement
+EXPLORE_EVERY   = 8       # Transfers between tries of other options
+READ_BYTES      = 65536   # Per read of the ssh output
+
+SENSOR_RATE     = 250e3   # bytes/s of bulk data per sensor
+UPLINK_RATE     = 500e3   # bytes/s of bulk data per uplink group
+MIN_RATE        = 10e3    # bytes/s floor of the uplink rate
+BURST           = 0.5     # seconds of rate the buckets can save up
+STATUS_SHARE    = 0.25    # of the rate while status commands run
+PROBE_INTERVAL  = 2.      # seconds between RTT probes of an uplink
+RTT_CONGESTED   = 2.      # RTT / lowest RTT to cut the rate
+RTT_PAUSE       = 4.      # RTT / lowest RTT to pause the transfers
+INCREASE        = 0.1     # of UPLINK_RATE added per normal probe
+
+# Popen busy flags of the status and control commands of a sensor
+STATUS_BUSY = [ 'timePopenBusy', 'pingPopenBusy', 'dataPopenBusy',
+                'dataSubCmdPopenBusy', 'logPopenBusy',
+                'logSubCmdPopenBusy', 'umxPopenBusy' ]
+
+UPLINKS = {}  # Uplink by name
+
+#---------------------------------------------------------------
+def RemoteCompressCmd( codec, level, remotePath ) :
+    if codec == 'none' :
+        return 'cat ' + remotePath
+    return codec + ' -c -' + str( level ) + ' ' + remotePath
+
+#---------------------------------------------------------------
+def RemoteDecompressCmd( codec, remotePath ) :
+    if codec == 'none' :
+        return 'cat > ' + remotePath
+    return codec + ' -dc > ' + remotePath
+
+#---------------------------------------------------------------
+def Decompressor( codec ) :
+    # Object with decompress( data ) for the codec
+    if codec == 'gzip' :
+        return zlib.decompressobj( wbits = 31 )
+    return None
+
+#---------------------------------------------------------------
+def Compress( codec, level, data ) :
+    if codec == 'gzip' :
+        compressor = zlib.compressobj( level, wbits = 31 )
+        return compressor.compress( data ) + compressor.flush()
+    return data
+
+#---------------------------------------------------------
+# Token bucket of bytes at rate bytes/s
+#---------------------------------------------------------
+class TokenBucket:
+    def __init__( self, rate ):
+        self.rate   = rate
+        self.tokens = rate * BURST
+        self.time   = time.monotonic()
+
+    #-----------------------------------------------------------
+    def Available( self ):
+        now = time.monotonic()
+        self.tokens = min( self.rate * BURST, self.tokens +
+                           ( now - self.time ) * self.rate )
+        self.time   = now
+        return self.tokens
+
+    #-----------------------------------------------------------
+    def Take( self, numBytes ):
+        self.tokens = self.tokens - numBytes
+
+#---------------------------------------------------------------
+def ParsePingRTT( output ) :
+    # RTT seconds from 'rtt min/avg/max/mdev = 0.1/0.2/0.3/0.0 ms'
+    # (busybox: 'round-trip min/avg/max'), None if the ping was lost
+    match = re.search( r'min/avg/max\S* = [\d.]+/([\d.]+)/', output )
+    if not match :
+        return None
+    return float( match.group( 1 ) ) / 1000.
+
+#---------------------------------------------------------
+# Rate control of the bulk transfers over a shared uplink
+#---------------------------------------------------------
+class Uplink:
+    def __init__( self, name ):
+        self.name       = name
+        self.sensors    = []     # all sensors on the uplink
+        self.transfers  = []     # running PullTransfers
+        self.bucket     = TokenBucket( UPLINK_RATE )
+        self.limit      = UPLINK_RATE
+        self.baseRTT    = None   # lowest RTT seen
+        self.rtt        = None   # latest RTT
+        self.paused     = False
+        self.probePopen = None
+        self.probeTime  = 0.
+        self.updateTime = 0.
+
+    #-----------------------------------------------------------
+    def StatusBusy( self ):
+        for sensor in self.sensors :
+            for busy in STATUS_BUSY :
+                if getattr( sensor, busy, False ) :
+                    return True
+        return False
+
+    #-----------------------------------------------------------
+    def Update( self ):
+        # Probe the RTT and set the rate, at most every 0.1 s
+        now = time.monotonic()
+        if now - self.updateTime < 0.1 :
+            return
+        self.updateTime = now
+
+        if self.probePopen :
+            if self.probePopen.poll() != None :
+                sp_out = self.probePopen.communicate()
+                self.probePopen = None
+                self.ObserveRTT( ParsePingRTT( sp_out[0].decode( 'utf-8' ) ) )
+
+        elif self.transfers and now - self.probeTime > PROBE_INTERVAL :
+            self.probeTime  = now
+            self.probePopen = \
+                MonitorCommands.PingCmd( self.transfers[0].sensor )
+
+        share = STATUS_SHARE if self.StatusBusy() else 1.
+        self.bucket.Available()
+        self.bucket.rate = self.limit * share
+
+    #-----------------------------------------------------------
+    def ObserveRTT( self, rtt ):
+        # Adjust the rate limit from a ping RTT, None if lost
+        self.rtt = rtt
+        if rtt is None :
+            self.paused = True
+            self.limit  = max( MIN_RATE, self.limit / 2. )
+        else :
+            if self.baseRTT is None or rtt < self.baseRTT :
+                self.baseRTT = rtt
+            # 10 ms of slack for the jitter of a fast link
+            ratio = rtt / ( self.baseRTT + 0.01 )
+
+            self.paused = ratio > RTT_PAUSE
+            if ratio > RTT_CONGESTED :
+                self.limit = max( MIN_RATE, self.limit / 2. )
+            else :
+                self.limit = min( UPLINK_RATE,
+                                  self.limit + INCREASE * UPLINK_RATE )
+
+        if DEBUG:
+            print( 'Uplink ' + self.name + ' rtt ' + str( rtt ) + \
+                   ' limit ' + str( round( self.limit ) ) + \
+                   ( ' paused' if self.paused else '' ) )
+
+    #-----------------------------------------------------------
+    def Available( self ):
+        if self.paused :
+            return 0
+        return self.bucket.Available()
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        line = 'uplink ' + self.name + ' ' + str( len( self.sensors ) ) + \
+               ' sensors, limit %.0f kB/s' % ( self.limit / 1000. )
+        if self.rtt is not None :
+            line = line + ', rtt %.1f ms (lowest %.1f ms)' % \
+                   ( self.rtt * 1000., self.baseRTT * 1000. )
+        if self.paused :
+            line = line + ', paused'
+        return line
+
+#---------------------------------------------------------------
+def GetUplink( sensor ) :
+    # The Uplink of the sensor, created on first use
+    name = sensor.uplink if sensor.uplink else sensor.IP
+    if name not in UPLINKS :
+        UPLINKS[ name ] = Uplink( name )
+    uplink = UPLINKS[ name ]
+    if sensor not in uplink.sensors :
+        uplink.sensors.append( sensor )
+    return uplink
+
+#---------------------------------------------------------------
+def ObservePing( sensor, output ) :
+    # Status pings of the sensor also feed the rate control
+    uplink = GetUplink( sensor )
+    if uplink.transfers :
+        uplink.ObserveRTT( ParsePingRTT( output ) )
+
+#---------------------------------------------------------------
+def ReadLimited( sensor, popen, Write ) :
+    # Read the non-blocking stdout of popen within the rate limits
+    # of the sensor and its uplink and Write( data ) what arrived.
+    # Return True while running, False at the end of the output.
+    bucket = Stats( sensor ).bucket
+    uplink = GetUplink( sensor )
+    uplink.Update()
+
+    while True :
+        allowed = int( min( READ_BYTES, bucket.Available(),
+                            uplink.Available() ) )
+        if allowed <= 0 :
+            # What is left in the pipe of a finished ssh is local
+            if popen.poll() == None :
+                return True
+            allowed = READ_BYTES
+
+        try :
+            data = os.read( popen.stdout.fileno(), allowed )
+        except BlockingIOError :
+            return True
+
+        if not data :
+            return False
+
+        bucket.Take( len( data ) )
+        uplink.bucket.Take( len( data ) )
+        Write( data )
+
+#---------------------------------------------------------
+# Measured transfer performance of one sensor
+#---------------------------------------------------------
+class TransferStats:
+    def __init__( self ):
+        self.bandwidth = PRIOR_BANDWIDTH   # bytes/s on the link
+        self.measured  = False
+        self.ratio     = {}                # by ( codec, level )
+        self.speed     = {}                # compressor bytes/s
+        self.count     = {}                # transfers
+        for option in PRIOR :
+            self.ratio[ option ] = PRIOR[ option ][0]
+            self.speed[ option ] = PRIOR[ option ][1]
+            self.count[ option ] = 0
+        self.transfers      = 0
+        self.lastOption     = None
+        self.lastRatio      = 0.
+        self.lastThroughput = 0.
+        self.bucket         = TokenBucket( SENSOR_RATE )
+
+    #-----------------------------------------------------------
+    def Expected( self, option ):
+        return min( self.bandwidth * self.ratio[ option ],
+                    self.speed[ option ] )
+
+    #-----------------------------------------------------------
+    def Choose( self ):
+        # The ( codec, level ) with the best expected throughput
+        if self.transfers % EXPLORE_EVERY == EXPLORE_EVERY - 1 :
+            return min( PRIOR.keys(), key = lambda o : self.count[ o ] )
+        return self.Best()
+
+    #-----------------------------------------------------------
+    def Best( self ):
+        return max( PRIOR.keys(), key = self.Expected )
+
+    #-----------------------------------------------------------
+    def Record( self, option, rawBytes, wireBytes, seconds ):
+        # Update the estimates from a finished transfer
+        if rawBytes <= 0 or wireBytes <= 0 or seconds <= 0. :
+            return
+
+        ratio      = rawBytes / wireBytes
+        throughput = rawBytes / seconds
+
+        self.ratio[ option ] = self.ratio[ option ] + \
+                               SMOOTHING * ( ratio - self.ratio[ option ] )
+        self.count[ option ] = self.count[ option ] + 1
+        self.transfers       = self.transfers + 1
+
+        # The transfer ran at the slower of the link and the
+        # compressor. Whichever was faster than expected is updated.
+        linkRate = wireBytes / seconds
+        if not self.measured :
+            self.bandwidth = linkRate
+            self.measured  = True
+        elif option[0] == 'none' or \
+             linkRate * ratio < self.speed[ option ] :
+            self.bandwidth = self.bandwidth + \
+                             SMOOTHING * ( linkRate - self.bandwidth )
+        if option[0] != 'none' and \
+           throughput < self.bandwidth * ratio :
+            self.speed[ option ] = self.speed[ option ] + \
+                                   SMOOTHING * ( throughput -
+                                                 self.speed[ option ] )
+
+        self.lastOption     = option
+        self.lastRatio      = ratio
+        self.lastThroughput = throughput
+
+    #-----------------------------------------------------------
+    def Report( self ):
+        line = 'link %.0f kB/s' % ( self.bandwidth / 1000. )
+        if self.lastOption :
+            line = line + ', last %s -%d ratio %.2f at %.0f kB/s' % \
+                   ( self.lastOption + ( self.lastRatio,
+                                         self.lastThroughput / 1000. ) )
+        line = line + ', best ' + '%s -%d' % self.Best()
+        return line
+
+#---------------------------------------------------------------
+def Stats( sensor ) :
+    # The TransferStats of a sensor, created on first use
+    if not sensor.transferStats :
+        sensor.transferStats = TransferStats()
+    return sensor.transferStats
+
+#---------------------------------------------------------
+# Pull a file from a sensor, decompressing as it arrives.
+# Poll() until it returns False, then check returncode.
+#---------------------------------------------------------
+class PullTransfer:
+    def __init__( self, sensor, remotePath, localFile ):
+        self.sensor     = sensor
+        self.remotePath = remotePath
+        self.localFile  = localFile
+        self.option     = Stats( sensor ).Choose()
+        self.decompress = Decompressor( self.option[0] )
+        self.rawBytes   = 0
+        self.wireBytes  = 0
+        self.returncode = None
+        self.errorMsg   = ''
+        self.startTime  = time.monotonic()
+        self.uplink     = GetUplink( sensor )
+        self.fo         = open( localFile, 'wb' )
+        self.popen      = MonitorCommands.CompressedPullCmd( sensor,
+            RemoteCompressCmd( self.option[0], self.option[1], remotePath ) )
+
+        # Read without blocking the Tk mainloop
+        os.set_blocking( self.popen.stdout.fileno(), False )
+        self.uplink.transfers.append( self )
+
+        if DEBUG:
+            print( 'PullTransfer ' + sensor.name + ' ' + remotePath + \
+                   ' ' + str( self.option ) )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        # Read and decompress what has arrived within the rate
+        # limits, True while running
+        if ReadLimited( self.sensor, self.popen, self.Write ) :
+            return True
+        self.Finish()
+        return False
+
+    #-----------------------------------------------------------
+    def Write( self, data ):
+        self.wireBytes = self.wireBytes + len( data )
+        if self.decompress :
+            try :
+                data = self.decompress.decompress( data )
+            except zlib.error as e :
+                self.errorMsg = str( e )
+                self.popen.kill()
+                return
+        self.rawBytes = self.rawBytes + len( data )
+        self.fo.write( data )
+
+    #-----------------------------------------------------------
+    def Finish( self ):
+        self.popen.communicate()
+        self.fo.close()
+        self.uplink.transfers.remove( self )
+        self.returncode = self.popen.returncode
+
+        if self.returncode == 0 and not self.errorMsg :
+            Stats( self.sensor ).Record( self.option, self.rawBytes,
+                                         self.wireBytes,
+                                         time.monotonic() - self.startTime )
+        elif not self.returncode :
+            self.returncode = 1
+
+    #-----------------------------------------------------------
+    def Wait( self ):
+        # Block until the transfer is done, return the returncode
+        while self.Poll() :
+            time.sleep( 0.02 )
+        return self.returncode
+
+#---------------------------------------------------------------
+def Push( sensor, localFile, remotePath ) :
+    # Compress localFile and start it on its way to remotePath.
+    # Return the ssh Popen to poll like the other commands. The
+    # whole file is written to the pipe, meant for config files.
+    # An unreadable localFile raises OSError.
+    # remotePath.tmp is written, renamed to remotePath and the
+    # md5sum of remotePath is printed on stdout.
+    stats  = Stats( sensor )
+    option = stats.Choose()
+
+    fi   = open( os.path.expanduser( localFile ), 'rb' )
+    data = fi.read()
+    fi.close()
+
+    compressed = Compress( option[0], option[1], data )
+    if data and compressed :
+        # The push returns before the transfer ends, so only the
+        # compression ratio is measured
+        stats.ratio[ option ] = stats.ratio[ option ] + SMOOTHING * \
+            ( len( data ) / len( compressed ) - stats.ratio[ option ] )
+
+    remoteCmd = RemoteDecompressCmd( option[0], remotePath + '.tmp' ) + \
+                ' && mv ' + remotePath + '.tmp ' + remotePath + \
+                ' && md5sum ' + remotePath
+
+    sp = MonitorCommands.CompressedPushCmd( sensor, remoteCmd )
+    sp.stdin.write( compressed )
+    sp.stdin.close()
+    sp.stdin = None   # so that communicate() reads the output
+    return sp
@@ -0,0 +1,93 @@
+#----------------------------------------------------------------------------
+# Name:     UMXData.py
+# Purpose:  NumPy access to the samples of UMX data files
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+import numpy as np
+
+import LibConfig
+import UMXFile
+
+#---------------------------------------------------------------
+def ReadRuns( fileName, startTime = None, stopTime = None ) :
+    # Read a local UMX file and return the FileHeader and a list of
+    # ( runStartTime, samples ) for each run of contiguous blocks,
+    # trimmed to startTime <= t < stopTime. samples is an int32
+    # numpy array, runStartTime is the UTC of samples[0].
+    fileHeader, blocks = UMXFile.ReadFile( fileName )
+    fs = fileHeader.samplingRate
+
+    runs = []
+    run  = []
+    for blockHeader, samples in blocks :
+        # A block that does not follow on from the previous one
+        # (one second later) starts a new run
+        if run and abs( blockHeader.utcTime - run[-1][0] - 1. ) > 0.5 / fs :
+            runs.append( run )
+            run = []
+        run.append( ( blockHeader.utcTime, samples ) )
+    if run :
+        runs.append( run )
+
+    trimmed = []
+    for run in runs :
+        runStart = run[0][0]
+        samples  = np.concatenate( [ np.frombuffer( s, dtype = np.int32 )
+                                     for t, s in run ] )
+        first = 0
+        last  = len( samples )
+        if startTime is not None :
+            first = max( first, int( np.ceil( ( startTime - runStart ) * fs ) ) )
+        if stopTime is not None :
+            last  = min( last,  int( np.ceil( ( stopTime  - runStart ) * fs ) ) )
+        if last > first :
+            trimmed.append( ( runStart + first / fs, samples[ first : last ] ) )
+
+    return fileHeader, trimmed
+
+#---------------------------------------------------------------
+def CalibrationFactor( calibrationLevel ) :
+    # Sensor sensitivity in V/Pa from a calibrationLevel such as
+    # '20mv/Pa'. Return None if it can not be parsed.
+    match = LibConfig.CALIBRATION.match( calibrationLevel )
+    if not match :
+        return None
+
+    scale = { '' : 1., 'm' : 1e-3, 'u' : 1e-6, 'n' : 1e-9 }
+    try :
+        value = float( match.group( 1 ) )
+    except ValueError :
+        return None
+
+    if value <= 0. :
+        return None
+
+    return value * scale[ match.group( 2 ).lower() ]
+
+#---------------------------------------------------------------
+def ConfigCalibrationLevel( configFile ) :
+    # The sensorConfig calibrationLevel string from a UMSX .cfg file,
+    # or None if the file can not be read
+    try :
+        value = LibConfig.ParseFile( configFile ).Get(
+            'sensorConfig.calibrationLevel' )
+    except Exception :
+        return None
+
+    if not isinstance( value, str ) :
+        return None
+
+    return value
+
+#---------------------------------------------------------------
+def CountsToPascal( calibrationLevel ) :
+    # Pa per ADC count for calibrationLevel, or None
+    sensitivity = CalibrationFactor( calibrationLevel )
+    if not sensitivity :
+        return None
+
+    return UMXFile.COUNTS_TO_VOLTS / sensitivity
@@ -0,0 +1,440 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     UMXExport.py
+# Purpose:  Batch export of UMX data files to miniSEED, HDF5 or Parquet
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./UMXExport.py -f hdf5 -o ~/SensorExport/SN056 ~/SensorArchive/SN056
+#
+# Every .umx file under the input directory is written to the same
+# relative path under the output directory with the extension of
+# the format. Files are converted in parallel, one file per task,
+# reading EXPORT_BLOCKS one second blocks at a time. A file whose
+# output is newer than the .umx is skipped.
+#
+# The UMX header (sensorName, sensorLocation, version, samplingRate,
+# calibrationLevel, calibrationDate) and the GPS position of the
+# first block are carried as:
+#   hdf5    : attributes of the file. Datasets 'samples' (int32
+#             counts) and per block 'blockTime', 'gpsLatitude',
+#             'gpsLongitude', 'gpsElevation', 'batteryLevel'.
+#   parquet : JSON in the 'umx' schema metadata. One row per block:
+#             blockTime, gps*, batteryLevel, samples (int32 list).
+#   mseed   : Steim2 records of network NETWORK, station from the
+#             sensorName, channel <band>DF, calib in Pa/count, and
+#             the metadata in a <file>.mseed.json sidecar.
+#
+# The writers need h5py, pyarrow or obspy respectively, which are
+# only imported when that format is used.
+#------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import importlib.util
+import json
+import os
+import time
+
+import numpy as np
+
+import MonitorCommands
+import UMXData
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+EXPORT_BLOCKS = 60    # Blocks (seconds) held in memory per file
+NETWORK       = 'XX'  # miniSEED network code
+
+#---------------------------------------------------------------
+def Chunks( blocks ) :
+    # Group the ( BlockHeader, samples ) of an iterator into lists
+    # of up to EXPORT_BLOCKS
+    chunk = []
+    for block in blocks :
+        chunk.append( block )
+        if len( chunk ) == EXPORT_BLOCKS :
+            yield chunk
+            chunk = []
+    if chunk :
+        yield chunk
+
+#---------------------------------------------------------------
+def BlockArrays( chunk ) :
+    # Per block header columns and the concatenated samples
+    columns = {}
+    for name in ( 'utcTime', 'gpsLatitude', 'gpsLongitude',
+                  'gpsElevation', 'batteryLevel' ) :
+        columns[ name ] = np.array( [ getattr( blockHeader, name )
+                                      for blockHeader, samples in chunk ] )
+    samples = np.concatenate( [ np.frombuffer( samples, dtype = np.int32 )
+                                for blockHeader, samples in chunk ] )
+    return columns, samples
+
+#---------------------------------------------------------------
+def Metadata( fileName, fileHeader, blockHeader, calibrationLevel ) :
+    level = calibrationLevel or fileHeader.calibrationLevel
+    return { 'sensorName'       : fileHeader.sensorName,
+             'sensorLocation'   : fileHeader.sensorLocation,
+             'version'          : fileHeader.version,
+             'samplingRate'     : fileHeader.samplingRate,
+             'calibrationLevel' : level,
+             'calibrationDate'  : fileHeader.calibrationDate,
+             'pascalPerCount'   : UMXData.CountsToPascal( level ) or 0.,
+             'gpsLatitude'      : blockHeader.gpsLatitude,
+             'gpsLongitude'     : blockHeader.gpsLongitude,
+             'gpsElevation'     : blockHeader.gpsElevation,
+             'startTime'        : blockHeader.utcTime,
+             'sourceFile'       : os.path.basename( fileName ) }
+
+#---------------------------------------------------------------
+def WriteHDF5( outFile, metadata, chunks ) :
+    try :
+        import h5py
+    except ImportError :
+        raise( Exception( 'HDF5 export needs h5py (pip3 install h5py).' ) )
+
+    rate = metadata[ 'samplingRate' ]
+    fo   = h5py.File( outFile, 'w' )
+    try :
+        for key in metadata :
+            fo.attrs[ key ] = metadata[ key ]
+
+        samples = fo.create_dataset( 'samples', ( 0, ), dtype = 'int32',
+                                     maxshape = ( None, ),
+                                     chunks = ( EXPORT_BLOCKS * rate, ),
+                                     compression = 'gzip' )
+        samples.attrs[ 'units' ] = 'counts'
+        columns = {}
+
+        for chunk in chunks :
+            blockColumns, blockSamples = BlockArrays( chunk )
+            blockColumns[ 'blockTime' ] = blockColumns.pop( 'utcTime' )
+
+            n = samples.shape[0]
+            samples.resize( ( n + len( blockSamples ), ) )
+            samples[ n : ] = blockSamples
+
+            for name in blockColumns :
+                if name not in columns :
+                    columns[ name ] = fo.create_dataset( name, ( 0, ),
+                        dtype = 'float64', maxshape = ( None, ),
+                        chunks = ( EXPORT_BLOCKS, ) )
+                n = columns[ name ].shape[0]
+                columns[ name ].resize( ( n + len( chunk ), ) )
+                columns[ name ][ n : ] = blockColumns[ name ]
+    finally :
+        fo.close()
+
+#---------------------------------------------------------------
+def WriteParquet( outFile, metadata, chunks ) :
+    try :
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError :
+        raise( Exception( 'Parquet export needs pyarrow ' + \
+                          '(pip3 install pyarrow).' ) )
+
+    rate   = metadata[ 'samplingRate' ]
+    fields = [ pyarrow.field( name, pyarrow.float64() )
+               for name in ( 'blockTime', 'gpsLatitude', 'gpsLongitude',
+                             'gpsElevation', 'batteryLevel' ) ]
+    fields.append( pyarrow.field( 'samples',
+                                  pyarrow.list_( pyarrow.int32(), rate ) ) )
+    schema = pyarrow.schema( fields,
+                             metadata = { 'umx' : json.dumps( metadata ) } )
+
+    writer = pyarrow.parquet.ParquetWriter( outFile, schema )
+    try :
+        for chunk in chunks :
+            blockColumns, blockSamples = BlockArrays( chunk )
+            blockColumns[ 'blockTime' ] = blockColumns.pop( 'utcTime' )
+
+            arrays = [ pyarrow.array( blockColumns[ field.name ] )
+                       for field in fields[ : -1 ] ]
+            arrays.append( pyarrow.FixedSizeListArray.from_arrays(
+                               pyarrow.array( blockSamples ), rate ) )
+
+            # One row group per chunk
+            writer.write_table( pyarrow.Table.from_arrays( arrays,
+                                                           schema = schema ) )
+    finally :
+        writer.close()
+
+#---------------------------------------------------------------
+def BandCode( samplingRate ) :
+    # SEED band code of a broadband channel
+    for minRate, code in ( ( 250, 'C' ), ( 80, 'H' ), ( 10, 'B' ),
+                           ( 1, 'L' ) ) :
+        if samplingRate >= minRate :
+            return code
+    return 'V'
+
+#---------------------------------------------------------------
+def WriteMiniSEED( outFile, metadata, chunks ) :
+    try :
+        import obspy
+    except ImportError :
+        raise( Exception( 'miniSEED export needs obspy ' + \
+                          '(pip3 install obspy).' ) )
+
+    rate  = metadata[ 'samplingRate' ]
+    stats = { 'network'       : NETWORK,
+              'station'       : metadata[ 'sensorName' ].split( '-' )[-1][-5:],
+              'location'      : '',
+              'channel'       : BandCode( rate ) + 'DF',
+              'sampling_rate' : rate,
+              'calib'         : metadata[ 'pascalPerCount' ] or 1. }
+
+    fo = open( outFile, 'wb' )
+    try :
+        for chunk in chunks :
+            blockColumns, blockSamples = BlockArrays( chunk )
+
+            # A trace for each run of contiguous blocks in the chunk
+            blockTimes = blockColumns[ 'utcTime' ]
+            breaks = np.flatnonzero( np.abs( np.diff( blockTimes ) - 1. ) >
+                                     0.5 / rate ) + 1
+            first = 0
+            for last in list( breaks ) + [ len( chunk ) ] :
+                trace = obspy.Trace( blockSamples[ first * rate :
+                                                   last * rate ].copy(),
+                                     header = dict( stats ) )
+                trace.stats.starttime = obspy.UTCDateTime( blockTimes[ first ] )
+                obspy.Stream( [ trace ] ).write( fo, format = 'MSEED',
+                                                 encoding = 'STEIM2',
+                                                 reclen = 4096 )
+                first = last
+    finally :
+        fo.close()
+
+# format : ( file extension, required module, writer,
+#            metadata in a .json sidecar )
+FORMATS = { 'hdf5'    : ( '.h5',      'h5py',    WriteHDF5,     False ),
+            'parquet' : ( '.parquet', 'pyarrow', WriteParquet,  False ),
+            'mseed'   : ( '.mseed',   'obspy',   WriteMiniSEED, True  ) }
+
+#---------------------------------------------------------------
+def CheckFormat( fmt ) :
+    # Raise an Exception unless fmt can be written here
+    if fmt not in FORMATS :
+        raise( Exception( 'Unknown export format ' + repr( fmt ) + \
+                          ', use one of ' + ', '.join( sorted( FORMATS ) ) ) )
+    module = FORMATS[ fmt ][1]
+    if not importlib.util.find_spec( module ) :
+        raise( Exception( fmt + ' export needs ' + module + \
+                          ' (pip3 install ' + module + ').' ) )
+
+#---------------------------------------------------------------
+def ExportFile( fileName, outFile, fmt, calibrationLevel = None ) :
+    # Convert one UMX file, runs in the worker processes.
+    # Return ( fileName, numBlocks, error message or '' )
+    tempFile = outFile + '.tmp'
+    try :
+        fileHeader, blocks = UMXFile.IterFile( fileName )
+        firstBlock = next( blocks, None )
+        if not firstBlock :
+            return fileName, 0, fileName + ': no complete blocks.'
+
+        metadata = Metadata( fileName, fileHeader, firstBlock[0],
+                             calibrationLevel )
+
+        numBlocks = [ 0 ]
+        def Blocks() :
+            yield firstBlock
+            for block in blocks :
+                yield block
+                numBlocks[0] = numBlocks[0] + 1
+
+        os.makedirs( os.path.dirname( os.path.abspath( outFile ) ),
+                     exist_ok = True )
+        FORMATS[ fmt ][2]( tempFile, metadata, Chunks( Blocks() ) )
+
+        if FORMATS[ fmt ][3] :
+            fo = open( outFile + '.json', 'w' )
+            json.dump( metadata, fo, indent = 1 )
+            fo.close()
+        os.replace( tempFile, outFile )
+
+    except Exception as e :
+        if os.path.exists( tempFile ) :
+            os.remove( tempFile )
+        return fileName, 0, fileName + ': ' + str( e )
+
+    return fileName, numBlocks[0] + 1, ''
+
+#---------------------------------------------------------------
+def PlanExport( inPath, outPath, fmt, force = False ) :
+    # Return [ ( fileName, outFile ) ] to convert and the number of
+    # files whose output is up to date
+    extension = FORMATS[ fmt ][0]
+    jobs      = []
+    upToDate  = 0
+
+    for root, dirs, files in os.walk( inPath ) :
+        for f in sorted( files ) :
+            if not UMXFile.ParseFileName( f ) :
+                continue
+            fileName = os.path.join( root, f )
+            outFile  = os.path.join( outPath,
+                                     os.path.relpath( fileName, inPath ) )
+            outFile  = outFile[ : -len( UMXFile.FILE_SUFFIX ) ] + extension
+
+            if not force and os.path.exists( outFile ) and \
+               os.path.getmtime( outFile ) >= os.path.getmtime( fileName ) :
+                upToDate = upToDate + 1
+                continue
+            jobs.append( ( fileName, outFile ) )
+
+    return jobs, upToDate
+
+#---------------------------------------------------------------
+def SubmitExport( executor, jobs, fmt, calibrationLevel = None ) :
+    return [ executor.submit( ExportFile, fileName, outFile, fmt,
+                              calibrationLevel )
+             for fileName, outFile in jobs ]
+
+#---------------------------------------------------------------
+def Result( future ) :
+    # ( fileName, blocks, error ) of an ExportFile future, a task that
+    # raised (a broken process pool) is a failed export
+    try :
+        return future.result()
+    except Exception as e :
+        return '', 0, 'Export task: ' + str( e )
+
+#---------------------------------------------------------
+# Export of the archived data of the selected sensors,
+# driven from the Tk mainloop like the NCPASensor Poll*Cmd
+#---------------------------------------------------------
+class ExportJob:
+    def __init__( self, monitor, keys, fmt ):
+        self.monitor   = monitor
+        self.fmt       = fmt
+        self.futures   = []
+        self.upToDate  = 0
+        self.messages  = ''
+        self.startTime = time.time()
+
+        for key in keys :
+            sensor  = monitor.SensorCollection.SensorDict[ key ]
+            inPath  = os.path.join( monitor.args.archivePath, sensor.name )
+            outPath = os.path.join( monitor.args.exportPath, sensor.name )
+            jobs, upToDate = PlanExport( inPath, outPath, fmt )
+
+            self.upToDate = self.upToDate + upToDate
+            self.futures.extend( SubmitExport( monitor.GetProcessPool(),
+                jobs, fmt, UMXData.ConfigCalibrationLevel(
+                               sensor.configInPath + sensor.configInFile ) ) )
+
+        monitor.Tk_root.after( 200, self.Poll )
+
+    #-----------------------------------------------------------
+    def Poll( self ):
+        done   = [ future for future in self.futures if future.done() ]
+        failed = [ future for future in done if Result( future )[2] ]
+
+        msg = MonitorCommands.GetLocalUTC() + ' Export ' + self.fmt + \
+              ': ' + str( len( done ) ) + ' of ' + \
+              str( len( self.futures ) ) + ' files, ' + \
+              str( len( failed ) ) + ' failed, ' + \
+              str( self.upToDate ) + ' up to date'
+
+        if len( done ) < len( self.futures ) :
+            self.monitor.msgCommand.set( msg )
+            # register this function for a callback after 200 ms
+            self.monitor.Tk_root.after( 200, self.Poll )
+            return
+
+        for future in failed :
+            self.messages = self.messages + MonitorCommands.GetLocalUTC() + \
+                            ' Export Failed: ' + Result( future )[2] + '\n'
+        self.monitor.msgCommand.set( self.messages + msg + ' in ' + \
+            str( round( time.time() - self.startTime ) ) + ' s.\n' )
+        self.monitor.exportJob = None
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    CheckFormat( args.format )
+
+    jobs, upToDate = PlanExport( args.inPath, args.outPath, args.format,
+                                 args.force )
+    print( str( len( jobs ) ) + ' files to export, ' + \
+           str( upToDate ) + ' up to date.' )
+
+    executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+    futures  = SubmitExport( executor, jobs, args.format,
+                             args.calibrationLevel or None )
+
+    numBlocks = 0
+    for future in concurrent.futures.as_completed( futures ) :
+        fileName, blocks, error = Result( future )
+        numBlocks = numBlocks + blocks
+        if error :
+            print( error )
+        elif DEBUG :
+            print( fileName + ': ' + str( blocks ) + ' blocks' )
+    executor.shutdown()
+
+    print( 'Exported ' + str( numBlocks ) + ' s of data to ' + args.outPath )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'NCPA UMX export' )
+
+    parser.add_argument('inPath',
+                        help = 'Directory of UMX files.')
+
+    parser.add_argument('-f', '--format',
+                        dest   = 'format', type = str,
+                        action = 'store', default = 'hdf5',
+                        help = 'hdf5, parquet or mseed (hdf5).')
+
+    parser.add_argument('-o', '--outPath',
+                        dest   = 'outPath', type = str,
+                        action = 'store', default = './',
+                        help = 'Output directory (./).')
+
+    parser.add_argument('-k', '--calibrationLevel',
+                        dest   = 'calibrationLevel', type = str,
+                        action = 'store', default = '',
+                        help = 'calibrationLevel (from the file header).')
+
+    parser.add_argument('-F', '--force',
+                        dest   = 'force',
+                        action = 'store_true', default = False,
+                        help = 'Export files that are up to date.')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = None,
+                        help = 'Number of worker processes (all cores).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
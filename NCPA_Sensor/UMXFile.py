@@ -0,0 +1,264 @@
+#----------------------------------------------------------------------------
+# Name:     UMXFile.py
+# Purpose:  Decode the UMX data files written by UMXcontrol4
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# UMX file layout, following headerConfig in UMSX1.4.cfg.
+# All values are little endian.
+#
+#   File header : magic            char[4]   '.umx'
+#                 version          char[16]
+#                 sensorLocation   char[32]
+#                 sensorName       char[32]
+#                 calibrationLevel char[16]
+#                 calibrationDate  char[16]
+#                 samplingRate     int32     Hz
+#
+#   Blocks      : One block per second, a block header
+#                 utcTime          float64   seconds since the epoch
+#                 gpsLatitude      float64   degrees
+#                 gpsLongitude     float64   degrees
+#                 gpsElevation     float64   m
+#                 batteryLevel     float64   V
+#                 dataType         int32
+#                 nameADC          char[16]
+#                 followed by samplingRate int32 ADC samples.
+#
+# This module only uses the standard library so that it can also
+# be run on the sensors (see MonitorCommands.RemotePythonCmd).
+#------------------------------------------------------------------
+
+import array
+import calendar
+import struct
+import sys
+import time
+
+UMX_MAGIC    = b'.umx'
+FILE_HEADER  = struct.Struct( '<4s16s32s32s16s16si' )
+BLOCK_HEADER = struct.Struct( '<dddddi16s' )
+SAMPLE_SIZE  = 4
+
+# The data file names are:
+# /data/ncpa42-1XXX_YYMMDD/ncpa42-1XXX_YYMMDD_HHMMSS.umx
+FILE_SUFFIX = '.umx'
+FILE_LENGTH = 300   # seconds, UMXFileLength in UMSX1.4.cfg
+
+# LTC-2440 ADC: 24 bit signed output, full scale is +/- VREF / 2
+ADC_VREF        = 5.0
+ADC_FULL_SCALE  = 2**23
+COUNTS_TO_VOLTS = ADC_VREF / 2. / ADC_FULL_SCALE
+
+#---------------------------------------------------------------
+def CString( field ) :
+    # Decode a NUL padded char[] field
+    return field.split( b'\0', 1 )[0].decode( 'ascii', 'replace' ).strip()
+
+#---------------------------------------------------------------
+def ParseFileName( fileName ) :
+    # Return ( sensorName, startTime ) from a data file name, the
+    # startTime is in seconds since the epoch (UTC).
+    # Return None if fileName is not a UMX data file name.
+    fileName = fileName.split( '/' )[-1]
+    if not fileName.endswith( FILE_SUFFIX ) :
+        return None
+
+    words = fileName[ : -len( FILE_SUFFIX ) ].split( '_' )
+    if len( words ) != 3 :
+        return None
+
+    try :
+        t = time.strptime( words[1] + words[2], '%y%m%d%H%M%S' )
+    except ValueError :
+        return None
+
+    return ( words[0], calendar.timegm( t ) )
+
+#---------------------------------------------------------------
+def ParseUTC( utc ) :
+    # Seconds since the epoch from 'YYYY-mm-ddTHH:MM:SS' or the
+    # file name format 'YYMMDD_HHMMSS'
+    for fmt in ( '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%y%m%d_%H%M%S' ) :
+        try :
+            return calendar.timegm( time.strptime( utc.strip(), fmt ) )
+        except ValueError :
+            pass
+
+    raise( Exception( 'Invalid UTC time: ' + utc ) )
+
+#---------------------------------------------------------------
+def SelectFiles( fileNames, startTime, stopTime, fileLength = FILE_LENGTH ) :
+    # Return the UMX data files, sorted by start time, whose name
+    # places them within startTime to stopTime. A None time is open.
+    selected = []
+    for fileName in fileNames :
+        parsed = ParseFileName( fileName )
+        if not parsed :
+            continue
+        fileStart = parsed[1]
+        if stopTime  is not None and fileStart >= stopTime :
+            continue
+        if startTime is not None and fileStart + fileLength <= startTime :
+            continue
+        selected.append( ( fileStart, fileName ) )
+
+    selected.sort()
+    return [ fileName for fileStart, fileName in selected ]
+
+#---------------------------------------------------------------
+def DataDirName( sensorName, startTime ) :
+    return sensorName + '_' + \
+           time.strftime( '%y%m%d', time.gmtime( startTime ) )
+
+#---------------------------------------------------------------
+def DataFileName( sensorName, startTime ) :
+    return sensorName + '_' + \
+           time.strftime( '%y%m%d_%H%M%S', time.gmtime( startTime ) ) + \
+           FILE_SUFFIX
+
+#---------------------------------------------------------
+# UMX file header
+#---------------------------------------------------------
+class FileHeader:
+    def __init__( self, data ):
+        if len( data ) < FILE_HEADER.size :
+            raise( Exception( 'UMX file header is truncated: ' + \
+                              str( len( data ) ) + ' bytes.' ) )
+
+        fields = FILE_HEADER.unpack_from( data )
+
+        if fields[0] != UMX_MAGIC :
+            raise( Exception( 'UMX file header has bad magic: ' + \
+                              repr( fields[0] ) ) )
+
+        self.magic            = CString( fields[0] )
+        self.version          = CString( fields[1] )
+        self.sensorLocation   = CString( fields[2] )
+        self.sensorName       = CString( fields[3] )
+        self.calibrationLevel = CString( fields[4] )
+        self.calibrationDate  = CString( fields[5] )
+        self.samplingRate     = fields[6]
+
+        if self.samplingRate < 1 :
+            raise( Exception( 'UMX file header has bad samplingRate: ' + \
+                              str( self.samplingRate ) ) )
+
+        self.blockSize = BlockSize( self.samplingRate )
+
+#---------------------------------------------------------
+# UMX block header
+#---------------------------------------------------------
+class BlockHeader:
+    def __init__( self, data, offset = 0 ):
+        fields = BLOCK_HEADER.unpack_from( data, offset )
+
+        self.utcTime      = fields[0]
+        self.gpsLatitude  = fields[1]
+        self.gpsLongitude = fields[2]
+        self.gpsElevation = fields[3]
+        self.batteryLevel = fields[4]
+        self.dataType     = fields[5]
+        self.nameADC      = CString( fields[6] )
+
+#---------------------------------------------------------------
+def BlockSize( samplingRate ) :
+    return BLOCK_HEADER.size + samplingRate * SAMPLE_SIZE
+
+#---------------------------------------------------------------
+def BlockOffset( samplingRate, blockIndex ) :
+    # Byte offset of block blockIndex from the start of the file
+    return FILE_HEADER.size + blockIndex * BlockSize( samplingRate )
+
+#---------------------------------------------------------------
+def DecodeSamples( data, offset, numSamples ) :
+    # Return an array( 'i' ) of numSamples int32 ADC samples
+    samples = array.array( 'i' )
+    samples.frombytes( data[ offset : offset + numSamples * SAMPLE_SIZE ] )
+    if sys.byteorder == 'big' :
+        samples.byteswap()
+    return samples
+
+#---------------------------------------------------------------
+def DecodeBlocks( data, fileHeader, offset = FILE_HEADER.size ) :
+    # Decode the complete blocks in data from offset.
+    # Return a list of ( BlockHeader, samples ) and the offset
+    # of the first byte not consumed.
+    blocks = []
+    while offset + fileHeader.blockSize <= len( data ) :
+        blockHeader = BlockHeader( data, offset )
+        samples     = DecodeSamples( data, offset + BLOCK_HEADER.size,
+                                     fileHeader.samplingRate )
+        blocks.append( ( blockHeader, samples ) )
+        offset = offset + fileHeader.blockSize
+
+    return blocks, offset
+
+#---------------------------------------------------------------
+def ReadFile( fileName ) :
+    # Return the FileHeader and a list of ( BlockHeader, samples )
+    # for a local UMX file. A partial last block is ignored.
+    fi   = open( fileName, 'rb' )
+    data = fi.read()
+    fi.close()
+
+    fileHeader = FileHeader( data )
+    blocks, offset = DecodeBlocks( data, fileHeader )
+
+    return fileHeader, blocks
+
+#---------------------------------------------------------------
+def IterFile( fileName ) :
+    # Return the FileHeader and an iterator of ( BlockHeader, samples )
+    # that reads one block at a time, for files too large to read
+    # whole. A partial last block is ignored.
+    fi = open( fileName, 'rb' )
+    try :
+        fileHeader = FileHeader( fi.read( FILE_HEADER.size ) )
+    except Exception :
+        fi.close()
+        raise
+
+    def Blocks() :
+        try :
+            while True :
+                data = fi.read( fileHeader.blockSize )
+                if len( data ) < fileHeader.blockSize :
+                    return
+                yield ( BlockHeader( data ),
+                        DecodeSamples( data, BLOCK_HEADER.size,
+                                       fileHeader.samplingRate ) )
+        finally :
+            fi.close()
+
+    return fileHeader, Blocks()
+
+#---------------------------------------------------------
+# Incremental decoder for a byte stream of a UMX file,
+# for example from 'tail -c +1 -f' on a sensor.
+#---------------------------------------------------------
+class StreamDecoder:
+    def __init__( self ):
+        self.buffer     = b''
+        self.fileHeader = None
+
+    #-----------------------------------------------------------
+    def Feed( self, data ):
+        # Add data to the stream, return a list of the complete
+        # ( BlockHeader, samples ) decoded so far
+        self.buffer = self.buffer + data
+
+        if not self.fileHeader :
+            if len( self.buffer ) < FILE_HEADER.size :
+                return []
+            self.fileHeader = FileHeader( self.buffer )
+            self.buffer     = self.buffer[ FILE_HEADER.size : ]
+
+        blocks, offset = DecodeBlocks( self.buffer, self.fileHeader, 0 )
+        self.buffer = self.buffer[ offset : ]
+
+        return blocks
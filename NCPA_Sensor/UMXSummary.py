@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     UMXSummary.py
+# Purpose:  Reduce UMX data to min/max/mean/RMS records per interval
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./UMXSummary.py -b 2026-10-19T12:00:00 -e 2026-10-19T13:00:00
+#                 -i 1 -o summary.bin /data
+# ./UMXSummary.py -d summary.bin
+#
+# This runs on the sensors (see MonitorCommands.SummaryCmd) as well
+# as on local files, so it only uses the standard library.
+#
+# Binary summary format, little endian:
+#   Header : magic 'UMXS' char[4], sensorName char[32],
+#            samplingRate int32, interval float64 seconds
+#   Runs   : runStart float64, numRecords uint32, followed by
+#            numRecords records of min int32, max int32,
+#            mean float32, rms float32 in ADC counts.
+# A run is a stretch of contiguous intervals, record i of a run
+# starts at runStart + i * interval.
+#------------------------------------------------------------------
+
+import argparse
+import math
+import os
+import struct
+import sys
+
+import UMXFile
+
+SUMMARY_MAGIC  = b'UMXS'
+SUMMARY_HEADER = struct.Struct( '<4s32sid' )
+RUN_HEADER     = struct.Struct( '<dI' )
+RECORD         = struct.Struct( '<iiff' )
+
+#---------------------------------------------------------------
+def SummarizeFiles( fileNames, startTime, stopTime, interval ) :
+    # Return ( sensorName, samplingRate, runs ) where runs is a list
+    # of ( runStart, [ ( min, max, mean, rms ) ] ). interval is a
+    # whole number of seconds, one or more one second UMX blocks.
+    sensorName   = ''
+    samplingRate = 0
+    runs         = []
+    records      = []
+    runStart     = None
+    nextTime     = None
+
+    # Running sums of the current interval
+    count = 0
+    lo = hi = total = totalSq = 0
+    intervalStart = None
+
+    for fileName in fileNames :
+        try :
+            fileHeader, blocks = UMXFile.ReadFile( fileName )
+        except Exception as e :
+            sys.stderr.write( fileName + ': ' + str( e ) + '\n' )
+            continue
+
+        sensorName   = fileHeader.sensorName
+        samplingRate = fileHeader.samplingRate
+
+        for blockHeader, samples in blocks :
+            t = blockHeader.utcTime
+            if startTime is not None and t < startTime :
+                continue
+            if stopTime is not None and t >= stopTime :
+                continue
+
+            # A gap ends the current run, the partial interval is dropped
+            if nextTime is not None and abs( t - nextTime ) > 0.5 :
+                if records :
+                    runs.append( ( runStart, records ) )
+                records  = []
+                runStart = None
+                count    = 0
+
+            if count == 0 :
+                intervalStart = t
+                lo = min( samples )
+                hi = max( samples )
+                total = totalSq = 0
+                if runStart is None :
+                    runStart = t
+
+            lo      = min( lo, min( samples ) )
+            hi      = max( hi, max( samples ) )
+            total   = total + sum( samples )
+            totalSq = totalSq + sum( s * s for s in samples )
+            count   = count + len( samples )
+            nextTime = t + 1.
+
+            if t + 1. - intervalStart >= interval - 0.5 :
+                records.append( ( lo, hi, total / count,
+                                  math.sqrt( totalSq / count ) ) )
+                count = 0
+
+    if records :
+        runs.append( ( runStart, records ) )
+
+    return sensorName, samplingRate, runs
+
+#---------------------------------------------------------------
+def Encode( sensorName, samplingRate, interval, runs ) :
+    parts = [ SUMMARY_HEADER.pack( SUMMARY_MAGIC,
+                                   sensorName.encode( 'ascii' ),
+                                   samplingRate, interval ) ]
+    for runStart, records in runs :
+        parts.append( RUN_HEADER.pack( runStart, len( records ) ) )
+        for record in records :
+            parts.append( RECORD.pack( *record ) )
+
+    return b''.join( parts )
+
+#---------------------------------------------------------------
+def Decode( data ) :
+    # Inverse of Encode(): return ( sensorName, samplingRate,
+    # interval, runs )
+    if len( data ) < SUMMARY_HEADER.size :
+        raise( Exception( 'UMX summary is truncated: ' + \
+                          str( len( data ) ) + ' bytes.' ) )
+
+    magic, name, samplingRate, interval = SUMMARY_HEADER.unpack_from( data )
+    if magic != SUMMARY_MAGIC :
+        raise( Exception( 'UMX summary has bad magic: ' + repr( magic ) ) )
+
+    runs   = []
+    offset = SUMMARY_HEADER.size
+    while offset + RUN_HEADER.size <= len( data ) :
+        runStart, numRecords = RUN_HEADER.unpack_from( data, offset )
+        offset = offset + RUN_HEADER.size
+
+        if offset + numRecords * RECORD.size > len( data ) :
+            raise( Exception( 'UMX summary run is truncated.' ) )
+
+        records = [ RECORD.unpack_from( data, offset + i * RECORD.size )
+                    for i in range( numRecords ) ]
+        offset  = offset + numRecords * RECORD.size
+        runs.append( ( runStart, records ) )
+
+    return UMXFile.CString( name ), samplingRate, interval, runs
+
+#---------------------------------------------------------------
+def WriteTable( fileName, interval, runs ) :
+    # Text columns for gnuplot: UTC seconds, min, max, mean, rms.
+    # A blank line between runs breaks the plotted line at gaps.
+    fo = open( fileName, 'w' )
+    for runStart, records in runs :
+        for i, record in enumerate( records ) :
+            fo.write( '%.3f %d %d %.3f %.3f\n' % \
+                      ( ( runStart + i * interval, ) + tuple( record ) ) )
+        fo.write( '\n' )
+    fo.close()
+
+#---------------------------------------------------------------
+def FindFiles( paths ) :
+    fileNames = []
+    for path in paths :
+        if os.path.isdir( path ) :
+            for root, dirs, files in os.walk( path ) :
+                fileNames.extend( os.path.join( root, f ) for f in files )
+        else :
+            fileNames.append( path )
+    return fileNames
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    if args.decode :
+        fi = open( args.decode, 'rb' )
+        sensorName, samplingRate, interval, runs = Decode( fi.read() )
+        fi.close()
+        print( sensorName + ' ' + str( samplingRate ) + ' Hz, ' + \
+               str( interval ) + ' s records' )
+        for runStart, records in runs :
+            for i, record in enumerate( records ) :
+                print( '%.3f %d %d %.3f %.3f' % \
+                       ( ( runStart + i * interval, ) + tuple( record ) ) )
+        return
+
+    startTime = UMXFile.ParseUTC( args.begin ) if args.begin else None
+    stopTime  = UMXFile.ParseUTC( args.end   ) if args.end   else None
+
+    fileNames = UMXFile.SelectFiles( FindFiles( args.paths ),
+                                     startTime, stopTime )
+
+    sensorName, samplingRate, runs = \
+        SummarizeFiles( fileNames, startTime, stopTime, args.interval )
+    data = Encode( sensorName, samplingRate, args.interval, runs )
+
+    if args.outFile :
+        fo = open( args.outFile, 'wb' )
+        fo.write( data )
+        fo.close()
+    else :
+        sys.stdout.buffer.write( data )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    parser = argparse.ArgumentParser( description = 'UMX data summary' )
+
+    parser.add_argument('paths', nargs = '*', default = [ '/data' ],
+                        help = 'UMX files or directories (/data).')
+
+    parser.add_argument('-b', '--begin',
+                        dest   = 'begin', type = str,
+                        action = 'store', default = '',
+                        help = 'Start UTC (2026-10-19T12:00:00).')
+
+    parser.add_argument('-e', '--end',
+                        dest   = 'end', type = str,
+                        action = 'store', default = '',
+                        help = 'End UTC (2026-10-19T13:00:00).')
+
+    parser.add_argument('-i', '--interval',
+                        dest   = 'interval', type = int,
+                        action = 'store', default = 1,
+                        help = 'Seconds per summary record (1).')
+
+    parser.add_argument('-o', '--outFile',
+                        dest   = 'outFile', type = str,
+                        action = 'store', default = '',
+                        help = 'Output file (stdout).')
+
+    parser.add_argument('-d', '--decode',
+                        dest   = 'decode', type = str,
+                        action = 'store', default = '',
+                        help = 'Print the records of a summary file.')
+
+    return parser.parse_args()
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#! /usr/bin/env python3
+
+#----------------------------------------------------------------------------
+# Name:     UMXVerify.py
+# Purpose:  Integrity checks of UMX data files
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# Usage:
+# ./UMXVerify.py -c ~/umxverify.json /data
+# ./UMXVerify.py -j 8 -l 300 ~/SensorArchive
+#
+# Checks of each file, reading only the headers:
+#   the file header magic '.umx' and samplingRate
+#   whole blocks, a partial last block is a truncated file
+#   UMXFileLength blocks (-l), the newest file of each sensor and
+#   any file whose start time + UMXFileLength is not yet past are
+#   still being written and may be shorter
+#   the first block at the time in the file name, the block
+#   utcTime increasing by 1 s (a jump is a gap in the file)
+# This runs on the sensors (see MonitorCommands.VerifyCmd) as well
+# as on local archives, so it only uses the standard library.
+#
+# The results are cached by file identity, path, size and mtime,
+# in the -c file so that only new and changed files are read.
+#
+# One line per file with problems, sorted by file name:
+#   fileName problem; problem ...
+# and a last line '# files checked bad'.
+#------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import UMXFile
+
+DEBUG = False # Set True by the -v (verbose) option
+
+TOLERANCE = 0.5   # seconds of slack of the block times
+
+#---------------------------------------------------------------
+def VerifyFile( fileName, fileLength = UMXFile.FILE_LENGTH, newest = False ) :
+    # Return a list of the problems of a UMX file, [] if it is good
+    problems = []
+    fi = open( fileName, 'rb' )
+    try :
+        try :
+            fileHeader = UMXFile.FileHeader( fi.read( UMXFile.FILE_HEADER.size ) )
+        except Exception as e :
+            return [ str( e ) ]
+
+        fi.seek( 0, os.SEEK_END )
+        size   = fi.tell() - UMXFile.FILE_HEADER.size
+        blocks = size // fileHeader.blockSize
+        if size % fileHeader.blockSize :
+            problems.append( 'truncated: partial block of ' + \
+                             str( size % fileHeader.blockSize ) + ' bytes' )
+        if blocks < fileLength and not newest :
+            problems.append( 'short: ' + str( blocks ) + ' of ' + \
+                             str( fileLength ) + ' blocks' )
+        elif blocks > fileLength :
+            problems.append( 'long: ' + str( blocks ) + ' of ' + \
+                             str( fileLength ) + ' blocks' )
+
+        # The utcTime of every block header
+        parsed   = UMXFile.ParseFileName( fileName )
+        expected = parsed[1] if parsed else None
+        jumps    = 0
+        for block in range( blocks ) :
+            fi.seek( UMXFile.BlockOffset( fileHeader.samplingRate, block ) )
+            utcTime = UMXFile.BlockHeader(
+                fi.read( UMXFile.BLOCK_HEADER.size ) ).utcTime
+
+            if expected is not None and abs( utcTime - expected ) > TOLERANCE :
+                if block == 0 :
+                    problems.append( 'first block at %+.3f s' % \
+                                     ( utcTime - expected ) )
+                elif utcTime <= expected - 1. :
+                    problems.append( 'block ' + str( block ) + \
+                                     ' time goes back %.3f s' % \
+                                     ( expected - 1. - utcTime ) )
+                else :
+                    jumps = jumps + 1
+            expected = utcTime + 1.
+
+        if jumps :
+            problems.append( str( jumps ) + ' time jumps' )
+    finally :
+        fi.close()
+
+    return problems
+
+#---------------------------------------------------------------
+def VerifyFiles( fileNames, fileLength = UMXFile.FILE_LENGTH, newest = () ) :
+    # Return [ ( fileName, problems ) ] of fileNames, newest are
+    # the files still being written
+    results = []
+    for fileName in fileNames :
+        try :
+            problems = VerifyFile( fileName, fileLength, fileName in newest )
+        except Exception as e :
+            problems = [ str( e ) ]
+        results.append( ( fileName, problems ) )
+    return results
+
+#---------------------------------------------------------------
+def Identity( fileName ) :
+    stat = os.stat( fileName )
+    return [ stat.st_size, stat.st_mtime ]
+
+#---------------------------------------------------------------
+def LoadCache( cacheFile ) :
+    # { fileName : [ size, mtime, problems ] }
+    try :
+        fi = open( cacheFile )
+        cache = json.load( fi )
+        fi.close()
+    except ( OSError, ValueError ) :
+        cache = {}
+    return cache
+
+#---------------------------------------------------------------
+def SaveCache( cacheFile, cache ) :
+    fo = open( cacheFile + '.tmp', 'w' )
+    json.dump( cache, fo )
+    fo.close()
+    os.replace( cacheFile + '.tmp', cacheFile )
+
+#---------------------------------------------------------------
+def PlanVerify( fileNames, cache, fileLength = UMXFile.FILE_LENGTH ) :
+    # Split fileNames into the cached [ ( fileName, problems ) ] and
+    # those to check, and the files that may still be written: the
+    # newest one of each sensor and those that started less than
+    # fileLength ago. An older file that ends a day directory is
+    # not newest, it is short.
+    cached   = []
+    toCheck  = []
+    newest   = set()
+    last     = {}   # ( startTime, fileName ) of the newest file by sensor
+    now      = time.time()
+    for fileName in fileNames :
+        parsed = UMXFile.ParseFileName( fileName )
+        if parsed :
+            sensorName, startTime = parsed
+            if startTime + fileLength > now :
+                newest.add( fileName )
+            if sensorName not in last or startTime > last[ sensorName ][0] :
+                last[ sensorName ] = ( startTime, fileName )
+
+        entry = cache.get( fileName )
+        if entry and entry[ : 2 ] == Identity( fileName ) :
+            cached.append( ( fileName, entry[2] ) )
+        else :
+            toCheck.append( fileName )
+
+    newest.update( fileName for startTime, fileName in last.values() )
+    return cached, toCheck, newest
+
+#---------------------------------------------------------------
+def UpdateCache( cache, results, newest ) :
+    # The newest files are still changing, they are not cached
+    for fileName, problems in results :
+        if fileName not in newest :
+            try :
+                cache[ fileName ] = Identity( fileName ) + [ problems ]
+            except OSError :
+                pass
+
+#---------------------------------------------------------------
+def SubmitVerify( executor, fileNames, fileLength, newest, chunk = 50 ) :
+    # Chunks of fileNames as VerifyFiles tasks of the process pool
+    return [ executor.submit( VerifyFiles, fileNames[ i : i + chunk ],
+                              fileLength, newest )
+             for i in range( 0, len( fileNames ), chunk ) ]
+
+#---------------------------------------------------------------
+def FormatResults( results ) :
+    lines = [ fileName + ' ' + '; '.join( problems )
+              for fileName, problems in sorted( results ) if problems ]
+    lines.append( '# ' + str( len( results ) ) + ' checked ' + \
+                  str( len( lines ) ) + ' bad' )
+    return lines
+
+#---------------------------------------------------------------
+def ParseLines( text ) :
+    # [ ( fileName, problems ) ] of the bad files and the number
+    # of files checked from the output of main()
+    bad     = []
+    checked = 0
+    for line in text.split( '\n' ) :
+        if line.startswith( '#' ) :
+            checked = int( line.split()[1] )
+        elif line.strip() :
+            fileName, problems = ( line.split( None, 1 ) + [ '' ] )[ : 2 ]
+            bad.append( ( fileName, problems.split( '; ' ) ) )
+    return bad, checked
+
+#----------------------------------------------------------------------------
+# Main module
+#----------------------------------------------------------------------------
+def main():
+    args = ParseCmdLine()
+
+    fileNames = []
+    for path in args.paths :
+        if os.path.isdir( path ) :
+            for root, dirs, files in os.walk( path ) :
+                fileNames.extend( os.path.join( root, f ) for f in files )
+        else :
+            fileNames.append( path )
+    fileNames = sorted( f for f in fileNames
+                        if f.endswith( UMXFile.FILE_SUFFIX ) )
+
+    cache = LoadCache( args.cacheFile ) if args.cacheFile else {}
+    cached, toCheck, newest = PlanVerify( fileNames, cache, args.fileLength )
+
+    if args.jobs == 1 :
+        results = VerifyFiles( toCheck, args.fileLength, newest )
+    else :
+        executor = concurrent.futures.ProcessPoolExecutor( args.jobs )
+        results  = []
+        for future in SubmitVerify( executor, toCheck, args.fileLength,
+                                    newest ) :
+            results.extend( future.result() )
+        executor.shutdown()
+
+    if args.cacheFile :
+        UpdateCache( cache, results, newest )
+        SaveCache( args.cacheFile, cache )
+
+    if DEBUG :
+        print( str( len( toCheck ) ) + ' read, ' + str( len( cached ) ) + \
+               ' cached' )
+    for line in FormatResults( cached + results ) :
+        print( line )
+
+#----------------------------------------------------------------------------
+def ParseCmdLine():
+    global DEBUG
+
+    parser = argparse.ArgumentParser( description = 'UMX file verification' )
+
+    parser.add_argument('paths', nargs = '*', default = [ '/data' ],
+                        help = 'UMX files or directories (/data).')
+
+    parser.add_argument('-c', '--cacheFile',
+                        dest   = 'cacheFile', type = str,
+                        action = 'store', default = '',
+                        help = 'Results cache (none).')
+
+    parser.add_argument('-l', '--fileLength',
+                        dest   = 'fileLength', type = int,
+                        action = 'store', default = UMXFile.FILE_LENGTH,
+                        help = 'UMXFileLength seconds per file (300).')
+
+    parser.add_argument('-j', '--jobs',
+                        dest   = 'jobs', type = int,
+                        action = 'store', default = 1,
+                        help = 'Number of worker processes (1).')
+
+    parser.add_argument('-v', '--verbose',
+                        dest   = 'verbose', # type = bool,
+                        action = 'store_true', default = False )
+
+    args = parser.parse_args()
+
+    # set DEBUG status
+    DEBUG = args.verbose
+
+    return args
+
+#----------------------------------------------------------------------------
+# Provide for cmd line invocation independent of import
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#----------------------------------------------------------------------------
+# Name:     ZoomView.py
+# Purpose:  Zoomable min/max view of archived NCPA sensor data
+#
+# Author:   J Park
+#
+# Created:
+#----------------------------------------------------------------------------
+
+#------------------------------------------------------------------
+# One chart per sensor over a shared time window. Every redraw
+# reads only the Pyramid tiles of the level matching the window
+# width, so a week and a few seconds are equally quick to draw.
+# Click a chart to center it there, the buttons zoom and pan.
+#------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+from tkinter import *
+from tkinter import ttk # 'tk themed widgets'
+
+import Pyramid
+
+DEBUG = False # Set True by the -v (verbose) option
+
+CHART_WIDTH  = 800
+CHART_HEIGHT = 120
+ZOOM         = 4.      # Window width factor of Zoom In / Out
+MIN_WINDOW   = 2.      # seconds
+MAX_WINDOW   = 28 * 86400.
+
+#---------------------------------------------------------
+# Toplevel window with one min/max chart per sensor
+#---------------------------------------------------------
+class ZoomView:
+    def __init__( self, monitor ):
+        self.monitor   = monitor
+        self.reader    = Pyramid.PyramidReader( monitor.args.pyramidPath )
+        self.charts    = {}   # ( Canvas, text ) by sensor name
+        self.startTime = None
+        self.stopTime  = None
+        self.window    = Toplevel( monitor.Tk_root )
+        self.window.title( 'NCPA: Zoom Data' )
+        self.window.protocol( 'WM_DELETE_WINDOW', self.Close )
+        self.window.columnconfigure( 0, weight = 1 )
+
+        buttons = ttk.Frame( self.window )
+        buttons.grid( column = 0, row = 0, sticky = (W,E) )
+        for column, ( label, command ) in enumerate( (
+                ( '<<',       lambda: self.Pan( -0.5 ) ),
+                ( 'Zoom In',  lambda: self.Zoom( 1. / ZOOM ) ),
+                ( 'Zoom Out', lambda: self.Zoom( ZOOM ) ),
+                ( '>>',       lambda: self.Pan( 0.5 ) ),
+                ( 'Day',      lambda: self.Last( 86400. ) ),
+                ( 'Week',     lambda: self.Last( 7 * 86400. ) ) ) ) :
+            ttk.Button( buttons, text = label, command = command ).grid(
+                column = column, row = 0, padx = 2, pady = 2 )
+
+        self.label = ttk.Label( buttons, text = '' )
+        self.label.grid( column = 6, row = 0, padx = 5, sticky = W )
+
+    #-----------------------------------------------------------
+    def AddSensor( self, sensorName ):
+        if sensorName in self.charts :
+            return
+
+        row    = len( self.charts ) + 1
+        canvas = Canvas( self.window, width = CHART_WIDTH,
+                         height = CHART_HEIGHT, background = 'white' )
+        canvas.grid( column = 0, row = row, sticky = (N,S,W,E),
+                     padx = 3, pady = 3 )
+        canvas.bind( '<Button-1>',
+                     lambda event, c = canvas: self.Center( c, event.x ) )
+        self.window.rowconfigure( row, weight = 1 )
+
+        text = canvas.create_text( 5, 5, anchor = NW, text = sensorName )
+        self.charts[ sensorName ] = ( canvas, text )
+
+        if self.startTime is None :
+            self.Last( 86400. )
+
+    #-----------------------------------------------------------
+    def Last( self, seconds ):
+        # Show the last seconds of data of the sensors
+        ends = [ extent[1] for extent in
+                 ( self.reader.Extent( name ) for name in self.charts )
+                 if extent ]
+        self.stopTime  = max( ends ) if ends else time.time()
+        self.startTime = self.stopTime - seconds
+        self.Draw()
+
+    #-----------------------------------------------------------
+    def Zoom( self, factor ):
+        center = ( self.startTime + self.stopTime ) / 2.
+        width  = min( max( ( self.stopTime - self.startTime ) * factor,
+                           MIN_WINDOW ), MAX_WINDOW )
+        self.startTime = center - width / 2.
+        self.stopTime  = center + width / 2.
+        self.Draw()
+
+    #-----------------------------------------------------------
+    def Pan( self, fraction ):
+        shift = ( self.stopTime - self.startTime ) * fraction
+        self.startTime = self.startTime + shift
+        self.stopTime  = self.stopTime  + shift
+        self.Draw()
+
+    #-----------------------------------------------------------
+    def Center( self, canvas, x ):
+        width = max( canvas.winfo_width(), 2 )
+        shift = ( x / width - 0.5 ) * ( self.stopTime - self.startTime )
+        self.startTime = self.startTime + shift
+        self.stopTime  = self.stopTime  + shift
+        self.Draw()
+
+    #-----------------------------------------------------------
+    def Draw( self ):
+        if self.startTime is None :
+            return
+
+        pixels = CHART_WIDTH
+        for name in self.charts :
+            pixels = Size( self.charts[ name ][0] )[0]
+            break
+        level = Pyramid.ChooseLevel( self.startTime, self.stopTime, pixels )
+
+        self.label.configure( text = UTC( self.startTime ) + ' - ' + \
+            UTC( self.stopTime ) + '  ' + \
+            str( Pyramid.LEVELS[ level ] ) + ' s bins' )
+
+        for name in self.charts :
+            self.DrawChart( name, level )
+
+    #-----------------------------------------------------------
+    def DrawChart( self, name, level ):
+        canvas, text = self.charts[ name ]
+        canvas.delete( 'data' )
+
+        width, height = Size( canvas )
+
+        times, mins, maxs = self.reader.Query( name, self.startTime,
+                                               self.stopTime, level )
+        full = ~np.isnan( mins )
+        if not full.any() :
+            canvas.itemconfigure( text, text = name + '  no data' )
+            return
+
+        yMin   = np.min( mins[ full ] )
+        yMax   = np.max( maxs[ full ] )
+        yScale = ( height - 20 ) / max( yMax - yMin, 1 )
+        xScale = width / ( self.stopTime - self.startTime )
+
+        xs  = ( times - self.startTime ) * xScale
+        yLo = height - 5 - ( mins - yMin ) * yScale
+        yHi = height - 5 - ( maxs - yMin ) * yScale
+
+        # One zig-zag line of min to max per run of bins with data
+        edges = np.flatnonzero( np.diff( full.astype( int ) ) ) + 1
+        for run in np.split( np.arange( len( times ) ), edges ) :
+            if not full[ run[0] ] :
+                continue
+            coords = np.column_stack( ( xs[ run ], yLo[ run ],
+                                        xs[ run ], yHi[ run ] ) ).ravel()
+            if len( coords ) == 4 :
+                coords = np.append( coords, coords[ -2 : ] + ( 1, 0 ) )
+            canvas.create_line( *coords.tolist(), fill = 'blue',
+                                tags = 'data' )
+
+        canvas.itemconfigure( text, text = name + '  [' + \
+                              str( int( yMin ) ) + ', ' + \
+                              str( int( yMax ) ) + ']' )
+        canvas.tag_raise( text )
+
+    #-----------------------------------------------------------
+    def Close( self ):
+        self.window.destroy()
+        self.monitor.zoomView = None
+
+#---------------------------------------------------------------
+def Size( canvas ) :
+    # The canvas size, the configured size until it is mapped
+    if canvas.winfo_width() < 10 :
+        return CHART_WIDTH, CHART_HEIGHT
+    return canvas.winfo_width(), canvas.winfo_height()
+
+#---------------------------------------------------------------
+def UTC( t ) :
+    return time.strftime( '%Y-%m-%d %H:%M:%S', time.gmtime( t ) )